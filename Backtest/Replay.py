@@ -0,0 +1,520 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from decimal import Decimal
+
+import Factories.Definitions as Definitions
+from Factories.Definitions import AggregationOrderBook, OpenVolume, \
+   overlayConfig
+from Factories.Provider.Factory import Factory
+from Factories.Dealer.Factory import DealerFactory
+from Hedger.SimpleHedger import SimpleHedger
+from Providers.Leverex import LeverexProvider
+from leverex_core.api_connection import AuthApiConnection
+from leverex_core.clock import SimulatedClock
+from leverex_core.product_router import ProductRouter
+from leverex_core.recorder import RecordReader
+from leverex_core.utils import LeverexOrder, ORDER_ACTION_CREATED, round_down
+
+#taker collateral when the config doesn't set one
+DEFAULT_TAKER_BALANCE = 100000
+
+################################################################################
+##
+#### replay providers
+##
+################################################################################
+class ReplayConnection(AuthApiConnection):
+   '''
+   Leverex connection fed from a record log. Requests are captured
+   instead of sent. The recorded replies carry the references of the
+   recorded session, they are matched to this session's pending
+   requests by type, in order. Replies to requests this session never
+   made are dropped.
+   '''
+   def __init__(self, clock):
+      super().__init__(api_endpoint=None, login_endpoint=None)
+      self._login_client = None
+      self.clock = clock
+      self.pending = {}
+      self.sent = []
+      self.lastQuote = []
+      self.authorized = False
+      self.unmatched = 0
+
+   async def _send(self, message):
+      key = next(iter(message))
+      body = message[key]
+      if isinstance(body, dict) and 'reference' in body:
+         if key == 'submit_prices':
+            self.lastQuote = body['prices']
+            #the recorded acks are for the recorded quotes, ack our own
+            cb = self._requests_cb.pop(body['reference'], None)
+            if cb != None:
+               await self._call_listener_cb(cb,
+                  { key : { 'result' : 1, 'reference' : body['reference'] } })
+         else:
+            self.pending.setdefault(key, deque()).append(body['reference'])
+      self.sent.append((self.clock.time_ns(), message))
+
+   async def feed(self, data):
+      update = json.loads(data)
+      key = next(iter(update), None)
+      if key == 'authorize':
+         if not self.authorized and update[key].get('success'):
+            self.authorized = True
+            await self._call_listener_method('on_connected')
+            await self._call_listener_method('on_authorized')
+         return
+      if key == 'submit_prices':
+         return
+
+      body = update[key]
+      if isinstance(body, dict) and 'reference' in body:
+         pending = self.pending.get(key)
+         if not pending:
+            self.unmatched += 1
+            return
+         body['reference'] = pending.popleft()
+         data = json.dumps(update)
+      await self.processMessage(data)
+
+########
+class ReplayTaker(Factory):
+   '''
+   Taker filled against the recorded Bitfinex book. Exposure updates
+   respect the exposure cooldown in replay time and fill at market, the
+   recorded account events are ignored: this account's exposure is
+   whatever the replayed hedger made it.
+
+   This replaces BitfinexProvider's handlers rather than feeding them:
+   a replay exercises the hedger and the Leverex maker, not the
+   Bitfinex book, position and exposure code.
+   '''
+   def __init__(self, config, clock):
+      super().__init__("Bitfinex", clock)
+      self.product = config['bitfinex']['product']
+      self.collateral_pct = config['bitfinex']['collateral_pct']
+      self.setLeverage(100/self.collateral_pct)
+      self.cooldown = config['bitfinex']['exposure_cooldown']
+      self.max_offer_volume = config['hedger']['max_offer_volume']
+
+      self.balance = Decimal(config.get('backtest', {}).get(
+         'taker_balance', DEFAULT_TAKER_BALANCE))
+      self.order_book = AggregationOrderBook()
+      self.exposure = Decimal(0)
+      self.indexPrice = 0
+
+      self.targetExposure = None
+      self.lastHedge = None
+      self.hedges = []
+
+   ## feed ##
+   async def feed(self, event, args):
+      if len(args) == 0:
+         return
+      data = args[0]
+      if isinstance(data, dict) and data.get('symbol', self.product) != self.product:
+         return
+
+      if event == 'order_book_snapshot':
+         self.order_book.reset()
+         self.order_book.setup_from_snapshot(data['data'])
+         if not self.isReady():
+            await self.setConnected(True)
+            await self.setInitBalance()
+            await self.setInitPosition()
+      elif event == 'order_book_update':
+         self.order_book.process_update(data['data'])
+         await self.onOrderBookUpdate()
+      elif event == 'status_update':
+         if data == None or 'deriv_price' not in data:
+            return
+         self.indexPrice = data['deriv_price']
+         await self.dealerCallback(self, Definitions.PriceEvent)
+
+   async def onClock(self):
+      #a queued target goes out once the cooldown is over
+      if self.targetExposure != None:
+         await self.hedge()
+
+   ## exposure ##
+   def getExposure(self):
+      if not self.isReady():
+         return None
+      return self.exposure
+
+   async def updateExposure(self, exposure):
+      self.targetExposure = Decimal(exposure)
+      await self.hedge()
+
+   async def hedge(self):
+      now = self.clock.time_ns() / 1000000
+      if self.lastHedge != None and self.lastHedge + self.cooldown > now:
+         return
+
+      target = self.targetExposure
+      self.targetExposure = None
+      diff = round_down(target - self.exposure, 8)
+      if abs(diff) < Decimal(0.000001):
+         return
+
+      #market order, walks the book from the top
+      isBuy = diff > 0
+      levels = self.order_book.get_levels(isBuy)
+      if len(levels) == 0:
+         logging.warning(f"[ReplayTaker] empty book, can't hedge {diff}")
+         self.targetExposure = target
+         return
+
+      top = levels[0][0]
+      if isBuy:
+         price = self.order_book.get_aggregated_ask_price(diff).price
+      else:
+         price = self.order_book.get_aggregated_bid_price(-diff).price
+
+      self.hedges.append(Hedge(self.clock.time_ns(), diff, price, top))
+      self.exposure += diff
+      self.lastHedge = now
+      await self.onPositionUpdate()
+
+   ## volume ##
+   def getOpenVolume(self):
+      if not self.isReady():
+         return None
+
+      priceBid = self.order_book.get_aggregated_bid_price(self.max_offer_volume)
+      priceAsk = self.order_book.get_aggregated_ask_price(self.max_offer_volume)
+      if priceBid == None or priceAsk == None:
+         return None
+
+      collateralPct = self.getCollateralRatio()
+      margin = abs(self.exposure) * Decimal(priceAsk.price) * collateralPct
+      askMargin = 0
+      bidMargin = 0
+      if self.exposure > 0:
+         bidMargin = round_down(margin, 6)
+      else:
+         askMargin = round_down(margin, 6)
+
+      return OpenVolume(self.balance - margin,
+         askMargin, collateralPct * round_down(priceAsk.price, 2),
+         bidMargin, collateralPct * round_down(priceBid.price, 2))
+
+   ## cash, funds don't move in a replay ##
+   async def loadAddresses(self, callback):
+      await callback()
+
+   async def loadWithdrawals(self, callback):
+      await callback()
+
+   def withdrawalsLoaded(self):
+      return True
+
+   def getPendingWithdrawals(self):
+      return []
+
+   def getCashMetrics(self):
+      return None
+
+################################################################################
+##
+#### results
+##
+################################################################################
+class Quote(object):
+   def __init__(self, timestamp, offers):
+      self.timestamp = timestamp
+      self.offers = offers
+
+   def toJson(self):
+      return { 'timestamp' : self.timestamp, 'offers' : self.offers }
+
+class Hedge(object):
+   def __init__(self, timestamp, amount, price, topPrice):
+      self.timestamp = timestamp
+      self.amount = amount
+      self.price = price
+      self.topPrice = topPrice
+
+   @property
+   def slippage(self):
+      #paid over the top of the book, as a ratio
+      if self.topPrice == 0:
+         return 0
+      if self.amount > 0:
+         return (self.price - self.topPrice) / self.topPrice
+      return (self.topPrice - self.price) / self.topPrice
+
+   def toJson(self):
+      return {
+         'timestamp' : self.timestamp,
+         'amount' : str(self.amount),
+         'price' : self.price,
+         'slippage' : self.slippage
+      }
+
+class EventCost(object):
+   def __init__(self, name):
+      self.name = name
+      self.count = 0
+      self.total = 0 #in ns
+      self.max = 0
+
+   def record(self, cost):
+      self.count += 1
+      self.total += cost
+      self.max = max(self.max, cost)
+
+   def getAverage(self):
+      if self.count == 0:
+         return 0
+      return self.total / self.count
+
+   def toJson(self):
+      return {
+         'count' : self.count,
+         'avg_us' : round(self.getAverage() / 1000, 3),
+         'max_us' : round(self.max / 1000, 3)
+      }
+
+   def __str__(self):
+      return f"{self.name}: {self.count} events, " \
+         f"avg: {round(self.getAverage() / 1000, 3)}us, " \
+         f"max: {round(self.max / 1000, 3)}us"
+
+########
+class ReplayResult(object):
+   def __init__(self):
+      self.quotes = []
+      self.hedges = []
+      #(timestamp, maker exposure, taker exposure), on change only
+      self.exposures = []
+      self.costs = {}
+      self.recordedQuotes = 0
+      self.recordedHedges = 0
+      #recorded maker fills, and how many the replayed quotes covered
+      self.fills = 0
+      self.quotedFills = 0
+      self.records = 0
+      self.unmatchedReplies = 0
+      self.duration = 0 #replay time covered, in ns
+
+   def recordCost(self, name, cost):
+      if name not in self.costs:
+         self.costs[name] = EventCost(name)
+      self.costs[name].record(cost)
+
+   def recordExposure(self, timestamp, makerExposure, takerExposure):
+      if len(self.exposures) > 0 and \
+         self.exposures[-1][1:] == (makerExposure, takerExposure):
+         return
+      self.exposures.append((timestamp, makerExposure, takerExposure))
+
+   def getMaxDrift(self):
+      #largest unhedged exposure seen
+      result = Decimal(0)
+      for timestamp, maker, taker in self.exposures:
+         if maker == None or taker == None:
+            continue
+         result = max(result, abs(Decimal(maker) + Decimal(taker)))
+      return result
+
+   def getFillRate(self):
+      if self.fills == 0:
+         return 0
+      return self.quotedFills / self.fills
+
+   def getSlippage(self):
+      volume = sum(abs(hedge.amount) for hedge in self.hedges)
+      if volume == 0:
+         return 0
+      return sum(float(abs(hedge.amount)) * hedge.slippage \
+         for hedge in self.hedges) / float(volume)
+
+   def toJson(self):
+      return {
+         'records' : self.records,
+         'duration_s' : self.duration / 1000000000,
+         'quotes' : [quote.toJson() for quote in self.quotes],
+         'recorded_quotes' : self.recordedQuotes,
+         'hedges' : [hedge.toJson() for hedge in self.hedges],
+         'recorded_hedges' : self.recordedHedges,
+         'fills' : self.fills,
+         'fill_rate' : self.getFillRate(),
+         'slippage' : self.getSlippage(),
+         'exposures' : [[ts, str(maker), str(taker)] \
+            for ts, maker, taker in self.exposures],
+         'max_drift' : str(self.getMaxDrift()),
+         'unmatched_replies' : self.unmatchedReplies,
+         'costs' : { name : cost.toJson() for name, cost in self.costs.items() }
+      }
+
+   def __str__(self):
+      lines = [
+         f"replayed {self.records} records, {round(self.duration / 1000000000, 3)}s",
+         f"quotes: {len(self.quotes)} (recorded: {self.recordedQuotes})",
+         f"maker fills: {self.fills}, "
+            f"covered by replayed quotes: {round(self.getFillRate() * 100, 2)}%",
+         f"hedges: {len(self.hedges)} (recorded: {self.recordedHedges}), "
+            f"avg slippage: {round(self.getSlippage() * 10000, 3)}bp",
+         f"max exposure drift: {self.getMaxDrift()}",
+         "processing cost:"
+      ]
+      for name in sorted(self.costs):
+         lines.append(f"  - {str(self.costs[name])}")
+      return "\n".join(lines)
+
+################################################################################
+##
+#### engine
+##
+################################################################################
+class ReplayEngine(object):
+   '''
+   Runs a recorded session through a dealer as fast as it can be
+   processed: the real LeverexProvider fed the recorded leverex frames,
+   a ReplayTaker fed the recorded Bitfinex book, SimpleHedger and the
+   DealerFactory event path in between. Every component runs on a
+   SimulatedClock that only moves with the records, the hedger's offers
+   loop wakes in replay time. Reporters and supervision are not started.
+
+   path is the record log, or an open RecordReader to share one between
+   runs.
+
+   Rebalancing is disabled, funds don't move in a replay.
+   '''
+   def __init__(self, config, path, hedger=None):
+      self.config = overlayConfig(config, { 'rebalance' : { 'enable' : False } })
+      if isinstance(path, RecordReader):
+         self.reader = path
+      else:
+         self.reader = RecordReader(path)
+      self.clock = SimulatedClock()
+      self.result = ReplayResult()
+
+      self.connection = ReplayConnection(self.clock)
+      self.router = ProductRouter(self.connection)
+      self.connection.listener = self.router
+
+      self.maker = LeverexProvider(self.config, self.router, self.clock)
+      self.taker = ReplayTaker(self.config, self.clock)
+      if hedger == None:
+         hedger = SimpleHedger(self.config, self.clock)
+      self.hedger = hedger
+      self.dealer = DealerFactory(self.maker, self.taker, self.hedger)
+
+   def setup(self):
+      self.maker.setup(self.dealer.onEvent)
+      self.taker.setup(self.dealer.onEvent)
+      self.hedger.setup(self.dealer.onEvent, self.maker)
+
+   async def run(self, since=0):
+      self.setup()
+      offersTask = None
+      try:
+         start = None
+         for record in self.reader.getMessages(since):
+            if start == None:
+               start = record.timestamp
+               self.clock.advance(start)
+               offersTask = asyncio.create_task(self.hedger.offersLoop())
+               await asyncio.sleep(0)
+            await self.advance(record.timestamp)
+
+            name = await self.process(record)
+            if name == None:
+               continue
+            self.result.records += 1
+            self.result.recordExposure(self.clock.time_ns(),
+               self.maker.getExposure(), self.taker.getExposure())
+
+         if start != None:
+            self.result.duration = self.clock.time_ns() - start
+      finally:
+         if offersTask != None:
+            offersTask.cancel()
+      return self.getResult()
+
+   async def advance(self, timestamp):
+      #wake the sleepers due before this record, in deadline order
+      while True:
+         deadline = self.clock.getNextDeadline()
+         if deadline == None or deadline > timestamp:
+            break
+         self.clock.advance(deadline)
+         await asyncio.sleep(0)
+      self.clock.advance(timestamp)
+      await self.taker.onClock()
+
+   async def process(self, record):
+      #returns the event name, None for records that aren't replayed
+      if not record.isInbound():
+         self.countRecorded(record)
+         return None
+
+      if record.stream == 'leverex':
+         message = record.json()
+         name = next(iter(message), None)
+         if name == 'order_update':
+            self.checkFill(message['order_update'])
+         feed = self.connection.feed(record.data)
+      elif record.stream == 'bitfinex':
+         event = record.json()
+         name = event['event']
+         feed = self.taker.feed(name, event['args'])
+      else:
+         return None
+
+      start = time.perf_counter_ns()
+      try:
+         await feed
+      except Exception as e:
+         logging.error(f"[ReplayEngine] {record.stream} {name} failed with error: {e}")
+      self.result.recordCost(f"{record.stream}.{name}",
+         time.perf_counter_ns() - start)
+      return name
+
+   def checkFill(self, update):
+      #would the replayed quotes have taken this recorded maker fill
+      if update.get('action') != ORDER_ACTION_CREATED:
+         return
+      order = LeverexOrder(update['order'])
+      if not order.is_trade_position() or order.is_taker:
+         return
+      self.result.fills += 1
+
+      offers = self.getLastQuote()
+      for offer in offers:
+         if Decimal(offer['volume']) < Decimal(order.quantity):
+            continue
+         if order.is_sell():
+            #sold on our ask
+            covered = 'ask' in offer and Decimal(offer['ask']) <= Decimal(order.price)
+         else:
+            covered = 'bid' in offer and Decimal(offer['bid']) >= Decimal(order.price)
+         if covered:
+            self.result.quotedFills += 1
+         return
+
+   def getLastQuote(self):
+      return self.connection.lastQuote
+
+   def countRecorded(self, record):
+      message = record.json()
+      if record.stream == 'leverex' and 'submit_prices' in message:
+         self.result.recordedQuotes += 1
+      elif record.stream == 'bitfinex' and message.get('request') == 'submit_order':
+         self.result.recordedHedges += 1
+
+   def getResult(self):
+      for timestamp, message in self.connection.sent:
+         if 'submit_prices' in message:
+            self.result.quotes.append(Quote(timestamp,
+               message['submit_prices']['prices']))
+      self.connection.sent.clear()
+      self.result.hedges = self.taker.hedges
+      self.result.unmatchedReplies = self.connection.unmatched
+      return self.result
@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from Backtest.Replay import ReplayEngine
+from Factories.Definitions import overlayConfig
+from leverex_core.recorder import RecordReader
+
+#sweepable parameter: config group it lives in
+SWEEP_PARAMETERS = {
+   'price_ratio'        : 'hedger',
+   'quote_ratio'        : 'hedger',
+   'max_offer_volume'   : 'hedger',
+   'exposure_cooldown'  : 'bitfinex'
+}
+
+class SweepException(Exception):
+   pass
+
+################################################################################
+##
+#### grid
+##
+################################################################################
+def parseParameter(arg):
+   #"name=v1,v2,..." to (name, [values])
+   if '=' not in arg:
+      raise SweepException(f"expected name=value[,value...], got {arg}")
+   name, values = arg.split('=', 1)
+   name = name.strip()
+   if name not in SWEEP_PARAMETERS:
+      raise SweepException(f"can't sweep {name}, "
+         f"pick from {', '.join(SWEEP_PARAMETERS)}")
+
+   result = []
+   for value in values.split(','):
+      value = value.strip()
+      if len(value) == 0:
+         continue
+      number = float(value)
+      result.append(int(number) if number.is_integer() and '.' not in value \
+         else number)
+   if len(result) == 0:
+      raise SweepException(f"no values for {name}")
+   return name, result
+
+def getSweepPoints(grid):
+   #cartesian product of the grid, as a list of { name : value }
+   names = list(grid)
+   return [dict(zip(names, values)) \
+      for values in itertools.product(*[grid[name] for name in names])]
+
+def getSweepConfig(config, point):
+   overlay = {}
+   for name, value in point.items():
+      group = SWEEP_PARAMETERS[name]
+      overlay.setdefault(group, {})[name] = value
+   return overlayConfig(config, overlay)
+
+################################################################################
+##
+#### workers
+##
+################################################################################
+'''
+Each worker process maps the record log once, read-only, and replays
+its share of the grid off that map. The pages are shared with every
+other worker mapping the same file, the log is never copied or pickled.
+'''
+_reader = None
+
+def _initWorker(path):
+   global _reader
+   logging.getLogger().setLevel(logging.ERROR)
+   _reader = RecordReader(path, mapped=True)
+
+def _runPoint(config, point, since):
+   engine = ReplayEngine(getSweepConfig(config, point), _reader)
+   result = asyncio.run(engine.run(since))
+   return SweepRow(point, result)
+
+########
+class SweepRow(object):
+   '''
+   The figures of a replay worth comparing across points. Small and
+   picklable, full results stay in the worker.
+   '''
+   def __init__(self, point, result):
+      self.point = point
+      self.records = result.records
+      self.fills = result.fills
+      self.fillRate = result.getFillRate()
+      self.quotes = len(result.quotes)
+      self.recordedQuotes = result.recordedQuotes
+      self.hedges = len(result.hedges)
+      self.hedgeVolume = sum(abs(hedge.amount) for hedge in result.hedges)
+      self.slippage = result.getSlippage()
+      self.maxDrift = result.getMaxDrift()
+
+   def toJson(self):
+      return {
+         'parameters' : self.point,
+         'records' : self.records,
+         'fills' : self.fills,
+         'fill_rate' : self.fillRate,
+         'quotes' : self.quotes,
+         'recorded_quotes' : self.recordedQuotes,
+         'hedges' : self.hedges,
+         'hedge_volume' : str(self.hedgeVolume),
+         'slippage' : self.slippage,
+         'max_drift' : str(self.maxDrift)
+      }
+
+################################################################################
+##
+#### sweep
+##
+################################################################################
+class ParameterSweep(object):
+   '''
+   Replays one recorded session once per point of a parameter grid,
+   points are spread over a process pool. Rows come back in grid order.
+   '''
+   def __init__(self, config, path, grid, workers=None):
+      if len(grid) == 0:
+         raise SweepException("empty grid")
+      for name in grid:
+         if name not in SWEEP_PARAMETERS:
+            raise SweepException(f"can't sweep {name}")
+
+      self.config = config
+      self.path = os.path.abspath(path)
+      self.points = getSweepPoints(grid)
+      self.workers = workers
+
+      #fail on a bad log before spawning anything
+      RecordReader(self.path)
+
+   def run(self, since=0):
+      with ProcessPoolExecutor(max_workers=self.workers,
+         initializer=_initWorker, initargs=(self.path,)) as executor:
+         futures = [executor.submit(_runPoint, self.config, point, since) \
+            for point in self.points]
+         return [future.result() for future in futures]
+
+   @staticmethod
+   def getTable(rows):
+      if len(rows) == 0:
+         return ""
+
+      names = list(rows[0].point)
+      header = names + ['fills', 'fill rate', 'quotes', 'hedges',
+         'hedge vol', 'slippage (bp)', 'max drift', 'messages']
+      lines = [header]
+      for row in rows:
+         lines.append([str(row.point[name]) for name in names] + [
+            str(row.fills),
+            f"{round(row.fillRate * 100, 2)}%",
+            f"{row.quotes} ({row.recordedQuotes})",
+            str(row.hedges),
+            str(row.hedgeVolume),
+            str(round(row.slippage * 10000, 3)),
+            str(row.maxDrift),
+            str(row.records)
+         ])
+
+      widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+      result = []
+      for i, line in enumerate(lines):
+         result.append("  ".join(
+            field.rjust(widths[j]) for j, field in enumerate(line)))
+         if i == 0:
+            result.append("  ".join('-' * width for width in widths))
+      return "\n".join(result)
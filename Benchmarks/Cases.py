@@ -0,0 +1,326 @@
+import json
+from decimal import Decimal
+
+from Benchmarks.Suite import BenchmarkCase
+from Factories.Definitions import AggregationOrderBook, OpenVolume
+from Hedger.SimpleHedger import SimpleHedger
+from leverex_core.api_connection import AuthApiConnection
+from leverex_core.utils import LeverexOpenVolume, LeverexOrder, DealerOffers, \
+   PriceOffer, SessionInfo, SessionOpenInfo, SessionOrders, round_down, \
+   SIDE_BUY, SIDE_SELL, ORDER_STATUS_FILLED, ORDER_TYPE_TRADE_POSITION, \
+   ORDER_ACTION_UPDATED
+
+PRICE = 10000
+SESSION_ID = 5
+PRODUCT = 'xbtusd_rf'
+
+BOOK_DEPTHS = [25, 100, 250]
+ORDER_COUNTS = [10, 100, 1000]
+
+#open volume is quadratic in the order count, past this it's a slow case
+SLOW_ORDER_COUNT = 1000
+
+HEDGER_CONFIG = {
+   'hedger' : {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   },
+   'rebalance' : {
+      'enable' : False,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+}
+
+################################################################################
+##
+#### fixtures
+##
+################################################################################
+def getBookSnapshot(depth):
+   #bitfinex style [price, count, amount], asks have negative amounts
+   result = []
+   for i in range(depth):
+      result.append([PRICE - 1 - i, 1, 0.5 + (i % 5) * 0.1])
+      result.append([PRICE + 1 + i, 1, -0.5 - (i % 5) * 0.1])
+   return result
+
+def getSession():
+   return SessionInfo(SessionOpenInfo({
+      'product_type' : PRODUCT,
+      'cut_off_at' : 0,
+      'last_cut_off_price' : PRICE,
+      'session_id' : SESSION_ID,
+      'previous_session_id' : SESSION_ID - 1,
+      'healthy' : True,
+      'fee_taker' : 15,
+      'fee_maker' : -5
+   }))
+
+def getOrderData(id, quantity, price, side, isTaker=False):
+   return {
+      'id' : id,
+      'timestamp' : 1,
+      'quantity' : quantity,
+      'price' : price,
+      'side' : side,
+      'status' : ORDER_STATUS_FILLED,
+      'product_type' : PRODUCT,
+      'reference_exposure' : 0,
+      'session_id' : SESSION_ID,
+      'rollover_type' : ORDER_TYPE_TRADE_POSITION,
+      'fee' : 1,
+      'is_taker' : isTaker
+   }
+
+class OrdersProvider(object):
+   #what LeverexOpenVolume reads off a LeverexProvider
+   def __init__(self, orderCount):
+      self.ccy = 'USDT'
+      self.balances = { 'USDT' : 100000 }
+      self.indexPrice = PRICE
+      self.currentSession = getSession()
+
+      orders = SessionOrders(SESSION_ID)
+      orders.setSessionObj(self.currentSession)
+      for i in range(orderCount):
+         side = SIDE_BUY if i % 2 == 0 else SIDE_SELL
+         orders.setOrder(LeverexOrder(getOrderData(i, 0.01 * (1 + i % 7),
+            PRICE - orderCount + i * 2, side, i % 3 == 0)), ORDER_ACTION_UPDATED)
+      self.orderData = { SESSION_ID : orders }
+
+########
+class StubMaker(object):
+   def __init__(self):
+      self.submitted = 0
+
+   def getOpenVolume(self):
+      return OpenVolume(10000, 0, PRICE, 0, PRICE)
+
+   async def submitPrices(self, offers):
+      self.submitted += 1
+
+class StubTaker(object):
+   def __init__(self, depth):
+      self.order_book = AggregationOrderBook()
+      self.order_book.setup_from_snapshot(getBookSnapshot(depth))
+
+   def getOpenVolume(self):
+      return OpenVolume(100000, 0, PRICE, 0, PRICE)
+
+class StubListener(object):
+   #every leverex event the dispatch benchmarks reach, as no-ops
+   async def on_market_data(self, update):
+      pass
+
+   async def on_order_event(self, order, action):
+      pass
+
+   async def on_session_open(self, session):
+      pass
+
+   async def on_balance_update(self, balances):
+      pass
+
+   async def on_dealer_offers(self, offers):
+      pass
+
+async def noop(*args):
+   pass
+
+################################################################################
+##
+#### order book
+##
+################################################################################
+class OrderBookUpdate(BenchmarkCase):
+   def __init__(self, depth):
+      self.depth = depth
+      self.name = f"order_book.process_update[{depth}]"
+
+   def setup(self):
+      self.book = AggregationOrderBook()
+      self.book.setup_from_snapshot(getBookSnapshot(self.depth))
+
+      #volume changes on existing levels, the depth holds
+      self.updates = []
+      for i in range(self.depth):
+         self.updates.append([PRICE - 1 - i, 2, 0.7])
+         self.updates.append([PRICE + 1 + i, 2, -0.7])
+      self.index = 0
+
+   def run(self):
+      self.book.process_update(self.updates[self.index])
+      self.index = (self.index + 1) % len(self.updates)
+
+class OrderBookAggregatedPrice(BenchmarkCase):
+   def __init__(self, depth, isAsk):
+      self.depth = depth
+      self.isAsk = isAsk
+      side = 'ask' if isAsk else 'bid'
+      self.name = f"order_book.get_aggregated_{side}_price[{depth}]"
+
+   def setup(self):
+      self.book = AggregationOrderBook()
+      self.book.setup_from_snapshot(getBookSnapshot(self.depth))
+
+      #walk half the book
+      self.volume = sum(entry[2] for entry in getBookSnapshot(self.depth) \
+         if entry[2] > 0) / 2
+      if self.isAsk:
+         self.call = self.book.get_aggregated_ask_price
+      else:
+         self.call = self.book.get_aggregated_bid_price
+
+   def run(self):
+      self.call(self.volume)
+
+################################################################################
+##
+#### leverex open volume
+##
+################################################################################
+class OpenVolumeCase(BenchmarkCase):
+   def __init__(self, method, orderCount):
+      self.method = method
+      self.orderCount = orderCount
+      self.name = f"open_volume.{method}[{orderCount}]"
+      self.slow = orderCount >= SLOW_ORDER_COUNT
+
+   def setup(self):
+      self.openVolume = LeverexOpenVolume(OrdersProvider(self.orderCount))
+      price = Decimal(PRICE)
+      calls = {
+         'getMargin' : lambda: self.openVolume.getMargin(),
+         'getReleasableExposure' : \
+            lambda: self.openVolume.getReleasableExposure(price, price),
+         'get' : lambda: self.openVolume.get(5, 0.2)
+      }
+      self.call = calls[self.method]
+
+   def run(self):
+      self.call()
+
+################################################################################
+##
+#### hedger
+##
+################################################################################
+class CompareOffers(BenchmarkCase):
+   name = "hedger.compareOffers"
+
+   def setup(self):
+      self.hedger = SimpleHedger(HEDGER_CONFIG)
+      #equal offers, every field gets compared
+      self.offers = [
+         [PriceOffer(1, ask=PRICE + 10, bid=PRICE - 10),
+            PriceOffer(2, ask=PRICE + 20, bid=PRICE - 20)]
+         for i in range(2)]
+
+   def run(self):
+      self.hedger.compareOffers(self.offers[0], self.offers[1])
+
+class SubmitPrices(BenchmarkCase):
+   name = "hedger.submitPrices"
+
+   def setup(self):
+      self.maker = StubMaker()
+      self.taker = StubTaker(BOOK_DEPTHS[0])
+      self.hedger = SimpleHedger(HEDGER_CONFIG)
+      self.hedger.setup(noop, self.maker)
+      self.hedger.setReady()
+
+   async def run(self):
+      await self.hedger.submitPrices(self.maker, self.taker)
+
+################################################################################
+##
+#### leverex messages
+##
+################################################################################
+class DealerOffersCase(BenchmarkCase):
+   name = "dealer_offers"
+
+   def setup(self):
+      offers = []
+      for i in range(5):
+         offers.append({ 'command' : 1, 'side' : SIDE_BUY,
+            'volume' : str(i + 1), 'price' : str(PRICE - 10 * (i + 1)) })
+         offers.append({ 'command' : 1, 'side' : SIDE_SELL,
+            'volume' : str(i + 1), 'price' : str(PRICE + 10 * (i + 1)) })
+      self.packet = { 'product_type' : PRODUCT, 'offers' : offers }
+
+   def run(self):
+      DealerOffers(self.packet)
+
+class Dispatch(BenchmarkCase):
+   '''
+   processMessage on a raw frame, what readLoop does per message.
+   '''
+   messages = {
+      'market_data' : { 'market_data' : {
+         'product_type' : PRODUCT, 'live_cutoff' : str(PRICE) }},
+      'order_update' : { 'order_update' : {
+         'order' : getOrderData(1, 0.5, PRICE, SIDE_BUY),
+         'action' : ORDER_ACTION_UPDATED }},
+      'session_open' : { 'session_open' : {
+         'product_type' : PRODUCT, 'cut_off_at' : 0,
+         'last_cut_off_price' : PRICE, 'session_id' : SESSION_ID,
+         'previous_session_id' : SESSION_ID - 1, 'healthy' : True,
+         'fee_taker' : 15, 'fee_maker' : -5 }},
+      'load_balance' : { 'load_balance' : {
+         'balances' : [{ 'currency' : 'USDT', 'balance' : '10000' }] }},
+      'submit_prices' : { 'submit_prices' : {
+         'prices' : [], 'reference' : 'ref' }}
+   }
+
+   def __init__(self, messageType):
+      self.messageType = messageType
+      self.name = f"dispatch.{messageType}"
+
+   def setup(self):
+      self.connection = AuthApiConnection('', '')
+      self.connection.listener = StubListener()
+      self.data = json.dumps(self.messages[self.messageType])
+      self.isReply = self.messageType == 'submit_prices'
+
+   async def run(self):
+      if self.isReply:
+         self.connection._requests_cb['ref'] = noop
+      await self.connection.processMessage(self.data)
+
+################################################################################
+##
+#### utils
+##
+################################################################################
+class RoundDown(BenchmarkCase):
+   def __init__(self, valueType):
+      self.name = f"round_down[{valueType.__name__}]"
+      self.value = valueType('12345.678912345')
+
+   def run(self):
+      round_down(self.value, 6)
+
+################################################################################
+def getCases():
+   cases = []
+   for depth in BOOK_DEPTHS:
+      cases.append(OrderBookUpdate(depth))
+      cases.append(OrderBookAggregatedPrice(depth, True))
+      cases.append(OrderBookAggregatedPrice(depth, False))
+
+   for method in ['getMargin', 'getReleasableExposure', 'get']:
+      for count in ORDER_COUNTS:
+         cases.append(OpenVolumeCase(method, count))
+
+   cases.append(CompareOffers())
+   cases.append(SubmitPrices())
+   cases.append(DealerOffersCase())
+   for messageType in Dispatch.messages:
+      cases.append(Dispatch(messageType))
+   cases.append(RoundDown(float))
+   cases.append(RoundDown(Decimal))
+   return cases
@@ -0,0 +1,231 @@
+import asyncio
+import fnmatch
+import gc
+import json
+import platform
+import time
+
+#a timed batch runs at least this long, number of calls is scaled to fit
+MIN_BATCH_TIME = 0.05 #in s
+REPEAT = 5
+
+#slower than the baseline by more than this ratio is a regression
+DEFAULT_THRESHOLD = 0.25
+
+RESULTS_VERSION = 1
+
+class BenchmarkException(Exception):
+   pass
+
+################################################################################
+##
+#### cases
+##
+################################################################################
+class BenchmarkCase(object):
+   '''
+   A single call on a hot path. setup() builds the state the call runs
+   against and is not timed, run() is the timed call. Cases on coroutines
+   define run() as async, the whole timing then happens on one event loop.
+
+   Slow cases take seconds per call, they only run when asked for and
+   time a single batch.
+   '''
+   name = None
+   slow = False
+
+   def setup(self):
+      pass
+
+   def run(self):
+      raise NotImplementedError()
+
+   def isAsync(self):
+      return asyncio.iscoroutinefunction(self.run)
+
+########
+class BenchmarkResult(object):
+   def __init__(self, name, nsPerCall, number, repeat):
+      self.name = name
+      self.nsPerCall = nsPerCall #best batch, per call
+      self.number = number #calls per batch
+      self.repeat = repeat
+
+   def toJson(self):
+      return {
+         'ns_per_call' : self.nsPerCall,
+         'number' : self.number,
+         'repeat' : self.repeat
+      }
+
+   @staticmethod
+   def fromJson(name, data):
+      return BenchmarkResult(name, data['ns_per_call'],
+         data.get('number', 0), data.get('repeat', 0))
+
+   def __str__(self):
+      return f"{self.name}: {formatDuration(self.nsPerCall)} " \
+         f"({self.number} x {self.repeat})"
+
+################################################################################
+##
+#### runner
+##
+################################################################################
+class BenchmarkRunner(object):
+   '''
+   timeit style: the number of calls per batch grows until a batch takes
+   minBatchTime, then the best of repeat batches is kept. gc is off while
+   a batch runs.
+   '''
+   def __init__(self, cases, repeat=REPEAT, minBatchTime=MIN_BATCH_TIME):
+      self.cases = cases
+      self.repeat = repeat
+      self.minBatchTime = minBatchTime
+
+   def getCases(self, pattern=None, slow=False):
+      result = []
+      for case in self.cases:
+         if case.slow and not slow:
+            continue
+         if pattern != None and not fnmatch.fnmatch(case.name, pattern):
+            continue
+         result.append(case)
+      return result
+
+   def run(self, pattern=None, slow=False, callback=None):
+      results = {}
+      for case in self.getCases(pattern, slow):
+         result = self.runCase(case)
+         results[case.name] = result
+         if callback != None:
+            callback(result)
+      return results
+
+   def runCase(self, case):
+      case.setup()
+      if case.isAsync():
+         return asyncio.run(self._runAsync(case))
+
+      if case.slow:
+         return BenchmarkResult(case.name, self._time(case, 1), 1, 1)
+
+      number = self._calibrate(lambda n: self._time(case, n))
+      best = min(self._time(case, number) for i in range(self.repeat))
+      return BenchmarkResult(case.name, best / number, number, self.repeat)
+
+   async def _runAsync(self, case):
+      if case.slow:
+         return BenchmarkResult(case.name, await self._timeAsync(case, 1), 1, 1)
+
+      number = 1
+      while True:
+         elapsed = await self._timeAsync(case, number)
+         if elapsed >= self.minBatchTime * 1e9:
+            break
+         number = self._scale(number, elapsed)
+
+      best = None
+      for i in range(self.repeat):
+         elapsed = await self._timeAsync(case, number)
+         best = elapsed if best == None else min(best, elapsed)
+      return BenchmarkResult(case.name, best / number, number, self.repeat)
+
+   def _calibrate(self, timer):
+      number = 1
+      while True:
+         elapsed = timer(number)
+         if elapsed >= self.minBatchTime * 1e9:
+            return number
+         number = self._scale(number, elapsed)
+
+   def _scale(self, number, elapsed):
+      #aim past the batch time in one step, at most 10x per step
+      if elapsed <= 0:
+         return number * 10
+      target = int(number * self.minBatchTime * 1.2e9 / elapsed) + 1
+      return max(number + 1, min(target, number * 10))
+
+   def _time(self, case, number):
+      run = case.run
+      gcEnabled = gc.isenabled()
+      gc.disable()
+      try:
+         start = time.perf_counter_ns()
+         for i in range(number):
+            run()
+         return time.perf_counter_ns() - start
+      finally:
+         if gcEnabled:
+            gc.enable()
+
+   async def _timeAsync(self, case, number):
+      run = case.run
+      gcEnabled = gc.isenabled()
+      gc.disable()
+      try:
+         start = time.perf_counter_ns()
+         for i in range(number):
+            await run()
+         return time.perf_counter_ns() - start
+      finally:
+         if gcEnabled:
+            gc.enable()
+
+################################################################################
+##
+#### baselines
+##
+################################################################################
+def saveResults(path, results):
+   with open(path, 'w') as resultFile:
+      json.dump({
+         'version' : RESULTS_VERSION,
+         'python' : platform.python_version(),
+         'machine' : platform.machine(),
+         'results' : { name : results[name].toJson() for name in sorted(results) }
+      }, resultFile, indent=3)
+
+def loadResults(path):
+   with open(path) as resultFile:
+      data = json.load(resultFile)
+   if data.get('version') != RESULTS_VERSION:
+      raise BenchmarkException(f"unsupported benchmark results in {path}")
+   return { name : BenchmarkResult.fromJson(name, entry) \
+      for name, entry in data['results'].items() }
+
+########
+class Comparison(object):
+   def __init__(self, name, baseline, current, threshold):
+      self.name = name
+      self.baseline = baseline
+      self.current = current
+      self.ratio = None
+      if baseline != None and current != None and baseline.nsPerCall > 0:
+         self.ratio = current.nsPerCall / baseline.nsPerCall
+      self.regressed = self.ratio != None and self.ratio > 1 + threshold
+
+   def __str__(self):
+      if self.baseline == None:
+         return f"{self.name}: {formatDuration(self.current.nsPerCall)} (new)"
+      if self.current == None:
+         return f"{self.name}: not run (baseline " \
+            f"{formatDuration(self.baseline.nsPerCall)})"
+
+      change = round((self.ratio - 1) * 100, 1)
+      flag = " REGRESSED" if self.regressed else ""
+      return f"{self.name}: {formatDuration(self.current.nsPerCall)} vs " \
+         f"{formatDuration(self.baseline.nsPerCall)} ({change:+}%){flag}"
+
+def compareResults(baseline, results, threshold=DEFAULT_THRESHOLD):
+   #one comparison per benchmark in either set, sorted by name
+   names = sorted(set(baseline) | set(results))
+   return [Comparison(name, baseline.get(name), results.get(name), threshold) \
+      for name in names]
+
+def formatDuration(ns):
+   if ns >= 1000000:
+      return f"{round(ns / 1000000, 3)}ms"
+   if ns >= 1000:
+      return f"{round(ns / 1000, 3)}us"
+   return f"{round(ns, 1)}ns"
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+
+from Factories.Definitions import ConfigException, checkConfig
+
+POLL_INTERVAL = 1 #in seconds
+
+################################################################################
+def isSameKind(a, b):
+   #bools are ints to python, keep them apart
+   if isinstance(a, bool) or isinstance(b, bool):
+      return type(a) == type(b)
+   if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+      return True
+   return type(a) == type(b)
+
+def getChangedSettings(old, new):
+   #returns (group, key) pairs, key is None for top level entries
+   changes = []
+   for group in set(old) | set(new):
+      oldGroup = old.get(group)
+      newGroup = new.get(group)
+      if not isinstance(oldGroup, dict) or not isinstance(newGroup, dict):
+         if oldGroup != newGroup:
+            changes.append((group, None))
+         continue
+
+      for key in set(oldGroup) | set(newGroup):
+         if key not in oldGroup or key not in newGroup or \
+            oldGroup[key] != newGroup[key]:
+            changes.append((group, key))
+   return sorted(changes, key=str)
+
+################################################################################
+class ConfigReloader(object):
+   '''
+   Watches the dealer's config file and applies changes to a running
+   dealer, triggered on SIGHUP or when the file's mtime changes. The new
+   config is checked against every component's required_settings and
+   may only change entries listed in their reloadable_settings. Anything
+   else (keys, endpoints, products) needs a restart and fails the reload,
+   in which case the running config is kept as is.
+
+   splitConfig maps a config to per product configs, these are checked
+   one by one. A single dealer has one, keyed None.
+   '''
+   def __init__(self, dealer, path, splitConfig=None):
+      self.dealer = dealer
+      self.path = path
+      self.splitConfig = splitConfig
+      self.name = "ConfigReloader"
+      self.trigger = asyncio.Event()
+
+      self.mtime = os.stat(path).st_mtime_ns
+      self.config = self.load()
+      self.reloadCount = 0
+      self.failedCount = 0
+      self.lastError = None
+
+   def getAsyncIOTask(self):
+      return asyncio.create_task(self.run())
+
+   def load(self):
+      with open(self.path) as configFile:
+         return json.load(configFile)
+
+   async def run(self):
+      loop = asyncio.get_running_loop()
+      hasSignal = False
+      try:
+         loop.add_signal_handler(signal.SIGHUP, self.trigger.set)
+         hasSignal = True
+      except (ValueError, RuntimeError, NotImplementedError, AttributeError):
+         #not on the main thread or no SIGHUP on this platform
+         logging.debug("[ConfigReloader] SIGHUP unavailable, watching mtime only")
+
+      try:
+         while True:
+            try:
+               await asyncio.wait_for(self.trigger.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+               pass
+
+            if self.trigger.is_set() or self.hasChanged():
+               self.trigger.clear()
+               await self.reload()
+      finally:
+         if hasSignal:
+            loop.remove_signal_handler(signal.SIGHUP)
+
+   def hasChanged(self):
+      try:
+         return os.stat(self.path).st_mtime_ns != self.mtime
+      except OSError:
+         return False
+
+   def getConfigs(self, config):
+      if self.splitConfig == None:
+         return { None : config }
+      return self.splitConfig(config)
+
+   def validate(self, config):
+      oldConfigs = self.getConfigs(self.config)
+      newConfigs = self.getConfigs(config)
+      if set(oldConfigs) != set(newConfigs):
+         raise ConfigException('products can\'t be changed without a restart')
+
+      changes = set()
+      for product in newConfigs:
+         changes.update(self.validateProduct(
+            oldConfigs[product], newConfigs[product]))
+      return sorted(changes, key=str)
+
+   def validateProduct(self, oldConfig, config):
+      components = self.dealer.getConfigurables()
+      for component in components:
+         checkConfig(config, getattr(component, 'required_settings', {}))
+
+      reloadable = set()
+      for component in components:
+         settings = getattr(component, 'reloadable_settings', {})
+         for group in settings:
+            for key in settings[group]:
+               reloadable.add((group, key))
+
+      changes = getChangedSettings(oldConfig, config)
+      for group, key in changes:
+         if (group, key) not in reloadable:
+            if key == None:
+               raise ConfigException(f'\"{group}\" can\'t be changed without a restart')
+            raise ConfigException(
+               f'\"{key}\" in config group \"{group}\" can\'t be changed without a restart')
+
+         if key in oldConfig[group] and key in config[group] and \
+            not isSameKind(oldConfig[group][key], config[group][key]):
+            raise ConfigException(
+               f'\"{key}\" in config group \"{group}\" has the wrong type')
+      return changes
+
+   async def reload(self):
+      try:
+         self.mtime = os.stat(self.path).st_mtime_ns
+         config = self.load()
+         changes = self.validate(config)
+      except (OSError, ValueError, ConfigException) as e:
+         self.failedCount += 1
+         self.lastError = e
+         logging.error(f"config reload failed, keeping current config: {e}")
+         return False
+
+      if len(changes) == 0:
+         return True
+
+      self.config = config
+      self.reloadCount += 1
+      logging.warning("reloading config: " +
+         ", ".join(f"{group}.{key}" for group, key in changes))
+      await self.dealer.applyConfig(config)
+      return True
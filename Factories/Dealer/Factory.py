@@ -2,18 +2,56 @@ import logging
 import asyncio
 
 import Factories.Definitions as Definitions
+from leverex_core.memory import MemoryReport
 from Factories.StatusReporter.Factory import Factory
+from Factories.Dealer.Scheduler import EventScheduler
+from Factories.Dealer.Supervisor import Supervisor
+from Factories.Dealer.Standby import StandbyManager, LeaderLock
+from Factories.Dealer.ConfigReloader import ConfigReloader
 
 class DealerException(Exception):
    pass
 
 class DealerFactory(object):
-   def __init__(self, maker, taker, hedgingStrat, statusReporters=[]):
+   def __init__(self, maker, taker, hedgingStrat, statusReporters=[],
+      lockFile=None, configFile=None, loopMonitor=None, profiler=None,
+      memoryMonitor=None, lock=None):
       self.maker = maker         #Provider
       self.taker = taker         #Provider
       self.hedger = hedgingStrat #HedgerFactory
       self.statusReporters = statusReporters
       self._name = "Dealer"
+      self.supervisor = Supervisor(self.onComponentRestart)
+
+      #times event processing and samples event loop lag
+      self.loopMonitor = loopMonitor
+      if loopMonitor != None:
+         self.scheduler = EventScheduler(self.processMonitoredEvent)
+      else:
+         self.scheduler = EventScheduler(self.processEvent)
+
+      #profiles the live process on demand
+      self.profiler = profiler
+
+      #periodic memory gauges reports
+      self.memoryMonitor = memoryMonitor
+
+      #with a lock file, only the instance holding it quotes and hedges.
+      #a LeaderLock passed in outlives this dealer, restarts within the
+      #process keep the leadership
+      self.active = True
+      self.standby = None
+      self.ownsLock = False
+      if lock == None and lockFile != None:
+         lock = LeaderLock(lockFile)
+         self.ownsLock = True
+      if lock != None:
+         self.standby = StandbyManager(self, lock)
+
+      #with a config file, settings can be changed on the fly
+      self.configReloader = None
+      if configFile != None:
+         self.configReloader = ConfigReloader(self, configFile)
 
    async def run(self):
       #sanity checks
@@ -23,33 +61,65 @@ class DealerFactory(object):
 
          ## maker setup ##
          self.maker.setup(self.onEvent)
-         tasks = [self.maker.getAsyncIOTask()]
+         self.supervisor.add(self.maker.name, self.maker, critical=True)
 
          ## taker setup ##
          self.taker.setup(self.onEvent)
-         tasks.append(self.taker.getAsyncIOTask())
+         self.supervisor.add(self.taker.name, self.taker, critical=True)
 
          ## hedger setup ##
          self.hedger.setup(self.onEvent, self.maker)
-         tasks.append(self.hedger.getAsyncIOTask())
+         self.supervisor.add(self.hedger.name, self.hedger, critical=True)
 
          ## status reporters setup ##
          for reporter in self.statusReporters:
-            reporterTask = reporter.getAsyncIOTask()
-            if reporterTask == None:
-               continue
-            tasks.append(reporterTask)
+            self.supervisor.add(type(reporter).__name__, reporter, critical=False)
+
+         ## loop monitor ##
+         if self.loopMonitor != None:
+            self.supervisor.add(self.loopMonitor.name,
+               self.loopMonitor, critical=False, shared=True)
+
+         ## profiler ##
+         if self.profiler != None:
+            self.supervisor.add(self.profiler.name,
+               self.profiler, critical=False, shared=True)
+
+         ## memory ##
+         if self.memoryMonitor != None:
+            self.memoryMonitor.setup(self.onMemoryTick)
+            self.supervisor.add(self.memoryMonitor.name,
+               self.memoryMonitor, critical=False, shared=True)
+
+         ## config reload ##
+         if self.configReloader != None:
+            self.supervisor.add(self.configReloader.name,
+               self.configReloader, critical=False)
 
-         #start asyncio tasks
-         done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+         ## leadership ##
+         if self.standby != None:
+            if not self.standby.lock.tryAcquire():
+               logging.warning(f"{self.standby.lock.path} is locked, starting in standby")
+               self.setActive(False)
+            self.supervisor.add(self.standby.name, self.standby, critical=True)
+
+         #start asyncio tasks, returns once a critical component exits
+         return await self.supervisor.run()
       except Exception as e:
-         print (f"dealer loop exception: {e}")
-         loop = asyncio.get_running_loop()
-         loop.stop()
-         return
+         #the caller restarts the dealer, other dealers on this loop
+         #keep running
+         logging.error(f"dealer loop exception: {e}")
+         raise
 
    def stop(self):
-      pass
+      #ends this dealer's tasks, a restart builds a new dealer
+      self.supervisor.stop()
+      self.maker.teardown()
+      self.taker.teardown()
+      if self.memoryMonitor != None:
+         self.memoryMonitor.removeCallback(self.onMemoryTick)
+      if self.standby != None and self.ownsLock:
+         self.standby.lock.close()
 
    @property
    def name(self):
@@ -57,6 +127,16 @@ class DealerFactory(object):
 
    #### events ####
    async def onEvent(self, provider, eventType):
+      #hedge critical events jump ahead of book bursts and reporting
+      await self.scheduler.push(provider, eventType)
+
+   async def processMonitoredEvent(self, provider, eventType):
+      #times each event's processing, a push only measures whatever
+      #else it drained along the way
+      await self.loopMonitor.call(eventType, self.processEvent,
+         provider, eventType)
+
+   async def processEvent(self, provider, eventType):
       if eventType == Definitions.Ready:
          #a provider ready state changed
          await self.onReadyEvent()
@@ -77,6 +157,15 @@ class DealerFactory(object):
       elif eventType == Definitions.Transaction:
          await self.onTransactionEvent()
          return
+      elif eventType == Definitions.Leadership:
+         await self.onLeadershipEvent()
+         return
+      elif eventType == Definitions.Reload:
+         await self.onReloadEvent()
+         return
+      elif eventType == Definitions.Memory:
+         await self.onMemoryEvent()
+         return
 
       if provider == self.maker:
          await self.onMakerEvent(eventType)
@@ -121,7 +210,7 @@ class DealerFactory(object):
    ## status ##
    async def onReadyEvent(self):
       await self.hedger.onReadyEvent(self.maker, self.taker)
-      await self.taker.checkCollateral(self.maker.getOpenPrice())
+      await self.onCollateralEvent()
       for reporter in self.statusReporters:
          await reporter.onReadyEvent(self)
 
@@ -131,12 +220,20 @@ class DealerFactory(object):
          and self.hedger.isReady()
 
    async def waitOnReady(self):
-      await self.maker.waitOnReady()
-      await self.taker.waitOnReady()
-      await self.hedger.waitOnReady()
+      await asyncio.gather(
+         self.maker.waitOnReady(),
+         self.taker.waitOnReady(),
+         self.hedger.waitOnReady())
 
       await self.onReadyEvent()
 
+   def getTimeToReady(self):
+      #seconds each component took to first become ready, None if pending
+      result = {}
+      for component in [self.maker, self.taker, self.hedger]:
+         result[component.name] = component.readiness.timeToReady
+      return result
+
    def getStatusStr(self):
       if not self.taker.isReady():
          return f"{self.taker.name} is not ready"
@@ -147,6 +244,8 @@ class DealerFactory(object):
 
    ## collateral ##
    async def onCollateralEvent(self):
+      if not self.active:
+         return
       await self.taker.checkCollateral(self.maker.getOpenPrice())
 
    ## price ##
@@ -159,8 +258,69 @@ class DealerFactory(object):
       for reporter in self.statusReporters:
          await reporter.onRebalanceEvent(self)
 
+   ## leadership ##
+   def isActive(self):
+      return self.active
+
+   def setActive(self, value):
+      self.active = value
+      self.hedger.setActive(value)
+
+   async def takeOver(self):
+      self.setActive(True)
+      await self.onEvent(None, Definitions.Leadership)
+
+   async def onLeadershipEvent(self):
+      #our book and positions are warm, resync exposure and requote now
+      await self.hedger.onTakeOver(self.maker, self.taker)
+      await self.onCollateralEvent()
+      for reporter in self.statusReporters:
+         await reporter.onReadyEvent(self)
+
+   ## config ##
+   def getConfigurables(self):
+      return [self.maker, self.taker, self.hedger]
+
+   async def applyConfig(self, config):
+      #no awaits until every component has its new settings
+      for component in self.getConfigurables():
+         component.reloadConfig(config)
+      await self.onEvent(None, Definitions.Reload)
+
+   async def onReloadEvent(self):
+      await self.hedger.onReloadEvent(self.maker, self.taker)
+      await self.onCollateralEvent()
+
+   ## supervision ##
+   async def onComponentRestart(self, component):
+      for reporter in self.statusReporters:
+         await reporter.onSupervisionEvent(self)
+
    ## transactions ##
    async def onTransactionEvent(self):
       await self.maker.cashOps.process()
       await self.taker.cashOps.process()
       await self.hedger.onBalanceEvent(self.maker, self.taker)
+
+   ## memory ##
+   async def onMemoryTick(self):
+      await self.onEvent(None, Definitions.Memory)
+
+   async def onMemoryEvent(self):
+      for reporter in self.statusReporters:
+         await reporter.onMemoryEvent(self)
+
+   def getMemoryGauges(self):
+      gauges = {}
+      components = [self.maker, self.taker] + self.statusReporters
+      for component in components:
+         name = getattr(component, 'name', type(component).__name__)
+         for key, size in component.getMemoryGauges().items():
+            gauges[f"{name}.{key}"] = size
+
+      for key, size in Definitions.TheTxTracker.getMemoryGauges().items():
+         gauges[f"tx_tracker.{key}"] = size
+      return gauges
+
+   def getMemoryReport(self):
+      return MemoryReport(self.getMemoryGauges())
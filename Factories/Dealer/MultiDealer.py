@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+
+from Factories.Definitions import ConfigException, overlayConfig
+from Factories.StatusReporter.Factory import ReportQueue, drainReports
+from Factories.Dealer.Supervisor import MIN_BACKOFF, MAX_BACKOFF, STABLE_UPTIME
+from Factories.Dealer.ConfigReloader import ConfigReloader
+
+################################################################################
+def getProductConfigs(config):
+   '''
+   Expands the "products" list of a multi product config into one config
+   per product. Each entry overrides groups of the base config and has to
+   name the leverex and bitfinex products it pairs.
+
+   Balances are account wide: every product quotes off the full balance,
+   use per product quote_ratio to split it. Only the first product may
+   rebalance, the others would move the same funds. A shared book
+   mirror (bitfinex shared_book_path) has to be set per product.
+   '''
+   if 'products' not in config or len(config['products']) == 0:
+      raise ConfigException('Missing \"products\" in config')
+
+   base = {}
+   for key in config:
+      if key != 'products':
+         base[key] = config[key]
+
+   result = []
+   seen = { 'leverex' : set(), 'bitfinex' : set() }
+   sharedBookPaths = set()
+   for i, overrides in enumerate(config['products']):
+      productConfig = overlayConfig(base, overrides)
+
+      for group in seen:
+         if group not in overrides or 'product' not in overrides[group]:
+            raise ConfigException(
+               f'products entry #{i} is missing \"product\" in config group \"{group}\"')
+         product = overrides[group]['product']
+         if product in seen[group]:
+            raise ConfigException(f'{group} product {product} is listed twice')
+         seen[group].add(product)
+
+      #each product's writer maps its own region
+      path = productConfig.get('bitfinex', {}).get('shared_book_path')
+      if path != None:
+         if path in sharedBookPaths:
+            raise ConfigException(
+               f'products entry #{i} shares shared_book_path {path}, set one per product')
+         sharedBookPaths.add(path)
+
+      if i > 0 and 'rebalance' in productConfig:
+         productConfig['rebalance']['enable'] = False
+      result.append(productConfig)
+   return result
+
+################################################################################
+class MultiDealer(object):
+   '''
+   Runs one DealerFactory per product in a single process. The providers
+   share their connections through routers (ProductRouter for leverex,
+   BfxRouter for bitfinex), each product keeps its own hedger, exposure
+   manager, scheduler and supervisor. Product notifications only reach
+   their own dealer and a dealer failing doesn't stop the others.
+
+   All status reporters push to a single queue drained by one task.
+
+   With a createDealer(productConfig) builder, a product whose dealer
+   exits is stopped and rebuilt from its config with exponential
+   backoff. Without one a dealer runs once. A config file is watched
+   for the whole process, each product gets its own expanded config
+   applied.
+   '''
+   def __init__(self, dealers, createDealer=None, configs=None,
+      configFile=None, minBackoff=MIN_BACKOFF, maxBackoff=MAX_BACKOFF):
+      #product label: DealerFactory
+      self.dealers = dealers
+      #product label: product config, to rebuild dealers from
+      self.configs = configs if configs != None else {}
+      self.createDealer = createDealer
+      self.minBackoff = minBackoff
+      self.maxBackoff = maxBackoff
+      self.restarts = {}
+      self.reportQueue = ReportQueue()
+      self.reportTask = None
+
+      for product in self.dealers:
+         self.shareQueue(product, self.dealers[product])
+
+      self.configReloader = None
+      self.reloaderTask = None
+      if configFile != None:
+         self.configReloader = ConfigReloader(self, configFile,
+            self.getConfigsByProduct)
+
+   def shareQueue(self, product, dealer):
+      for reporter in dealer.statusReporters:
+         reporter.shareQueue(self.reportQueue, product)
+
+   async def run(self):
+      if self.reportTask == None:
+         self.reportTask = asyncio.create_task(drainReports(self.reportQueue))
+      if self.configReloader != None and self.reloaderTask == None:
+         self.reloaderTask = self.configReloader.getAsyncIOTask()
+
+      #returns once every product's dealer has exited for good
+      await asyncio.gather(*[self.runDealer(product) \
+         for product in list(self.dealers)])
+
+   async def runDealer(self, product):
+      backoff = self.minBackoff
+      while True:
+         dealer = self.dealers[product]
+         start = time.monotonic()
+         try:
+            component = await dealer.run()
+            error = "dealer exited"
+            if component != None:
+               error = f"{component.name} exited: {component.lastError}"
+         except Exception as e:
+            error = e
+            logging.error(f"dealer for {product} failed with error: {e}")
+
+         if self.createDealer == None:
+            return
+
+         #leftover tasks go with the dealer, the others keep running
+         dealer.stop()
+         if time.monotonic() - start >= STABLE_UPTIME:
+            backoff = self.minBackoff
+         self.restarts[product] = self.restarts.get(product, 0) + 1
+         logging.warning(f"restarting dealer for {product} in {backoff}s"
+            f" ({error}, restart #{self.restarts[product]})")
+         await asyncio.sleep(backoff)
+         backoff = min(backoff * 2, self.maxBackoff)
+
+         try:
+            dealer = self.createDealer(self.configs[product])
+         except Exception as e:
+            logging.error(f"failed to rebuild dealer for {product}: {e}")
+            continue
+         self.shareQueue(product, dealer)
+         self.dealers[product] = dealer
+
+   def stop(self):
+      if self.reportTask != None:
+         self.reportTask.cancel()
+         self.reportTask = None
+      if self.reloaderTask != None:
+         self.reloaderTask.cancel()
+         self.reloaderTask = None
+      for dealer in self.dealers.values():
+         dealer.stop()
+
+   ## config reload ##
+   def getConfigurables(self):
+      result = []
+      for dealer in self.dealers.values():
+         result.extend(dealer.getConfigurables())
+      return result
+
+   @staticmethod
+   def getConfigsByProduct(config):
+      result = {}
+      for productConfig in getProductConfigs(config):
+         result[productConfig['leverex']['product']] = productConfig
+      return result
+
+   async def applyConfig(self, config):
+      configs = self.getConfigsByProduct(config)
+      for product, productConfig in configs.items():
+         self.configs[product] = productConfig
+         await self.dealers[product].applyConfig(productConfig)
+
+   async def waitOnReady(self):
+      await asyncio.gather(*[dealer.waitOnReady() \
+         for dealer in self.dealers.values()])
+
+   def isReady(self):
+      for dealer in self.dealers.values():
+         if not dealer.isReady():
+            return False
+      return True
+
+   def getStatusStr(self):
+      result = []
+      for product, dealer in self.dealers.items():
+         status = dealer.getStatusStr()
+         if status == None:
+            status = "ready"
+         result.append(f"{product}: {status}")
+      return "\n".join(result)
@@ -0,0 +1,156 @@
+import logging
+import time
+from collections import deque
+
+import Factories.Definitions as Definitions
+
+## priority classes, lower goes first ##
+HEDGE    = 0
+STATE    = 1
+QUOTE    = 2
+CASH     = 3
+REPORT   = 4
+
+CLASS_NAMES = ['hedge', 'state', 'quote', 'cash', 'report']
+
+EVENT_PRIORITY = {
+   Definitions.Leadership  : HEDGE,
+   Definitions.Position    : HEDGE,
+   Definitions.Collateral  : STATE,
+   Definitions.Ready       : STATE,
+   Definitions.Reload      : STATE,
+   Definitions.OrderBook   : QUOTE,
+   Definitions.Balance     : CASH,
+   Definitions.Rebalance   : CASH,
+   Definitions.Transaction : CASH,
+   Definitions.PriceEvent  : REPORT,
+   Definitions.Memory      : REPORT
+}
+
+#handlers read the providers' current state, so a burst of these
+#only needs to be processed once
+COALESCED_EVENTS = set([
+   Definitions.OrderBook,
+   Definitions.PriceEvent,
+   Definitions.Balance,
+   Definitions.Memory
+])
+
+#queued events older than this are served ahead of higher classes
+STARVATION_DELAY = 0.25 #in seconds
+
+################################################################################
+class ClassStats(object):
+   def __init__(self, name):
+      self.name = name
+      self.count = 0
+      self.coalesced = 0
+      self.totalDelay = 0
+      self.maxDelay = 0
+      self.starved = 0
+
+   def record(self, delay):
+      self.count += 1
+      self.totalDelay += delay
+      self.maxDelay = max(self.maxDelay, delay)
+
+   def getAverageDelay(self):
+      if self.count == 0:
+         return 0
+      return self.totalDelay / self.count
+
+   def __str__(self):
+      return f"{self.name}: {self.count} events, {self.coalesced} coalesced, " \
+         f"{self.starved} aged, queue delay avg: {round(self.getAverageDelay() * 1000, 3)}ms, " \
+         f"max: {round(self.maxDelay * 1000, 3)}ms"
+
+################################################################################
+class EventScheduler(object):
+   '''
+   Orders dealer events by priority class. An event arriving while the
+   scheduler is idle is processed inline, events arriving while another
+   one is being processed (re-entrant or from another provider's task)
+   are queued and drained by the running call in priority order.
+
+   push() therefore only waits on its own event when the scheduler was
+   idle: a queued push returns right away, its event is handled by the
+   push that is draining. A handler raising is logged and the drain
+   moves on to the next event, it never fails an unrelated caller.
+   '''
+   def __init__(self, handler):
+      self.handler = handler
+      self.queues = [deque() for name in CLASS_NAMES]
+      self.pending = set()
+      self.running = False
+      self.stats = [ClassStats(name) for name in CLASS_NAMES]
+      self.errors = 0
+
+   def __len__(self):
+      return sum(len(queue) for queue in self.queues)
+
+   async def push(self, provider, eventType):
+      priority = EVENT_PRIORITY.get(eventType, STATE)
+      key = (id(provider), eventType)
+      if eventType in COALESCED_EVENTS:
+         if key in self.pending:
+            self.stats[priority].coalesced += 1
+            return
+         self.pending.add(key)
+
+      self.queues[priority].append(
+         (time.monotonic(), priority, key, provider, eventType))
+
+      if self.running:
+         return
+      await self.drain()
+
+   def popNext(self):
+      #oldest overdue event first, then by priority
+      now = time.monotonic()
+      overdue = None
+      for queue in self.queues:
+         if len(queue) == 0 or now - queue[0][0] < STARVATION_DELAY:
+            continue
+         if overdue == None or queue[0][0] < overdue[0][0]:
+            overdue = queue
+
+      if overdue != None:
+         item = overdue.popleft()
+         for queue in self.queues[0:item[1]]:
+            if len(queue) > 0:
+               self.stats[item[1]].starved += 1
+               break
+         return item
+
+      for queue in self.queues:
+         if len(queue) > 0:
+            return queue.popleft()
+      return None
+
+   async def drain(self):
+      self.running = True
+      try:
+         while True:
+            item = self.popNext()
+            if item == None:
+               return
+
+            queuedAt, priority, key, provider, eventType = item
+            self.pending.discard(key)
+            self.stats[priority].record(time.monotonic() - queuedAt)
+            try:
+               await self.handler(provider, eventType)
+            except Exception as e:
+               self.errors += 1
+               logging.error(f"[EventScheduler] failed to process"
+                  f" \"{eventType}\" with error: {e}")
+      finally:
+         self.running = False
+
+   def getStats(self):
+      return self.stats
+
+   def getStatsStr(self):
+      lines = [f"  - {str(stats)}" for stats in self.stats]
+      lines.append(f"  - handler errors: {self.errors}")
+      return "\n".join(lines)
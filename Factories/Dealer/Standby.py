@@ -0,0 +1,106 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+
+#how often a standby tries to take the lock, this bounds takeover latency
+POLL_INTERVAL = 0.01       #in seconds
+HEARTBEAT_INTERVAL = 1
+HEARTBEAT_TIMEOUT = 5
+
+################################################################################
+class LeaderLock(object):
+   '''
+   flock based leadership: whoever holds the lock is the primary. The
+   kernel drops the lock the moment the primary's process exits, so a
+   standby polling it notices a dead primary right away. The holder
+   also writes a heartbeat into the file for hung process detection.
+   '''
+   def __init__(self, path):
+      self.path = path
+      self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+      self.locked = False
+
+   def tryAcquire(self):
+      if self.locked:
+         return True
+
+      try:
+         fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except BlockingIOError:
+         return False
+
+      self.locked = True
+      self.writeHeartbeat()
+      return True
+
+   def writeHeartbeat(self):
+      data = json.dumps({'pid': os.getpid(), 'time': time.time()}).encode()
+      os.ftruncate(self.fd, 0)
+      os.pwrite(self.fd, data, 0)
+
+   def readHeartbeat(self):
+      try:
+         return json.loads(os.pread(self.fd, 256, 0))
+      except ValueError:
+         #empty or mid write
+         return None
+
+   def release(self):
+      if self.locked:
+         fcntl.flock(self.fd, fcntl.LOCK_UN)
+         self.locked = False
+
+   def close(self):
+      if self.fd == None:
+         return
+      self.release()
+      os.close(self.fd)
+      self.fd = None
+
+################################################################################
+class StandbyManager(object):
+   '''
+   Runs as a critical dealer component. A dealer that can't get the
+   lock at startup runs in standby: logged in, tracking positions and
+   the taker book, but neither quoting nor hedging. It takes over as
+   soon as the lock frees up.
+   '''
+   def __init__(self, dealer, lock):
+      self.dealer = dealer
+      self.lock = lock
+      self.name = "Standby"
+      self.takeoverTime = None
+
+   def isPrimary(self):
+      return self.lock.locked
+
+   def getAsyncIOTask(self):
+      return asyncio.create_task(self.run())
+
+   async def run(self):
+      lastWarning = 0
+      while not self.lock.tryAcquire():
+         #a primary that holds the lock but stopped beating is hung,
+         #we can't safely quote over it, only flag it
+         heartbeat = self.lock.readHeartbeat()
+         now = time.time()
+         if heartbeat != None and now - heartbeat['time'] > HEARTBEAT_TIMEOUT \
+            and now - lastWarning > HEARTBEAT_TIMEOUT:
+            lastWarning = now
+            logging.error(f"primary dealer (pid {heartbeat['pid']}) holds"
+               f" {self.lock.path} but missed its heartbeat")
+         await asyncio.sleep(POLL_INTERVAL)
+
+      if not self.dealer.isActive():
+         start = time.monotonic()
+         await self.dealer.takeOver()
+         self.takeoverTime = time.monotonic() - start
+         logging.warning(f"took over as primary dealer in"
+            f" {round(self.takeoverTime * 1000, 2)}ms")
+
+      while True:
+         self.lock.writeHeartbeat()
+         await asyncio.sleep(HEARTBEAT_INTERVAL)
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+
+MIN_BACKOFF = 1      #in seconds
+MAX_BACKOFF = 60
+#a component that stayed up this long starts over from MIN_BACKOFF
+STABLE_UPTIME = 60
+
+################################################################################
+class Component(object):
+   def __init__(self, name, factory, critical, minBackoff=MIN_BACKOFF,
+      shared=False):
+      self.name = name
+      self.factory = factory
+      self.critical = critical
+      #shared tasks serve other dealers too, they outlive this one
+      self.shared = shared
+      self.task = None
+
+      self.restarts = 0
+      self.downtime = 0
+      self.downSince = None
+      self.upSince = None
+      self.lastError = None
+      self.minBackoff = minBackoff
+      self.backoff = minBackoff
+
+   def start(self):
+      self.task = self.factory.getAsyncIOTask()
+      now = time.monotonic()
+      if self.downSince != None:
+         self.downtime += now - self.downSince
+         self.downSince = None
+      self.upSince = now
+      return self.task
+
+   def onDown(self, error):
+      now = time.monotonic()
+      self.downSince = now
+      self.lastError = error
+      if self.upSince != None and now - self.upSince >= STABLE_UPTIME:
+         self.backoff = self.minBackoff
+
+   def getDowntime(self):
+      if self.downSince == None:
+         return self.downtime
+      return self.downtime + time.monotonic() - self.downSince
+
+   def __str__(self):
+      kind = "critical" if self.critical else "auxiliary"
+      state = "up" if self.downSince == None else "down"
+      result = f"{self.name} ({kind}): {state}, restarts: {self.restarts}, " \
+         f"downtime: {round(self.getDowntime(), 1)}s"
+      if self.lastError != None:
+         result += f", last error: {self.lastError}"
+      return result
+
+################################################################################
+class Supervisor(object):
+   '''
+   Runs the dealer's component tasks. Critical components (maker, taker,
+   hedger) are not restarted in isolation: the first one to exit ends
+   the run so the dealer can restart as a whole. Auxiliary components
+   (status reporters) are restarted on their own with exponential
+   backoff and never take the dealer down.
+   '''
+   def __init__(self, onRestart=None,
+      minBackoff=MIN_BACKOFF, maxBackoff=MAX_BACKOFF):
+      self.components = []
+      self.onRestart = onRestart
+      self.minBackoff = minBackoff
+      self.maxBackoff = maxBackoff
+      self._auxTasks = []
+
+   def add(self, name, factory, critical, shared=False):
+      component = Component(name, factory, critical, self.minBackoff, shared)
+      self.components.append(component)
+      return component
+
+   async def run(self):
+      criticalTasks = []
+      for component in self.components:
+         if component.critical:
+            task = component.start()
+            if task != None:
+               criticalTasks.append(task)
+         else:
+            self._auxTasks.append(asyncio.create_task(
+               self.supervise(component), name=f"supervise {component.name}"))
+
+      if len(criticalTasks) == 0:
+         return None
+
+      done, pending = await asyncio.wait(
+         criticalTasks, return_when=asyncio.FIRST_COMPLETED)
+
+      for component in self.components:
+         if component.critical and component.task in done:
+            error = self.getError(component.task)
+            component.onDown(error)
+            if error != None:
+               logging.error(f"critical component {component.name} failed with error: {error}")
+            return component
+
+   @staticmethod
+   def getError(task):
+      if task.cancelled():
+         return "cancelled"
+      return task.exception()
+
+   async def supervise(self, component):
+      while True:
+         task = component.start()
+         if task == None:
+            #nothing to run for this component
+            return
+
+         try:
+            await asyncio.wait([task])
+         except asyncio.CancelledError:
+            if not component.shared:
+               task.cancel()
+            raise
+
+         error = self.getError(task)
+         component.onDown(error)
+         component.restarts += 1
+         logging.warning(f"{component.name} exited (error: {error}), restarting"
+            f" in {component.backoff}s (restart #{component.restarts})")
+
+         if self.onRestart != None:
+            try:
+               await self.onRestart(component)
+            except Exception as e:
+               logging.error(f"failed to report restart of {component.name}: {e}")
+
+         await asyncio.sleep(component.backoff)
+         component.backoff = min(component.backoff * 2, self.maxBackoff)
+
+   def stop(self):
+      for task in self._auxTasks:
+         task.cancel()
+      self._auxTasks = []
+
+      #critical tasks outliving the run are stopped with the dealer
+      for component in self.components:
+         if component.critical and component.task != None:
+            component.task.cancel()
+
+   def getReport(self):
+      return [str(component) for component in self.components]
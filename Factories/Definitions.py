@@ -1,5 +1,8 @@
 from datetime import datetime
 import time
+import asyncio
+import copy
+import logging
 from decimal import Decimal
 
 ## dealer events ##
@@ -11,8 +14,13 @@ Collateral = 'collateral'
 PriceEvent = 'index_price'
 Rebalance = 'rebalance'
 Transaction = 'transaction'
+Supervision = 'supervision'
+Leadership = 'leadership'
+Reload = 'reload'
+Memory = 'memory'
 
 from leverex_core.utils import round_down
+from leverex_core.clock import WALL_CLOCK
 
 ################################################################################
 class ProviderException(Exception):
@@ -61,17 +69,23 @@ class PriceBookEntry():
 
 ########
 class AggregationOrderBook():
-   def __init__(self):
+   def __init__(self, sharedWriter=None):
       self._asks = {}
       self._bids = {}
 
+      #optional SharedBookWriter, mirrors the top levels to shared memory
+      self._sharedWriter = sharedWriter
+
    def reset(self):
+      #a snapshot follows, the mirror is updated once it is loaded
+      #rather than showing readers an empty book in between
       self._asks = {}
       self._bids = {}
 
    def setup_from_snapshot(self, snapshot_data):
       for entry in snapshot_data:
          self._set_entry(PriceBookEntry(entry))
+      self._publish()
 
    def process_update(self, update):
       entry = PriceBookEntry(update)
@@ -81,6 +95,21 @@ class AggregationOrderBook():
       else:
          self._set_entry(entry)
 
+      #most deltas land past the published depth, skip those
+      if self._sharedWriter != None and \
+         self._sharedWriter.isPublished(entry.is_ask, entry.price):
+         self._publish()
+
+   def closeSharedWriter(self):
+      #the book keeps working locally, it is no longer mirrored
+      if self._sharedWriter != None:
+         self._sharedWriter.close()
+         self._sharedWriter = None
+
+   def _publish(self):
+      if self._sharedWriter != None:
+         self._sharedWriter.publish(self._asks, self._bids)
+
    def _set_entry(self, entry: PriceBookEntry):
       if entry.is_ask:
          target_book = self._asks
@@ -101,13 +130,17 @@ class AggregationOrderBook():
       except:
          pass
 
+   def get_levels(self, is_ask):
+      #(price, volume) pairs, best price first
+      if is_ask:
+         return sorted(self._asks.items())
+      return sorted(self._bids.items(), reverse=True)
+
    def get_aggregated_ask_price(self, target_volume):
-      offers = sorted(self._asks.items())
-      return self._get_aggregated_offer(offers, target_volume)
+      return self._get_aggregated_offer(self.get_levels(True), target_volume)
 
    def get_aggregated_bid_price(self, target_volume):
-      offers = sorted(self._bids.items(), reverse=True)
-      return self._get_aggregated_offer(offers, target_volume)
+      return self._get_aggregated_offer(self.get_levels(False), target_volume)
 
    def _get_aggregated_offer(self, offers, target_volume):
       if target_volume == 0:
@@ -186,7 +219,7 @@ class PositionsReport(object):
 class BalanceReport(object):
    def __init__(self, provider):
       self.name = provider.name
-      self._timestamp = time.time_ns() / 1000000
+      self._timestamp = provider.clock.time_ns() / 1000000
 
    @property
    def timestamp(self):
@@ -203,7 +236,7 @@ class BalanceReport(object):
 class RebalanceReport(object):
    def __init__(self, provider):
       self.name = provider.name
-      self._timestamp = time.time_ns() / 1000000
+      self._timestamp = provider.clock.time_ns() / 1000000
 
    @property
    def timestamp(self):
@@ -387,6 +420,10 @@ class SideVolume(object):
       #hence the 2x
       return (balanceToQuote + self.freeMargin * 2) / self.priceFactor
 
+   def getMaxVolume(self):
+      #volume the provider can take on, regardless of quoting limits
+      return (self.freeBalance + self.freeMargin * 2) / self.priceFactor
+
 ########
 class OpenVolume(object):
    def __init__(self, balance, askMargin, askPrice, bidMargin, bidPrice):
@@ -404,6 +441,12 @@ class OpenVolume(object):
       }
       return result
 
+   def getMax(self):
+      return {
+         'ask': self.ask.getMaxVolume(),
+         'bid': self.bid.getMaxVolume()
+      }
+
 ########
 class OnChainTransaction(object):
    def __init__(self, txid, recipient, nConf, outputs):
@@ -423,7 +466,8 @@ class OnChainTransaction(object):
 
 ########
 class TransactionTracker(object):
-   def __init__(self):
+   def __init__(self, clock=WALL_CLOCK):
+      self.clock = clock
       self.transactions = {}
       self.orderedByTimestamp = {}
 
@@ -433,7 +477,7 @@ class TransactionTracker(object):
       else:
          self.transactions[txid] = OnChainTransaction(
             txid, recipient, nConf, outputs)
-         now = round(time.time() * 1000)
+         now = round(self.clock.time() * 1000)
          self.orderedByTimestamp[now] = txid
 
    def addDeposit(self, deposit):
@@ -452,8 +496,121 @@ class TransactionTracker(object):
          return None
       return self.transactions[txId]
 
+   def getMemoryGauges(self):
+      return {
+         'transactions' : len(self.transactions),
+         'ordered_by_timestamp' : len(self.orderedByTimestamp)
+      }
+
 TheTxTracker = TransactionTracker()
 
+################################################################################
+class InitBarrier(object):
+   '''
+   Joins initial data requests that are fired concurrently. Items are
+   added when their request goes out and marked done from the reply,
+   waiters resume once every added item is done. Keeps per item timings.
+   '''
+   def __init__(self, name):
+      self.name = name
+      self.items = {}
+      self._event = asyncio.Event()
+      self._event.set()
+
+   def add(self, item):
+      #re-adding an item restarts it, i.e. on data reloads
+      self.items[item] = [time.monotonic(), None]
+      self._event.clear()
+
+   def done(self, item):
+      if item not in self.items or self.items[item][1] != None:
+         return
+
+      self.items[item][1] = time.monotonic()
+      if self.isDone():
+         self._event.set()
+         logging.info(f"[{self.name}] initial data loaded: {self.getTimingsStr()}")
+
+   def isDone(self):
+      for item in self.items:
+         if self.items[item][1] == None:
+            return False
+      return True
+
+   async def run(self, item, coro):
+      #for loads that complete when awaited
+      self.add(item)
+      try:
+         return await coro
+      finally:
+         self.done(item)
+
+   async def wait(self):
+      await self._event.wait()
+
+   def getTimings(self):
+      #seconds per item, None for pending items
+      result = {}
+      for item in self.items:
+         start, end = self.items[item]
+         result[item] = None if end == None else end - start
+      return result
+
+   def getTimingsStr(self):
+      timings = []
+      for item, duration in self.getTimings().items():
+         if duration == None:
+            timings.append(f"{item}: pending")
+         else:
+            timings.append(f"{item}: {round(duration * 1000, 1)}ms")
+      return ", ".join(timings)
+
+################################################################################
+class ReadinessTracker(object):
+   '''
+   Ready state of a component as an asyncio.Event: waiters resume as
+   soon as the component reports it is ready. Components call update()
+   on every ready state change, waiters are never polled. Also measures
+   how long the component took to get there.
+   '''
+   def __init__(self, name):
+      self.name = name
+      self._event = asyncio.Event()
+      self.startTime = time.monotonic()
+      self.notReadySince = self.startTime
+
+      #seconds from creation to first ready state
+      self.timeToReady = None
+      #seconds from the last not ready state to ready
+      self.lastTimeToReady = None
+      self.readyCount = 0
+
+   def isSet(self):
+      return self._event.is_set()
+
+   def update(self, ready):
+      if ready == self._event.is_set():
+         return
+
+      now = time.monotonic()
+      if not ready:
+         self._event.clear()
+         self.notReadySince = now
+         return
+
+      self._event.set()
+      self.readyCount += 1
+      self.lastTimeToReady = now - self.notReadySince
+      if self.timeToReady == None:
+         self.timeToReady = now - self.startTime
+         logging.info(f"[{self.name}] ready after {round(self.timeToReady, 3)}s")
+
+   async def wait(self, isReady):
+      #picks up a state reached before anyone waited, changes from
+      #there on come in through update()
+      self.update(isReady())
+      await self._event.wait()
+
 ########
 class ConfigException(Exception):
    pass
@@ -463,9 +620,19 @@ def checkConfig(config, requiredSetting):
       if k not in config:
          raise ConfigException(f'Missing \"{k}\" in config')
 
-         for kk in requiredSetting[k]:
-            if kk not in config[k]:
-               raise ConfigException(f'Missing \"{kk}\" in config group \"{k}\"')
+      for kk in requiredSetting[k]:
+         if kk not in config[k]:
+            raise ConfigException(f'Missing \"{kk}\" in config group \"{k}\"')
+
+########
+def overlayConfig(config, overrides):
+   #copy of config with the groups in overrides updated
+   result = copy.deepcopy(config)
+   for group in overrides:
+      if group not in result:
+         result[group] = {}
+      result[group].update(overrides[group])
+   return result
 
 ########
 def double_eq(a, b, deviation_pct=0.01):
@@ -1,12 +1,21 @@
 import logging
 import asyncio
 
+from Factories.Definitions import ReadinessTracker
+from leverex_core.clock import WALL_CLOCK
+
 class HedgerFactory(object):
-   def __init__(self, name):
+   #config entries that can be changed on a running hedger
+   reloadable_settings = {}
+
+   def __init__(self, name, clock=None):
       self._name = name
+      self.clock = clock if clock != None else WALL_CLOCK
       self._ready = False
+      self._active = True
       self.onEventFunc = None
       self.maker = None
+      self.readiness = ReadinessTracker(name)
 
    ## setup ##
    def setup(self, onEventFunc, maker):
@@ -29,12 +38,28 @@ class HedgerFactory(object):
          raise Exception(f"Hedger {self._name} is missing event func")
       if not self.isReady():
          self._ready = True
+         self.readiness.update(True)
 
    async def waitOnReady(self):
-      while True:
-         if self.isReady():
-            return
-         await asyncio.sleep(0.1)
+      await self.readiness.wait(self.isReady)
+
+   ## standby ##
+   def isActive(self):
+      return self._active
+
+   def setActive(self, value):
+      #an inactive hedger tracks state but neither quotes nor hedges
+      self._active = value
+
+   async def onTakeOver(self, maker, taker):
+      await self.onReadyEvent(maker, taker)
+
+   ## config ##
+   def reloadConfig(self, config):
+      pass
+
+   async def onReloadEvent(self, maker, taker):
+      await self.onReadyEvent(maker, taker)
 
    ## rebalance ##
    async def onBalanceEvent(self, maker, taker):
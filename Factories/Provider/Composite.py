@@ -0,0 +1,363 @@
+import asyncio
+import logging
+from decimal import Decimal
+
+import Factories.Definitions as Definitions
+from Factories.Provider.Factory import Factory
+from Factories.Definitions import AggregationOrderBook, ProviderException, \
+   overlayConfig
+from leverex_core.utils import round_down
+
+#hedge slices smaller than this are folded into the largest one
+MIN_SPLIT_SIZE = 0.0001
+
+################################################################################
+class CompositeOrderBook(AggregationOrderBook):
+   '''
+   Read only depth view merging the books of several venues. Only
+   ready venues contribute, a disconnected venue's book is stale.
+   '''
+   def __init__(self, venues):
+      super().__init__()
+      self.venues = venues
+
+   def get_venue_levels(self, is_ask):
+      #(price, volume, venue), best price first
+      levels = []
+      for venue in self.venues:
+         if not venue.isReady():
+            continue
+         for price, volume in venue.order_book.get_levels(is_ask):
+            levels.append((price, volume, venue))
+      levels.sort(key=lambda level: level[0], reverse=not is_ask)
+      return levels
+
+   def get_levels(self, is_ask):
+      merged = {}
+      for price, volume, venue in self.get_venue_levels(is_ask):
+         merged[price] = merged.get(price, 0) + volume
+      if is_ask:
+         return sorted(merged.items())
+      return sorted(merged.items(), reverse=True)
+
+   def __str__(self):
+      asks = sum(level[1] for level in self.get_levels(True))
+      bids = sum(level[1] for level in self.get_levels(False))
+      return f'ask {asks}, bids {bids}'
+
+########
+class CompositeOpenVolume(object):
+   def __init__(self, volumes):
+      self.volumes = volumes
+
+   def get(self, maxVolume, unquoteRatio):
+      result = { 'ask': 0, 'bid': 0 }
+      for volume in self.volumes:
+         venueVolume = volume.get(maxVolume, unquoteRatio)
+         result['ask'] += venueVolume['ask']
+         result['bid'] += venueVolume['bid']
+
+      #maxVolume caps the dealer, not each venue
+      maxVolume = Decimal(maxVolume)
+      result['ask'] = min(result['ask'], maxVolume)
+      result['bid'] = min(result['bid'], maxVolume)
+      return result
+
+########
+class CompositeReport(object):
+   def __init__(self, name, reports):
+      self.name = name
+      self.reports = reports
+
+   def __eq__(self, obj):
+      if not isinstance(obj, CompositeReport):
+         return False
+      return self.reports == obj.reports
+
+   def __str__(self):
+      return "\n".join(str(report) for report in self.reports)
+
+   def getPnlReport(self):
+      return "\n".join(report.getPnlReport() for report in self.reports)
+
+################################################################################
+class CompositeTaker(Factory):
+   '''
+   Several taker venues behind a single provider. Their books merge into
+   one depth view for quoting and exposure is netted across venues.
+   Hedges are split by walking the merged book best price first, each
+   venue capped by the volume its free collateral can carry. Venues
+   holding a position the hedge reduces are filled first. Venues that
+   aren't ready are routed around: the composite quotes and hedges on
+   the others as long as one is up.
+
+   Cash management (addresses, withdrawals, rebalance metrics) goes
+   through the first venue, the primary.
+   '''
+   def __init__(self, venues, name="Takers", minSplitSize=MIN_SPLIT_SIZE):
+      super().__init__(name)
+      if len(venues) == 0:
+         raise ProviderException("composite taker needs at least one venue")
+
+      self.venues = venues
+      self.primary = venues[0]
+      self.order_book = CompositeOrderBook(venues)
+      self.minSplitSize = minSplitSize
+      self.lastSplit = None
+      #venue: last exposure it reported while ready
+      self.lastExposures = {}
+
+      self.cashOps = self.primary.cashOps
+      self.chainAddresses = self.primary.chainAddresses
+      self._leverage = self.primary.leverage
+      self.collateral_pct = self.primary.collateral_pct
+
+      #venues are all of a kind, they check and reload the same settings
+      self.required_settings = getattr(self.primary, 'required_settings', {})
+      self.reloadable_settings = self.primary.reloadable_settings
+
+   ## setup ##
+   def setup(self, callback):
+      if callback == None:
+         raise ProviderException("missing hedging callback")
+      self.dealerCallback = callback
+      for venue in self.venues:
+         venue.setup(self.onVenueEvent)
+
+   def teardown(self):
+      for venue in self.venues:
+         venue.teardown()
+
+   def getAsyncIOTask(self):
+      tasks = set()
+      for venue in self.venues:
+         task = venue.getAsyncIOTask()
+         if task != None:
+            tasks.add(task)
+      if len(tasks) == 0:
+         return None
+      return asyncio.create_task(self.runVenues(tasks))
+
+   async def runVenues(self, tasks):
+      #the composite is down as soon as one venue is
+      try:
+         done, pending = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_COMPLETED)
+      finally:
+         for task in tasks:
+            task.cancel()
+      for task in done:
+         if not task.cancelled() and task.exception() != None:
+            raise task.exception()
+
+   def reloadConfig(self, config):
+      #per venue overrides ("takers") apply on top of the new config,
+      #changing them takes a restart
+      takers = config.get('takers')
+      for i, venue in enumerate(self.venues):
+         venueConfig = config
+         if takers != None:
+            venueConfig = overlayConfig(config, { 'bitfinex' : takers[i] })
+         venue.reloadConfig(venueConfig)
+
+   async def onVenueEvent(self, venue, eventType):
+      #the dealer only knows about the composite
+      self.getVenueExposure(venue)
+      if eventType == Definitions.Ready:
+         self.updateReadyState()
+      await self.dealerCallback(self, eventType)
+
+   ## state ##
+   def getReadyVenues(self):
+      return [venue for venue in self.venues if venue.isReady()]
+
+   def isReady(self):
+      return len(self.getReadyVenues()) > 0
+
+   def isBroken(self):
+      for venue in self.venues:
+         if venue.isBroken():
+            return True
+      return False
+
+   def getStatusStr(self):
+      statuses = []
+      for venue in self.venues:
+         if not venue.isReady():
+            statuses.append(f"{venue.name}: {venue.getStatusStr()}")
+      if len(statuses) == 0:
+         return "N/a"
+      return ", ".join(statuses)
+
+   ## exposure ##
+   def getVenueExposure(self, venue):
+      #a venue that is down can't trade, its last known exposure
+      #still nets against the others
+      exposure = venue.getExposure()
+      if exposure != None:
+         self.lastExposures[venue] = Decimal(exposure)
+      return self.lastExposures.get(venue)
+
+   def getExposure(self):
+      total = Decimal(0)
+      for venue in self.venues:
+         exposure = self.getVenueExposure(venue)
+         if exposure == None:
+            return None
+         total += exposure
+      return total
+
+   def getVenueTarget(self, venue):
+      #exposure a venue is headed to, counting a target queued behind
+      #its cooldown: that one still fires
+      pending = venue.getPendingExposure()
+      if pending != None:
+         return Decimal(pending)
+      return self.getVenueExposure(venue)
+
+   async def updateExposure(self, exposure):
+      #a venue that went down can't place what it queued, drop it so it
+      #doesn't fire once the venue is back on a stale split
+      for venue in self.venues:
+         if not venue.isReady():
+            venue.cancelPendingExposure()
+
+      split = self.splitHedge(exposure)
+      if split == None:
+         return
+      self.lastSplit = split
+      await asyncio.gather(*[venue.updateExposure(target) \
+         for venue, target in split.items()])
+
+   def getVenueRoom(self, venue, isBuy, exposure):
+      #volume a venue can take in the hedge direction
+      room = Decimal(0)
+      openVolume = venue.getOpenVolume()
+      if openVolume != None:
+         room = Decimal(openVolume.getMax()['bid' if isBuy else 'ask'])
+
+      #unwinding a position needs no collateral
+      if isBuy and exposure < 0:
+         room = max(room, -exposure)
+      elif not isBuy and exposure > 0:
+         room = max(room, exposure)
+      return max(room, Decimal(0))
+
+   def splitHedge(self, target):
+      #returns the target exposure of each venue that has to move, queued
+      #targets count as reached: a new target replaces a venue's queued
+      #one, the others still fire as they are
+      exposures = {}
+      for venue in self.venues:
+         exposure = self.getVenueTarget(venue)
+         if exposure == None:
+            logging.warning(f"[{self.name}] {venue.name} has no exposure, can't split hedge")
+            return None
+         exposures[venue] = exposure
+
+      delta = round_down(Decimal(target) - sum(exposures.values()), 8)
+      if delta == 0:
+         return {}
+
+      #exposure nets across all venues, only ready ones can trade
+      venues = self.getReadyVenues()
+      if len(venues) == 0:
+         logging.warning(f"[{self.name}] no venue is ready, can't split hedge")
+         return None
+
+      isBuy = delta > 0
+      sign = 1 if isBuy else -1
+      remaining = abs(delta)
+      unwind = {}
+      room = {}
+      allocation = {}
+      for venue in venues:
+         unwind[venue] = max(-sign * exposures[venue], Decimal(0))
+         room[venue] = self.getVenueRoom(venue, isBuy, exposures[venue])
+         allocation[venue] = Decimal(0)
+
+      #reduce existing positions first so venues don't end up holding
+      #offsetting exposure, then take the best prices, a buy lifts the asks
+      levels = [[venue, Decimal(volume)] for price, volume, venue \
+         in self.order_book.get_venue_levels(isBuy)]
+      for cap in [unwind, room]:
+         for level in levels:
+            if remaining <= 0:
+               break
+            venue = level[0]
+            size = min(level[1], cap[venue] - allocation[venue], remaining)
+            if size <= 0:
+               continue
+            level[1] -= size
+            allocation[venue] += size
+            remaining -= size
+
+      #past the visible depth, the venue with the most room left takes the rest
+      if remaining > 0:
+         venue = max(venues, key=lambda v: room[v] - allocation[v])
+         allocation[venue] += remaining
+
+      #avoid dust orders, the largest slice only takes what its collateral
+      #carries, the rest is left for the next hedge
+      largest = max(venues, key=lambda v: allocation[v])
+      for venue in venues:
+         if venue != largest and 0 < allocation[venue] < Decimal(self.minSplitSize):
+            fold = min(allocation[venue],
+               max(room[largest] - allocation[largest], Decimal(0)))
+            allocation[largest] += fold
+            allocation[venue] = Decimal(0)
+
+      result = {}
+      for venue in venues:
+         if allocation[venue] > 0:
+            result[venue] = round_down(exposures[venue] + sign * allocation[venue], 8)
+      return result
+
+   def getOpenVolume(self):
+      volumes = []
+      for venue in self.getReadyVenues():
+         volume = venue.getOpenVolume()
+         if volume != None:
+            volumes.append(volume)
+      if len(volumes) == 0:
+         return None
+      return CompositeOpenVolume(volumes)
+
+   async def checkCollateral(self, openPrice):
+      for venue in self.venues:
+         await venue.checkCollateral(openPrice)
+
+   ## reports ##
+   def getBalance(self):
+      return CompositeReport(self.name,
+         [venue.getBalance() for venue in self.venues])
+
+   def getPositions(self):
+      return CompositeReport(self.name,
+         [venue.getPositions() for venue in self.venues])
+
+   @property
+   def indexPrice(self):
+      return self.primary.indexPrice
+
+   ## cash, through the primary venue ##
+   async def loadAddresses(self, callback):
+      await self.primary.loadAddresses(callback)
+
+   async def loadWithdrawals(self, callback):
+      await self.primary.loadWithdrawals(callback)
+
+   def withdrawalsLoaded(self):
+      return self.primary.withdrawalsLoaded()
+
+   async def withdraw(self, amount, callback):
+      return await self.primary.withdraw(amount, callback)
+
+   async def cancelWithdrawals(self):
+      return await self.primary.cancelWithdrawals()
+
+   def getPendingWithdrawals(self):
+      return self.primary.getPendingWithdrawals()
+
+   def getCashMetrics(self):
+      return self.primary.getCashMetrics()
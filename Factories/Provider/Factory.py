@@ -3,6 +3,8 @@ import asyncio
 import Factories.Definitions as Definitions
 from decimal import Decimal
 
+from leverex_core.clock import WALL_CLOCK
+
 NOT_INITIALIZED = 0
 FETCHING = 1
 INITIALIZED = 2
@@ -82,10 +84,20 @@ class CashOpsManager(object):
       return result
 
 ################################################################################
+async def waitOnSharedTask(task):
+   #a provider's task over a connection shared with other dealers,
+   #cancelling it leaves the connection up
+   await asyncio.shield(task)
+
+########
 class Factory(object):
+   #config entries that can be changed on a running provider
+   reloadable_settings = {}
+
    ## setup ##
-   def __init__(self, name):
+   def __init__(self, name, clock=None):
       self._name = name
+      self.clock = clock if clock != None else WALL_CLOCK
       self.dealerCallback = None
       self._connected = False
       self._balanceInitialized = NOT_INITIALIZED
@@ -96,6 +108,7 @@ class Factory(object):
       self.openPrice = None
       self.chainAddresses = Definitions.DepositWithdrawAddresses()
       self.cashOps = CashOpsManager(self)
+      self.readiness = Definitions.ReadinessTracker(name)
 
    def setup(self, callback):
       if callback == None:
@@ -105,6 +118,11 @@ class Factory(object):
          raise Definitions.ProviderException(\
             f"leverage for provider {self.name} was not set")
 
+   def teardown(self):
+      #the dealer running this provider stopped, detach from anything
+      #that outlives it
+      pass
+
    def getAsyncIOTask(self):
       pass
 
@@ -132,6 +150,7 @@ class Factory(object):
    def resetInitFlags(self):
       self._balanceInitialized = NOT_INITIALIZED
       self._positionsInitialized = NOT_INITIALIZED
+      self.updateReadyState()
 
    async def getInitialData(self):
       pass
@@ -153,11 +172,13 @@ class Factory(object):
       if self._balanceInitialized == INITIALIZED:
          raise Definitions.ProviderException("init failure")
       self._balanceInitialized = INITIALIZED
+      self.updateReadyState()
 
    async def setInitPosition(self):
       if self._positionsInitialized == INITIALIZED:
          raise Definitions.ProviderException("init failure")
       self._positionsInitialized = INITIALIZED
+      self.updateReadyState()
       await self.onPositionUpdate()
 
    ## ready state ##
@@ -170,11 +191,11 @@ class Factory(object):
       #by default, we assume we cannot detect a broken state
       return False
 
+   def updateReadyState(self):
+      self.readiness.update(self.isReady())
+
    async def waitOnReady(self):
-      while True:
-         if self.isReady():
-            return
-         await asyncio.sleep(0.1)
+      await self.readiness.wait(self.isReady)
 
    def printReadyState(self):
       print (f"----- Provider: {self._name}, ready: {self.isReady()} -----\n"
@@ -182,6 +203,7 @@ class Factory(object):
 
    ## notifications ##
    async def onReady(self):
+      self.updateReadyState()
       await self.dealerCallback(self, Definitions.Ready)
 
    def onNewOrder(self, order):
@@ -210,6 +232,13 @@ class Factory(object):
       #maker position events
       pass
 
+   def getPendingExposure(self):
+      #exposure target queued behind a cooldown, None if there is none
+      return None
+
+   def cancelPendingExposure(self):
+      pass
+
    async def withdraw(self, amount, callback):
       logging.debug("[withdraw]")
 
@@ -227,6 +256,11 @@ class Factory(object):
       #maker position events
       pass
 
+   def reloadConfig(self, config):
+      #swap in the settings listed in reloadable_settings, the config
+      #was validated beforehand and this is called without yielding
+      pass
+
    async def setOpenPrice(self, price):
       self.openPrice = price
       await self.dealerCallback(self, Definitions.Collateral)
@@ -272,3 +306,6 @@ class Factory(object):
 
    def getCashOpsStr(self):
       return str(self.cashOps)
+
+   def getMemoryGauges(self):
+      return { 'cash_ops' : len(self.cashOps.queue) }
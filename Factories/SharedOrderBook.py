@@ -0,0 +1,158 @@
+import heapq
+import mmap
+import os
+import struct
+import time
+
+################################################################################
+##
+#### shared memory order book snapshots
+##
+################################################################################
+'''
+Layout of the shared region, all fields little endian:
+   header: magic, version, depth, ask count, bid count, seq, timestamp
+   asks: depth x (price, volume), best first
+   bids: depth x (price, volume), best first
+
+seq is a seqlock: odd while the writer is updating the region. Readers
+copy the region and retry if seq was odd or moved during the copy.
+'''
+SHARED_BOOK_MAGIC = b'LVXB'
+SHARED_BOOK_VERSION = 1
+DEFAULT_DEPTH = 25
+
+HEADER = struct.Struct('<4sIIIIQd')
+SEQ_OFFSET = 20
+SEQ = struct.Struct('<Q')
+LEVEL = struct.Struct('<dd')
+
+def getRegionSize(depth):
+   return HEADER.size + 2 * depth * LEVEL.size
+
+class SharedBookException(Exception):
+   pass
+
+################################################################################
+class SharedBookSnapshot(object):
+   def __init__(self, seq, timestamp, asks, bids):
+      self.seq = seq
+      self.timestamp = timestamp
+      self.asks = asks
+      self.bids = bids
+
+   def getAsk(self):
+      if len(self.asks) == 0:
+         return None
+      return self.asks[0]
+
+   def getBid(self):
+      if len(self.bids) == 0:
+         return None
+      return self.bids[0]
+
+################################################################################
+class SharedBookWriter(object):
+   '''
+   Publishes the top levels of an order book to a memory mapped file.
+   Single writer, never waits on readers.
+   '''
+   def __init__(self, path, depth=DEFAULT_DEPTH):
+      self.path = path
+      self.depth = depth
+      self.size = getRegionSize(depth)
+      self.seq = 0
+
+      #worst published price per side, None until the side fills the
+      #depth: changes past it don't move the published levels
+      self.askCutoff = None
+      self.bidCutoff = None
+
+      fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+      try:
+         os.ftruncate(fd, self.size)
+         self.mmap = mmap.mmap(fd, self.size)
+      finally:
+         os.close(fd)
+
+      self.levels = bytearray(2 * depth * LEVEL.size)
+      HEADER.pack_into(self.mmap, 0, SHARED_BOOK_MAGIC,
+         SHARED_BOOK_VERSION, depth, 0, 0, self.seq, 0)
+
+   def isPublished(self, isAsk, price):
+      if isAsk:
+         return self.askCutoff == None or price <= self.askCutoff
+      return self.bidCutoff == None or price >= self.bidCutoff
+
+   def publish(self, asks, bids):
+      '''
+      asks and bids are price -> volume maps, only the best `depth`
+      levels of each side are published
+      '''
+      topAsks = heapq.nsmallest(self.depth, asks.items())
+      topBids = heapq.nlargest(self.depth, bids.items())
+      self.askCutoff = topAsks[-1][0] if len(topAsks) == self.depth else None
+      self.bidCutoff = topBids[-1][0] if len(topBids) == self.depth else None
+
+      #pack outside of the critical section
+      offset = 0
+      for level in topAsks:
+         LEVEL.pack_into(self.levels, offset, level[0], level[1])
+         offset += LEVEL.size
+      offset = self.depth * LEVEL.size
+      for level in topBids:
+         LEVEL.pack_into(self.levels, offset, level[0], level[1])
+         offset += LEVEL.size
+
+      self.seq += 1
+      SEQ.pack_into(self.mmap, SEQ_OFFSET, self.seq)
+      HEADER.pack_into(self.mmap, 0, SHARED_BOOK_MAGIC, SHARED_BOOK_VERSION,
+         self.depth, len(topAsks), len(topBids), self.seq, time.time())
+      self.mmap[HEADER.size:self.size] = self.levels
+      self.seq += 1
+      SEQ.pack_into(self.mmap, SEQ_OFFSET, self.seq)
+
+   def close(self):
+      self.mmap.close()
+
+################################################################################
+class SharedBookReader(object):
+   def __init__(self, path):
+      self.path = path
+      with open(path, 'rb') as f:
+         self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+      magic, version, self.depth = HEADER.unpack_from(self.mmap, 0)[0:3]
+      if magic != SHARED_BOOK_MAGIC or version != SHARED_BOOK_VERSION:
+         raise SharedBookException(f"{path} is not a shared order book")
+      if len(self.mmap) < getRegionSize(self.depth):
+         raise SharedBookException(f"{path} is truncated")
+
+   def read(self, maxRetries=1000):
+      '''
+      Returns a consistent SharedBookSnapshot, or None if the writer
+      kept the region busy for maxRetries attempts.
+      '''
+      size = getRegionSize(self.depth)
+      for i in range(maxRetries):
+         seq = SEQ.unpack_from(self.mmap, SEQ_OFFSET)[0]
+         if seq & 1:
+            continue
+
+         data = self.mmap[0:size]
+         if SEQ.unpack_from(self.mmap, SEQ_OFFSET)[0] != seq:
+            continue
+
+         header = HEADER.unpack_from(data, 0)
+         askCount, bidCount, timestamp = header[3], header[4], header[6]
+         asks = [LEVEL.unpack_from(data, HEADER.size + n * LEVEL.size) \
+            for n in range(askCount)]
+         bidOffset = HEADER.size + self.depth * LEVEL.size
+         bids = [LEVEL.unpack_from(data, bidOffset + n * LEVEL.size) \
+            for n in range(bidCount)]
+         return SharedBookSnapshot(seq, timestamp, asks, bids)
+
+      return None
+
+   def close(self):
+      self.mmap.close()
@@ -1,6 +1,10 @@
 import Factories.Definitions as Definitions
+import asyncio
+import logging
 import time
 
+from leverex_core.clock import WALL_CLOCK
+
 DEALER = 'dealer'
 HEDGER = 'hedger'
 MAKER = 'maker'
@@ -25,9 +29,56 @@ class ReadyStatus(object):
 
       return result
 
+class ReportQueue(object):
+   '''
+   Pending notifications of a reporter, drained by its own task so
+   that reporting never runs on the hedging path. Reports are rendered
+   from the reporter's latest snapshots, so a notification that is
+   already pending covers any newer one of the same type: the queue
+   coalesces by type and is bounded by the number of event types.
+   '''
+   def __init__(self):
+      self.pending = {}
+      self._event = asyncio.Event()
+      self.coalesced = 0
+      self.reported = 0
+      self.maxDelay = 0
+
+   def __len__(self):
+      return len(self.pending)
+
+   def put(self, notification):
+      if notification in self.pending:
+         self.coalesced += 1
+         return
+      self.pending[notification] = time.monotonic()
+      self._event.set()
+
+   async def get(self):
+      while len(self.pending) == 0:
+         self._event.clear()
+         await self._event.wait()
+
+      notification = next(iter(self.pending))
+      queuedAt = self.pending.pop(notification)
+      self.maxDelay = max(self.maxDelay, time.monotonic() - queuedAt)
+      self.reported += 1
+      return notification
+
+async def drainReports(queue):
+   #entries are (reporter, notification), a queue can serve many reporters
+   while True:
+      reporter, notification = await queue.get()
+      try:
+         await reporter.report(notification)
+      except Exception as e:
+         logging.error(f"{type(reporter).__name__} failed to report"
+            f" \"{notification}\" with error: {e}")
+
 class Factory(object):
-   def __init__(self, config):
-      self.lastPriceEvent = 0
+   def __init__(self, config, clock=None):
+      self.clock = clock if clock != None else WALL_CLOCK
+      self.lastPriceEvent = None
       self.state = []
       self.offers = None
 
@@ -42,20 +93,44 @@ class Factory(object):
       }
       self.config = config
       self.rebalance = None
+      self.components = None
+      self.queue = ReportQueue()
+      self.ownsQueue = True
+      self.label = None
+      self.memory = None
+      self.scheduler = None
+      self.timeToReady = None
 
    def getAsyncIOTask(self):
-      return None
+      if not self.ownsQueue:
+         #the queue's owner drains it
+         return None
+      return asyncio.create_task(self.drainQueue())
+
+   def shareQueue(self, queue, label=None):
+      self.queue = queue
+      self.ownsQueue = False
+      self.label = label
+
+   async def drainQueue(self):
+      await drainReports(self.queue)
 
    async def report(self, event):
       pass
 
+   async def enqueue(self, event):
+      #snapshots are taken by the caller, the report itself runs
+      #on the drain task
+      self.queue.put((self, event))
+
    async def onReadyEvent(self, dealer):
       self.state.clear()
       self.state.append(ReadyStatus(dealer))
       self.state.append(ReadyStatus(dealer.hedger))
       self.state.append(ReadyStatus(dealer.maker))
       self.state.append(ReadyStatus(dealer.taker))
-      await self.report(Definitions.Ready)
+      self.timeToReady = dealer.getTimeToReady()
+      await self.enqueue(Definitions.Ready)
       await self.onPositionEvent(dealer)
 
    async def onBalanceEvent(self, dealer):
@@ -77,7 +152,7 @@ class Factory(object):
       #the __eq__ operators are tailored to ignore certain
       #changes, such as pnl
       #if changes:
-      await self.report(Definitions.Balance)
+      await self.enqueue(Definitions.Balance)
 
    async def onPositionEvent(self, dealer):
       changes = False
@@ -95,19 +170,43 @@ class Factory(object):
          changes = True
 
       if changes:
-         await self.report(Definitions.Position)
+         await self.enqueue(Definitions.Position)
 
    async def onPriceEvent(self, dealer):
-      if time.time() - self.lastPriceEvent < 30:
+      now = self.clock.monotonic()
+      if self.lastPriceEvent != None and now - self.lastPriceEvent < 30:
          return
-      self.lastPriceEvent = time.time()
+      self.lastPriceEvent = now
 
       self.positions[MAKER] = dealer.maker.getPositions()
       self.positions[TAKER] = dealer.taker.getPositions()
       self.offers = dealer.hedger.getOffersReport()
-      await self.report(Definitions.PriceEvent)
+      self.scheduler = dealer.scheduler.getStatsStr()
+      await self.enqueue(Definitions.PriceEvent)
 
    async def onRebalanceEvent(self, dealer):
       self.rebalance = dealer.hedger.getRebalanceStatus(
          dealer.maker, dealer.taker)
-      await self.report(Definitions.Rebalance)
\ No newline at end of file
+      await self.enqueue(Definitions.Rebalance)
+
+   async def onSupervisionEvent(self, dealer):
+      self.components = dealer.supervisor.getReport()
+      await self.enqueue(Definitions.Supervision)
+
+   async def onMemoryEvent(self, dealer):
+      self.memory = dealer.getMemoryReport()
+      await self.enqueue(Definitions.Memory)
+
+   def getMemoryGauges(self):
+      return { 'report_queue' : len(self.queue) }
+
+   def getTimeToReadyStr(self):
+      if self.timeToReady == None:
+         return "N/A"
+      timings = []
+      for name, duration in self.timeToReady.items():
+         if duration == None:
+            timings.append(f"{name}: pending")
+         else:
+            timings.append(f"{name}: {round(duration, 3)}s")
+      return ", ".join(timings)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import websockets
+
+from .Service import RECONNECT_DELAY
+
+################################################################################
+class BfxFanOutClient(object):
+   '''
+   Feeds Bitfinex public data from a local fan-out service to a
+   listener, using the same callbacks as the bfxapi websocket client
+   (on_order_book_snapshot, on_order_book_update, on_status_update).
+   '''
+   def __init__(self, socketPath, monitor=None):
+      self.socketPath = socketPath
+      self.monitor = monitor
+      self.websocket = None
+      self.listener = None
+      self.subscriptions = []
+      self.seqs = {}
+
+   async def subscribe(self, channel, symbol, **kwargs):
+      request = {'bfx_subscribe': dict(channel=channel, symbol=symbol, **kwargs)}
+      if request in self.subscriptions:
+         return
+      self.subscriptions.append(request)
+      if self.websocket != None:
+         await self.websocket.send(json.dumps(request))
+
+   async def subscribeBook(self, symbol, len, prec):
+      await self.subscribe('book', symbol, len=len, prec=prec)
+
+   async def subscribeStatus(self, symbol):
+      await self.subscribe('status', symbol)
+
+   async def _call_listener_cb(self, cb, *args):
+      if self.monitor != None:
+         await self.monitor.call('bitfinex', cb, *args)
+         return
+      if asyncio.iscoroutinefunction(cb):
+         await cb(*args)
+      else:
+         cb(*args)
+
+   async def run(self, listener):
+      self.listener = listener
+      while True:
+         try:
+            async with websockets.unix_connect(self.socketPath) as websocket:
+               self.websocket = websocket
+               self.seqs = {}
+               for request in self.subscriptions:
+                  await websocket.send(json.dumps(request))
+
+               async for data in websocket:
+                  await self.processMessage(json.loads(data))
+
+         except (OSError, websockets.exceptions.ConnectionClosed) as e:
+            logging.warning(f"[BfxFanOutClient] connection to {self.socketPath} lost: {e}")
+
+         #reconnecting gets us a fresh snapshot
+         self.websocket = None
+         await asyncio.sleep(RECONNECT_DELAY)
+
+   def checkSeq(self, key, seq, isSnapshot):
+      lastSeq = self.seqs.get(key)
+      self.seqs[key] = seq
+      if isSnapshot or lastSeq == None:
+         return True
+      return seq == lastSeq + 1
+
+   async def processMessage(self, message):
+      seq = message.get('seq')
+      if 'bfx_book' in message:
+         book = message['bfx_book']
+         self.checkSeq(('book', book['symbol']), seq, True)
+         await self._call_listener_cb(
+            self.listener.on_order_book_snapshot, book)
+
+      elif 'bfx_book_update' in message:
+         book = message['bfx_book_update']
+         if not self.checkSeq(('book', book['symbol']), seq, False):
+            #missed an update, drop the connection to resync
+            logging.warning("[BfxFanOutClient] book sequence gap, resyncing")
+            await self.websocket.close()
+            return
+         await self._call_listener_cb(
+            self.listener.on_order_book_update, book)
+
+      elif 'bfx_status' in message:
+         await self._call_listener_cb(
+            self.listener.on_status_update, message['bfx_status'])
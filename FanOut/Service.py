@@ -0,0 +1,442 @@
+import asyncio
+import json
+import logging
+import os
+import websockets
+
+from leverex_core.api_connection import generateReferenceId
+
+BFX_PUBLIC_ENDPOINT = 'wss://api-pub.bitfinex.com/ws/2'
+RECONNECT_DELAY = 5
+
+#subscribers that fall this many messages behind are dropped, they
+#resync from the snapshot when they reconnect
+SUBSCRIBER_QUEUE_LEN = 2000
+
+################################################################################
+##
+#### feeds
+##
+################################################################################
+class Feed(object):
+   '''
+   One upstream subscription, republished to local subscribers.
+   Every message carries the feed's sequence number, new subscribers
+   get the current snapshot before any update.
+   '''
+   def __init__(self, key):
+      self.key = key
+      self.seq = 0
+      self.subscribers = set()
+
+   def update(self, message):
+      pass
+
+   def getSnapshot(self):
+      return []
+
+   def publish(self, message):
+      self.update(message)
+      self.seq += 1
+      message['seq'] = self.seq
+
+      #serialize once for all subscribers
+      data = json.dumps(message)
+      for subscriber in list(self.subscribers):
+         subscriber.push(data)
+
+   def join(self, subscriber):
+      self.subscribers.add(subscriber)
+      for message in self.getSnapshot():
+         message['seq'] = self.seq
+         subscriber.push(json.dumps(message))
+
+   def leave(self, subscriber):
+      self.subscribers.discard(subscriber)
+
+####
+class LastValueFeed(Feed):
+   def __init__(self, key):
+      super().__init__(key)
+      self.lastMessage = None
+
+   def update(self, message):
+      self.lastMessage = dict(message)
+
+   def getSnapshot(self):
+      if self.lastMessage == None:
+         return []
+      return [dict(self.lastMessage)]
+
+####
+class AnnouncementFeed(Feed):
+   def __init__(self, key):
+      super().__init__(key)
+      self.items = {}
+
+   def update(self, message):
+      for item in message['chyrons'].get('items', []):
+         self.items[item.get('id')] = item
+
+   def getSnapshot(self):
+      if len(self.items) == 0:
+         return []
+      return [{'chyrons': {'items': list(self.items.values())}}]
+
+####
+class BfxBookFeed(Feed):
+   def __init__(self, key, symbol):
+      super().__init__(key)
+      self.symbol = symbol
+      self.levels = {}
+
+   def update(self, message):
+      if 'bfx_book' in message:
+         self.levels = {}
+         for entry in message['bfx_book']['data']:
+            self.setLevel(entry)
+      else:
+         self.setLevel(message['bfx_book_update']['data'])
+
+   def setLevel(self, entry):
+      #entry is [price, count, amount], the amount sign gives the side
+      key = (entry[0], entry[2] > 0)
+      if entry[1] == 0:
+         self.levels.pop(key, None)
+      else:
+         self.levels[key] = entry
+
+   def getSnapshot(self):
+      if len(self.levels) == 0:
+         return []
+      return [{'bfx_book': {
+         'symbol': self.symbol,
+         'data': list(self.levels.values())
+      }}]
+
+################################################################################
+class Subscriber(object):
+   def __init__(self, service, websocket):
+      self.service = service
+      self.websocket = websocket
+      self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_LEN)
+      self.feeds = set()
+      self.dropped = False
+      self.closeTask = None
+
+   def push(self, data):
+      try:
+         self.queue.put_nowait(data)
+      except asyncio.QueueFull:
+         if not self.dropped:
+            logging.warning("[FanOut] dropping slow subscriber")
+            self.dropped = True
+            self.closeTask = asyncio.create_task(self.close())
+
+   async def close(self):
+      try:
+         await self.websocket.close()
+      except Exception as e:
+         logging.warning(f"[FanOut] failed to close slow subscriber: {e}")
+
+   async def writeLoop(self):
+      while True:
+         data = await self.queue.get()
+         await self.websocket.send(data)
+
+################################################################################
+##
+#### upstream connections
+##
+################################################################################
+class Upstream(object):
+   def __init__(self, service, endpoint):
+      self.service = service
+      self.endpoint = endpoint
+      self.websocket = None
+
+      #subscription requests, replayed on reconnect
+      self.requests = {}
+
+   async def subscribe(self, key, request):
+      if key in self.requests:
+         return
+      self.requests[key] = request
+      await self.send(request)
+
+   async def send(self, request):
+      if self.websocket == None:
+         return
+      await self.websocket.send(json.dumps(request))
+
+   async def run(self):
+      while True:
+         try:
+            async with websockets.connect(self.endpoint) as websocket:
+               self.websocket = websocket
+               logging.info(f"[FanOut] connected to {self.endpoint}")
+               await self.onConnected()
+               async for data in websocket:
+                  await self.processMessage(json.loads(data))
+
+         except Exception as e:
+            logging.warning(f"[FanOut] upstream {self.endpoint} failed with error: {e}")
+
+         self.websocket = None
+         await asyncio.sleep(RECONNECT_DELAY)
+
+   async def onConnected(self):
+      for request in list(self.requests.values()):
+         await self.send(request)
+
+   async def processMessage(self, message):
+      pass
+
+####
+class LeverexUpstream(Upstream):
+   def __init__(self, service, endpoint):
+      super().__init__(service, endpoint)
+      self._requests_cb = {}
+
+   async def request(self, request, reference, subscriber):
+      #one off requests are routed back to whoever asked
+      upstreamReference = generateReferenceId()
+      self._requests_cb[upstreamReference] = (reference, subscriber)
+      request[next(iter(request))]['reference'] = upstreamReference
+      await self.send(request)
+
+   def dropSubscriber(self, subscriber):
+      #replies to a subscriber that went away have nowhere to go
+      for upstreamReference, (reference, owner) in list(self._requests_cb.items()):
+         if owner is subscriber:
+            del self._requests_cb[upstreamReference]
+
+   async def processMessage(self, message):
+      if 'market_data' in message:
+         product = message['market_data'].get('product_type')
+         self.service.publish(('market_data', product), message)
+
+      elif 'session_open' in message:
+         product = message['session_open'].get('product_type')
+         self.service.publish(('session', product), message)
+
+      elif 'session_closed' in message:
+         product = message['session_closed'].get('product_type')
+         self.service.publish(('session', product), message)
+
+      elif 'dealer_offers' in message:
+         product = message['dealer_offers'].get('product_type')
+         self.service.publish(('dealer_offers', product), message)
+
+      elif 'chyrons' in message:
+         self.service.publish(('chyrons', None), message)
+
+      elif 'product_fee' in message:
+         reply = message['product_fee']
+         upstreamReference = reply.get('reference')
+         if upstreamReference not in self._requests_cb:
+            return
+         reference, subscriber = self._requests_cb.pop(upstreamReference)
+         reply['reference'] = reference
+         subscriber.push(json.dumps(message))
+
+      elif 'subscribe' in message or 'subscribe_dealer_offers' in message:
+         #local subscribers are acked by the service, only report failures
+         reply = next(iter(message.values()))
+         if reply.get('success') != True:
+            logging.error(f"[FanOut] leverex subscription failed: {reply}")
+
+      else:
+         logging.debug(f"[FanOut] ignoring leverex message: {message}")
+
+####
+class BitfinexUpstream(Upstream):
+   def __init__(self, service, endpoint):
+      super().__init__(service, endpoint)
+      self.channels = {}
+
+   async def onConnected(self):
+      self.channels = {}
+      await super().onConnected()
+
+   async def processMessage(self, message):
+      if isinstance(message, dict):
+         if message.get('event') == 'subscribed':
+            if message['channel'] == 'book':
+               self.channels[message['chanId']] = ('book', message['symbol'])
+            elif message['channel'] == 'status':
+               self.channels[message['chanId']] = \
+                  ('status', message['key'].split(':', 1)[1])
+         elif message.get('event') == 'error':
+            logging.error(f"[FanOut] bitfinex error: {message}")
+         return
+
+      chanId, data = message[0], message[1]
+      if chanId not in self.channels or data == 'hb':
+         return
+
+      channel, symbol = self.channels[chanId]
+      if channel == 'book':
+         key = ('bfx_book', symbol)
+         if len(data) == 0 or isinstance(data[0], list):
+            self.service.publish(key, {'bfx_book': {'symbol': symbol, 'data': data}})
+         else:
+            self.service.publish(key, {'bfx_book_update': {'symbol': symbol, 'data': data}})
+
+      elif channel == 'status':
+         self.service.publish(('bfx_status', symbol), {'bfx_status': {
+            'symbol': symbol,
+            'timestamp': data[0],
+            'deriv_price': data[2],
+            'spot_price': data[3],
+            'mark_price': data[14] if len(data) > 14 else None
+         }})
+
+################################################################################
+##
+#### service
+##
+################################################################################
+class FanOutService(object):
+   '''
+   Holds a single upstream subscription per feed and republishes it to
+   local processes over a unix socket. Local subscribers speak the
+   Leverex public api protocol, Bitfinex feeds are requested with
+   bfx_subscribe.
+   '''
+   def __init__(self, config):
+      fanoutConfig = config['fanout']
+      self.socketPath = fanoutConfig['socket_path']
+      self.feeds = {}
+      self.subscribers = set()
+
+      self.leverex = None
+      if 'leverex' in config and 'public_endpoint' in config['leverex']:
+         self.leverex = LeverexUpstream(self,
+            config['leverex']['public_endpoint'])
+
+      self.bitfinex = BitfinexUpstream(self,
+         fanoutConfig.get('bitfinex_endpoint', BFX_PUBLIC_ENDPOINT))
+      self.server = None
+
+   def getFeed(self, key):
+      if key not in self.feeds:
+         if key[0] == 'bfx_book':
+            self.feeds[key] = BfxBookFeed(key, key[1])
+         elif key[0] == 'chyrons':
+            self.feeds[key] = AnnouncementFeed(key)
+         else:
+            self.feeds[key] = LastValueFeed(key)
+      return self.feeds[key]
+
+   def publish(self, key, message):
+      self.getFeed(key).publish(message)
+
+   ## local subscribers ##
+   async def start(self):
+      if os.path.exists(self.socketPath):
+         os.remove(self.socketPath)
+      self.server = await websockets.unix_serve(
+         self.handler, self.socketPath)
+
+   async def stop(self):
+      if self.server != None:
+         self.server.close()
+         await self.server.wait_closed()
+         self.server = None
+
+   async def handler(self, websocket):
+      subscriber = Subscriber(self, websocket)
+      self.subscribers.add(subscriber)
+      writeTask = asyncio.create_task(subscriber.writeLoop())
+
+      try:
+         async for data in websocket:
+            await self.processRequest(subscriber, json.loads(data))
+      except websockets.exceptions.ConnectionClosed:
+         pass
+      finally:
+         writeTask.cancel()
+         for feed in subscriber.feeds:
+            feed.leave(subscriber)
+         if self.leverex != None:
+            self.leverex.dropSubscriber(subscriber)
+         self.subscribers.discard(subscriber)
+
+   def join(self, subscriber, key):
+      feed = self.getFeed(key)
+      if feed in subscriber.feeds:
+         return
+      subscriber.feeds.add(feed)
+      feed.join(subscriber)
+
+   async def processRequest(self, subscriber, request):
+      if 'bfx_subscribe' in request:
+         await self.subscribeBitfinex(subscriber, request['bfx_subscribe'])
+         return
+
+      if self.leverex == None:
+         logging.warning(f"[FanOut] no leverex upstream for request: {request}")
+         return
+
+      if 'subscribe' in request:
+         product = request['subscribe']['product_type']
+         await self.leverex.subscribe(('market_data', product), request)
+         self.join(subscriber, ('market_data', product))
+         subscriber.push(json.dumps({'subscribe': {'success': True}}))
+
+      elif 'session_open' in request:
+         product = request['session_open']['product_type']
+         await self.leverex.subscribe(('session', product), request)
+         self.join(subscriber, ('session', product))
+
+      elif 'subscribe_dealer_offers' in request:
+         product = request['subscribe_dealer_offers']['product_type']
+         await self.leverex.subscribe(('dealer_offers', product), request)
+         self.join(subscriber, ('dealer_offers', product))
+         subscriber.push(json.dumps({'subscribe_dealer_offers': {'success': True}}))
+
+      elif 'get_chyrons' in request:
+         await self.leverex.subscribe(('chyrons', None), request)
+         self.join(subscriber, ('chyrons', None))
+
+      elif 'product_fee' in request:
+         reference = request['product_fee'].get('reference')
+         await self.leverex.request(request, reference, subscriber)
+
+      else:
+         logging.warning(f"[FanOut] unsupported request: {request}")
+
+   async def subscribeBitfinex(self, subscriber, request):
+      symbol = request['symbol']
+      if request['channel'] == 'book':
+         await self.bitfinex.subscribe(('bfx_book', symbol), {
+            'event': 'subscribe',
+            'channel': 'book',
+            'symbol': symbol,
+            'prec': request.get('prec', 'P0'),
+            'len': str(request.get('len', 100))
+         })
+         self.join(subscriber, ('bfx_book', symbol))
+
+      elif request['channel'] == 'status':
+         await self.bitfinex.subscribe(('bfx_status', symbol), {
+            'event': 'subscribe',
+            'channel': 'status',
+            'key': f"deriv:{symbol}"
+         })
+         self.join(subscriber, ('bfx_status', symbol))
+
+   ## run ##
+   def getAsyncIOTasks(self):
+      tasks = [asyncio.create_task(self.bitfinex.run())]
+      if self.leverex != None:
+         tasks.append(asyncio.create_task(self.leverex.run()))
+      return tasks
+
+   async def run(self):
+      await self.start()
+      try:
+         await asyncio.gather(*self.getAsyncIOTasks())
+      finally:
+         await self.stop()
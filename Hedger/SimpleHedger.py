@@ -1,10 +1,10 @@
 import asyncio
 import logging
-import time
 from decimal import Decimal
 
 from Factories.Hedger.Factory import HedgerFactory
-from Factories.Definitions import Rebalance, RebalanceReport, double_eq
+from Factories.Definitions import Rebalance, RebalanceReport, double_eq, \
+   InitBarrier
 from leverex_core.utils import PriceOffer, OfferException, round_down
 
 CANCEL_PENDING          = 'cancel_pending'
@@ -17,6 +17,9 @@ WITHDRAW_TODO        = 'withdraw_todo'
 WITHDRAW_ONGOING     = 'withdraw_ongoing'
 WITHDRAW_DONE        = 'withdraw_done'
 
+#offers are pushed again if they haven't changed for this long
+OFFERS_REFRESH_INTERVAL = 5000 #in ms
+
 ################################################################################
 class HedgerException(Exception):
    pass
@@ -206,17 +209,30 @@ class RebalanceManager(object):
    LOAD_ADDRESS_DONE       = 3
 
    ## setup ##
-   def __init__(self, config, maker, taker, onEventFunc):
+   def __init__(self, config, maker, taker, onEventFunc, isActive):
       self.maker = maker
       self.taker = taker
       self.target = None
       self.onEventFunc = onEventFunc
 
+      #a standby dealer tracks funds but leaves moving them to the primary
+      self.isActive = isActive
+
       self.config = config
       self.enabled = config['rebalance']['enable']
 
       self.loadedWithdrawals = False
       self.loadedAddresses = self.LOAD_ADDRESS_PENDING
+      self.initBarrier = InitBarrier("rebalance setup")
+
+   def reloadConfig(self, config):
+      self.config = config
+      self.enabled = config['rebalance']['enable']
+
+      #targets carry the thresholds they were computed with, drop
+      #the current one unless it is already moving funds
+      if self.target != None and not self.target.inTransit():
+         self.target = None
 
    def canAssess(self):
       #do not assess rebalance if we are requesting withdrawals
@@ -263,17 +279,34 @@ class RebalanceManager(object):
 
    ##
    async def setup(self):
-      #load providers' addresses
-      await self.maker.loadAddresses(self.completeSetup)
-      await self.taker.loadAddresses(self.completeSetup)
+      #loads may only send their request and reply later, barrier items
+      #are done from the callbacks so their timings cover the replies
+      barrier = self.initBarrier
+      providers = { 'maker' : self.maker, 'taker' : self.taker }
+
+      async def addrCallback():
+         await self.completeSetup()
+         for name, provider in providers.items():
+            if provider.chainAddresses.hasAddresses():
+               barrier.done(f"{name} addresses")
 
       #get pending withdrawals
       async def wtdrCallback():
+         for name, provider in providers.items():
+            if provider.withdrawalsLoaded():
+               barrier.done(f"{name} withdrawals")
          if self.maker.withdrawalsLoaded() and \
             self.taker.withdrawalsLoaded():
             self.loadedWithdrawals = True
             await self.processRebalance()
 
+      for name in providers:
+         barrier.add(f"{name} addresses")
+         barrier.add(f"{name} withdrawals")
+
+      #none of these depend on each other, send them all before any reply
+      await self.maker.loadAddresses(addrCallback)
+      await self.taker.loadAddresses(addrCallback)
       await self.maker.loadWithdrawals(wtdrCallback)
       await self.taker.loadWithdrawals(wtdrCallback)
 
@@ -327,6 +360,8 @@ class RebalanceManager(object):
 
    ## rebalance process ##
    async def processRebalance(self):
+      if not self.isActive():
+         return
       if not (self.maker.isReady() and self.taker.isReady()):
          return
 
@@ -499,9 +534,19 @@ class SimpleHedger(HedgerFactory):
       ],
       'rebalance' : ['enable', 'threshold_pct', 'min_amount']
    }
+   reloadable_settings = {
+      'hedger' : [
+         'price_ratio',
+         'max_offer_volume',
+         'min_size',
+         'quote_ratio',
+         'offer_refresh_delay_ms'
+      ],
+      'rebalance' : ['enable', 'threshold_pct', 'min_amount']
+   }
 
-   def __init__(self, config):
-      super().__init__("Hedger")
+   def __init__(self, config, clock=None):
+      super().__init__("Hedger", clock)
 
       #check for required config entries
       for k in self.required_settings:
@@ -512,6 +557,13 @@ class SimpleHedger(HedgerFactory):
             if kk not in config[k]:
                raise HedgerException(f'Missing \"{kk}\" in config group \"{k}\"')
 
+      self.loadSettings(config)
+
+      self.offers = []
+      self.rebalMan = None
+      self.lastOffersPushTime = 0
+
+   def loadSettings(self, config):
       self.config             = config
       self.price_ratio        = config['hedger']['price_ratio']
       self.max_offer_volume   = config['hedger']['max_offer_volume']
@@ -522,13 +574,14 @@ class SimpleHedger(HedgerFactory):
       if 'offer_refresh_delay_ms' in config['hedger']:
          self.offer_refresh_delay = config['hedger']['offer_refresh_delay_ms']
 
-      self.offers = []
-      self.rebalMan = None
-      self.lastOffersPushTime = 0
-
    def getAsyncIOTask(self):
       return asyncio.create_task(self.offersLoop())
 
+   def reloadConfig(self, config):
+      self.loadSettings(config)
+      if self.rebalMan != None:
+         self.rebalMan.reloadConfig(config)
+
    #############################################################################
    ## price offers methods
    #############################################################################
@@ -565,20 +618,25 @@ class SimpleHedger(HedgerFactory):
          await self.pushOffers(newOffers)
 
    async def pushOffers(self, offers):
-      self.lastOffersPushTime = time.time_ns() / 1000000
+      self.lastOffersPushTime = self.clock.time_ns() / 1000000
+      if not self.isActive():
+         #standby, the primary owns the maker's offers
+         return
       await self.maker.submitPrices(offers)
 
    async def offersLoop(self):
       while True:
-         lastPushTimeDiff = (time.time_ns() / 1000000) - self.lastOffersPushTime
-         if lastPushTimeDiff >= 5000:
+         lastPushTimeDiff = (self.clock.time_ns() / 1000000) - self.lastOffersPushTime
+         if lastPushTimeDiff >= OFFERS_REFRESH_INTERVAL:
             try:
                await self.pushOffers(self.offers)
             except:
-               self.lastOffersPushTime = time.time_ns() / 1000000
+               self.lastOffersPushTime = self.clock.time_ns() / 1000000
                continue
          else:
-            await asyncio.sleep(lastPushTimeDiff / 1000)
+            #sleep until the next refresh is due
+            await self.clock.sleep(
+               (OFFERS_REFRESH_INTERVAL - lastPushTimeDiff) / 1000)
 
    async def clearOffers(self):
       await self.queueOffers([])
@@ -631,13 +689,16 @@ class SimpleHedger(HedgerFactory):
       offers = []
       try:
          if ask_volume == bid_volume and ask_volume:
-               offer = PriceOffer(volume=ask_volume, ask=ask_price, bid=bid_price)
+               offer = PriceOffer(volume=ask_volume, ask=ask_price, bid=bid_price,
+                  clock=self.clock)
                offers = [offer]
          else:
             if ask_volume != 0:
-               offers.append(PriceOffer(volume=ask_volume, ask=ask_price))
+               offers.append(PriceOffer(volume=ask_volume, ask=ask_price,
+                  clock=self.clock))
             if bid_volume != 0:
-               offers.append(PriceOffer(volume=bid_volume, bid=bid_price))
+               offers.append(PriceOffer(volume=bid_volume, bid=bid_price,
+                  clock=self.clock))
       except OfferException as e:
          logging.debug("failed to instantiate valid offer:\n"
             f"  ask vol: {ask_volume}, price: {ask_price}\n"
@@ -704,7 +765,9 @@ class SimpleHedger(HedgerFactory):
          #on the opposite side of exposureUpdate to get the maker exposure in sync
          #with the taker's capacity
 
-         #update taker position
+         #update taker position, a standby leaves it to the primary
+         if not self.isActive():
+            return
          await taker.updateExposure(-makerExposure)
 
       #report ready state to hedger factory. On first exposure sync, this will
@@ -712,7 +775,7 @@ class SimpleHedger(HedgerFactory):
       self.setReady()
       if self.rebalMan == None:
          self.rebalMan = RebalanceManager(self.config,
-            maker, taker, self.onEventFunc)
+            maker, taker, self.onEventFunc, self.isActive)
          await self.rebalMan.setup()
 
    ####
@@ -784,6 +847,19 @@ class SimpleHedger(HedgerFactory):
       await self.checkBalanceDistribution()
       await self.submitPrices(maker, taker)
 
+   ####
+   async def onReloadEvent(self, maker, taker):
+      #requote right away with the new ratios and volumes
+      await self.checkBalanceDistribution()
+      await self.submitPrices(maker, taker, True)
+
+   ####
+   async def onTakeOver(self, maker, taker):
+      #offers were computed while in standby but never pushed, force them
+      await self.checkExposureSync(maker, taker)
+      await self.checkBalanceDistribution()
+      await self.submitPrices(maker, taker, True)
+
    #############################################################################
    ## rebalance status
    #############################################################################
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import deque
+
+from Backtest.Replay import ReplayTaker
+from FanOut.Client import BfxFanOutClient
+from LoadTest.Stats import StepStats, STREAM_BOOK, STREAM_MARKET_DATA, \
+   STREAM_DEALER_OFFERS, STREAM_ORDER_UPDATE
+from Providers.Leverex import LeverexProvider
+from leverex_core.clock import WALL_CLOCK
+from leverex_core.utils import ORDER_ACTION_CREATED
+
+LOOP_LAG_INTERVAL = 0.01 #in s
+
+################################################################################
+##
+#### probes
+##
+################################################################################
+class DealerProbe(object):
+   '''
+   Dealer side of the load test stats: messages processed per stream,
+   hedge latency and event loop lag, per step of the ramp. Hedge
+   latency runs from the oldest maker fill the hedge covers.
+   '''
+   def __init__(self, schedule):
+      self.schedule = schedule
+      self.steps = [StepStats() for i in range(schedule.getStepCount())]
+      self.unhedgedFills = deque()
+
+   def getStats(self):
+      step = self.schedule.getStep(time.time())
+      if step == None:
+         return None
+      return self.steps[step]
+
+   def countProcessed(self, stream, count=1):
+      stats = self.getStats()
+      if stats != None:
+         StepStats.count(stats.processed, stream, count)
+
+   def onFill(self, timestamp):
+      self.unhedgedFills.append(timestamp)
+
+   def onHedge(self):
+      if len(self.unhedgedFills) == 0:
+         return
+      stats = self.getStats()
+      if stats != None:
+         stats.hedgeLatency.append(time.time() - self.unhedgedFills[0])
+      self.unhedgedFills.clear()
+
+   def onLoopLag(self, lag):
+      stats = self.getStats()
+      if stats != None:
+         stats.loopLag.append(lag)
+
+   async def loopLagTask(self):
+      #how late a short sleep wakes up is how long the loop was busy
+      while True:
+         start = time.monotonic()
+         await asyncio.sleep(LOOP_LAG_INTERVAL)
+         self.onLoopLag(max(0, time.monotonic() - start - LOOP_LAG_INTERVAL))
+
+################################################################################
+##
+#### providers
+##
+################################################################################
+class LoadTestMaker(LeverexProvider):
+   '''
+   The Leverex provider as the dealer runs it, counting what it
+   processes. Also subscribes to dealer offers, the dealer doesn't
+   but a client would, to put that stream through the same connection.
+   '''
+   def __init__(self, config, probe):
+      super().__init__(config)
+      self.probe = probe
+
+   async def on_authorized(self):
+      await super().on_authorized()
+      await self.connection.subscribe_dealer_offers(self.product)
+
+   async def on_market_data(self, marketData):
+      await super().on_market_data(marketData)
+      self.probe.countProcessed(STREAM_MARKET_DATA)
+
+   async def on_dealer_offers(self, offers):
+      self.probe.countProcessed(STREAM_DEALER_OFFERS)
+
+   async def on_order_event(self, order, eventType):
+      if eventType == ORDER_ACTION_CREATED and not order.is_taker:
+         self.probe.onFill(order.timestamp)
+      await super().on_order_event(order, eventType)
+      self.probe.countProcessed(STREAM_ORDER_UPDATE)
+
+########
+class LoadTestTaker(ReplayTaker):
+   '''
+   Taker fed with the Bitfinex public feed through the fan-out
+   service, hedges fill at market on that book.
+   '''
+   def __init__(self, config, socketPath, probe):
+      super().__init__(config, WALL_CLOCK)
+      self.probe = probe
+      self.bookLength = config['bitfinex'].get('order_book_len', 100)
+      self.bookPrecision = config['bitfinex'].get('order_book_aggregation', 'P0')
+      self.client = BfxFanOutClient(socketPath)
+
+   def getAsyncIOTask(self):
+      return asyncio.create_task(self.run())
+
+   async def run(self):
+      await self.client.subscribeBook(self.product,
+         self.bookLength, self.bookPrecision)
+      await self.client.subscribeStatus(self.product)
+      await asyncio.gather(self.client.run(self), self.cooldownLoop())
+
+   async def cooldownLoop(self):
+      while True:
+         await asyncio.sleep(max(self.cooldown, 10) / 1000)
+         await self.onClock()
+
+   ## fan-out listener ##
+   async def on_order_book_snapshot(self, book):
+      await self.feed('order_book_snapshot', [book])
+
+   async def on_order_book_update(self, book):
+      await self.feed('order_book_update', [book])
+      self.probe.countProcessed(STREAM_BOOK)
+
+   async def on_status_update(self, status):
+      await self.feed('status_update', [status])
+
+   ## exposure ##
+   async def hedge(self):
+      hedgeCount = len(self.hedges)
+      await super().hedge()
+      if len(self.hedges) > hedgeCount:
+         self.probe.onHedge()
@@ -0,0 +1,289 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from jwcrypto import jwk
+
+from Factories.Dealer.Factory import DealerFactory
+from Hedger.SimpleHedger import SimpleHedger
+from LoadTest.Dealer import DealerProbe, LoadTestMaker, LoadTestTaker
+from LoadTest.Servers import runLoadServers
+from LoadTest.Stats import RateSchedule, StepStats, getPercentile, \
+   LOAD_STREAMS, STREAM_BOOK, STREAM_MARKET_DATA, STREAM_DEALER_OFFERS, \
+   STREAM_ORDER_UPDATE
+
+#base rates in messages per second, book rates count deltas
+DEFAULT_RATES = {
+   STREAM_BOOK : 200,
+   STREAM_MARKET_DATA : 5,
+   STREAM_DEALER_OFFERS : 5,
+   STREAM_ORDER_UPDATE : 0.5
+}
+DEFAULT_MULTIPLIERS = [1, 2, 4, 8, 16]
+DEFAULT_STEP_DURATION = 10 #in s
+DEFAULT_WARMUP = 3
+
+DEFAULT_SETTINGS = {
+   'product' : 'xbtusd_rf',
+   'symbol' : 'tTESTBTCF0:TESTUSDTF0',
+   'price' : 10000,
+   'balance' : 1000000,
+   'book_depth' : 25,
+   'price_ratio' : 0.002,
+   'max_offer_volume' : 5,
+   'exposure_cooldown' : 0 #in ms
+}
+
+#a step is saturated once the dealer falls this far behind the load
+MIN_THROUGHPUT_RATIO = 0.95
+MAX_LOOP_LAG = 0.1 #in s, p99
+
+SERVERS_TIMEOUT = 10 #in s
+
+class LoadTestException(Exception):
+   pass
+
+################################################################################
+##
+#### report
+##
+################################################################################
+class StepReport(object):
+   def __init__(self, step, schedule, stats):
+      self.step = step
+      self.multiplier = schedule.multipliers[step]
+      self.targetRate = schedule.getTotalRate(step)
+      self.stats = stats
+      self.sentRate = stats.getSent() / schedule.stepDuration
+      self.processedRate = stats.getProcessed() / schedule.stepDuration
+
+   def getThroughputRatio(self):
+      #how much of the scheduled load went through the dealer
+      if self.targetRate == 0:
+         return 1
+      return min(self.sentRate, self.processedRate) / self.targetRate
+
+   def isSaturated(self):
+      if self.getThroughputRatio() < MIN_THROUGHPUT_RATIO:
+         return True
+      lag = getPercentile(self.stats.loopLag, 99)
+      return lag != None and lag > MAX_LOOP_LAG
+
+   def toJson(self):
+      stats = self.stats
+      return {
+         'step' : self.step,
+         'multiplier' : self.multiplier,
+         'target_rate' : self.targetRate,
+         'sent_rate' : self.sentRate,
+         'processed_rate' : self.processedRate,
+         'sent' : stats.sent,
+         'processed' : stats.processed,
+         'quotes' : stats.quotes,
+         'coalesced_ticks' : stats.coalescedTicks,
+         'unmatched_quotes' : stats.unmatchedQuotes,
+         'quote_latency' : getLatencies(stats.quoteLatency),
+         'hedge_latency' : getLatencies(stats.hedgeLatency),
+         'loop_lag' : getLatencies(stats.loopLag),
+         'saturated' : self.isSaturated()
+      }
+
+def getLatencies(values):
+   return {
+      'count' : len(values),
+      'p50' : getPercentile(values, 50),
+      'p99' : getPercentile(values, 99),
+      'max' : max(values) if len(values) > 0 else None
+   }
+
+def formatLatency(value):
+   if value == None:
+      return "N/A"
+   return f"{round(value * 1000, 1)}ms"
+
+########
+class LoadReport(object):
+   def __init__(self, schedule, serverSteps, dealerSteps):
+      self.schedule = schedule
+      self.steps = []
+      for i in range(schedule.getStepCount()):
+         stats = StepStats()
+         stats.merge(serverSteps[i])
+         stats.merge(dealerSteps[i])
+         self.steps.append(StepReport(i, schedule, stats))
+
+   def getSaturationStep(self):
+      #first step the dealer couldn't sustain, None if it kept up
+      for step in self.steps:
+         if step.isSaturated():
+            return step
+      return None
+
+   def toJson(self):
+      saturation = self.getSaturationStep()
+      return {
+         'rates' : self.schedule.rates,
+         'step_duration' : self.schedule.stepDuration,
+         'steps' : [step.toJson() for step in self.steps],
+         'saturation_step' : saturation.step if saturation != None else None
+      }
+
+   def __str__(self):
+      result = "step  x     target/s  sent/s    proc/s    quotes  " \
+         "quote p50/p99      hedge p50/p99      lag p99\n"
+      for step in self.steps:
+         stats = step.stats
+         quote = f"{formatLatency(getPercentile(stats.quoteLatency, 50))}/" \
+            f"{formatLatency(getPercentile(stats.quoteLatency, 99))}"
+         hedge = f"{formatLatency(getPercentile(stats.hedgeLatency, 50))}/" \
+            f"{formatLatency(getPercentile(stats.hedgeLatency, 99))}"
+         result += f"{step.step:<5} {step.multiplier:<5} " \
+            f"{round(step.targetRate, 1):<9} {round(step.sentRate, 1):<9} " \
+            f"{round(step.processedRate, 1):<9} {stats.quotes:<7} " \
+            f"{quote:<18} {hedge:<18} " \
+            f"{formatLatency(getPercentile(stats.loopLag, 99))}"
+         if step.isSaturated():
+            result += " (saturated)"
+         result += "\n"
+
+      saturation = self.getSaturationStep()
+      if saturation == None:
+         result += "no saturation, the dealer kept up with every step"
+      else:
+         result += f"saturated at step {saturation.step}, " \
+            f"{round(saturation.targetRate, 1)} msg/s scheduled, " \
+            f"{round(saturation.processedRate, 1)} msg/s processed"
+      return result
+
+################################################################################
+##
+#### harness
+##
+################################################################################
+class LoadTest(object):
+   '''
+   Runs a full dealer against local stand-ins of its venues while the
+   load ramps up. The stand-ins run in their own process so that their
+   cost doesn't show on the dealer's event loop. Both processes agree
+   on step boundaries through the wall clock.
+   '''
+   def __init__(self, rates=DEFAULT_RATES, multipliers=DEFAULT_MULTIPLIERS,
+      stepDuration=DEFAULT_STEP_DURATION, warmup=DEFAULT_WARMUP,
+      settings={}, hedgerConfig={}):
+      self.rates = rates
+      self.multipliers = multipliers
+      self.stepDuration = stepDuration
+      self.warmup = warmup
+      self.settings = dict(DEFAULT_SETTINGS)
+      self.settings.update(settings)
+      self.hedgerConfig = hedgerConfig
+
+   def getDealerConfig(self, endpoints, keyPath):
+      settings = self.settings
+      hedger = {
+         'max_offer_volume' : settings['max_offer_volume'],
+         'price_ratio' : settings['price_ratio'],
+         'min_size' : 0.00006,
+         'quote_ratio' : 0.3
+      }
+      hedger.update(self.hedgerConfig)
+      return {
+         'leverex' : {
+            'api_endpoint' : endpoints['api_endpoint'],
+            'login_endpoint' : endpoints['login_endpoint'],
+            'key_file_path' : keyPath,
+            'product' : settings['product']
+         },
+         'bitfinex' : {
+            'product' : settings['symbol'],
+            'collateral_pct' : 50,
+            'exposure_cooldown' : settings['exposure_cooldown'],
+            'order_book_len' : settings['book_depth']
+         },
+         'hedger' : hedger,
+         'rebalance' : {
+            'enable' : False,
+            'threshold_pct' : 0.1,
+            'min_amount' : 10
+         },
+         'backtest' : {
+            'taker_balance' : settings['balance']
+         }
+      }
+
+   def run(self):
+      with tempfile.TemporaryDirectory() as tmpDir:
+         keyPath = os.path.join(tmpDir, 'key.pem')
+         with open(keyPath, 'wb') as keyFile:
+            key = jwk.JWK.generate(kty='EC', crv='P-256')
+            keyFile.write(key.export_to_pem(private_key=True, password=None))
+
+         settings = dict(self.settings)
+         settings['fanout_socket'] = os.path.join(tmpDir, 'fanout.sock')
+         #the quote tracker prices ticks the way the hedger will
+         settings['price_ratio'] = self.hedgerConfig.get(
+            'price_ratio', settings['price_ratio'])
+         schedule = RateSchedule(self.rates, self.multipliers,
+            self.stepDuration, time.time() + self.warmup)
+
+         context = multiprocessing.get_context('spawn')
+         pipe, childPipe = context.Pipe()
+         servers = context.Process(target=runLoadServers,
+            args=(settings, schedule, childPipe), daemon=True)
+         servers.start()
+         try:
+            if not pipe.poll(SERVERS_TIMEOUT):
+               raise LoadTestException("load servers failed to start")
+            endpoints = pipe.recv()
+            if time.time() > schedule.start:
+               raise LoadTestException("load servers took longer than the "
+                  "warmup to start, increase it")
+
+            config = self.getDealerConfig(endpoints, keyPath)
+            dealerSteps = asyncio.run(self.runDealer(config,
+               settings['fanout_socket'], schedule))
+
+            if not pipe.poll(SERVERS_TIMEOUT):
+               raise LoadTestException("load servers failed to report")
+            serverSteps = pipe.recv()
+         finally:
+            servers.join(SERVERS_TIMEOUT)
+            if servers.is_alive():
+               servers.kill()
+
+      return LoadReport(schedule, serverSteps, dealerSteps)
+
+   async def runDealer(self, config, socketPath, schedule):
+      probe = DealerProbe(schedule)
+      maker = LoadTestMaker(config, probe)
+      taker = LoadTestTaker(config, socketPath, probe)
+      hedger = SimpleHedger(config)
+      dealer = DealerFactory(maker, taker, hedger)
+
+      tasks = [asyncio.create_task(dealer.run()),
+         asyncio.create_task(probe.loopLagTask())]
+      try:
+         await asyncio.sleep(schedule.getEnd() - time.time())
+      finally:
+         for task in tasks:
+            task.cancel()
+         await asyncio.gather(*tasks, return_exceptions=True)
+      return probe.steps
+
+################################################################################
+def parseRates(value):
+   #"book=200,market_data=5"
+   rates = dict(DEFAULT_RATES)
+   for entry in value.split(','):
+      name, sep, rate = entry.partition('=')
+      name = name.strip()
+      if sep == '' or name not in LOAD_STREAMS:
+         raise LoadTestException(f"invalid rate: {entry}, "
+            f"expected <stream>=<rate> with stream in {LOAD_STREAMS}")
+      rates[name] = float(rate)
+   return rates
+
+def parseMultipliers(value):
+   return [float(multiplier) for multiplier in value.split(',')]
@@ -0,0 +1,429 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+import websockets
+
+from FanOut.Service import FanOutService
+from LoadTest.Stats import StepStats, STREAM_BOOK, STREAM_MARKET_DATA, \
+   STREAM_DEALER_OFFERS, STREAM_ORDER_UPDATE
+from Simulator.Exchange import SimulatorException, getSettings
+from Simulator.Server import SimulatorServer
+from leverex_core.utils import SIDE_BUY, SIDE_SELL, ORDER_ACTION_CREATED
+
+LOCALHOST = '127.0.0.1'
+TOKEN_LIFETIME = 3600 #in s
+#the taker account filling the dealer's quotes
+LOAD_TEST_TAKER = 'loadtest-taker@simulator'
+
+#the top level of each side moves by this ratio of the price per tick,
+#past the hedger's tolerance for requoting. A phase of ticks moves it
+#one way, the next one back
+TICK_RATIO = 0.002
+PHASE_TICKS = 100
+LEVEL_VOLUME = 100
+#static depth sits beyond the walking top
+DEPTH_RATIO = 0.2
+
+FILL_SIZE = 0.01
+#messages sent per wake up at most, what's left is dropped
+MAX_BURST = 100
+
+################################################################################
+##
+#### quote tracking
+##
+################################################################################
+class BookWalker(object):
+   '''
+   Bitfinex book whose top moves on every tick: the top ask and top bid
+   take turns moving by a step, up for PHASE_TICKS ticks, then back
+   down. The top level alone covers any quote, so the dealer's quote
+   changes with every tick and no book state repeats within a phase.
+
+   A tick is 2 deltas, the new top level then the removal of the old
+   one, so the top changes only once and never to the static depth.
+   '''
+   def __init__(self, price, depth):
+      self.step = round(price * TICK_RATIO, 2)
+      self.price = price
+      #the spread stays positive whichever side moves first
+      self.topAsk = float(price + self.step)
+      self.topBid = float(price - self.step)
+      self.depth = depth
+      self.ticks = 0
+
+   def getSnapshot(self):
+      result = [[self.topAsk, 1, -LEVEL_VOLUME], [self.topBid, 1, LEVEL_VOLUME]]
+      offset = self.price * DEPTH_RATIO
+      for i in range(self.depth - 1):
+         result.append([self.price + offset + i, 1, -LEVEL_VOLUME])
+         result.append([self.price - offset - i, 1, LEVEL_VOLUME])
+      return result
+
+   def tick(self):
+      #returns the deltas for this tick
+      isAsk = self.ticks % 2 == 0
+      direction = 1 if (self.ticks // PHASE_TICKS) % 2 == 0 else -1
+      self.ticks += 1
+
+      old = self.topAsk if isAsk else self.topBid
+      new = round(old + direction * self.step, 2)
+      volume = -LEVEL_VOLUME if isAsk else LEVEL_VOLUME
+      if isAsk:
+         self.topAsk = new
+      else:
+         self.topBid = new
+
+      return [[new, 1, volume], [old, 0, -1 if isAsk else 1]]
+
+########
+class QuoteTracker(object):
+   '''
+   Ties dealer quotes back to the book tick they price. Ticks wait in a
+   queue with the quote they should produce, a quote matches the latest
+   tick it prices: its latency runs from that tick's send time, older
+   ticks were coalesced into it. Periodic refreshes of the last quote
+   are not matched.
+   '''
+   def __init__(self, priceRatio):
+      self.priceRatio = priceRatio
+      self.ticks = deque()
+      self.lastPrices = None
+
+   def getQuotePrices(self, topAsk, topBid):
+      #what SimpleHedger quotes when the top level covers the volume
+      return round(topAsk * (1 + self.priceRatio), 2), \
+         round(topBid * (1 - self.priceRatio), 2)
+
+   def onTick(self, timestamp, topAsk, topBid):
+      ask, bid = self.getQuotePrices(topAsk, topBid)
+      self.ticks.append((timestamp, ask, bid))
+
+   def onQuote(self, timestamp, prices, stats):
+      ask = None
+      bid = None
+      for offer in prices:
+         if ask == None and 'ask' in offer:
+            ask = float(offer['ask'])
+         if bid == None and 'bid' in offer:
+            bid = float(offer['bid'])
+      if ask == None and bid == None:
+         return
+      if (ask, bid) == self.lastPrices:
+         return
+      self.lastPrices = (ask, bid)
+
+      match = None
+      for i in range(len(self.ticks) - 1, -1, -1):
+         tickTime, tickAsk, tickBid = self.ticks[i]
+         if ask != None and abs(ask - tickAsk) > 0.005:
+            continue
+         if bid != None and abs(bid - tickBid) > 0.005:
+            continue
+         match = i
+         break
+
+      if stats == None:
+         return
+      if match == None:
+         stats.unmatchedQuotes += 1
+         return
+
+      tickTime = self.ticks[match][0]
+      stats.quoteLatency.append(timestamp - tickTime)
+      stats.coalescedTicks += match
+      for i in range(match + 1):
+         self.ticks.popleft()
+
+################################################################################
+##
+#### servers
+##
+################################################################################
+class RateEmitter(object):
+   '''
+   Paces a server's streams by the schedule and counts what it sent
+   per step.
+   '''
+   def __init__(self, schedule):
+      self.schedule = schedule
+      self.steps = [StepStats() for i in range(schedule.getStepCount())]
+
+   def getStats(self, now=None):
+      step = self.schedule.getStep(now if now != None else time.time())
+      if step == None:
+         return None
+      return self.steps[step]
+
+   def countSent(self, stream, count=1):
+      stats = self.getStats()
+      if stats != None:
+         StepStats.count(stats.sent, stream, count)
+
+   async def emitLoop(self, stream, emit, batch=1):
+      '''
+      Calls emit at the scheduled rate, emit sends batch messages.
+      Calls due are counted from the start of the step, a consumer that
+      can't keep up shows as fewer messages sent than scheduled.
+      '''
+      step = None
+      sent = 0
+      while True:
+         now = time.time()
+         if now >= self.schedule.getEnd():
+            return
+
+         current = self.schedule.getStep(now)
+         if current == None:
+            await asyncio.sleep(self.schedule.start - now)
+            continue
+         if current != step:
+            step = current
+            sent = 0
+
+         rate = self.schedule.getRate(stream, step) / batch
+         stepStart = self.schedule.getStepStart(step)
+         if rate <= 0:
+            await asyncio.sleep(stepStart + self.schedule.stepDuration - now)
+            continue
+
+         due = int((now - stepStart) * rate) - sent
+         if due > MAX_BURST:
+            sent += due - MAX_BURST
+            due = MAX_BURST
+         for i in range(due):
+            await emit()
+         sent += due
+         await asyncio.sleep(max(1 / rate, 0.001))
+
+########
+class LoadServer(RateEmitter):
+   def __init__(self, schedule):
+      super().__init__(schedule)
+      self.server = None
+      self.port = None
+
+   async def start(self):
+      self.server = await websockets.serve(self.handler, LOCALHOST, 0)
+      self.port = self.server.sockets[0].getsockname()[1]
+
+   async def stop(self):
+      if self.server != None:
+         self.server.close()
+         await self.server.wait_closed()
+         self.server = None
+
+   def getEndpoint(self):
+      return f"ws://{LOCALHOST}:{self.port}"
+
+   async def handler(self, websocket):
+      try:
+         async for data in websocket:
+            await self.processMessage(websocket, json.loads(data))
+      except websockets.exceptions.ConnectionClosed:
+         pass
+
+   async def processMessage(self, websocket, message):
+      pass
+
+########
+class FakeBitfinexServer(LoadServer):
+   '''
+   Public Bitfinex websocket (v2), book and status channels for one
+   symbol. Book deltas are paced by the schedule.
+   '''
+   BOOK_CHANNEL = 1
+   STATUS_CHANNEL = 2
+
+   def __init__(self, schedule, symbol, price, depth, tracker):
+      super().__init__(schedule)
+      self.symbol = symbol
+      self.price = price
+      self.book = BookWalker(price, depth)
+      self.tracker = tracker
+      self.bookSubscribers = set()
+
+   async def processMessage(self, websocket, message):
+      if message.get('event') != 'subscribe':
+         return
+
+      if message['channel'] == 'book':
+         await websocket.send(json.dumps({ 'event' : 'subscribed',
+            'channel' : 'book', 'chanId' : self.BOOK_CHANNEL,
+            'symbol' : message['symbol'] }))
+         await websocket.send(json.dumps(
+            [self.BOOK_CHANNEL, self.book.getSnapshot()]))
+         self.bookSubscribers.add(websocket)
+
+      elif message['channel'] == 'status':
+         await websocket.send(json.dumps({ 'event' : 'subscribed',
+            'channel' : 'status', 'chanId' : self.STATUS_CHANNEL,
+            'key' : message['key'] }))
+         status = [0] * 15
+         status[0] = int(time.time() * 1000)
+         status[2] = self.price
+         status[3] = self.price
+         await websocket.send(json.dumps([self.STATUS_CHANNEL, status]))
+
+   async def tick(self):
+      deltas = self.book.tick()
+      self.tracker.onTick(time.time(), self.book.topAsk, self.book.topBid)
+      for websocket in list(self.bookSubscribers):
+         for delta in deltas:
+            try:
+               await websocket.send(json.dumps([self.BOOK_CHANNEL, delta]))
+            except websockets.exceptions.ConnectionClosed:
+               self.bookSubscribers.discard(websocket)
+               break
+            self.countSent(STREAM_BOOK)
+
+   def getAsyncIOTasks(self):
+      #the book rate is in deltas, a tick is 2 of them
+      return [asyncio.create_task(self.emitLoop(STREAM_BOOK, self.tick, 2))]
+
+########
+class LoadSimulator(RateEmitter, SimulatorServer):
+   '''
+   The exchange simulator serving the dealer's login and Leverex api.
+   Its own timed loops don't run, market data, dealer offers and maker
+   fills go out at the scheduled rates instead. Fills are market orders
+   from a taker account on the dealer's quotes, they alternate sides.
+   '''
+   def __init__(self, schedule, product, price, balance, tracker):
+      RateEmitter.__init__(self, schedule)
+      SimulatorServer.__init__(self, getSettings({ 'simulator' : {
+         'products' : [product],
+         'price' : price,
+         'initial_balance' : balance,
+         'token_lifetime' : TOKEN_LIFETIME
+      }}))
+      self.product = product
+      self.tracker = tracker
+      self.taker = self.exchange.getAccount(LOAD_TEST_TAKER)
+      self.fills = 0
+
+   async def processRequest(self, client, request):
+      name = next(iter(request))
+      if name == 'submit_prices':
+         stats = self.getStats()
+         if stats != None:
+            stats.quotes += 1
+         self.tracker.onQuote(time.time(), request[name]['prices'], stats)
+      await SimulatorServer.processRequest(self, client, request)
+
+   def publishCounted(self, stream, key, message):
+      subscribers = self.subscriptions.topics.get(key)
+      if not subscribers:
+         return
+      self.subscriptions.publish(key, message)
+      self.countSent(stream, len(subscribers))
+
+   ## load ##
+   async def emitMarketData(self):
+      self.exchange.moveIndexPrice(self.product)
+      self.publishCounted(STREAM_MARKET_DATA, ('market_data', self.product),
+         { 'market_data' : self.exchange.getMarketData(self.product) })
+
+   async def emitDealerOffers(self):
+      self.publishCounted(STREAM_DEALER_OFFERS, ('dealer_offers', self.product),
+         { 'dealer_offers' : self.exchange.getDealerOffers(self.product) })
+
+   async def emitFill(self):
+      #the taker buys on the dealer's ask, then sells on its bid
+      side = SIDE_BUY if self.fills % 2 == 0 else SIDE_SELL
+      try:
+         fills = self.exchange.marketOrder(self.taker, self.product, side, FILL_SIZE)
+      except SimulatorException:
+         #nothing quoted yet
+         return
+      self.fills += 1
+
+      for account, order in fills:
+         if account is self.taker:
+            continue
+         self.publishCounted(STREAM_ORDER_UPDATE, ('account', account.email),
+            { 'order_update' : { 'order' : order, 'action' : ORDER_ACTION_CREATED }})
+         self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+
+   def getAsyncIOTasks(self):
+      return [
+         asyncio.create_task(self.emitLoop(STREAM_MARKET_DATA, self.emitMarketData)),
+         asyncio.create_task(self.emitLoop(STREAM_DEALER_OFFERS, self.emitDealerOffers)),
+         asyncio.create_task(self.emitLoop(STREAM_ORDER_UPDATE, self.emitFill))
+      ]
+
+################################################################################
+##
+#### load servers process
+##
+################################################################################
+class LoadServers(object):
+   '''
+   The venues a dealer under load talks to: the exchange simulator for
+   login and the Leverex api, and a Bitfinex public feed served through
+   the fan-out service, as the dealer would get it in production.
+   '''
+   def __init__(self, settings, schedule):
+      self.settings = settings
+      self.schedule = schedule
+      self.tracker = QuoteTracker(settings['price_ratio'])
+
+      self.leverex = LoadSimulator(schedule, settings['product'],
+         settings['price'], settings['balance'], self.tracker)
+      self.bitfinex = FakeBitfinexServer(schedule, settings['symbol'],
+         settings['price'], settings['book_depth'], self.tracker)
+      self.fanout = None
+
+   async def start(self):
+      await self.leverex.start()
+      await self.bitfinex.start()
+
+      self.fanout = FanOutService({ 'fanout' : {
+         'socket_path' : self.settings['fanout_socket'],
+         'bitfinex_endpoint' : self.bitfinex.getEndpoint()
+      }})
+      await self.fanout.start()
+
+      return {
+         'login_endpoint' : self.leverex.getEndpoint('login'),
+         'api_endpoint' : self.leverex.getEndpoint('api')
+      }
+
+   async def run(self):
+      fanoutTasks = self.fanout.getAsyncIOTasks()
+      try:
+         await asyncio.gather(
+            *self.leverex.getAsyncIOTasks(), *self.bitfinex.getAsyncIOTasks())
+         #let the last quotes come in
+         await asyncio.sleep(1)
+      finally:
+         for task in fanoutTasks:
+            task.cancel()
+         await self.fanout.stop()
+         await self.leverex.stop()
+         await self.bitfinex.stop()
+
+      result = []
+      for i in range(self.schedule.getStepCount()):
+         stats = StepStats()
+         stats.merge(self.leverex.steps[i])
+         stats.merge(self.bitfinex.steps[i])
+         result.append(stats)
+      return result
+
+def runLoadServers(settings, schedule, pipe):
+   '''
+   Load server process: sends the endpoints once they're up, then the
+   per step stats once the ramp is over.
+   '''
+   logging.getLogger().setLevel(logging.ERROR)
+
+   async def run():
+      servers = LoadServers(settings, schedule)
+      pipe.send(await servers.start())
+      pipe.send(await servers.run())
+
+   asyncio.run(run())
@@ -0,0 +1,95 @@
+import math
+
+#load streams and what they carry
+STREAM_BOOK          = 'book'           #bitfinex book deltas
+STREAM_MARKET_DATA   = 'market_data'
+STREAM_DEALER_OFFERS = 'dealer_offers'
+STREAM_ORDER_UPDATE  = 'order_update'   #maker fills
+
+LOAD_STREAMS = [STREAM_BOOK, STREAM_MARKET_DATA,
+   STREAM_DEALER_OFFERS, STREAM_ORDER_UPDATE]
+
+################################################################################
+class RateSchedule(object):
+   '''
+   Load ramp: every step runs for stepDuration seconds, with each stream
+   at its base rate (messages per second) times the step multiplier.
+   start is a wall clock timestamp, so the load servers and the dealer
+   agree on step boundaries across processes.
+   '''
+   def __init__(self, rates, multipliers, stepDuration, start=0):
+      self.rates = rates
+      self.multipliers = multipliers
+      self.stepDuration = stepDuration
+      self.start = start
+
+   def getStepCount(self):
+      return len(self.multipliers)
+
+   def getStep(self, now):
+      #None before the ramp and after it
+      if now < self.start:
+         return None
+      step = int((now - self.start) // self.stepDuration)
+      if step >= len(self.multipliers):
+         return None
+      return step
+
+   def getStepStart(self, step):
+      return self.start + step * self.stepDuration
+
+   def getEnd(self):
+      return self.getStepStart(len(self.multipliers))
+
+   def getRate(self, stream, step):
+      return self.rates.get(stream, 0) * self.multipliers[step]
+
+   def getTotalRate(self, step):
+      return sum(self.getRate(stream, step) for stream in self.rates)
+
+########
+class StepStats(object):
+   '''
+   What one side of the load test saw during a step. The load servers
+   fill in what they sent and the quote latency, the dealer what it
+   processed, its hedge latency and event loop lag.
+   '''
+   def __init__(self):
+      self.sent = {}
+      self.processed = {}
+      self.quotes = 0
+      self.coalescedTicks = 0
+      self.unmatchedQuotes = 0
+      self.quoteLatency = []  #in s
+      self.hedgeLatency = []
+      self.loopLag = []
+
+   @staticmethod
+   def count(counters, stream, count=1):
+      counters[stream] = counters.get(stream, 0) + count
+
+   def merge(self, other):
+      for stream, count in other.sent.items():
+         self.count(self.sent, stream, count)
+      for stream, count in other.processed.items():
+         self.count(self.processed, stream, count)
+      self.quotes += other.quotes
+      self.coalescedTicks += other.coalescedTicks
+      self.unmatchedQuotes += other.unmatchedQuotes
+      self.quoteLatency += other.quoteLatency
+      self.hedgeLatency += other.hedgeLatency
+      self.loopLag += other.loopLag
+
+   def getSent(self):
+      return sum(self.sent.values())
+
+   def getProcessed(self):
+      return sum(self.processed.values())
+
+##
+def getPercentile(values, pct):
+   if len(values) == 0:
+      return None
+   ordered = sorted(values)
+   index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+   return ordered[index]
@@ -1,19 +1,18 @@
 import logging
 import asyncio
-import time
+import json
 from decimal import Decimal
-from datetime import datetime
-import traceback
 
-from Factories.Provider.Factory import Factory
+from Factories.Provider.Factory import Factory, waitOnSharedTask
 from Factories.Definitions import ProviderException, \
    AggregationOrderBook, PositionsReport, BalanceReport, \
    PriceEvent, CashOperation, OpenVolume, TheTxTracker, \
    checkConfig, double_eq
 from leverex_core.utils import round_down
+from leverex_core.recorder import getRecorder
+from leverex_core.loop_monitor import getLoopMonitor
 
 from Providers.bfxapi.bfxapi import Client
-from Providers.bfxapi.bfxapi import Order
 import Providers.bfxapi.bfxapi.models as bfx_models
 
 
@@ -325,7 +324,7 @@ class BfxWithdrawal(CashOperation):
 
    async def doTheTask(self, bfx):
       #withdraw
-      self.withdrawalTimestamp = round(time.time() * 1000)
+      self.withdrawalTimestamp = round(bfx.clock.time() * 1000)
       self.withdrawResult = await bfx.connection.rest.submit_wallet_withdraw(
          wallet=BfxAccounts.EXCHANGE,
          method=bfx.deposit_method,
@@ -434,7 +433,7 @@ class BfxExposureManagement(object):
       logging.info(f"[updateExposureTo] {msg}")
 
    async def sleepFor(self, cd):
-      await asyncio.sleep(cd / 1000.0)
+      await self.provider.clock.sleep(cd / 1000.0)
       await self.updateExposureTo(None)
 
    async def updateExposureTo(self, targetQty):
@@ -444,6 +443,9 @@ class BfxExposureManagement(object):
          if double_eq(targetQty, self.provider.getExposure()):
             self.log(f"exposure is already {targetQty}, skipping")
             #traceback.print_stack()
+            if self.targetExposure != None:
+               #a queued target is stale now
+               self.targetExposure = targetQty
             return
 
       firstCaller = False
@@ -453,7 +455,7 @@ class BfxExposureManagement(object):
          firstCaller = True
 
       while True:
-         now = time.time_ns() / 1000000
+         now = self.provider.clock.time_ns() / 1000000
          remainingCooldown = self.lastUpdate_ + self.cooldown_ - now
 
          if remainingCooldown > 0:
@@ -474,6 +476,9 @@ class BfxExposureManagement(object):
             #reset target exposure and trigger cooldown
             target = self.targetExposure
             self.targetExposure = None
+            if target == None:
+               #the queued target was cancelled
+               return
             self.lastUpdate_ = now
 
             currentExposure = self.provider.getExposure()
@@ -488,6 +493,10 @@ class BfxExposureManagement(object):
             self.log(f"push count: {self.pushCount}, call count: {self.callCount}")
 
             #update exposure and return
+            self.provider.recordOutbound('submit_order',
+               symbol=self.provider.product,
+               leverage=self.provider.leverage,
+               amount=exposureDiff)
             await self.provider.connection.ws.submit_order(
                symbol=self.provider.product,
                leverage=self.provider.leverage,
@@ -497,6 +506,155 @@ class BfxExposureManagement(object):
             return
 
 
+################################################################################
+##
+#### Shared client
+##
+################################################################################
+def createClient(config):
+   log_level = 'INFO'
+   if 'log_level' in config:
+      log_level = config['log_level']
+   return Client(API_KEY=config['api_key'],
+      API_SECRET=config['api_secret'], logLevel=log_level)
+
+def encodeEventArg(arg):
+   #bfxapi models are plain objects
+   if hasattr(arg, '__dict__'):
+      return vars(arg)
+   return str(arg)
+
+def recordHandler(recorder, event, handler):
+   '''
+   bfxapi doesn't expose its raw frames, record the parsed event each
+   handler is given instead
+   '''
+   if recorder == None:
+      return handler
+
+   def recordedHandler(*args):
+      recorder.inbound('bitfinex', json.dumps(
+         { 'event' : event, 'args' : args }, default=encodeEventArg))
+      return handler(*args)
+   return recordedHandler
+
+########
+class BfxRouter(object):
+   '''
+   One Bitfinex client serving several providers of the same account.
+   Book, status and position notifications are routed by symbol, the
+   rest (auth, wallets, snapshots) is broadcast. A provider raising
+   out of a callback is logged and does not stop delivery to others.
+   '''
+   BROADCAST_EVENTS = [
+      'authenticated',
+      'balance_update',
+      'wallet_snapshot',
+      'wallet_update',
+      'order_new',
+      'order_confirmed',
+      'order_closed',
+      'position_snapshot',
+      'margin_info_update'
+   ]
+
+   def __init__(self, config):
+      self.connection = createClient(config['bitfinex'])
+      self.recorder = getRecorder(config)
+      self.monitor = getLoopMonitor(config)
+      self.listeners = {}
+      self._task = None
+
+      handlers = {}
+      for event in self.BROADCAST_EVENTS:
+         handlers[event] = self.getBroadcaster(f"on_{event}")
+      handlers['order_book_update'] = self.on_order_book_update
+      handlers['order_book_snapshot'] = self.on_order_book_snapshot
+      handlers['position_new'] = self.on_position_new
+      handlers['position_update'] = self.on_position_update
+      handlers['position_close'] = self.on_position_close
+      handlers['status_update'] = self.on_status_update
+
+      for event, handler in handlers.items():
+         if self.monitor != None:
+            handler = self.monitor.wrap(event, handler)
+         self.connection.ws.on(event,
+            recordHandler(self.recorder, event, handler))
+
+   def addListener(self, symbol, listener):
+      if symbol in self.listeners:
+         raise BitfinexException(f"symbol {symbol} already has a listener")
+      self.listeners[symbol] = listener
+
+   def removeListener(self, symbol, listener):
+      if self.listeners.get(symbol) is listener:
+         del self.listeners[symbol]
+
+   def getAsyncIOTask(self):
+      #every provider asks for the client task, only run it once
+      if self._task == None or self._task.get_loop() is not asyncio.get_running_loop():
+         self._task = asyncio.create_task(self.connection.ws.get_task_executable())
+      return self._task
+
+   ## dispatch ##
+   async def _call(self, listener, methodName, *args):
+      try:
+         result = getattr(listener, methodName)(*args)
+         if asyncio.iscoroutine(result):
+            await result
+      except Exception as e:
+         logging.error(f"[BfxRouter] {listener.product} failed"
+            f" on {methodName} with error: {e}")
+
+   async def _route(self, symbol, methodName, *args):
+      if symbol == None:
+         await self._broadcast(methodName, *args)
+         return
+
+      listener = self.listeners.get(symbol)
+      if listener == None:
+         logging.debug(f"[BfxRouter] no listener for {symbol}, dropping {methodName}")
+         return
+      await self._call(listener, methodName, *args)
+
+   async def _broadcast(self, methodName, *args):
+      for symbol in list(self.listeners):
+         await self._call(self.listeners[symbol], methodName, *args)
+
+   def getBroadcaster(self, methodName):
+      async def broadcast(*args):
+         await self._broadcast(methodName, *args)
+      return broadcast
+
+   @staticmethod
+   def getPositionSymbol(data):
+      try:
+         return data[2][0]
+      except (IndexError, TypeError):
+         return None
+
+   ## symbol notifications ##
+   async def on_order_book_update(self, data):
+      await self._route(data.get('symbol'), 'on_order_book_update', data)
+
+   async def on_order_book_snapshot(self, data):
+      await self._route(data.get('symbol'), 'on_order_book_snapshot', data)
+
+   async def on_position_new(self, data):
+      await self._route(self.getPositionSymbol(data), 'on_position_new', data)
+
+   async def on_position_update(self, data):
+      await self._route(self.getPositionSymbol(data), 'on_position_update', data)
+
+   async def on_position_close(self, data):
+      await self._route(self.getPositionSymbol(data), 'on_position_close', data)
+
+   async def on_status_update(self, status):
+      symbol = None
+      if isinstance(status, dict):
+         symbol = status.get('symbol')
+      await self._route(symbol, 'on_status_update', status)
+
 ################################################################################
 ##
 #### Provider
@@ -516,13 +674,27 @@ class BitfinexProvider(Factory):
          'max_offer_volume'
       ]
    }
+   #leverage (collateral_pct) applies to the positions already open,
+   #changing it takes a restart
+   reloadable_settings = {
+      'bitfinex': [
+         'max_collateral_deviation',
+         'exposure_cooldown'
+      ],
+      'hedger': [
+         'max_offer_volume'
+      ]
+   }
 
    #############################################################################
    #### setup
    #############################################################################
-   def __init__(self, config):
-      super().__init__("Bitfinex")
+   def __init__(self, config, router=None, clock=None):
+      super().__init__("Bitfinex", clock)
       self.connection = None
+      self.router = router
+      self.recorder = getRecorder(config)
+      self.monitor = getLoopMonitor(config)
       self.positions = {}
       self.balances = {}
       self.lastReadyState = False
@@ -537,8 +709,7 @@ class BitfinexProvider(Factory):
       self.ccy_base = ccyToBase(self.ccy)
       self.collateral_pct = self.config['collateral_pct']
       self.setLeverage(100/self.collateral_pct)
-      self.max_collateral_deviation = self.config['max_collateral_deviation']
-      self.max_offer_volume = config['hedger']['max_offer_volume']
+      self.loadSettings(config)
       self.deposit_method = self.config['deposit_method']
 
       self.order_book_len = 100
@@ -549,37 +720,76 @@ class BitfinexProvider(Factory):
       if 'order_book_aggregation' in self.config:
          self.order_book_aggregation = self.config['order_book_aggregation']
 
+      #public feeds can come from a local fan-out service
+      self.fanout = None
+      if 'fanout_socket' in self.config:
+         from FanOut.Client import BfxFanOutClient
+         self.fanout = BfxFanOutClient(self.config['fanout_socket'],
+            self.monitor)
+
+      #mirror the book to shared memory for local readers
+      sharedWriter = None
+      if 'shared_book_path' in self.config:
+         from Factories.SharedOrderBook import SharedBookWriter
+         sharedWriter = SharedBookWriter(self.config['shared_book_path'],
+            self.config.get('shared_book_depth', self.order_book_len))
+
       # setup Bitfinex connection
-      self.order_book = AggregationOrderBook()
+      self.order_book = AggregationOrderBook(sharedWriter)
       self.expManager = BfxExposureManagement(
          self, self.config['exposure_cooldown'])
 
+   def loadSettings(self, config):
+      self.max_collateral_deviation = config['bitfinex']['max_collateral_deviation']
+      self.max_offer_volume = config['hedger']['max_offer_volume']
+
+   def reloadConfig(self, config):
+      #connection settings stay as they are, only swap the risk parameters
+      self.loadSettings(config)
+      self.expManager.cooldown_ = config['bitfinex']['exposure_cooldown']
+      for key in self.reloadable_settings['bitfinex']:
+         self.config[key] = config['bitfinex'][key]
+
    def setup(self, callback):
       super().setup(callback)
 
-      log_level = 'INFO'
-      if 'log_level' in self.config:
-         log_level = self.config['log_level']
-      self.connection = Client(API_KEY=self.config['api_key'],
-         API_SECRET=self.config['api_secret'], logLevel=log_level)
-
-      #self.connection.ws.on('error', self.on_error)
-      self.connection.ws.on('authenticated', self.on_authenticated)
-      self.connection.ws.on('balance_update', self.on_balance_updated)
-      self.connection.ws.on('wallet_snapshot', self.on_wallet_snapshot)
-      self.connection.ws.on('wallet_update', self.on_wallet_update)
-      self.connection.ws.on('order_book_update', self.on_order_book_update)
-      self.connection.ws.on('order_book_snapshot', self.on_order_book_snapshot)
-
-      self.connection.ws.on('order_new', self.on_order_new)
-      self.connection.ws.on('order_confirmed', self.on_order_confirmed)
-      self.connection.ws.on('order_closed', self.on_order_closed)
-      self.connection.ws.on('position_snapshot', self.on_position_snapshot)
-      self.connection.ws.on('position_new', self.on_position_new)
-      self.connection.ws.on('position_update', self.on_position_update)
-      self.connection.ws.on('position_close', self.on_position_close)
-      self.connection.ws.on('margin_info_update', self.on_margin_info_update)
-      self.connection.ws.on('status_update', self.on_status_update)
+      if self.router != None:
+         #account events reach us through the shared client's router
+         self.connection = self.router.connection
+         self.router.addListener(self.product, self)
+         return
+
+      self.connection = createClient(self.config)
+
+      handlers = {
+         #'error' : self.on_error,
+         'authenticated' : self.on_authenticated,
+         'balance_update' : self.on_balance_updated,
+         'wallet_snapshot' : self.on_wallet_snapshot,
+         'wallet_update' : self.on_wallet_update,
+         'order_book_update' : self.on_order_book_update,
+         'order_book_snapshot' : self.on_order_book_snapshot,
+
+         'order_new' : self.on_order_new,
+         'order_confirmed' : self.on_order_confirmed,
+         'order_closed' : self.on_order_closed,
+         'position_snapshot' : self.on_position_snapshot,
+         'position_new' : self.on_position_new,
+         'position_update' : self.on_position_update,
+         'position_close' : self.on_position_close,
+         'margin_info_update' : self.on_margin_info_update,
+         'status_update' : self.on_status_update
+      }
+      for event, handler in handlers.items():
+         if self.monitor != None:
+            handler = self.monitor.wrap(event, handler)
+         self.connection.ws.on(event,
+            recordHandler(self.recorder, event, handler))
+
+   def recordOutbound(self, request, **kwargs):
+      if self.recorder != None:
+         self.recorder.outbound('bitfinex', json.dumps(
+            { 'request' : request, 'args' : kwargs }, default=str))
 
    async def loadAddresses(self, callback):
       try:
@@ -614,11 +824,17 @@ class BitfinexProvider(Factory):
       await super().setConnected(True)
       await super().fetchInitialData()
 
-      # subscribe to order book
+      #subscribe to order book and status report
+      if self.fanout != None:
+         await self.fanout.subscribeBook(self.product,
+            len=self.order_book_len, prec=self.order_book_aggregation)
+         await self.fanout.subscribeStatus(self.product)
+         return
+
+      self.recordOutbound('subscribe', symbol=self.product,
+         len=self.order_book_len, prec=self.order_book_aggregation)
       await self.connection.ws.subscribe('book', self.product,
          len=self.order_book_len, prec=self.order_book_aggregation)
-
-      # subscribe to status report
       await self.connection.ws.subscribe_derivative_status(self.product)
 
    ## balance events ##
@@ -681,6 +897,8 @@ class BitfinexProvider(Factory):
       await super().onOrderBookUpdate()
 
    def on_order_book_snapshot(self, data):
+      #snapshots replace the book, they are sent again on resubscription
+      self.order_book.reset()
       self.order_book.setup_from_snapshot(data['data'])
 
    ## order events ##
@@ -741,8 +959,27 @@ class BitfinexProvider(Factory):
 
    ## setup ##
    def getAsyncIOTask(self):
+      if self.fanout != None:
+         return asyncio.create_task(self.runWithFanOut())
+      if self.router != None:
+         return asyncio.create_task(
+            waitOnSharedTask(self.router.getAsyncIOTask()))
       return asyncio.create_task(self.connection.ws.get_task_executable())
 
+   def teardown(self):
+      if self.router != None:
+         self.router.removeListener(self.product, self)
+      #a restart maps the region anew
+      self.order_book.closeSharedWriter()
+
+   async def runWithFanOut(self):
+      clientTask = None
+      if self.router != None:
+         clientTask = waitOnSharedTask(self.router.getAsyncIOTask())
+      else:
+         clientTask = self.connection.ws.get_task_executable()
+      await asyncio.gather(clientTask, self.fanout.run(self))
+
    ## state ##
    def isReady(self):
       return self.lastReadyState
@@ -875,6 +1112,12 @@ class BitfinexProvider(Factory):
    async def updateExposure(self, quantity):
       await self.expManager.updateExposureTo(quantity)
 
+   def getPendingExposure(self):
+      return self.expManager.targetExposure
+
+   def cancelPendingExposure(self):
+      self.expManager.targetExposure = None
+
    def getPositions(self):
       return BfxPositionsReport(self)
 
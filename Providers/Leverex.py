@@ -1,11 +1,9 @@
 import logging
 import asyncio
-import json
 import time
 from decimal import Decimal
-from datetime import datetime
 
-from Factories.Provider.Factory import Factory
+from Factories.Provider.Factory import Factory, waitOnSharedTask
 from Factories.Definitions import PositionsReport, \
    BalanceReport, PriceEvent, \
    CashOperation, TheTxTracker, \
@@ -258,9 +256,9 @@ class LeverexProvider(Factory, LeverexBaseClient):
    }
 
    ## setup ##
-   def __init__(self, config):
-      LeverexBaseClient.__init__(self, config)
-      Factory.__init__(self, "Leverex")
+   def __init__(self, config, router=None, clock=None):
+      LeverexBaseClient.__init__(self, config, router)
+      Factory.__init__(self, "Leverex", clock)
       self.lastReadyState = False
 
       #check for required config entries
@@ -276,8 +274,15 @@ class LeverexProvider(Factory, LeverexBaseClient):
 
    ##
    def getAsyncIOTask(self):
+      if self.router != None:
+         return asyncio.create_task(
+            waitOnSharedTask(self.router.getAsyncIOTask()))
       return asyncio.create_task(self.connection.run(self))
 
+   def teardown(self):
+      if self.router != None:
+         self.router.removeListener(self.product, self)
+
    #############################################################################
    #### withdrawals
    #############################################################################
@@ -505,3 +510,8 @@ class LeverexProvider(Factory, LeverexBaseClient):
       if not self.isReady():
          return None
       return LeverexBaseClient.getExposure(self)
+
+   def getMemoryGauges(self):
+      gauges = Factory.getMemoryGauges(self)
+      gauges.update(LeverexBaseClient.getMemoryGauges(self))
+      return gauges
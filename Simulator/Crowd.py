@@ -0,0 +1,115 @@
+import asyncio
+import json
+import random
+import time
+
+import websockets
+
+from LoadTest.Stats import getPercentile
+from leverex_core.api_connection import generateReferenceId
+from leverex_core.utils import SIDE_BUY, SIDE_SELL
+
+CROWD_ORDER_AMOUNT = 0.001
+
+################################################################################
+class CrowdStats(object):
+   def __init__(self):
+      self.connected = 0
+      self.orders = 0
+      self.filled = 0
+      self.rejected = 0
+      self.latency = [] #in s, market order round trips
+
+   def __str__(self):
+      p50 = getPercentile(self.latency, 50)
+      p99 = getPercentile(self.latency, 99)
+      result = f"clients: {self.connected}, orders: {self.orders}, " \
+         f"filled: {self.filled}, rejected: {self.rejected}"
+      if p50 != None:
+         result += f", latency p50: {round(p50 * 1000, 1)}ms, " \
+            f"p99: {round(p99 * 1000, 1)}ms"
+      return result
+
+########
+class CrowdClient(object):
+   '''
+   A bare taker on the authenticated api: logs in, follows the dealer
+   offers and sends market orders at random intervals. No key
+   material, the simulator only reads the key id off the challenge,
+   so thousands of them fit on one event loop.
+   '''
+   def __init__(self, crowd, id):
+      self.crowd = crowd
+      self.id = id
+      self.pending = {}
+
+   async def login(self):
+      async with websockets.connect(self.crowd.endpoints['login_endpoint']) as websocket:
+         challenge = json.dumps({ 'header' : { 'kid' : f"crowd{self.id:07d}" }})
+         await websocket.send(json.dumps({ 'message_id' : 1, 'method' : 'new',
+            'api' : 'login', 'args' : { 'signed_challenge' : challenge }}))
+         reply = json.loads(await websocket.recv())
+         if reply['error'] != None:
+            raise Exception(f"crowd login failed: {reply['error']}")
+         return reply['data']['access_token']
+
+   async def run(self):
+      token = await self.login()
+      product = self.crowd.product
+      async with websockets.connect(self.crowd.endpoints['api_endpoint']) as websocket:
+         await websocket.send(json.dumps({ 'authorize' : { 'token' : token }}))
+         reply = json.loads(await websocket.recv())
+         if not reply['authorize']['success']:
+            raise Exception("crowd authorization failed")
+         self.crowd.stats.connected += 1
+
+         for request in ['session_open', 'subscribe_dealer_offers', 'load_balance']:
+            await websocket.send(json.dumps({ request : { 'product_type' : product }}))
+
+         await asyncio.gather(self.readLoop(websocket), self.orderLoop(websocket))
+
+   async def readLoop(self, websocket):
+      async for data in websocket:
+         message = json.loads(data)
+         if 'market_order' not in message:
+            continue
+         reply = message['market_order']
+         sent = self.pending.pop(reply.get('reference'), None)
+         if sent == None:
+            continue
+
+         stats = self.crowd.stats
+         stats.latency.append(time.monotonic() - sent)
+         if reply['success']:
+            stats.filled += 1
+         else:
+            stats.rejected += 1
+
+   async def orderLoop(self, websocket):
+      while True:
+         await asyncio.sleep(random.expovariate(self.crowd.orderRate))
+         reference = generateReferenceId()
+         self.pending[reference] = time.monotonic()
+         self.crowd.stats.orders += 1
+         await websocket.send(json.dumps({ 'market_order' : {
+            'amount' : str(CROWD_ORDER_AMOUNT),
+            'side' : random.choice([SIDE_BUY, SIDE_SELL]),
+            'product_type' : self.crowd.product,
+            'reference' : reference }}))
+
+########
+class Crowd(object):
+   '''
+   Simulated takers contending for the dealers' offers, each sends
+   orderRate market orders per second on average.
+   '''
+   def __init__(self, endpoints, count, orderRate, product):
+      self.endpoints = endpoints
+      self.count = count
+      self.orderRate = orderRate
+      self.product = product
+      self.stats = CrowdStats()
+
+   async def run(self):
+      clients = [CrowdClient(self, i) for i in range(self.count)]
+      await asyncio.gather(*[client.run() for client in clients])
@@ -0,0 +1,362 @@
+import random
+from decimal import Decimal
+
+from leverex_core.clock import WALL_CLOCK
+from leverex_core.utils import get_product_info, WithdrawInfo, \
+   SIDE_BUY, SIDE_SELL, ORDER_STATUS_FILLED, ORDER_TYPE_TRADE_POSITION, \
+   ORDER_TYPE_NORMAL_ROLLOVER_POSITION
+
+DEFAULT_SETTINGS = {
+   'products' : ['xbtusd_rf'],
+   'price' : 10000,              #starting index price
+   'price_volatility' : 0.0005,  #per market data tick
+   'session_duration' : 3600,    #in s, time between cutoffs
+   'fee_taker' : 15,             #per unit of product
+   'fee_maker' : -5,
+   'initial_balance' : 100000,   #new accounts start with this much cash
+   'withdrawal_delay' : 5,       #in s, before a withdrawal completes
+   'token_lifetime' : 600,       #in s
+   'market_data_interval' : 1,   #in s
+   'offers_interval' : 0.1       #in s, dealer offers are published at most this often
+}
+
+class SimulatorException(Exception):
+   pass
+
+def getSettings(config):
+   settings = dict(DEFAULT_SETTINGS)
+   settings.update(config.get('simulator', {}))
+   return settings
+
+################################################################################
+##
+#### state
+##
+################################################################################
+class SimSession(object):
+   def __init__(self, product, sessionId, openPrice, cutOffAt, settings):
+      self.product = product
+      self.sessionId = sessionId
+      self.openPrice = openPrice
+      self.cutOffAt = cutOffAt
+      self.feeTaker = settings['fee_taker']
+      self.feeMaker = settings['fee_maker']
+      self.open = True
+
+   def getIM(self):
+      #initial margin per unit, leverex runs 10x
+      return Decimal(self.openPrice) / 10
+
+   def toOpenJson(self):
+      return {
+         'product_type' : self.product,
+         'cut_off_at' : int(self.cutOffAt),
+         'last_cut_off_price' : self.openPrice,
+         'session_id' : self.sessionId,
+         'previous_session_id' : self.sessionId - 1,
+         'healthy' : True,
+         'fee_taker' : self.feeTaker,
+         'fee_maker' : self.feeMaker
+      }
+
+   def toCloseJson(self):
+      return {
+         'product_type' : self.product,
+         'session_id' : self.sessionId,
+         'healthy' : True
+      }
+
+########
+class Account(object):
+   def __init__(self, email, balance, ccy):
+      self.email = email
+      self.ccy = ccy
+      self.balances = { ccy : Decimal(balance) }
+
+      #current session orders per product, older sessions are settled
+      self.orders = {}
+      self.withdrawals = {}
+      self.deposits = []
+      self.depositAddress = f"sim1{random.getrandbits(64):016x}"
+      self.addresses = [{ 'address' : f"sim1{random.getrandbits(64):016x}",
+         'description' : 'simulator' }]
+
+   def getOrders(self, product):
+      return self.orders.setdefault(product, [])
+
+   def getNetExposure(self, product):
+      exposure = Decimal(0)
+      for order in self.getOrders(product):
+         quantity = Decimal(order['quantity'])
+         exposure += quantity if order['side'] == SIDE_BUY else -quantity
+      return exposure
+
+   def getPnl(self, product, price):
+      pnl = Decimal(0)
+      for order in self.getOrders(product):
+         value = Decimal(order['quantity']) * (Decimal(price) - Decimal(order['price']))
+         pnl += value if order['side'] == SIDE_BUY else -value
+      return pnl
+
+   def getBalance(self):
+      return self.balances[self.ccy]
+
+   def addBalance(self, amount):
+      self.balances[self.ccy] += Decimal(amount)
+
+   def toBalanceJson(self):
+      return { 'balances' : [{ 'currency' : ccy, 'balance' : str(balance) } \
+         for ccy, balance in self.balances.items()] }
+
+################################################################################
+##
+#### exchange
+##
+################################################################################
+class Exchange(object):
+   '''
+   Leverex exchange state, without any IO: accounts, sessions, dealer
+   offers and market orders matched against them. Dealer offers are
+   price streams, a market order fills in full on the best offer that
+   covers its amount and doesn't consume it.
+
+   Methods that change accounts return the (account, message) pairs
+   to send out, the server does the sending.
+   '''
+   def __init__(self, settings, clock=WALL_CLOCK):
+      self.settings = settings
+      self.clock = clock
+      self.accounts = {}
+      self.sessions = {}
+      self.indexPrices = {}
+      self.offers = {}
+      self.nextOrderId = 1
+      self.nextWithdrawalId = 1
+      self.nextSessionId = 1
+
+      for product in settings['products']:
+         if get_product_info(product) == None:
+            raise SimulatorException(f"unknown product {product}")
+         self.indexPrices[product] = settings['price']
+         self.offers[product] = {}
+         self.openSession(product)
+
+   def getAccount(self, email):
+      if email not in self.accounts:
+         product = self.settings['products'][0]
+         self.accounts[email] = Account(email,
+            self.settings['initial_balance'], get_product_info(product).cash_ccy)
+      return self.accounts[email]
+
+   def checkProduct(self, product):
+      if product not in self.sessions:
+         raise SimulatorException(f"unknown product {product}")
+
+   ## sessions ##
+   def openSession(self, product):
+      price = round(self.indexPrices[product], 2)
+      session = SimSession(product, self.nextSessionId, price,
+         self.clock.time() + self.settings['session_duration'], self.settings)
+      self.nextSessionId += 1
+      self.sessions[product] = session
+      return session
+
+   def rollSession(self, product):
+      '''
+      Cutoff: settles every account's pnl at the index price and rolls
+      its net exposure into the new session. Returns the closed session,
+      the new one and the rollover order updates.
+      '''
+      closed = self.sessions[product]
+      closed.open = False
+      session = self.openSession(product)
+
+      updates = []
+      for account in self.accounts.values():
+         exposure = account.getNetExposure(product)
+         if len(account.getOrders(product)) == 0:
+            continue
+         account.addBalance(account.getPnl(product, session.openPrice))
+         account.orders[product] = []
+         if exposure == 0:
+            continue
+
+         order = self.createOrder(product, session, abs(exposure),
+            session.openPrice, SIDE_BUY if exposure > 0 else SIDE_SELL,
+            False, 0, ORDER_TYPE_NORMAL_ROLLOVER_POSITION)
+         account.getOrders(product).append(order)
+         updates.append((account, order))
+      return closed, session, updates
+
+   ## market data ##
+   def moveIndexPrice(self, product):
+      price = self.indexPrices[product]
+      price *= 1 + random.gauss(0, self.settings['price_volatility'])
+      self.indexPrices[product] = round(price, 2)
+      return self.indexPrices[product]
+
+   def getMarketData(self, product):
+      return { 'product_type' : product,
+         'live_cutoff' : str(self.indexPrices[product]) }
+
+   ## dealer offers ##
+   def submitPrices(self, account, product, prices):
+      self.checkProduct(product)
+      offers = []
+      for price in prices:
+         volume = Decimal(price['volume'])
+         if volume <= 0:
+            continue
+         offers.append({ 'volume' : volume,
+            'ask' : Decimal(price['ask']) if 'ask' in price else None,
+            'bid' : Decimal(price['bid']) if 'bid' in price else None })
+
+      if len(offers) == 0:
+         self.offers[product].pop(account.email, None)
+      else:
+         self.offers[product][account.email] = offers
+
+   def getDealerOffers(self, product):
+      offers = []
+      for dealerOffers in self.offers[product].values():
+         for offer in dealerOffers:
+            if offer['ask'] != None:
+               offers.append({ 'command' : 1, 'side' : SIDE_SELL,
+                  'volume' : str(offer['volume']), 'price' : str(offer['ask']) })
+            if offer['bid'] != None:
+               offers.append({ 'command' : 1, 'side' : SIDE_BUY,
+                  'volume' : str(offer['volume']), 'price' : str(offer['bid']) })
+      return { 'product_type' : product, 'offers' : offers }
+
+   ## orders ##
+   def createOrder(self, product, session, quantity, price, side,
+      isTaker, fee, rolloverType=ORDER_TYPE_TRADE_POSITION):
+      order = {
+         'id' : self.nextOrderId,
+         'timestamp' : self.clock.time(),
+         'quantity' : str(quantity),
+         'price' : str(price),
+         'side' : side,
+         'status' : ORDER_STATUS_FILLED,
+         'product_type' : product,
+         'reference_exposure' : 0,
+         'session_id' : session.sessionId,
+         'rollover_type' : rolloverType,
+         'fee' : str(fee),
+         'is_taker' : isTaker
+      }
+      self.nextOrderId += 1
+      return order
+
+   def getBestOffer(self, product, side, amount, taker):
+      #the taker buys on the dealers' asks and sells on their bids
+      key = 'ask' if side == SIDE_BUY else 'bid'
+      best = None
+      for email, offers in self.offers[product].items():
+         if email == taker.email:
+            continue
+         for offer in offers:
+            if offer[key] == None or offer['volume'] < amount:
+               continue
+            if best == None or \
+               (side == SIDE_BUY and offer[key] < best[1]) or \
+               (side == SIDE_SELL and offer[key] > best[1]):
+               best = (email, offer[key])
+      return best
+
+   def marketOrder(self, taker, product, side, amount):
+      self.checkProduct(product)
+      session = self.sessions[product]
+      amount = Decimal(amount)
+      if amount <= 0:
+         raise SimulatorException("invalid amount")
+      if side not in (SIDE_BUY, SIDE_SELL):
+         raise SimulatorException("invalid side")
+
+      best = self.getBestOffer(product, side, amount, taker)
+      if best == None:
+         raise SimulatorException("no offer for this amount")
+      makerEmail, price = best
+      maker = self.accounts[makerEmail]
+
+      #margin check on the taker, the maker is trusted to quote within its means
+      exposure = taker.getNetExposure(product)
+      exposure += amount if side == SIDE_BUY else -amount
+      fee = amount * Decimal(session.feeTaker)
+      if abs(exposure) * session.getIM() + fee > taker.getBalance():
+         raise SimulatorException("insufficient balance")
+
+      makerSide = SIDE_SELL if side == SIDE_BUY else SIDE_BUY
+      makerFee = amount * Decimal(session.feeMaker)
+      takerOrder = self.createOrder(product, session, amount, price,
+         side, True, fee)
+      makerOrder = self.createOrder(product, session, amount, price,
+         makerSide, False, makerFee)
+
+      taker.getOrders(product).append(takerOrder)
+      taker.addBalance(-fee)
+      maker.getOrders(product).append(makerOrder)
+      maker.addBalance(-makerFee)
+      return [(taker, takerOrder), (maker, makerOrder)]
+
+   def loadOrders(self, account, product):
+      self.checkProduct(product)
+      return list(account.getOrders(product))
+
+   ## cash ##
+   def withdraw(self, account, address, currency, amount):
+      amount = Decimal(amount)
+      if currency != account.ccy:
+         raise SimulatorException(f"can't withdraw {currency}")
+      if amount <= 0 or amount > account.getBalance():
+         raise SimulatorException("insufficient balance")
+
+      withdrawal = {
+         'id' : str(self.nextWithdrawalId),
+         'status' : WithdrawInfo.WITHDRAW_PENDING,
+         'recv_address' : address,
+         'currency' : currency,
+         'amount' : str(amount),
+         'timestamp' : self.clock.time()
+      }
+      self.nextWithdrawalId += 1
+      account.withdrawals[withdrawal['id']] = withdrawal
+      account.addBalance(-amount)
+      return withdrawal
+
+   def setWithdrawalStatus(self, account, id, status):
+      #returns the withdrawal if it was pending
+      withdrawal = account.withdrawals.get(str(id))
+      if withdrawal == None:
+         raise SimulatorException(f"unknown withdrawal {id}")
+      if withdrawal['status'] != WithdrawInfo.WITHDRAW_PENDING:
+         return None
+
+      withdrawal['status'] = status
+      if status == WithdrawInfo.WITHDRAW_CANCELLED:
+         account.addBalance(withdrawal['amount'])
+      return withdrawal
+
+   def cancelWithdrawal(self, account, id):
+      withdrawal = self.setWithdrawalStatus(account, id,
+         WithdrawInfo.WITHDRAW_CANCELLED)
+      if withdrawal == None:
+         raise SimulatorException(f"withdrawal {id} can't be cancelled")
+      return withdrawal
+
+   def completeWithdrawal(self, account, id):
+      return self.setWithdrawalStatus(account, id,
+         WithdrawInfo.WITHDRAW_COMPLETED)
+
+   def deposit(self, account, amount):
+      deposit = {
+         'tx_id' : f"{random.getrandbits(128):032x}",
+         'nb_conf' : 1,
+         'unblinded_link' : '',
+         'timestamp' : self.clock.time(),
+         'outputs' : [{ 'currency' : account.ccy, 'amount' : str(amount) }],
+         'recv_address' : account.depositAddress
+      }
+      account.deposits.append(deposit)
+      account.addBalance(amount)
+      return deposit
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import logging
+import secrets
+
+import websockets
+
+from Simulator.Exchange import Exchange, SimulatorException
+from leverex_core.utils import ORDER_ACTION_CREATED
+
+LOCALHOST = '127.0.0.1'
+
+#requests served without authorization, what the public api offers
+PUBLIC_REQUESTS = ['subscribe', 'session_open', 'subscribe_dealer_offers',
+   'get_chyrons', 'product_fee']
+
+################################################################################
+class SimulatorClient(object):
+   def __init__(self, websocket, public):
+      self.websocket = websocket
+      self.public = public
+      self.account = None
+
+########
+class Subscriptions(object):
+   '''
+   Websockets per topic. Broadcasts serialize once and don't wait on
+   any single client, a slow client can't hold the others back.
+   '''
+   def __init__(self):
+      self.topics = {}
+      self.keys = {}
+
+   def add(self, key, websocket):
+      self.topics.setdefault(key, set()).add(websocket)
+      self.keys.setdefault(websocket, set()).add(key)
+
+   def remove(self, websocket):
+      for key in self.keys.pop(websocket, []):
+         subscribers = self.topics[key]
+         subscribers.discard(websocket)
+         if len(subscribers) == 0:
+            del self.topics[key]
+
+   def publish(self, key, message):
+      subscribers = self.topics.get(key)
+      if not subscribers:
+         return
+      websockets.broadcast(subscribers, json.dumps(message))
+
+################################################################################
+##
+#### server
+##
+################################################################################
+class SimulatorServer(object):
+   '''
+   Serves an Exchange over the Leverex protocols: the login api, the
+   authenticated api AuthApiConnection speaks and the public api
+   PublicApiConnection speaks.
+
+   Logins aren't verified, the key that signed the challenge names the
+   account: any key logs in, each key gets its own account.
+   '''
+   def __init__(self, settings, exchange=None):
+      self.settings = settings
+      self.exchange = exchange if exchange != None else Exchange(settings)
+      self.tokens = {}
+      self.subscriptions = Subscriptions()
+      self.clients = set()
+      self.dirtyOffers = set()
+      self.servers = {}
+
+   ## setup ##
+   async def start(self, host=LOCALHOST, apiPort=0, publicPort=0, loginPort=0):
+      #no per message compression, its zlib state per client is the
+      #bulk of the memory and cpu cost with thousands of clients
+      self.servers['api'] = await websockets.serve(
+         self.apiHandler, host, apiPort, compression=None)
+      self.servers['public'] = await websockets.serve(
+         self.publicHandler, host, publicPort, compression=None)
+      self.servers['login'] = await websockets.serve(
+         self.loginHandler, host, loginPort, compression=None)
+
+   async def stop(self):
+      for server in self.servers.values():
+         server.close()
+         await server.wait_closed()
+      self.servers = {}
+
+   def getEndpoint(self, name):
+      host, port = self.servers[name].sockets[0].getsockname()[:2]
+      return f"ws://{host}:{port}"
+
+   def getConfig(self):
+      #leverex config group to point a dealer or a client at the simulator
+      return {
+         'api_endpoint' : self.getEndpoint('api'),
+         'public_endpoint' : self.getEndpoint('public'),
+         'login_endpoint' : self.getEndpoint('login')
+      }
+
+   def getAsyncIOTasks(self):
+      return [asyncio.create_task(self.sessionLoop()),
+         asyncio.create_task(self.marketDataLoop()),
+         asyncio.create_task(self.offersLoop())]
+
+   ## login api ##
+   async def loginHandler(self, websocket):
+      try:
+         async for data in websocket:
+            request = json.loads(data)
+            reply = { 'message_id' : request.get('message_id'),
+               'method' : request.get('method'), 'error' : None }
+            try:
+               reply['data'] = self.login(request)
+            except SimulatorException as e:
+               reply['error'] = str(e)
+            await websocket.send(json.dumps(reply))
+      except websockets.exceptions.ConnectionClosed:
+         pass
+
+   def login(self, request):
+      args = request.get('args', {})
+      if request.get('method') == 'new':
+         try:
+            challenge = json.loads(args['signed_challenge'])
+            keyId = challenge['header']['kid']
+         except (KeyError, TypeError, ValueError):
+            raise SimulatorException("invalid challenge")
+         email = f"{keyId[:12]}@simulator"
+      elif request.get('method') == 'renew':
+         if args.get('access_token') not in self.tokens:
+            raise SimulatorException("unknown token")
+         email = self.tokens.pop(args['access_token'])
+      else:
+         raise SimulatorException(f"unsupported method {request.get('method')}")
+
+      token = secrets.token_hex(16)
+      self.tokens[token] = email
+      return { 'access_token' : token, 'grant' : 'basic',
+         'expires_in' : self.settings['token_lifetime'] }
+
+   ## leverex apis ##
+   async def apiHandler(self, websocket):
+      await self.serve(SimulatorClient(websocket, False))
+
+   async def publicHandler(self, websocket):
+      await self.serve(SimulatorClient(websocket, True))
+
+   async def serve(self, client):
+      self.clients.add(client)
+      try:
+         async for data in client.websocket:
+            try:
+               await self.processRequest(client, json.loads(data))
+            except (SimulatorException, KeyError, ValueError) as e:
+               logging.warning(f"[Simulator] bad request {data}: {e}")
+      except websockets.exceptions.ConnectionClosed:
+         pass
+      finally:
+         self.clients.discard(client)
+         self.subscriptions.remove(client.websocket)
+
+   async def reply(self, client, name, body, reference=None):
+      if reference != None:
+         body['reference'] = reference
+      await client.websocket.send(json.dumps({ name : body }))
+
+   def sendToAccount(self, account, message):
+      self.subscriptions.publish(('account', account.email), message)
+
+   async def processRequest(self, client, request):
+      name = next(iter(request))
+      body = request[name]
+      reference = body.get('reference')
+
+      if name not in PUBLIC_REQUESTS:
+         if name == 'authorize' and not client.public:
+            await self.authorize(client, body)
+            return
+         if client.account == None:
+            logging.warning(f"[Simulator] unauthorized request: {request}")
+            return
+
+      account = client.account
+      if name == 'subscribe':
+         product = body['product_type']
+         self.exchange.checkProduct(product)
+         self.subscriptions.add(('market_data', product), client.websocket)
+         await self.reply(client, name, { 'success' : True })
+         await self.reply(client, 'market_data', self.exchange.getMarketData(product))
+
+      elif name == 'session_open':
+         product = body['product_type']
+         self.exchange.checkProduct(product)
+         self.subscriptions.add(('session', product), client.websocket)
+         await self.reply(client, name, self.exchange.sessions[product].toOpenJson())
+
+      elif name == 'subscribe_dealer_offers':
+         product = body['product_type']
+         self.exchange.checkProduct(product)
+         self.subscriptions.add(('dealer_offers', product), client.websocket)
+         await self.reply(client, name, { 'success' : True })
+         await self.reply(client, 'dealer_offers', self.exchange.getDealerOffers(product))
+
+      elif name == 'get_chyrons':
+         await self.reply(client, 'chyrons', { 'items' : [] })
+
+      elif name == 'product_fee':
+         product = body['product_type']
+         self.exchange.checkProduct(product)
+         await self.reply(client, name, { 'product_type' : product,
+            'fee' : self.exchange.sessions[product].feeTaker }, reference)
+
+      elif name == 'load_balance':
+         await self.reply(client, name, account.toBalanceJson())
+
+      elif name == 'load_orders':
+         orders = self.exchange.loadOrders(account, body['product_type'])
+         await self.reply(client, name, { 'orders' : orders }, reference)
+
+      elif name == 'submit_prices':
+         product = body['product_type']
+         self.exchange.submitPrices(account, product, body['prices'])
+         self.dirtyOffers.add(product)
+         await self.reply(client, name, { 'result' : 1 }, reference)
+
+      elif name == 'market_order':
+         await self.marketOrder(client, body)
+
+      elif name == 'load_withdrawals':
+         await self.reply(client, name, { 'withdrawals' : \
+            list(account.withdrawals.values()) }, reference)
+
+      elif name == 'load_deposits':
+         await self.reply(client, name, { 'deposits' : account.deposits }, reference)
+
+      elif name == 'load_addresses':
+         await self.reply(client, name, { 'addresses' : account.addresses }, reference)
+
+      elif name == 'load_deposit_address':
+         await self.reply(client, name, { 'address' : account.depositAddress }, reference)
+
+      elif name == 'withdraw_liquid':
+         await self.withdraw(client, body)
+
+      elif name == 'cancel_withdraw':
+         try:
+            withdrawal = self.exchange.cancelWithdrawal(account, body['id'])
+            result = dict(withdrawal, success=True)
+         except SimulatorException as e:
+            result = { 'id' : body['id'], 'status' : 0,
+               'success' : False, 'error_msg' : str(e) }
+         await self.reply(client, name, result, reference)
+         self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+
+      else:
+         logging.warning(f"[Simulator] unsupported request: {request}")
+
+   async def authorize(self, client, body):
+      email = self.tokens.get(body.get('token'))
+      if email == None:
+         await self.reply(client, 'authorize', { 'success' : False,
+            'error_msg' : 'invalid token' })
+         return
+
+      if client.account == None:
+         client.account = self.exchange.getAccount(email)
+         self.subscriptions.add(('account', email), client.websocket)
+      await self.reply(client, 'authorize', { 'success' : True, 'email' : email })
+
+   async def marketOrder(self, client, body):
+      try:
+         fills = self.exchange.marketOrder(client.account,
+            body['product_type'], int(body['side']), body['amount'])
+      except SimulatorException as e:
+         await self.reply(client, 'market_order', { 'success' : False,
+            'error_msg' : str(e) }, body.get('reference'))
+         return
+
+      await self.reply(client, 'market_order', { 'success' : True },
+         body.get('reference'))
+      for account, order in fills:
+         self.sendToAccount(account, { 'order_update' : {
+            'order' : order, 'action' : ORDER_ACTION_CREATED }})
+         self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+
+   async def withdraw(self, client, body):
+      account = client.account
+      try:
+         withdrawal = self.exchange.withdraw(account, body['address'],
+            body['currency'], body['amount'])
+      except SimulatorException as e:
+         await self.reply(client, 'withdraw_liquid', { 'id' : 0, 'status' : 0,
+            'success' : False, 'error_msg' : str(e) }, body.get('reference'))
+         return
+
+      await self.reply(client, 'withdraw_liquid', dict(withdrawal, success=True),
+         body.get('reference'))
+      self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+
+      withdrawalId = withdrawal['id']
+      def complete():
+         #cancelled withdrawals stay cancelled
+         completed = self.exchange.completeWithdrawal(account, withdrawalId)
+         if completed != None:
+            self.sendToAccount(account, { 'update_withdrawal' : completed })
+
+      asyncio.get_running_loop().call_later(
+         self.settings['withdrawal_delay'], complete)
+
+   def deposit(self, email, amount):
+      #funds an account from outside, as an on-chain deposit would
+      account = self.exchange.getAccount(email)
+      deposit = self.exchange.deposit(account, amount)
+      self.sendToAccount(account, { 'update_deposit' : deposit })
+      self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+      return deposit
+
+   ## loops ##
+   async def sessionLoop(self):
+      while True:
+         now = self.exchange.clock.time()
+         nextCutOff = min(session.cutOffAt for session in self.exchange.sessions.values())
+         if nextCutOff > now:
+            await asyncio.sleep(nextCutOff - now)
+            continue
+
+         for product, session in list(self.exchange.sessions.items()):
+            if session.cutOffAt <= now:
+               self.rollSession(product)
+
+   def rollSession(self, product):
+      closed, session, updates = self.exchange.rollSession(product)
+      self.subscriptions.publish(('session', product),
+         { 'session_closed' : closed.toCloseJson() })
+      self.subscriptions.publish(('session', product),
+         { 'session_open' : session.toOpenJson() })
+
+      for account, order in updates:
+         self.sendToAccount(account, { 'order_update' : {
+            'order' : order, 'action' : ORDER_ACTION_CREATED }})
+      for account in self.exchange.accounts.values():
+         self.sendToAccount(account, { 'load_balance' : account.toBalanceJson() })
+
+   async def marketDataLoop(self):
+      while True:
+         await asyncio.sleep(self.settings['market_data_interval'])
+         for product in self.exchange.sessions:
+            self.exchange.moveIndexPrice(product)
+            self.subscriptions.publish(('market_data', product),
+               { 'market_data' : self.exchange.getMarketData(product) })
+
+   async def offersLoop(self):
+      #quotes coalesce between publications, thousands of subscribers
+      #get the latest offers at a bounded rate
+      while True:
+         await asyncio.sleep(self.settings['offers_interval'])
+         dirty = self.dirtyOffers
+         self.dirtyOffers = set()
+         for product in dirty:
+            self.subscriptions.publish(('dealer_offers', product),
+               { 'dealer_offers' : self.exchange.getDealerOffers(product) })
@@ -1,27 +1,28 @@
-import time
+import asyncio
+import sys
 from datetime import datetime
 
 from Factories.StatusReporter.Factory import Factory, MAKER, TAKER
 from Factories.Definitions import Position, Balance, Ready, \
-   PriceEvent, Rebalance
+   PriceEvent, Rebalance, Supervision, Memory
 
 class LocalReporter(Factory):
    #### setup ####
-   def __init__(self, config):
-      super().__init__(config)
+   def __init__(self, config, clock=None):
+      super().__init__(config, clock)
 
-   def getAsyncIOTask(self):
-      return None
-
-   #### print statements ####
-   def printReady(self):
-      print (f"-- STATUS: {datetime.fromtimestamp(time.time())} --")
+   #### renderers ####
+   #these render the report, the terminal write happens off the loop
+   def renderReady(self):
+      lines = [f"-- STATUS: {datetime.fromtimestamp(self.clock.time())} --"]
       for state in self.state:
-         print(state)
-      print ("")
+         lines.append(str(state))
+      lines.append(f"  time to ready: {self.getTimeToReadyStr()}")
+      lines.append("")
+      return lines
 
-   def printBalances(self):
-      print (f"++ WALLETS: {datetime.fromtimestamp(time.time())} ++")
+   def renderBalances(self):
+      lines = [f"++ WALLETS: {datetime.fromtimestamp(self.clock.time())} ++"]
       makerBalance = self.balances[MAKER]
       takerBalance = self.balances[TAKER]
       if makerBalance is None:
@@ -33,45 +34,85 @@ class LocalReporter(Factory):
       else:
          takerBalance = str(takerBalance)
       final = makerBalance + " +\n" + takerBalance
-      print (final)
+      lines.append(final)
+      return lines
 
-   def printPositions(self):
-      print (f"** POSITIONS: {datetime.fromtimestamp(time.time())} **")
+   def renderPositions(self):
+      lines = [f"** POSITIONS: {datetime.fromtimestamp(self.clock.time())} **"]
       final = str(self.positions[MAKER]) + " *\n" + str(self.positions[TAKER])
-      print (final)
-
-   def printPriceEvent(self):
-      print (f"$$ PRICE UPDATE: {datetime.fromtimestamp(time.time())} $$")
-
-      print (" $  - PNL:")
-      print (self.positions[MAKER].getPnlReport())
-      print (self.positions[TAKER].getPnlReport())
-      print (" $\n $  - OFFERS:")
-      print (self.offers)
-
-   def printRebalance(self):
-      print (f"-- REBALANCE: {datetime.fromtimestamp(time.time())} --")
-
-      print (str(self.rebalance))
-      print ("")
+      lines.append(final)
+      return lines
+
+   def renderPriceEvent(self):
+      lines = [f"$$ PRICE UPDATE: {datetime.fromtimestamp(self.clock.time())} $$"]
+
+      lines.append(" $  - PNL:")
+      lines.append(self.positions[MAKER].getPnlReport())
+      lines.append(self.positions[TAKER].getPnlReport())
+      lines.append(" $\n $  - OFFERS:")
+      lines.append(str(self.offers))
+      lines.append(" $\n $  - EVENT SCHEDULER:")
+      lines.append(str(self.scheduler))
+      return lines
+
+   def renderRebalance(self):
+      lines = [f"-- REBALANCE: {datetime.fromtimestamp(self.clock.time())} --"]
+
+      lines.append(str(self.rebalance))
+      lines.append("")
+      return lines
+
+   def renderSupervision(self):
+      lines = [f"!! COMPONENTS: {datetime.fromtimestamp(self.clock.time())} !!"]
+      for component in self.components:
+         lines.append(f"  - {component}")
+      lines.append("")
+      return lines
+
+   def renderMemory(self):
+      lines = [f"## MEMORY: {datetime.fromtimestamp(self.clock.time())} ##"]
+      lines.append(str(self.memory))
+      lines.append("")
+      return lines
+
+   @staticmethod
+   def write(text):
+      sys.stdout.write(text)
+      sys.stdout.flush()
 
    #### report override ####
    async def report(self, notification):
       try:
+         lines = None
          if notification == Ready:
-            self.printReady()
+            lines = self.renderReady()
 
          elif notification == Balance:
-            self.printBalances()
+            lines = self.renderBalances()
 
          elif notification == Position:
-            self.printPositions()
+            lines = self.renderPositions()
 
          elif notification == PriceEvent:
-            self.printPriceEvent()
+            lines = self.renderPriceEvent()
 
          elif notification == Rebalance:
-            self.printRebalance()
+            lines = self.renderRebalance()
+
+         elif notification == Supervision:
+            lines = self.renderSupervision()
+
+         elif notification == Memory:
+            lines = self.renderMemory()
+
+         if lines == None:
+            return
+         if self.label != None:
+            lines[0] = f"[{self.label}] {lines[0]}"
+
+         #a slow terminal should only hold up this reporter
+         loop = asyncio.get_running_loop()
+         await loop.run_in_executor(None, self.write, "\n".join(lines) + "\n")
 
       except Exception as e:
          print (f"failed to print report of type \"{notification}\""
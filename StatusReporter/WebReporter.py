@@ -3,8 +3,6 @@ from Factories.Definitions import Position, Balance, Ready
 
 import websockets, asyncio, traceback, logging, json
 import datetime
-import ssl
-import certifi
 
 class DataProxyObject:
    def __init__(self):
@@ -12,6 +10,9 @@ class DataProxyObject:
       self.ready_state = None
       self.balances = None
       self.positions = None
+      self.memory = None
+      self.scheduler = None
+      self.time_to_ready = None
    
 from json import JSONEncoder
 from decimal import Decimal
@@ -25,12 +26,16 @@ class DataEncoder(JSONEncoder):
         return obj.__dict__ 
 
 class WebReporter(Factory):
-   def __init__(self, config):
+   def __init__(self, config, clock=None):
       self._connection = None
       self._buffer = []
-      super().__init__(config)
+      super().__init__(config, clock)
 
    async def connect(self):
+        #tls setup is only needed once the exporter connects
+        import ssl
+        import certifi
+
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
         ssl_context.load_verify_locations(certifi.where())
         ssl_context.load_cert_chain(self.config["exporter_service"]["client_cert"])
@@ -76,6 +81,8 @@ class WebReporter(Factory):
        obj = DataProxyObject()
        obj.ready_state = self.state
        obj.dealer_id = self.config["exporter_service"].get("name")
+       if self.label != None:
+          obj.dealer_id = f"{obj.dealer_id}:{self.label}"
        
        balance = {} 
        pos = {}
@@ -92,20 +99,40 @@ class WebReporter(Factory):
          pos[TAKER] = self.positions[TAKER].__dict__ 
    
        obj.positions = pos
+       obj.memory = self.memory
+       obj.scheduler = self.scheduler
+       obj.time_to_ready = self.timeToReady
 
        return obj
 
+   def getMemoryGauges(self):
+      gauges = Factory.getMemoryGauges(self)
+      gauges['buffer'] = len(self._buffer)
+      return gauges
+
    async def flushBuffer(self):
       for data in self._buffer:
          await self.sendMessage(data)
       self._buffer.clear()
 
    def getAsyncIOTask(self):
-      return asyncio.create_task(self.connect())
+      return asyncio.create_task(self.run())
+
+   async def run(self):
+      #the exporter connection drives the reporter's lifetime
+      drainTask = None
+      if self.ownsQueue:
+         drainTask = asyncio.create_task(self.drainQueue())
+      try:
+         await self.connect()
+      finally:
+         if drainTask != None:
+            drainTask.cancel()
 
    async def report(self, __):
       if not self._connection:
-         self._buffer.append(self.createDataProxy())
+         #proxies carry the full state, only the latest one matters
+         self._buffer = [self.createDataProxy()]
          return
       
       await self.flushBuffer()
@@ -0,0 +1,110 @@
+import unittest
+import asyncio
+import os
+import tempfile
+
+from Benchmarks.Cases import getCases
+from Benchmarks.Suite import BenchmarkCase, BenchmarkResult, BenchmarkRunner, \
+   BenchmarkException, saveResults, loadResults, compareResults
+
+################################################################################
+class CountingCase(BenchmarkCase):
+   def __init__(self, name, slow=False):
+      self.name = name
+      self.slow = slow
+      self.calls = 0
+
+   def run(self):
+      self.calls += 1
+
+class AsyncCase(CountingCase):
+   async def run(self):
+      self.calls += 1
+
+##
+def getResults(values):
+   return { name : BenchmarkResult(name, value, 10, 5) \
+      for name, value in values.items() }
+
+################################################################################
+##
+#### Benchmark tests
+##
+################################################################################
+class TestBenchmarks(unittest.TestCase):
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, "results.json")
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   def test_runner(self):
+      cases = [CountingCase('a.sync'), AsyncCase('a.async'),
+         CountingCase('b.slow', slow=True)]
+      runner = BenchmarkRunner(cases, repeat=2, minBatchTime=0.001)
+
+      results = runner.run()
+      self.assertEqual(sorted(results), ['a.async', 'a.sync'])
+      for case in cases[:2]:
+         result = results[case.name]
+         #calibration grew the batch, then 2 timed batches
+         self.assertGreater(result.number, 1)
+         self.assertEqual(result.repeat, 2)
+         self.assertGreaterEqual(case.calls, result.number * 2)
+         self.assertGreater(result.nsPerCall, 0)
+      self.assertEqual(cases[2].calls, 0)
+
+      #slow cases time a single call
+      results = runner.run('b.*', slow=True)
+      self.assertEqual(list(results), ['b.slow'])
+      self.assertEqual(results['b.slow'].number, 1)
+      self.assertEqual(cases[2].calls, 1)
+
+   def test_save_load(self):
+      results = getResults({ 'a' : 100, 'b' : 2000.5 })
+      saveResults(self.path, results)
+      loaded = loadResults(self.path)
+      self.assertEqual(sorted(loaded), ['a', 'b'])
+      self.assertEqual(loaded['b'].nsPerCall, 2000.5)
+      self.assertEqual(loaded['b'].number, 10)
+
+      with open(self.path, 'w') as resultFile:
+         resultFile.write('{ "version" : 0, "results" : {} }')
+      with self.assertRaises(BenchmarkException):
+         loadResults(self.path)
+
+   def test_compare(self):
+      baseline = getResults({ 'faster' : 100, 'within' : 100,
+         'slower' : 100, 'gone' : 100 })
+      results = getResults({ 'faster' : 50, 'within' : 120,
+         'slower' : 130, 'new' : 100 })
+
+      comparisons = { c.name : c for c in compareResults(baseline, results, 0.25) }
+      self.assertEqual(sorted(comparisons),
+         ['faster', 'gone', 'new', 'slower', 'within'])
+      self.assertEqual(comparisons['faster'].regressed, False)
+      self.assertEqual(comparisons['within'].regressed, False)
+      self.assertEqual(comparisons['slower'].regressed, True)
+      self.assertAlmostEqual(comparisons['slower'].ratio, 1.3)
+      self.assertEqual(comparisons['gone'].regressed, False)
+      self.assertEqual(comparisons['new'].regressed, False)
+      self.assertIn('REGRESSED', str(comparisons['slower']))
+      self.assertIn('(new)', str(comparisons['new']))
+
+   def test_cases(self):
+      #every case sets up and runs against the current code
+      cases = getCases()
+      names = [case.name for case in cases]
+      self.assertEqual(len(names), len(set(names)))
+      self.assertIn('order_book.process_update[250]', names)
+      self.assertIn('dispatch.order_update', names)
+
+      for case in cases:
+         if case.slow:
+            continue
+         case.setup()
+         if case.isAsync():
+            asyncio.run(case.run())
+         else:
+            case.run()
@@ -0,0 +1,66 @@
+import unittest
+import asyncio
+import time
+
+from leverex_core.clock import WallClock, MonotonicClock, \
+   SimulatedClock, NS_PER_SEC
+
+################################################################################
+##
+#### Clock tests
+##
+################################################################################
+class TestClock(unittest.IsolatedAsyncioTestCase):
+   def test_wall_clock(self):
+      clock = WallClock()
+      assert abs(clock.time() - time.time()) < 1
+      assert abs(MonotonicClock().time() - time.monotonic()) < 1
+
+   def test_simulated_time(self):
+      clock = SimulatedClock(5 * NS_PER_SEC)
+      assert clock.time() == 5
+      assert clock.monotonic() == 5
+
+      #never goes backwards
+      clock.advance(3 * NS_PER_SEC)
+      assert clock.time_ns() == 5 * NS_PER_SEC
+
+      clock.forward(0.5)
+      assert clock.time() == 5.5
+
+   async def test_simulated_sleep(self):
+      clock = SimulatedClock()
+      woken = []
+      async def sleeper(name, seconds):
+         await clock.sleep(seconds)
+         woken.append(name)
+
+      tasks = [
+         asyncio.create_task(sleeper('a', 2)),
+         asyncio.create_task(sleeper('b', 1))
+      ]
+      await asyncio.sleep(0)
+      assert clock.getNextDeadline() == NS_PER_SEC
+
+      assert clock.forward(0.5) == 0
+      await asyncio.sleep(0)
+      assert woken == []
+
+      assert clock.forward(0.5) == 1
+      await asyncio.sleep(0)
+      assert woken == ['b']
+
+      assert clock.forward(5) == 1
+      await asyncio.gather(*tasks)
+      assert woken == ['b', 'a']
+      assert clock.getNextDeadline() == None
+
+   async def test_cancelled_sleeper(self):
+      clock = SimulatedClock()
+      task = asyncio.create_task(clock.sleep(1))
+      await asyncio.sleep(0)
+      task.cancel()
+      await asyncio.sleep(0)
+
+      assert clock.getNextDeadline() == None
+      assert clock.forward(1) == 0
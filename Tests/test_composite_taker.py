@@ -0,0 +1,178 @@
+import unittest
+from decimal import Decimal
+
+from .tools import TestTaker, TestMaker
+from leverex_core.utils import Order, SIDE_BUY, SIDE_SELL
+from Factories.Definitions import double_eq
+from Factories.Provider.Composite import CompositeTaker
+from Hedger.SimpleHedger import SimpleHedger
+from Factories.Dealer.Factory import DealerFactory
+
+################################################################################
+##
+#### Composite taker tests
+##
+################################################################################
+class TestCompositeTaker(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : False,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   async def asyncSetUp(self):
+      self.maker = TestMaker(startBalance=10000)
+      self.venue1 = TestTaker(startBalance=1500)
+      self.venue2 = TestTaker(startBalance=500)
+      self.taker = CompositeTaker([self.venue1, self.venue2])
+      self.dealer = DealerFactory(self.maker, self.taker,
+         SimpleHedger(self.config))
+      await self.dealer.run()
+      await self.dealer.waitOnReady()
+
+      await self.venue1.populateOrderBook(10)
+      await self.venue2.populateOrderBook(4)
+
+   async def test_composite_book(self):
+      #levels from both venues, best price first
+      asks = self.taker.order_book.get_levels(True)
+      self.assertEqual(asks[0], (10002.5, 0.125))
+      self.assertEqual(asks[1], (10005, 0.25))
+      self.assertEqual(asks[2], (10006.25, 0.3125))
+      self.assertEqual(len(asks), 10)
+
+      offer = self.taker.order_book.get_aggregated_bid_price(0.3)
+      self.assertEqual(offer.volume, 0.375)
+      self.assertTrue(double_eq(offer.price, (9997.5 * 0.125 + 9995 * 0.25) / 0.375))
+
+      #quotes come off the merged book
+      self.assertGreater(len(self.maker.offers[-1]), 0)
+
+      #a venue going down drops out of the book, the composite routes
+      #around it
+      await self.venue2.setExplicitState(False)
+      self.assertEqual(len(self.taker.order_book.get_levels(True)), 5)
+      self.assertTrue(self.taker.isReady())
+      self.assertGreater(len(self.maker.offers[-1]), 0)
+
+      #down once every venue is
+      await self.venue1.setExplicitState(False)
+      self.assertFalse(self.taker.isReady())
+      self.assertIn(self.venue2.name, self.taker.getStatusStr())
+
+   async def test_hedge_split(self):
+      await self.maker.newOrder(Order(id=1, timestamp=0,
+         quantity=1, price=10000, side=SIDE_BUY))
+
+      #exposure is netted across venues
+      self.assertTrue(double_eq(self.taker.getExposure(), -1))
+
+      #venue2's best bids are taken until its collateral runs out,
+      #venue1 takes the rest
+      self.assertTrue(double_eq(self.venue2.getExposure(), -500 / 1500))
+      self.assertTrue(double_eq(self.venue1.getExposure(), -1 + 500 / 1500))
+      self.assertEqual(len(self.taker.lastSplit), 2)
+
+      #unwinding needs no collateral, both venues get flat
+      await self.maker.newOrder(Order(id=2, timestamp=0,
+         quantity=1, price=10000, side=SIDE_SELL))
+      self.assertTrue(double_eq(self.taker.getExposure(), 0))
+      self.assertTrue(double_eq(self.venue1.getExposure(), 0))
+      self.assertTrue(double_eq(self.venue2.getExposure(), 0))
+
+   async def test_dust(self):
+      #a hedge that fits the best level isn't split
+      await self.maker.newOrder(Order(id=1, timestamp=0,
+         quantity=0.1, price=10000, side=SIDE_BUY))
+      self.assertEqual(list(self.taker.lastSplit), [self.venue2])
+      self.assertTrue(double_eq(self.venue2.getExposure(), -0.1))
+      self.assertTrue(double_eq(self.venue1.getExposure(), 0))
+
+   async def test_unready_venue(self):
+      #hedges skip a venue that is down, its exposure still nets
+      await self.venue2.setExplicitState(False)
+      await self.maker.newOrder(Order(id=1, timestamp=0,
+         quantity=0.1, price=10000, side=SIDE_BUY))
+      self.assertEqual(list(self.taker.lastSplit), [self.venue1])
+      self.assertTrue(double_eq(self.venue1.getExposure(), -0.1))
+      self.assertEqual(self.venue2.exposure, 0)
+      self.assertTrue(double_eq(self.taker.getExposure(), -0.1))
+
+   async def test_queued_hedge(self):
+      #hedger out of the way, exposure targets are set by hand
+      self.dealer.setActive(False)
+
+      #venue2 is in its cooldown, the targets it gets are queued
+      queued = []
+      async def queue(exposure):
+         queued.append(Decimal(exposure))
+      self.venue2.updateExposure = queue
+      self.venue2.getPendingExposure = lambda: queued[-1] if queued else None
+      self.venue2.cancelPendingExposure = queued.clear
+
+      rooms = { self.venue1 : Decimal(0), self.venue2 : Decimal(1) }
+      self.taker.getVenueRoom = lambda venue, isBuy, exposure: rooms[venue]
+      await self.taker.updateExposure(Decimal('-0.1'))
+      self.assertEqual(queued, [Decimal('-0.1')])
+      self.assertEqual(self.venue2.exposure, 0)
+
+      #the book moved on, venue1 takes the next hedge but only the part
+      #venue2's queued target doesn't cover
+      rooms = { self.venue1 : Decimal(1), self.venue2 : Decimal(0) }
+      await self.taker.updateExposure(Decimal('-0.15'))
+      self.assertEqual(list(self.taker.lastSplit), [self.venue1])
+      self.assertTrue(double_eq(self.venue1.getExposure(), -0.05))
+      self.assertEqual(queued, [Decimal('-0.1')])
+
+      #venue2 goes down before its cooldown is up, its queued target is
+      #dropped and venue1 covers the whole hedge
+      await self.venue2.setExplicitState(False)
+      await self.taker.updateExposure(Decimal('-0.15'))
+      self.assertEqual(queued, [])
+      self.assertTrue(double_eq(self.venue1.getExposure(), -0.15))
+
+   async def test_dust_room(self):
+      #dust only folds into the largest slice as far as its room goes
+      rooms = { self.venue1 : Decimal('0.5'), self.venue2 : Decimal('0.00005') }
+      self.taker.getVenueRoom = lambda venue, isBuy, exposure: rooms[venue]
+      split = self.taker.splitHedge(Decimal('-0.50005'))
+      self.assertEqual(split, { self.venue1 : Decimal('-0.5') })
+
+      #it all folds when there is room for it
+      rooms[self.venue1] = Decimal(1)
+      split = self.taker.splitHedge(Decimal('-0.50005'))
+      self.assertEqual(split, { self.venue1 : Decimal('-0.50005') })
+
+   def test_reload(self):
+      class Venue(object):
+         reloadable_settings = { 'bitfinex' : [ 'max_collateral_deviation' ] }
+         def __init__(self):
+            self.leverage = 1
+            self.collateral_pct = 100
+            self.max_collateral_deviation = 1
+            self.cashOps = None
+            self.chainAddresses = None
+         def reloadConfig(self, config):
+            self.max_collateral_deviation = \
+               config['bitfinex']['max_collateral_deviation']
+
+      venues = [Venue(), Venue()]
+      taker = CompositeTaker(venues)
+      self.assertEqual(taker.reloadable_settings, Venue.reloadable_settings)
+
+      #per venue overrides still apply
+      taker.reloadConfig({ 'bitfinex' : { 'max_collateral_deviation' : 2 },
+         'takers' : [ {}, { 'max_collateral_deviation' : 5 } ] })
+      self.assertEqual(venues[0].max_collateral_deviation, 2)
+      self.assertEqual(venues[1].max_collateral_deviation, 5)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
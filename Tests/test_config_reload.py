@@ -0,0 +1,198 @@
+import unittest
+import asyncio
+import copy
+import json
+import os
+import signal
+import tempfile
+
+from .tools import TestTaker, TestMaker
+from Hedger.SimpleHedger import SimpleHedger
+from Factories.Dealer.Factory import DealerFactory
+from Factories.Dealer.ConfigReloader import getChangedSettings
+from Factories.Dealer.MultiDealer import MultiDealer, getProductConfigs
+from Factories.Definitions import double_eq
+
+################################################################################
+##
+#### Config reload tests
+##
+################################################################################
+class TestConfigReload(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : True,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   def setUp(self):
+      fd, self.configPath = tempfile.mkstemp()
+      os.close(fd)
+      self.writeConfig(self.config)
+
+   def tearDown(self):
+      os.remove(self.configPath)
+
+   def writeConfig(self, config):
+      with open(self.configPath, 'w') as configFile:
+         json.dump(config, configFile)
+
+   async def createDealer(self):
+      self.maker = TestMaker(startBalance=1000)
+      self.taker = TestTaker(startBalance=1500)
+      self.hedger = SimpleHedger(copy.deepcopy(self.config))
+      dealer = DealerFactory(self.maker, self.taker, self.hedger,
+         configFile=self.configPath)
+      await dealer.run()
+      await dealer.waitOnReady()
+      await self.taker.populateOrderBook(10)
+      return dealer
+
+   def test_changed_settings(self):
+      newConfig = copy.deepcopy(self.config)
+      newConfig['hedger']['price_ratio'] = 0.02
+      newConfig['hedger']['offer_refresh_delay_ms'] = 100
+      del newConfig['rebalance']['min_amount']
+      newConfig['log_level'] = 'LOG'
+      self.assertEqual(getChangedSettings(self.config, newConfig), [
+         ('hedger', 'offer_refresh_delay_ms'),
+         ('hedger', 'price_ratio'),
+         ('log_level', None),
+         ('rebalance', 'min_amount')])
+
+   async def test_reload_requotes(self):
+      dealer = await self.createDealer()
+      offers0 = self.maker.offers[-1]
+      self.assertTrue(double_eq(offers0[0].ask, 10010.42 * 1.01))
+      offerCount = len(self.maker.offers)
+
+      newConfig = copy.deepcopy(self.config)
+      newConfig['hedger']['price_ratio'] = 0.02
+      newConfig['hedger']['max_offer_volume'] = 0.5
+      newConfig['rebalance']['enable'] = False
+      self.writeConfig(newConfig)
+
+      reloader = dealer.configReloader
+      self.assertTrue(await reloader.reload())
+      self.assertEqual(reloader.reloadCount, 1)
+
+      #new settings applied and pushed right away
+      self.assertEqual(self.hedger.price_ratio, 0.02)
+      self.assertEqual(self.hedger.max_offer_volume, 0.5)
+      self.assertFalse(self.hedger.rebalMan.enabled)
+      self.assertEqual(len(self.maker.offers), offerCount + 1)
+      offers1 = self.maker.offers[-1]
+      self.assertTrue(double_eq(offers1[0].volume, 0.5))
+      self.assertLess(offers1[0].bid, offers0[0].bid)
+      self.assertGreater(offers1[0].ask, offers0[0].ask)
+
+      #nothing changed, nothing to do
+      self.assertTrue(await reloader.reload())
+      self.assertEqual(reloader.reloadCount, 1)
+
+   async def test_invalid_reload(self):
+      dealer = await self.createDealer()
+      reloader = dealer.configReloader
+      offerCount = len(self.maker.offers)
+
+      #missing required entry
+      newConfig = copy.deepcopy(self.config)
+      del newConfig['hedger']['quote_ratio']
+      newConfig['hedger']['price_ratio'] = 0.02
+      self.writeConfig(newConfig)
+      self.assertFalse(await reloader.reload())
+
+      #setting that needs a restart
+      newConfig = copy.deepcopy(self.config)
+      newConfig['leverex'] = { 'product' : 'ethusd_rf' }
+      self.writeConfig(newConfig)
+      self.assertFalse(await reloader.reload())
+
+      #wrong type
+      newConfig = copy.deepcopy(self.config)
+      newConfig['hedger']['price_ratio'] = "0.02"
+      self.writeConfig(newConfig)
+      self.assertFalse(await reloader.reload())
+
+      #broken json
+      with open(self.configPath, 'w') as configFile:
+         configFile.write("{")
+      self.assertFalse(await reloader.reload())
+
+      #nothing was applied
+      self.assertEqual(reloader.failedCount, 4)
+      self.assertEqual(reloader.reloadCount, 0)
+      self.assertEqual(self.hedger.price_ratio, 0.01)
+      self.assertEqual(len(self.maker.offers), offerCount)
+
+   async def test_sighup(self):
+      dealer = await self.createDealer()
+      reloader = dealer.configReloader
+      await asyncio.sleep(0)
+
+      newConfig = copy.deepcopy(self.config)
+      newConfig['hedger']['quote_ratio'] = 0.1
+      self.writeConfig(newConfig)
+      os.kill(os.getpid(), signal.SIGHUP)
+      for i in range(50):
+         if reloader.reloadCount > 0:
+            break
+         await asyncio.sleep(0.01)
+
+      self.assertEqual(reloader.reloadCount, 1)
+      self.assertEqual(self.hedger.quote_ratio, 0.1)
+      dealer.supervisor.stop()
+
+   async def test_multi_dealer_reload(self):
+      config = copy.deepcopy(self.config)
+      config['products'] = [
+         { 'leverex' : { 'product' : 'xbtusd_rf' },
+            'bitfinex' : { 'product' : 'tBTCF0:USTF0' }},
+         { 'leverex' : { 'product' : 'ethusd_rf' },
+            'bitfinex' : { 'product' : 'tETHF0:USTF0' }}]
+      self.writeConfig(config)
+
+      dealers = {}
+      configs = {}
+      for productConfig in getProductConfigs(config):
+         product = productConfig['leverex']['product']
+         configs[product] = productConfig
+         dealers[product] = DealerFactory(TestMaker(startBalance=1000),
+            TestTaker(startBalance=1500), SimpleHedger(productConfig))
+      multiDealer = MultiDealer(dealers, configs=configs,
+         configFile=self.configPath)
+      await multiDealer.run()
+      await multiDealer.waitOnReady()
+      reloader = multiDealer.configReloader
+
+      #per product overrides are applied to their own dealer
+      config['products'][1]['hedger'] = { 'price_ratio' : 0.02 }
+      self.writeConfig(config)
+      self.assertTrue(await reloader.reload())
+      self.assertEqual(dealers['xbtusd_rf'].hedger.price_ratio, 0.01)
+      self.assertEqual(dealers['ethusd_rf'].hedger.price_ratio, 0.02)
+
+      #so are base config changes, to every product
+      config['hedger']['quote_ratio'] = 0.1
+      self.writeConfig(config)
+      self.assertTrue(await reloader.reload())
+      for dealer in dealers.values():
+         self.assertEqual(dealer.hedger.quote_ratio, 0.1)
+      self.assertEqual(reloader.reloadCount, 2)
+
+      #products can't be swapped on a running process
+      config['products'][1]['leverex']['product'] = 'bchusd_rf'
+      self.writeConfig(config)
+      self.assertFalse(await reloader.reload())
+      multiDealer.stop()
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import asyncio
 
-from Factories.Definitions import AggregationOrderBook
+from Factories.Definitions import AggregationOrderBook, ReadinessTracker, \
+   InitBarrier
 
 ################################################################################
 ##
@@ -80,3 +82,64 @@ class TestOrderBook(unittest.TestCase):
       result = orderBook.get_aggregated_bid_price(10)
       self.assertEqual(result.price, 9923.75)
       self.assertEqual(result.volume, 8)
+
+################################################################################
+##
+#### Readiness tests
+##
+################################################################################
+class TestReadiness(unittest.IsolatedAsyncioTestCase):
+   async def test_waiters_resume_on_ready(self):
+      tracker = ReadinessTracker("test")
+      state = {'ready': False}
+      isReady = lambda: state['ready']
+
+      waiter = asyncio.create_task(tracker.wait(isReady))
+      await asyncio.sleep(0)
+      self.assertFalse(waiter.done())
+      self.assertEqual(tracker.timeToReady, None)
+
+      state['ready'] = True
+      tracker.update(True)
+      await asyncio.sleep(0)
+      self.assertTrue(waiter.done())
+      self.assertIsNotNone(tracker.timeToReady)
+      self.assertEqual(tracker.readyCount, 1)
+
+      #going down and back up keeps the first time to ready
+      firstTimeToReady = tracker.timeToReady
+      tracker.update(False)
+      self.assertFalse(tracker.isSet())
+      tracker.update(True)
+      self.assertEqual(tracker.timeToReady, firstTimeToReady)
+      self.assertEqual(tracker.readyCount, 2)
+
+   async def test_unnotified_state(self):
+      #components that don't report their state are picked up on wait
+      tracker = ReadinessTracker("test")
+      await asyncio.wait_for(tracker.wait(lambda: True), 0.05)
+      self.assertTrue(tracker.isSet())
+
+   async def test_init_barrier(self):
+      barrier = InitBarrier("test")
+      await asyncio.wait_for(barrier.wait(), 0.05)
+
+      async def slowLoad(delay):
+         await asyncio.sleep(delay)
+
+      barrier.add('reply')
+      waiter = asyncio.create_task(barrier.wait())
+      await asyncio.gather(
+         barrier.run('load1', slowLoad(0.05)),
+         barrier.run('load2', slowLoad(0.05)))
+
+      #loads ran concurrently, the barrier still waits on the reply
+      timings = barrier.getTimings()
+      self.assertLess(timings['load1'] + timings['load2'], 0.2)
+      self.assertEqual(timings['reply'], None)
+      self.assertFalse(waiter.done())
+
+      barrier.done('reply')
+      await asyncio.wait_for(waiter, 0.05)
+      self.assertTrue(barrier.isDone())
+      self.assertIsNotNone(barrier.getTimings()['reply'])
@@ -0,0 +1,195 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import websockets
+
+from FanOut.Service import FanOutService, Subscriber, SUBSCRIBER_QUEUE_LEN
+from FanOut.Client import BfxFanOutClient
+from leverex_core.api_connection import PublicApiConnection
+from Factories.Definitions import AggregationOrderBook
+
+################################################################################
+##
+#### Fan-out service tests
+##
+################################################################################
+class FakeUpstream(object):
+   def __init__(self):
+      self.server = None
+      self.requests = []
+      self.sockets = []
+
+   async def start(self):
+      self.server = await websockets.serve(self.handler, '127.0.0.1', 0)
+      port = self.server.sockets[0].getsockname()[1]
+      return f"ws://127.0.0.1:{port}"
+
+   async def stop(self):
+      self.server.close()
+      await self.server.wait_closed()
+
+   async def handler(self, websocket):
+      self.sockets.append(websocket)
+      async for data in websocket:
+         request = json.loads(data)
+         self.requests.append(request)
+         if request.get('event') == 'subscribe':
+            reply = dict(request)
+            reply['event'] = 'subscribed'
+            reply['chanId'] = len(self.requests)
+            await websocket.send(json.dumps(reply))
+
+   async def push(self, message):
+      for websocket in self.sockets:
+         await websocket.send(json.dumps(message))
+
+####
+class PublicListener(object):
+   def __init__(self):
+      self.prices = []
+
+   def on_public_connected(self):
+      pass
+
+   async def on_market_data(self, marketData):
+      self.prices.append(marketData['live_cutoff'])
+
+####
+class BookListener(object):
+   def __init__(self):
+      self.order_book = AggregationOrderBook()
+      self.status = None
+
+   def on_order_book_snapshot(self, data):
+      self.order_book.reset()
+      self.order_book.setup_from_snapshot(data['data'])
+
+   async def on_order_book_update(self, data):
+      self.order_book.process_update(data['data'])
+
+   async def on_status_update(self, status):
+      self.status = status
+
+####
+async def waitFor(condition, timeout=2):
+   for i in range(int(timeout / 0.01)):
+      if condition():
+         return
+      await asyncio.sleep(0.01)
+   raise TimeoutError()
+
+class TestFanOut(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.leverex = FakeUpstream()
+      self.bitfinex = FakeUpstream()
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.socketPath = os.path.join(self.tmpDir.name, 'fanout.sock')
+
+      config = {
+         'leverex': {'public_endpoint': await self.leverex.start()},
+         'fanout': {
+            'socket_path': self.socketPath,
+            'bitfinex_endpoint': await self.bitfinex.start()
+         }
+      }
+      self.service = FanOutService(config)
+      self.serviceTask = asyncio.create_task(self.service.run())
+      await waitFor(lambda: os.path.exists(self.socketPath) \
+         and len(self.leverex.sockets) == 1 and len(self.bitfinex.sockets) == 1)
+      self.tasks = []
+
+   async def asyncTearDown(self):
+      for task in self.tasks + [self.serviceTask]:
+         task.cancel()
+      await asyncio.gather(*self.tasks, self.serviceTask, return_exceptions=True)
+      await self.leverex.stop()
+      await self.bitfinex.stop()
+      self.tmpDir.cleanup()
+
+   async def connectPublic(self):
+      connection = PublicApiConnection(f"unix://{self.socketPath}")
+      listener = PublicListener()
+      self.tasks.append(asyncio.create_task(connection.run(listener)))
+      await waitFor(lambda: connection.websocket != None)
+      await connection.subscribe_to_product('xbtusd_rf')
+      return listener
+
+   async def test_leverex_single_upstream(self):
+      listener1 = await self.connectPublic()
+      listener2 = await self.connectPublic()
+      await waitFor(lambda: len(self.service.getFeed(('market_data', 'xbtusd_rf')).subscribers) == 2)
+
+      #one upstream subscription for both subscribers
+      self.assertEqual(len(self.leverex.requests), 1)
+
+      await self.leverex.push({'market_data': {'product_type': 'xbtusd_rf', 'live_cutoff': '10000'}})
+      await waitFor(lambda: len(listener1.prices) == 1 and len(listener2.prices) == 1)
+
+      #late joiners get the last value
+      listener3 = await self.connectPublic()
+      await waitFor(lambda: listener3.prices == ['10000'])
+      self.assertEqual(len(self.leverex.requests), 1)
+
+   async def test_leverex_request_dropped_on_disconnect(self):
+      websocket = await websockets.unix_connect(self.socketPath)
+      await websocket.send(json.dumps({'product_fee':
+         {'product_type': 'xbtusd_rf', 'reference': 'fee_1'}}))
+      await waitFor(lambda: len(self.service.leverex._requests_cb) == 1)
+
+      #the reply never came, the subscriber's pending request goes
+      #away with it
+      await websocket.close()
+      await waitFor(lambda: len(self.service.leverex._requests_cb) == 0)
+
+   async def test_slow_subscriber(self):
+      class BrokenSocket(object):
+         closeCount = 0
+         async def close(self):
+            self.closeCount += 1
+            raise ConnectionResetError("socket gone")
+
+      #a subscriber that can't keep up is closed once, a failing close
+      #is logged rather than lost
+      subscriber = Subscriber(self.service, BrokenSocket())
+      for i in range(SUBSCRIBER_QUEUE_LEN + 2):
+         subscriber.push("data")
+      self.assertTrue(subscriber.dropped)
+      with self.assertLogs(level='WARNING'):
+         await subscriber.closeTask
+      self.assertEqual(subscriber.websocket.closeCount, 1)
+
+   async def test_bitfinex_book_snapshot_on_join(self):
+      symbol = 'tTESTBTCF0:TESTUSDTF0'
+      client1 = BfxFanOutClient(self.socketPath)
+      listener1 = BookListener()
+      self.tasks.append(asyncio.create_task(client1.run(listener1)))
+      await client1.subscribeBook(symbol, len=25, prec='P0')
+      await client1.subscribeStatus(symbol)
+      await waitFor(lambda: len(self.bitfinex.requests) == 2)
+
+      await self.bitfinex.push([1, [[100, 1, 1.0], [101, 1, -2.0]]])
+      await self.bitfinex.push([1, [99, 2, 3.0]])
+      await self.bitfinex.push([1, [101, 0, -1]])
+      await self.bitfinex.push([1, 'hb'])
+      await self.bitfinex.push([2, [0, None, 10050, 10040] + [None] * 10 + [10045]])
+      await waitFor(lambda: listener1.status != None)
+
+      self.assertEqual(listener1.order_book._bids, {100: 1.0, 99: 3.0})
+      self.assertEqual(listener1.order_book._asks, {})
+      self.assertEqual(listener1.status['deriv_price'], 10050)
+      self.assertEqual(self.service.getFeed(('bfx_book', symbol)).seq, 3)
+
+      #second subscriber resyncs from the service's book
+      client2 = BfxFanOutClient(self.socketPath)
+      listener2 = BookListener()
+      self.tasks.append(asyncio.create_task(client2.run(listener2)))
+      await client2.subscribeBook(symbol, len=25, prec='P0')
+      await waitFor(lambda: len(listener2.order_book._bids) == 2)
+      self.assertEqual(listener2.order_book._bids, {100: 1.0, 99: 3.0})
+      self.assertEqual(len(self.bitfinex.requests), 2)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
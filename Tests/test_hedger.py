@@ -1,5 +1,6 @@
 #import pdb; pdb.set_trace()
 import unittest
+import asyncio
 import copy
 
 from .tools import TestTaker, TestMaker, price
@@ -8,6 +9,7 @@ from leverex_core.utils import Order, SIDE_BUY, SIDE_SELL, \
 from Factories.Definitions import Balance, double_eq
 from Hedger.SimpleHedger import SimpleHedger
 from Factories.Dealer.Factory import DealerFactory
+from leverex_core.clock import SimulatedClock, NS_PER_SEC
 
 ################################################################################
 ##
@@ -81,6 +83,41 @@ class TestHedger(unittest.IsolatedAsyncioTestCase):
       await maker.setConnected(False)
       assert len(maker.offers) == 5
 
+   async def test_offers_refresh(self):
+      #unchanged offers are pushed again every 5 seconds
+      clock = SimulatedClock(1000 * NS_PER_SEC)
+      maker = TestMaker()
+      taker = TestTaker()
+      hedger = SimpleHedger(self.config, clock)
+      dealer = DealerFactory(maker, taker, hedger)
+      await dealer.run()
+      await dealer.waitOnReady()
+
+      await taker.updateBalance(15000)
+      await taker.populateOrderBook(10)
+      await maker.updateBalance(10000)
+      pushCount = len(maker.offers)
+      assert len(maker.offers[-1]) == 1
+      assert maker.offers[-1][0]._timestamp == 1000 * 1000
+
+      offersTask = asyncio.create_task(hedger.offersLoop())
+      await asyncio.sleep(0)
+      assert len(maker.offers) == pushCount
+
+      clock.forward(4.9)
+      await asyncio.sleep(0)
+      assert len(maker.offers) == pushCount
+
+      clock.forward(0.1)
+      await asyncio.sleep(0)
+      assert len(maker.offers) == pushCount + 1
+      assert maker.offers[-1] is hedger.offers
+
+      clock.forward(5)
+      await asyncio.sleep(0)
+      assert len(maker.offers) == pushCount + 2
+      offersTask.cancel()
+
    async def test_offers_volume(self):
       taker = TestTaker(startBalance=1500)
       maker = TestMaker(startBalance=1000)
@@ -401,6 +438,33 @@ class TestHedger(unittest.IsolatedAsyncioTestCase):
       await maker.setOpenPrice(10100)
       assert double_eq(taker.targetCollateral, 606)
 
+   async def test_rebalance_setup_timings(self):
+      #a maker that only sends its address request, the reply comes later
+      class DeferredMaker(TestMaker):
+         async def loadAddresses(self, callback):
+            self.addressReply = callback
+
+      taker = TestTaker(startBalance=1500, addr="mnop")
+      maker = DeferredMaker(startBalance=1000)
+      hedger = SimpleHedger(self.config)
+      dealer = DealerFactory(maker, taker, hedger)
+      await dealer.run()
+      await dealer.waitOnReady()
+
+      #the barrier waits on the reply, not the send
+      barrier = hedger.rebalMan.initBarrier
+      timings = barrier.getTimings()
+      self.assertEqual(timings['maker addresses'], None)
+      self.assertEqual(timings['taker addresses'], None)
+      self.assertNotEqual(timings['maker withdrawals'], None)
+      self.assertFalse(barrier.isDone())
+
+      await asyncio.sleep(0.01)
+      await TestMaker.loadAddresses(maker, maker.addressReply)
+      timings = barrier.getTimings()
+      self.assertGreaterEqual(timings['maker addresses'], 0.01)
+      self.assertTrue(barrier.isDone())
+
    async def test_rebalance_target(self):
       #setup taker and maker
       taker = TestTaker(startBalance=1500)
@@ -918,6 +982,34 @@ class TestHedger(unittest.IsolatedAsyncioTestCase):
       assert target.taker.toWithdraw['amount'] == 200
       assert taker.withdrawalHist[0]['status'] == WithdrawInfo.WITHDRAW_COMPLETED
 
+   async def test_rebalance_standby(self):
+      localConfig = copy.deepcopy(self.config)
+      localConfig['rebalance']['threshold_pct'] = 0.02
+
+      #same setup as the maker cancellation case, exposures match
+      taker = TestTaker(startBalance=2000, addr="efgh")
+      maker = TestMaker(startBalance=800, pendingWithdrawals=[200])
+      hedger = SimpleHedger(localConfig)
+      dealer = DealerFactory(maker, taker, hedger)
+      dealer.setActive(False)
+      await dealer.run()
+      await dealer.waitOnReady()
+
+      #a standby loads addresses and withdrawals but moves no funds
+      assert hedger.isReady() == True
+      assert hedger.rebalMan.canWithdraw() == True
+      assert hedger.rebalMan.target == None
+      assert maker.cancelWithdrawalsRequested == None
+      assert len(maker.withdrawalsToPush) == 0
+      assert len(taker.withdrawalsToPush) == 0
+
+      await dealer.onBalanceEvent()
+      assert maker.cancelWithdrawalsRequested == None
+
+      #the primary's job once it takes over
+      await dealer.takeOver()
+      assert maker.cancelWithdrawalsRequested != None
+
    async def test_rebalance_target_with_taker_cancellation(self):
       localConfig = copy.deepcopy(self.config)
       localConfig['rebalance']['threshold_pct'] = 0.02
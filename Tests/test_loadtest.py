@@ -0,0 +1,112 @@
+import unittest
+
+from LoadTest.Harness import LoadTest, LoadTestException, parseRates
+from LoadTest.Servers import BookWalker, QuoteTracker
+from LoadTest.Stats import RateSchedule, StepStats, getPercentile, \
+   STREAM_BOOK, STREAM_MARKET_DATA, STREAM_DEALER_OFFERS, STREAM_ORDER_UPDATE
+
+################################################################################
+##
+#### Load test tests
+##
+################################################################################
+class TestLoadTest(unittest.TestCase):
+   def test_schedule(self):
+      schedule = RateSchedule({ STREAM_BOOK : 100, STREAM_MARKET_DATA : 5 },
+         [1, 2, 4], 10, start=1000)
+      self.assertEqual(schedule.getStepCount(), 3)
+      self.assertEqual(schedule.getStep(999), None)
+      self.assertEqual(schedule.getStep(1000), 0)
+      self.assertEqual(schedule.getStep(1015), 1)
+      self.assertEqual(schedule.getStep(1030), None)
+      self.assertEqual(schedule.getEnd(), 1030)
+      self.assertEqual(schedule.getRate(STREAM_BOOK, 2), 400)
+      self.assertEqual(schedule.getRate(STREAM_ORDER_UPDATE, 2), 0)
+      self.assertEqual(schedule.getTotalRate(1), 210)
+
+   def test_stats(self):
+      stats = StepStats()
+      other = StepStats()
+      StepStats.count(stats.sent, STREAM_BOOK, 10)
+      StepStats.count(other.sent, STREAM_BOOK, 5)
+      StepStats.count(other.processed, STREAM_BOOK, 4)
+      other.quoteLatency = [0.1, 0.2]
+      stats.merge(other)
+      self.assertEqual(stats.getSent(), 15)
+      self.assertEqual(stats.getProcessed(), 4)
+      self.assertEqual(stats.quoteLatency, [0.1, 0.2])
+
+      self.assertEqual(getPercentile([], 50), None)
+      self.assertEqual(getPercentile(list(range(1, 101)), 50), 50)
+      self.assertEqual(getPercentile(list(range(1, 101)), 99), 99)
+      self.assertEqual(getPercentile([3], 99), 3)
+
+   def test_book_walker(self):
+      book = BookWalker(10000, 3)
+      snapshot = book.getSnapshot()
+      self.assertEqual(len(snapshot), 6)
+
+      #the new top goes in before the old one goes out
+      deltas = book.tick()
+      self.assertEqual(deltas, [[10040, 1, -100], [10020, 0, -1]])
+      self.assertEqual(book.topAsk, 10040)
+      deltas = book.tick()
+      self.assertEqual(deltas, [[10000, 1, 100], [9980, 0, 1]])
+      self.assertLess(book.topBid, book.topAsk)
+
+   def test_quote_tracker(self):
+      tracker = QuoteTracker(0.01)
+      stats = StepStats()
+      tracker.onTick(1.0, 100, 90)
+      tracker.onTick(2.0, 101, 90)
+      tracker.onTick(3.0, 102, 90)
+
+      #prices the second tick, the first one was coalesced into it
+      tracker.onQuote(2.5, [{ 'volume' : '1', 'ask' : '102.01', 'bid' : '89.1' }], stats)
+      self.assertEqual(stats.quoteLatency, [0.5])
+      self.assertEqual(stats.coalescedTicks, 1)
+
+      #refreshes of the same prices aren't matched
+      tracker.onQuote(2.6, [{ 'volume' : '1', 'ask' : '102.01', 'bid' : '89.1' }], stats)
+      self.assertEqual(stats.unmatchedQuotes, 0)
+
+      tracker.onQuote(3.5, [{ 'volume' : '1', 'ask' : '200' }], stats)
+      self.assertEqual(stats.unmatchedQuotes, 1)
+
+      tracker.onQuote(3.75, [{ 'volume' : '1', 'ask' : '103.02' },
+         { 'volume' : '2', 'bid' : '89.1' }], stats)
+      self.assertEqual(stats.quoteLatency, [0.5, 0.75])
+      self.assertEqual(len(tracker.ticks), 0)
+
+   def test_parse_rates(self):
+      rates = parseRates('book=500, market_data=1')
+      self.assertEqual(rates[STREAM_BOOK], 500)
+      self.assertEqual(rates[STREAM_MARKET_DATA], 1)
+      self.assertIn(STREAM_DEALER_OFFERS, rates)
+
+      with self.assertRaises(LoadTestException):
+         parseRates('trades=10')
+
+   def test_run(self):
+      #a short ramp, the dealer keeps up with this load
+      loadTest = LoadTest(rates={ STREAM_BOOK : 40, STREAM_MARKET_DATA : 4,
+         STREAM_DEALER_OFFERS : 4, STREAM_ORDER_UPDATE : 2 },
+         multipliers=[1, 2], stepDuration=1.5, warmup=2)
+      report = loadTest.run()
+
+      self.assertEqual(len(report.steps), 2)
+      for step in report.steps:
+         stats = step.stats
+         self.assertGreater(stats.getSent(), 0)
+         for stream in [STREAM_BOOK, STREAM_MARKET_DATA,
+            STREAM_DEALER_OFFERS, STREAM_ORDER_UPDATE]:
+            self.assertGreater(stats.processed.get(stream, 0), 0)
+         self.assertGreater(stats.quotes, 0)
+         self.assertGreater(len(stats.quoteLatency), 0)
+         self.assertGreater(len(stats.loopLag), 0)
+      self.assertGreater(sum(len(step.stats.hedgeLatency) \
+         for step in report.steps), 0)
+
+      result = report.toJson()
+      self.assertEqual(len(result['steps']), 2)
+      self.assertIn('quote p50/p99', str(report))
@@ -0,0 +1,197 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import os
+import tempfile
+import websockets
+from jwcrypto import jwk, jws
+
+from leverex_core.login_connection import LoginSession, \
+   LoginServiceClientWS, LoginConnectionException, getLoginSession
+
+################################################################################
+##
+#### Login session tests
+##
+################################################################################
+class FakeLoginServer(object):
+   def __init__(self):
+      self.server = None
+      self.connectionCount = 0
+      self.requests = []
+      self.dropNext = False
+      self.garbleNext = False
+
+   async def start(self):
+      self.server = await websockets.serve(self.handler, '127.0.0.1', 0)
+      port = self.server.sockets[0].getsockname()[1]
+      return f"ws://127.0.0.1:{port}"
+
+   async def stop(self):
+      self.server.close()
+      await self.server.wait_closed()
+
+   async def handler(self, websocket):
+      self.connectionCount += 1
+      async for data in websocket:
+         request = json.loads(data)
+         self.requests.append(request)
+
+         if self.dropNext:
+            #close the socket without replying
+            self.dropNext = False
+            await websocket.close()
+            return
+
+         if self.garbleNext:
+            #reply with something that isn't json
+            self.garbleNext = False
+            await websocket.send("not json")
+            continue
+
+         reply = {
+            'message_id': request['message_id'],
+            'method': request['method'],
+            'error': None,
+            'data': {
+               'access_token': f"token_{len(self.requests)}",
+               'expires_in': 600
+            }
+         }
+         await websocket.send(json.dumps(reply))
+
+class TestLoginSession(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.server = FakeLoginServer()
+      self.endpoint = await self.server.start()
+
+   async def asyncTearDown(self):
+      await self.server.stop()
+
+   async def test_connection_reuse(self):
+      session = LoginSession(self.endpoint)
+      client = LoginServiceClientWS(None, self.endpoint, session=session)
+      assert session.isConnected() == False
+
+      #successive renewals go over the same socket
+      token = await client.update_access_token("token_0")
+      assert token['access_token'] == "token_1"
+      token = await client.update_access_token(token['access_token'])
+      assert token['access_token'] == "token_2"
+      assert self.server.connectionCount == 1
+      assert session.isConnected() == True
+
+      #concurrent requests are multiplexed by message id
+      tokens = await asyncio.gather(
+         client.update_access_token("a"),
+         client.update_access_token("b"),
+         client.update_access_token("c"))
+      assert len(set([t['access_token'] for t in tokens])) == 3
+      assert self.server.connectionCount == 1
+
+      await session.close()
+
+   async def test_shared_session(self):
+      session = LoginSession(self.endpoint)
+      client1 = LoginServiceClientWS(None, self.endpoint, session=session)
+      client2 = LoginServiceClientWS(None, self.endpoint, session=session)
+
+      await client1.update_access_token("token_0")
+      await client2.update_access_token("token_0")
+      assert client1.get_session() is client2.get_session()
+      assert self.server.connectionCount == 1
+
+      await session.close()
+
+   async def test_reconnect(self):
+      session = LoginSession(self.endpoint)
+      client = LoginServiceClientWS(None, self.endpoint, session=session)
+      await client.update_access_token("token_0")
+      assert self.server.connectionCount == 1
+
+      #server drops the socket mid request, the request is retried
+      #on a new connection
+      self.server.dropNext = True
+      token = await client.update_access_token("token_1")
+      assert token['access_token'] == "token_3"
+      assert self.server.connectionCount == 2
+
+      #no retries left, the failure is reported
+      self.server.dropNext = True
+      with self.assertRaises(LoginConnectionException):
+         await session.request({'method': "renew", 'api': "login",
+            'args': {}}, retries=0)
+
+      await session.close()
+
+   async def test_read_failure(self):
+      session = LoginSession(self.endpoint)
+
+      #an unreadable reply fails the pending request and drops the socket
+      self.server.garbleNext = True
+      with self.assertRaises(LoginConnectionException):
+         await session.request({'method': "renew", 'api': "login",
+            'args': {}}, retries=0)
+      assert session.isConnected() == False
+
+      #the next request reconnects
+      reply = await session.request({'method': "renew", 'api': "login",
+         'args': {}}, retries=0)
+      assert reply['data']['access_token'] == "token_2"
+      assert self.server.connectionCount == 2
+
+      await session.close()
+
+   def test_shared_session_logging(self):
+      endpoint = "wss://dump_communication"
+      session = getLoginSession(endpoint)
+      assert session._dump_communication == False
+      assert getLoginSession(endpoint, dump_communication=True) is session
+      assert session._dump_communication == True
+
+   async def test_presigned_challenge(self):
+      #create a throw away key
+      key = jwk.JWK.generate(kty='EC', crv='P-256')
+      with tempfile.NamedTemporaryFile('wb', suffix='.pem', delete=False) as keyFile:
+         keyFile.write(key.export_to_pem(private_key=True, password=None))
+         keyPath = keyFile.name
+
+      try:
+         session = LoginSession(self.endpoint)
+         client = LoginServiceClientWS(keyPath, self.endpoint, session=session)
+
+         #challenge is signed and the session opened ahead of login
+         client.prepare_login("wss://api")
+         await asyncio.sleep(0.1)
+         assert session.isConnected() == True
+
+         #key material isn't hashed again at login
+         with patch.object(jwk.JWK, 'thumbprint') as thumbprint:
+            token = await client.logMeIn("wss://api")
+            thumbprint.assert_not_called()
+         assert token['access_token'] == "token_1"
+
+         #check the challenge signature
+         challenge = self.server.requests[0]['args']['signed_challenge']
+         verifier = jws.JWS()
+         verifier.deserialize(challenge)
+         verifier.verify(key)
+         payload = json.loads(verifier.payload)
+         assert payload['thumbprint'] == key.thumbprint()
+         assert payload['service_url'] == "wss://api"
+
+         #prepared challenges only apply to their endpoint
+         client.prepare_login("wss://other_api")
+         abandoned = client._challenge['task']
+         await client.logMeIn("wss://api")
+         assert abandoned.cancelled()
+         assert client._challenge == None
+         verifier = jws.JWS()
+         verifier.deserialize(self.server.requests[1]['args']['signed_challenge'])
+         verifier.verify(key)
+         assert json.loads(verifier.payload)['service_url'] == "wss://api"
+
+         await session.close()
+      finally:
+         os.remove(keyPath)
@@ -0,0 +1,103 @@
+import unittest
+import asyncio
+import time
+
+from leverex_core.api_connection import PublicApiConnection
+from leverex_core.loop_monitor import LoopMonitor, getLoopMonitor
+from Factories.Dealer.Factory import DealerFactory
+from Factories.Definitions import Position, OrderBook
+
+################################################################################
+def blockingCallback(duration):
+   time.sleep(duration)
+   return duration
+
+async def waitingCallback(duration):
+   await asyncio.sleep(duration)
+
+################################################################################
+##
+#### Loop monitor tests
+##
+################################################################################
+class TestLoopMonitor(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.monitor = LoopMonitor(threshold=0.02, interval=0.01)
+      self.task = self.monitor.getAsyncIOTask()
+      await asyncio.sleep(0.05)
+
+   async def asyncTearDown(self):
+      self.task.cancel()
+      await asyncio.gather(self.task, return_exceptions=True)
+      self.monitor.watchdog.join(1)
+
+   async def test_blocking_callback(self):
+      connection = PublicApiConnection('ws://localhost', monitor=self.monitor)
+      with self.assertLogs(level='WARNING') as logs:
+         await connection._call_listener_cb(blockingCallback, 0.1)
+         await asyncio.sleep(0.02)
+
+      self.assertEqual(self.monitor.slowCallbacks, 1)
+      self.assertGreaterEqual(self.monitor.stalls, 1)
+      self.assertGreater(self.monitor.lag.max, 0.05)
+
+      #the watchdog caught the line the loop was stuck on
+      message = logs.output[0]
+      self.assertIn("blockingCallback (leverex_public)", message)
+      self.assertIn("loop stalled in", message)
+      self.assertIn("time.sleep(duration)", message)
+
+   async def test_waiting_callback(self):
+      #awaits don't stall the loop, no stack to blame
+      with self.assertLogs(level='WARNING') as logs:
+         await self.monitor.call('orderbook', waitingCallback, 0.1)
+      self.assertEqual(self.monitor.slowCallbacks, 1)
+      self.assertEqual(self.monitor.stalls, 0)
+      self.assertIn("waitingCallback (orderbook)", logs.output[0])
+      self.assertIn("defined at", logs.output[0])
+
+      #fast ones go unreported, sync or not
+      self.assertEqual(await self.monitor.call('orderbook', blockingCallback, 0), 0)
+      await self.monitor.call('orderbook', waitingCallback, 0)
+      self.assertEqual(self.monitor.slowCallbacks, 1)
+
+   async def test_wrap(self):
+      #wrapped callbacks stay sync or async
+      wrapped = self.monitor.wrap('status_update', blockingCallback)
+      self.assertFalse(asyncio.iscoroutinefunction(wrapped))
+      with self.assertLogs(level='WARNING'):
+         self.assertEqual(wrapped(0.05), 0.05)
+      self.assertEqual(self.monitor.slowCallbacks, 1)
+
+      wrapped = self.monitor.wrap('status_update', waitingCallback)
+      self.assertTrue(asyncio.iscoroutinefunction(wrapped))
+      await wrapped(0)
+
+      #dealers sharing the monitor share its task
+      self.assertEqual(self.monitor.getAsyncIOTask(), self.task)
+
+   async def test_dealer_events(self):
+      dealer = DealerFactory(None, None, None, loopMonitor=self.monitor)
+      processed = []
+      async def processEvent(provider, eventType):
+         processed.append(eventType)
+         if eventType == Position:
+            #an event queued behind this one lands here
+            await dealer.onEvent(None, OrderBook)
+            await asyncio.sleep(0.05)
+      dealer.processEvent = processEvent
+
+      #each event is timed on its own processing, under its own type
+      with self.assertLogs(level='WARNING') as logs:
+         await dealer.onEvent(None, Position)
+      self.assertEqual(processed, [Position, OrderBook])
+      self.assertEqual(self.monitor.slowCallbacks, 1)
+      self.assertIn(f"({Position})", logs.output[0])
+
+########
+class TestLoopMonitorConfig(unittest.TestCase):
+   def test_config(self):
+      self.assertEqual(getLoopMonitor({}), None)
+      monitor = getLoopMonitor({ 'loop_monitor' : { 'threshold' : 0.1 }})
+      self.assertEqual(monitor.threshold, 0.1)
+      self.assertEqual(getLoopMonitor({ 'loop_monitor' : {}}), monitor)
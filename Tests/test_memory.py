@@ -0,0 +1,106 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import tracemalloc
+
+from .tools import TestTaker, TestMaker
+from Factories.Definitions import Memory
+from Factories.StatusReporter.Factory import Factory
+from Factories.Dealer.Factory import DealerFactory
+from Hedger.SimpleHedger import SimpleHedger
+from leverex_core.memory import MemoryMonitor, MemoryReport, MemoryTracker
+from leverex_core.utils import Announcements
+
+################################################################################
+def allocateLeak(leak):
+   for i in range(1000):
+      leak.append(f"leaked entry {i}")
+
+class MemoryReporter(Factory):
+   def __init__(self, config):
+      super().__init__(config)
+      self.reports = []
+
+   async def report(self, notification):
+      if notification == Memory:
+         self.reports.append(self.memory)
+
+################################################################################
+##
+#### Memory diagnostics tests
+##
+################################################################################
+class TestMemory(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : False,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   async def asyncSetUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.wasTracing = tracemalloc.is_tracing()
+
+   async def asyncTearDown(self):
+      if not self.wasTracing:
+         tracemalloc.stop()
+      self.tmpDir.cleanup()
+
+   async def test_snapshot_diff(self):
+      tracker = MemoryTracker(self.tmpDir.name, top=5)
+      self.assertEqual(tracker.snapshot(), None)
+      self.assertTrue(tracemalloc.is_tracing())
+
+      leak = []
+      allocateLeak(leak)
+      path = tracker.snapshot()
+      with open(path) as output:
+         diff = output.read()
+      self.assertIn('allocateLeak', diff)
+      self.assertIn('test_memory.py', diff)
+
+      #the next diff is against the latest snapshot
+      self.assertNotEqual(tracker.snapshot(), path)
+      self.assertEqual(len(os.listdir(self.tmpDir.name)), 2)
+
+      report = MemoryReport({ 'leak' : len(leak) })
+      self.assertNotEqual(report.traced, None)
+      self.assertIn("- leak: 1000", str(report))
+
+   async def test_dealer_reports(self):
+      maker = TestMaker(startBalance=1000)
+      taker = TestTaker(startBalance=1000)
+      hedger = SimpleHedger(self.config)
+      reporter = MemoryReporter(self.config)
+      monitor = MemoryMonitor(MemoryTracker(self.tmpDir.name), 0.01)
+      dealer = DealerFactory(maker, taker, hedger, [reporter],
+         memoryMonitor=monitor)
+      await dealer.run()
+      await dealer.waitOnReady()
+
+      await asyncio.sleep(0.05)
+      self.assertEqual(monitor.callbacks, [dealer.onMemoryTick])
+      dealer.stop()
+      self.assertGreater(len(reporter.reports), 0)
+
+      #a restarted dealer replaces the stopped one's callback
+      self.assertEqual(monitor.callbacks, [])
+
+      gauges = reporter.reports[-1].gauges
+      self.assertEqual(gauges[f"{maker.name}.cash_ops"], 0)
+      self.assertEqual(gauges[f"{taker.name}.cash_ops"], 0)
+      self.assertEqual(gauges["MemoryReporter.report_queue"], 0)
+      self.assertIn("tx_tracker.transactions", gauges)
+
+   def test_gauges(self):
+      announcements = Announcements()
+      announcements.processUpdate({ 'items' : [] })
+      self.assertEqual(announcements.getMemoryGauges(), { 'chyrons' : 0 })
@@ -0,0 +1,217 @@
+import unittest
+import asyncio
+
+from .tools import TestTaker, TestMaker
+from leverex_core.utils import Order, SIDE_BUY
+from Factories.Definitions import ConfigException, Ready, double_eq, overlayConfig
+from Factories.StatusReporter.Factory import Factory
+from Factories.Dealer.MultiDealer import MultiDealer, getProductConfigs
+from Hedger.SimpleHedger import SimpleHedger
+from Factories.Dealer.Factory import DealerFactory
+
+################################################################################
+##
+#### Multi product dealer tests
+##
+################################################################################
+class RecordingReporter(Factory):
+   def __init__(self, config):
+      super().__init__(config)
+      self.reports = []
+
+   async def report(self, notification):
+      self.reports.append(notification)
+
+class RunningMaker(TestMaker):
+   #stays up like a live connection
+   async def bootstrap(self):
+      await super().bootstrap()
+      await asyncio.Event().wait()
+
+class FailingMaker(TestMaker):
+   async def bootstrap(self):
+      await super().bootstrap()
+      raise Exception("connection lost")
+
+class RunningTaker(TestTaker):
+   async def bootstrap(self):
+      await super().bootstrap()
+      await asyncio.Event().wait()
+
+class TestMultiDealer(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['leverex'] = {
+      'api_endpoint' : 'wss://api',
+      'login_endpoint' : 'wss://login',
+      'product' : 'xbtusd_rf'
+   }
+   config['bitfinex'] = {
+      'product' : 'tBTCF0:USTF0',
+      'collateral_pct' : 15
+   }
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : True,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   def test_product_configs(self):
+      config = dict(self.config)
+      config['products'] = [
+         {
+            'leverex' : { 'product' : 'xbtusd_rf' },
+            'bitfinex' : { 'product' : 'tBTCF0:USTF0' }
+         },
+         {
+            'leverex' : { 'product' : 'ethusd_rf' },
+            'bitfinex' : { 'product' : 'tETHF0:USTF0' },
+            'hedger' : { 'max_offer_volume' : 50 }
+         }
+      ]
+
+      configs = getProductConfigs(config)
+      self.assertEqual(len(configs), 2)
+      self.assertNotIn('products', configs[0])
+      self.assertEqual(configs[1]['leverex']['product'], 'ethusd_rf')
+      self.assertEqual(configs[1]['leverex']['api_endpoint'], 'wss://api')
+      self.assertEqual(configs[1]['bitfinex']['collateral_pct'], 15)
+      self.assertEqual(configs[1]['hedger']['max_offer_volume'], 50)
+      self.assertEqual(configs[0]['hedger']['max_offer_volume'], 5)
+
+      #only the first product rebalances the shared account
+      self.assertTrue(configs[0]['rebalance']['enable'])
+      self.assertFalse(configs[1]['rebalance']['enable'])
+      self.assertTrue(self.config['rebalance']['enable'])
+
+      #every entry names both products, once
+      config['products'].append({ 'leverex' : { 'product' : 'xbtusd_rf' },
+         'bitfinex' : { 'product' : 'tXBTF0:USTF0' } })
+      with self.assertRaises(ConfigException):
+         getProductConfigs(config)
+
+      config['products'][2] = { 'leverex' : { 'product' : 'bchusd_rf' } }
+      with self.assertRaises(ConfigException):
+         getProductConfigs(config)
+
+      #book mirrors can't be shared across products
+      config['products'].pop()
+      config['bitfinex'] = dict(config['bitfinex'])
+      config['bitfinex']['shared_book_path'] = '/tmp/book'
+      with self.assertRaises(ConfigException):
+         getProductConfigs(config)
+
+      config['products'][1] = overlayConfig(config['products'][1],
+         { 'bitfinex' : { 'shared_book_path' : '/tmp/book_eth' } })
+      configs = getProductConfigs(config)
+      self.assertEqual(configs[0]['bitfinex']['shared_book_path'], '/tmp/book')
+      self.assertEqual(configs[1]['bitfinex']['shared_book_path'], '/tmp/book_eth')
+
+   async def test_product_isolation(self):
+      dealers = {}
+      providers = {}
+      for product in ['xbtusd_rf', 'ethusd_rf']:
+         maker = TestMaker(startBalance=1000)
+         taker = TestTaker(startBalance=1500)
+         providers[product] = (maker, taker)
+         dealers[product] = DealerFactory(maker, taker,
+            SimpleHedger(self.config), [RecordingReporter(self.config)])
+
+      multiDealer = MultiDealer(dealers)
+      await multiDealer.run()
+      await multiDealer.waitOnReady()
+      self.assertTrue(multiDealer.isReady())
+
+      xbtMaker, xbtTaker = providers['xbtusd_rf']
+      ethMaker, ethTaker = providers['ethusd_rf']
+      await xbtTaker.populateOrderBook(10)
+      await ethTaker.populateOrderBook(10)
+
+      #an order on one product is only hedged on that product
+      await xbtMaker.newOrder(Order(id=1, timestamp=0,
+         quantity=0.1, price=10000, side=SIDE_BUY))
+      self.assertTrue(double_eq(xbtTaker.getExposure(), -0.1))
+      self.assertEqual(ethTaker.getExposure(), 0)
+
+      #a product going down leaves the other one quoting
+      await xbtMaker.setConnected(False)
+      self.assertEqual(len(xbtMaker.offers[-1]), 0)
+      self.assertTrue(dealers['ethusd_rf'].isReady())
+      self.assertIn("ethusd_rf: ready", multiDealer.getStatusStr())
+      self.assertGreater(len(ethMaker.offers[-1]), 0)
+
+      #all reporters share one queue and one drain task
+      reporters = [dealer.statusReporters[0] for dealer in dealers.values()]
+      for reporter in reporters:
+         self.assertIs(reporter.queue, multiDealer.reportQueue)
+         self.assertIsNone(reporter.getAsyncIOTask())
+      await asyncio.sleep(0.01)
+      self.assertEqual(len(multiDealer.reportQueue), 0)
+      for reporter in reporters:
+         self.assertIn(Ready, reporter.reports)
+         self.assertNotIn(None, reporter.timeToReady.values())
+         self.assertIn("TestMaker: ", reporter.getTimeToReadyStr())
+      self.assertEqual(reporters[1].label, 'ethusd_rf')
+
+      multiDealer.stop()
+
+   async def test_product_restart(self):
+      built = []
+      def createDealer(productConfig):
+         product = productConfig['leverex']['product']
+         makerType = RunningMaker
+         if product == 'xbtusd_rf' and len(built) == 0:
+            makerType = FailingMaker
+         dealer = DealerFactory(makerType(startBalance=1000),
+            RunningTaker(startBalance=1500), SimpleHedger(productConfig),
+            [RecordingReporter(productConfig)])
+         built.append(product)
+         return dealer
+
+      configs = {}
+      dealers = {}
+      for product in ['xbtusd_rf', 'ethusd_rf']:
+         configs[product] = overlayConfig(self.config,
+            { 'leverex' : { 'product' : product }})
+         dealers[product] = createDealer(configs[product])
+      failed = dealers['xbtusd_rf']
+      ethDealer = dealers['ethusd_rf']
+
+      multiDealer = MultiDealer(dealers, createDealer, configs, minBackoff=0.01)
+      task = asyncio.create_task(multiDealer.run())
+      for i in range(50):
+         if multiDealer.restarts.get('xbtusd_rf', 0) > 0 and \
+            multiDealer.dealers['xbtusd_rf'] is not failed:
+            break
+         await asyncio.sleep(0.01)
+
+      #the failed product was stopped and rebuilt once
+      self.assertEqual(multiDealer.restarts, { 'xbtusd_rf' : 1 })
+      self.assertEqual(built, ['xbtusd_rf', 'ethusd_rf', 'xbtusd_rf'])
+      await asyncio.sleep(0)
+      self.assertTrue(failed.supervisor.components[1].task.cancelled())
+
+      #the rebuilt dealer quotes on the shared report queue
+      newDealer = multiDealer.dealers['xbtusd_rf']
+      await newDealer.waitOnReady()
+      self.assertIs(newDealer.statusReporters[0].queue, multiDealer.reportQueue)
+
+      #the other product never went down
+      self.assertIs(multiDealer.dealers['ethusd_rf'], ethDealer)
+      self.assertTrue(ethDealer.isReady())
+      self.assertFalse(ethDealer.supervisor.components[0].task.done())
+
+      multiDealer.stop()
+      await asyncio.sleep(0)
+      self.assertTrue(ethDealer.supervisor.components[0].task.cancelled())
+      task.cancel()
+      await asyncio.gather(task, return_exceptions=True)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import asyncio
+
+from leverex_core.product_router import ProductRouter
+from leverex_core.api_connection import AuthApiConnection
+from leverex_core.utils import SessionOpenInfo, DealerOffers
+
+################################################################################
+##
+#### Product router tests
+##
+################################################################################
+class FakeConnection(object):
+   def __init__(self):
+      self.runCount = 0
+      self._monitor = None
+
+   async def _call_listener_cb(self, cb, *args, **kwargs):
+      await AuthApiConnection._call_listener_cb(self, cb, *args, **kwargs)
+
+   async def run(self, listener):
+      self.runCount += 1
+      await asyncio.sleep(0)
+
+class FakeListener(object):
+   def __init__(self):
+      self.events = []
+      self.connected = False
+
+   def on_connected(self):
+      self.connected = True
+
+   async def on_market_data(self, marketData):
+      self.events.append(('market_data', marketData))
+
+   async def on_session_open(self, sessionInfo):
+      self.events.append(('session_open', sessionInfo))
+
+   async def on_balance_update(self, balances):
+      self.events.append(('balance', balances))
+
+   async def on_dealer_offers(self, offers):
+      self.events.append(('dealer_offers', offers))
+
+   async def on_withdraw_update(self, withdrawInfo):
+      self.events.append(('withdraw', withdrawInfo))
+
+def getSessionOpen(product):
+   return SessionOpenInfo({
+      'product_type': product,
+      'cut_off_at': 0,
+      'last_cut_off_price': 10000,
+      'session_id': 1,
+      'previous_session_id': 0,
+      'healthy': True,
+      'fee_taker': 0,
+      'fee_maker': 0
+   })
+
+class TestProductRouter(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.connection = FakeConnection()
+      self.router = ProductRouter(self.connection)
+      self.xbt = FakeListener()
+      self.eth = FakeListener()
+      self.router.addListener('xbtusd_rf', self.xbt)
+      self.router.addListener('ethusd_rf', self.eth)
+
+   async def test_product_routing(self):
+      await self.router.on_market_data({'product_type': 'ethusd_rf', 'live_cutoff': '2000'})
+      await self.router.on_session_open(getSessionOpen('xbtusd_rf'))
+      await self.router.on_dealer_offers(DealerOffers({'product_type': 'xbtusd_rf'}))
+
+      self.assertEqual([e[0] for e in self.xbt.events], ['session_open', 'dealer_offers'])
+      self.assertEqual([e[0] for e in self.eth.events], ['market_data'])
+
+      #unknown or missing products are dropped, not broadcast
+      with self.assertLogs(level='WARNING'):
+         await self.router.on_market_data({'product_type': 'foo', 'live_cutoff': '1'})
+         await self.router.on_market_data({'live_cutoff': '1'})
+         await self.router.onSubmitPrices({'submit_prices': {'reference': 'ref'}})
+      self.assertEqual(len(self.xbt.events), 2)
+      self.assertEqual(len(self.eth.events), 1)
+
+   async def test_broadcast(self):
+      await self.router.on_connected()
+      await self.router.on_balance_update({'balances': []})
+      #listeners without the handler are skipped
+      await self.router.on_authorized()
+
+      for listener in [self.xbt, self.eth]:
+         self.assertTrue(listener.connected)
+         self.assertEqual(listener.events, [('balance', {'balances': []})])
+
+   async def test_account_owner(self):
+      #transfers are booked once, by the first product
+      await self.router.on_withdraw_update('withdrawal')
+      self.assertEqual(self.xbt.events, [('withdraw', 'withdrawal')])
+      self.assertEqual(self.eth.events, [])
+
+      #unless an account handler takes them
+      handler = FakeListener()
+      self.router.setAccountHandler(handler)
+      await self.router.on_withdraw_update('withdrawal')
+      self.assertEqual(handler.events, [('withdraw', 'withdrawal')])
+      self.assertEqual(len(self.xbt.events), 1)
+
+      #hooks the router doesn't know about aren't silently swallowed
+      self.assertFalse(hasattr(self.router, 'on_foo'))
+
+   async def test_listener_isolation(self):
+      #a listener raising out of a callback doesn't stop the others
+      async def broken(balances):
+         raise Exception("broken session")
+      self.xbt.on_balance_update = broken
+
+      await self.router.on_balance_update({'balances': []})
+      await self.router.on_market_data({'product_type': 'ethusd_rf', 'live_cutoff': '2000'})
+      self.assertEqual([e[0] for e in self.eth.events], ['balance', 'market_data'])
+
+   async def test_single_connection_task(self):
+      with self.assertRaises(Exception):
+         self.router.addListener('xbtusd_rf', FakeListener())
+
+      task1 = self.router.getAsyncIOTask()
+      task2 = self.router.getAsyncIOTask()
+      self.assertIs(task1, task2)
+      await task1
+      self.assertEqual(self.connection.runCount, 1)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
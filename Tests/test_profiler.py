@@ -0,0 +1,89 @@
+import unittest
+import asyncio
+import os
+import pstats
+import tempfile
+import time
+
+from leverex_core.profiler import Profiler, ProfilerException, \
+   MODE_SAMPLING, PROFILE_SIGNAL
+
+################################################################################
+def busyWork(duration):
+   end = time.monotonic() + duration
+   total = 0
+   while time.monotonic() < end:
+      total += 1
+   return total
+
+################################################################################
+##
+#### Profiler tests
+##
+################################################################################
+class TestProfiler(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+
+   async def asyncTearDown(self):
+      self.tmpDir.cleanup()
+
+   async def test_cprofile(self):
+      profiler = Profiler(self.tmpDir.name)
+      profiler.start()
+      with self.assertRaises(ProfilerException):
+         profiler.start()
+      busyWork(0.02)
+      path = profiler.stop()
+      self.assertEqual(profiler.stop(), None)
+
+      self.assertTrue(path.endswith('.pstats'))
+      stats = pstats.Stats(path)
+      functions = [function[2] for function in stats.stats]
+      self.assertIn('busyWork', functions)
+
+      #runs end on their own, each in its own file
+      profiler.start(0.01)
+      await asyncio.sleep(0.05)
+      self.assertFalse(profiler.isRunning())
+      self.assertNotEqual(profiler.lastOutput, path)
+      self.assertEqual(len(os.listdir(self.tmpDir.name)), 2)
+
+   async def test_sampling(self):
+      profiler = Profiler(self.tmpDir.name, MODE_SAMPLING, interval=0.001)
+      profiler.start()
+      busyWork(0.05)
+      path = profiler.stop()
+
+      self.assertTrue(path.endswith('.collapsed'))
+      with open(path) as output:
+         lines = output.read().splitlines()
+      self.assertGreater(len(lines), 0)
+      stack, count = lines[0].rsplit(' ', 1)
+      self.assertGreater(int(count), 0)
+      self.assertTrue(stack.endswith('test_profiler.py:busyWork'))
+
+   async def test_signal(self):
+      profiler = Profiler(self.tmpDir.name)
+      task = profiler.getAsyncIOTask()
+      await asyncio.sleep(0)
+
+      os.kill(os.getpid(), PROFILE_SIGNAL)
+      await asyncio.sleep(0.01)
+      self.assertTrue(profiler.isRunning())
+      os.kill(os.getpid(), PROFILE_SIGNAL)
+      await asyncio.sleep(0.01)
+      self.assertFalse(profiler.isRunning())
+      self.assertTrue(os.path.exists(profiler.lastOutput))
+
+      #stopping the task ends a pending run
+      os.kill(os.getpid(), PROFILE_SIGNAL)
+      await asyncio.sleep(0.01)
+      task.cancel()
+      await asyncio.gather(task, return_exceptions=True)
+      self.assertFalse(profiler.isRunning())
+      self.assertEqual(len(os.listdir(self.tmpDir.name)), 2)
+
+   def test_mode(self):
+      with self.assertRaises(ProfilerException):
+         Profiler(self.tmpDir.name, 'perf')
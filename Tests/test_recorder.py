@@ -0,0 +1,236 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+import leverex_core.recorder as recorder
+from leverex_core.recorder import EventRecorder, RecordReader, \
+   RecorderException, getRecorder, IN, OUT
+from leverex_core.api_connection import AuthApiConnection, PublicApiConnection
+
+################################################################################
+class FakeSocket(object):
+   def __init__(self, messages=[]):
+      self.sent = []
+      self.messages = list(messages)
+
+   async def send(self, data):
+      self.sent.append(data)
+
+   async def recv(self):
+      return self.messages.pop(0)
+
+class FakeListener(object):
+   def __init__(self):
+      self.marketData = []
+
+   async def on_market_data(self, data):
+      self.marketData.append(data)
+
+##
+def writeRecords(path, count, indexInterval=4):
+   rec = EventRecorder(path, indexInterval)
+   for i in range(count):
+      if i % 2 == 0:
+         rec.inbound('leverex', json.dumps({ 'seq' : i }))
+      else:
+         rec.outbound('bitfinex', json.dumps({ 'seq' : i }))
+   rec.close()
+   return rec
+
+################################################################################
+##
+#### Event recorder tests
+##
+################################################################################
+class TestRecorder(unittest.TestCase):
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, "events.rec")
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   def test_round_trip(self):
+      rec = writeRecords(self.path, 10)
+      self.assertEqual(rec.written, 10)
+      self.assertEqual(rec.dropped, 0)
+
+      records = list(RecordReader(self.path))
+      self.assertEqual(len(records), 10)
+      for i, record in enumerate(records):
+         self.assertEqual(record.json()['seq'], i)
+         if i % 2 == 0:
+            self.assertEqual(record.kind, IN)
+            self.assertEqual(record.stream, 'leverex')
+         else:
+            self.assertEqual(record.kind, OUT)
+            self.assertEqual(record.stream, 'bitfinex')
+
+      #timestamps are monotonic
+      timestamps = [record.timestamp for record in records]
+      self.assertEqual(timestamps, sorted(timestamps))
+
+   def test_index(self):
+      writeRecords(self.path, 10, indexInterval=4)
+      index = RecordReader(self.path).getIndex()
+
+      #2 full chunks and the tail written on close
+      self.assertEqual([entry[4] for entry in index], [4, 4, 2])
+      self.assertEqual(index[0][0], 0)
+      self.assertEqual(index[1][0] > 0, True)
+
+   def test_seek(self):
+      writeRecords(self.path, 10, indexInterval=4)
+      reader = RecordReader(self.path)
+      records = list(reader)
+
+      since = records[6].timestamp
+      result = list(reader.getMessages(since))
+      self.assertEqual(result[0].json()['seq'], 6)
+      self.assertEqual(result[-1].json()['seq'], 9)
+
+      #seek lands at the start of the chunk holding the timestamp
+      offset, streams = reader.seek(since)
+      self.assertEqual(offset, records[4].offset)
+      self.assertEqual(streams, { 0 : 'leverex', 1 : 'bitfinex' })
+
+   def test_mapped(self):
+      writeRecords(self.path, 10, indexInterval=4)
+      reader = RecordReader(self.path)
+      mapped = RecordReader(self.path, mapped=True)
+      self.assertEqual(mapped.isMapped(), True)
+
+      records = list(reader)
+      mappedRecords = list(mapped)
+      self.assertEqual([(r.offset, r.timestamp, r.stream, r.payload) for r in records],
+         [(r.offset, r.timestamp, r.stream, r.payload) for r in mappedRecords])
+      self.assertEqual(mapped.getIndex(), reader.getIndex())
+      self.assertEqual(mapped.seek(records[6].timestamp),
+         reader.seek(records[6].timestamp))
+
+      mapped.close()
+      self.assertEqual(mapped.isMapped(), False)
+
+   def test_mapped_truncated_tail(self):
+      writeRecords(self.path, 5)
+      size = os.path.getsize(self.path)
+      with open(self.path, 'r+b') as recordFile:
+         recordFile.truncate(size - 3)
+
+      reader = RecordReader(self.path, mapped=True)
+      self.assertEqual(len(list(reader)), 5)
+      reader.close()
+
+   def test_append_sessions(self):
+      writeRecords(self.path, 3)
+
+      #a second writer declares its own streams
+      rec = EventRecorder(self.path)
+      rec.outbound('bitfinex', '{"seq": 3}')
+      rec.close()
+
+      records = list(RecordReader(self.path))
+      self.assertEqual([r.json()['seq'] for r in records], [0, 1, 2, 3])
+      self.assertEqual(records[3].stream, 'bitfinex')
+
+   def test_truncated_tail(self):
+      writeRecords(self.path, 5)
+      size = os.path.getsize(self.path)
+      with open(self.path, 'r+b') as recordFile:
+         recordFile.truncate(size - 3)
+
+      #the index written on close is cut, every message survives
+      self.assertEqual(len(list(RecordReader(self.path))), 5)
+
+   def test_bad_file(self):
+      with open(self.path, 'wb') as recordFile:
+         recordFile.write(b'not a record file')
+      with self.assertRaises(RecorderException):
+         RecordReader(self.path)
+
+   def test_drops(self):
+      with patch.object(recorder, 'MAX_QUEUE_LEN', 2):
+         rec = EventRecorder(self.path)
+
+      #hold the writer thread back on the first message
+      release = threading.Event()
+      write = rec._write
+      def blockedWrite(item):
+         release.wait()
+         write(item)
+      rec._write = blockedWrite
+
+      rec.inbound('leverex', 'a')
+      while not rec.queue.empty():
+         time.sleep(0.001)
+      for i in range(10):
+         rec.inbound('leverex', 'b')
+      release.set()
+      rec.close()
+
+      self.assertEqual(rec.recorded, 3)
+      self.assertEqual(rec.dropped, 8)
+      self.assertEqual(rec.written, 3)
+      self.assertEqual(len(list(RecordReader(self.path))), 3)
+
+   def test_get_recorder(self):
+      self.assertEqual(getRecorder({}), None)
+
+      config = { 'recorder' : { 'path' : self.path } }
+      rec = getRecorder(config)
+      self.assertIs(getRecorder(config), rec)
+      rec.close()
+      recorder._recorders.clear()
+
+################################################################################
+class TestRecordedConnections(unittest.IsolatedAsyncioTestCase):
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, "events.rec")
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   async def test_auth_connection(self):
+      rec = EventRecorder(self.path)
+      connection = AuthApiConnection('ws://api', 'ws://login', recorder=rec)
+      connection._login_client = None
+      connection.listener = FakeListener()
+      connection.websocket = FakeSocket(
+         [json.dumps({ 'market_data' : { 'live_cutoff' : '1' } })])
+
+      await connection.subscribe_to_product('xbtusd_rf')
+      data = await connection._recv()
+      await connection.processMessage(data)
+      rec.close()
+
+      self.assertEqual(len(connection.listener.marketData), 1)
+      records = list(RecordReader(self.path))
+      self.assertEqual(len(records), 2)
+      self.assertEqual(records[0].kind, OUT)
+      self.assertEqual(records[0].data, connection.websocket.sent[0])
+      self.assertEqual(records[1].kind, IN)
+      self.assertEqual(records[1].json()['market_data']['live_cutoff'], '1')
+
+   async def test_public_connection(self):
+      rec = EventRecorder(self.path)
+      connection = PublicApiConnection('ws://public', recorder=rec)
+      connection.websocket = FakeSocket()
+      await connection.subscribe_to_announcements()
+      rec.close()
+
+      records = list(RecordReader(self.path))
+      self.assertEqual(len(records), 1)
+      self.assertEqual(records[0].stream, 'leverex_public')
+      self.assertEqual(records[0].json(), { 'get_chyrons' : {} })
+
+   async def test_no_recorder(self):
+      connection = PublicApiConnection('ws://public')
+      connection.websocket = FakeSocket()
+      await connection.subscribe_to_announcements()
+      self.assertEqual(len(connection.websocket.sent), 1)
@@ -0,0 +1,204 @@
+import unittest
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from Backtest.Replay import ReplayEngine
+from Factories.Definitions import double_eq
+from leverex_core.recorder import EventRecorder, IN, OUT
+from leverex_core.utils import SIDE_BUY, SIDE_SELL, ORDER_STATUS_FILLED, \
+   ORDER_TYPE_TRADE_POSITION, ORDER_ACTION_CREATED
+
+from .tools import getOrderBookSnapshot, price
+
+MS = 1000000 #ns
+
+################################################################################
+def getOrder(id, quantity):
+   return {
+      'id' : id,
+      'timestamp' : 1,
+      'quantity' : quantity,
+      'price' : price,
+      'side' : SIDE_BUY,
+      'status' : ORDER_STATUS_FILLED,
+      'product_type' : 'xbtusd_rf',
+      'reference_exposure' : 0,
+      'session_id' : 5,
+      'rollover_type' : ORDER_TYPE_TRADE_POSITION,
+      'fee' : 0,
+      'is_taker' : False
+   }
+
+class RecordWriter(object):
+   #writes records with explicit timestamps
+   def __init__(self, path):
+      self.recorder = EventRecorder(path)
+
+   def leverex(self, ts, message, kind=IN):
+      self.recorder.queue.put((ts, 'leverex', kind, json.dumps(message)))
+
+   def bitfinex(self, ts, event, data):
+      self.recorder.queue.put((ts, 'bitfinex', IN,
+         json.dumps({ 'event' : event, 'args' : [data] })))
+
+   def close(self):
+      self.recorder.close()
+
+def writeSession(path):
+   writer = RecordWriter(path)
+   writer.leverex(1 * MS, { 'authorize' : { 'success' : True, 'email' : 'a@b.c' } })
+   writer.leverex(2 * MS, { 'session_open' : {
+      'product_type' : 'xbtusd_rf',
+      'cut_off_at' : 1,
+      'last_cut_off_price' : price,
+      'session_id' : 5,
+      'previous_session_id' : 4,
+      'healthy' : True,
+      'fee_taker' : 15,
+      'fee_maker' : -5
+   }})
+   writer.leverex(3 * MS, { 'load_balance' : {
+      'balances' : [{ 'currency' : 'USDT', 'balance' : '10000' }]
+   }})
+   writer.leverex(4 * MS, { 'load_orders' : {
+      'orders' : [], 'reference' : 'recorded_ref' }})
+
+   #a reply to a request the replay never makes
+   writer.leverex(5 * MS, { 'product_fee' : { 'reference' : 'other_ref' }})
+
+   writer.bitfinex(6 * MS, 'order_book_snapshot', {
+      'symbol' : 'tBTCF0:USTF0', 'data' : getOrderBookSnapshot(10) })
+   writer.leverex(7 * MS, { 'submit_prices' : { 'prices' : [] } }, OUT)
+   writer.leverex(8 * MS, { 'market_data' : {
+      'product_type' : 'xbtusd_rf', 'live_cutoff' : str(price) }})
+
+   #maker fills, the second one lands within the taker cooldown
+   writer.leverex(10 * MS, { 'order_update' : {
+      'order' : getOrder(1, 1), 'action' : ORDER_ACTION_CREATED }})
+   writer.leverex(100 * MS, { 'order_update' : {
+      'order' : getOrder(2, 0.5), 'action' : ORDER_ACTION_CREATED }})
+
+   #book update past the cooldown
+   writer.bitfinex(2000 * MS, 'order_book_update', {
+      'symbol' : 'tBTCF0:USTF0', 'data' : [price + 100, 1, -1] })
+   writer.close()
+
+################################################################################
+##
+#### Replay tests
+##
+################################################################################
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+   config = {
+      'leverex' : {
+         'api_endpoint' : 'the_endpoint',
+         'login_endpoint' : 'login_endpoint',
+         'key_file_path' : 'key/path',
+         'product' : 'xbtusd_rf'
+      },
+      'bitfinex' : {
+         'product' : 'tBTCF0:USTF0',
+         'collateral_pct' : 15,
+         'exposure_cooldown' : 1000
+      },
+      'hedger' : {
+         'price_ratio' : 0.01,
+         'max_offer_volume' : 5,
+         'min_size' : 0.00006,
+         'quote_ratio' : 0.2
+      },
+      'rebalance' : {
+         'enable' : True,
+         'threshold_pct' : 0.1,
+         'min_amount' : 10
+      }
+   }
+
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, "session.rec")
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   async def test_replay(self):
+      writeSession(self.path)
+      engine = ReplayEngine(self.config, self.path)
+      result = await engine.run()
+
+      #the dealer made it to ready off the recorded frames
+      assert engine.maker.isReady() == True
+      assert engine.taker.isReady() == True
+      assert engine.hedger.isReady() == True
+      assert result.records == 10
+      assert result.unmatchedReplies == 1
+      assert result.recordedQuotes == 1
+      assert len(result.quotes) > 0
+
+      #first fill hedged right away, the second after the cooldown
+      assert len(result.hedges) == 2
+      assert result.hedges[0].amount == Decimal(-1)
+      assert result.hedges[0].timestamp == 10 * MS
+      assert result.hedges[1].amount == Decimal(-0.5)
+      assert result.hedges[1].timestamp == 2000 * MS
+      assert double_eq(engine.taker.exposure, -1.5)
+
+      #selling into the bids pays the spread
+      assert result.hedges[0].price < price
+      assert result.hedges[0].slippage >= 0
+
+      #0.5 stayed unhedged through the cooldown
+      assert double_eq(result.getMaxDrift(), 0.5)
+      assert result.exposures[-1][1] + result.exposures[-1][2] == 0
+      assert result.duration == 1999 * MS
+
+      #the recorded fills bought at the index, the replayed bid sat lower
+      assert result.fills == 2
+      assert result.getFillRate() == 0
+
+      assert 'leverex.order_update' in result.costs
+      assert result.costs['leverex.order_update'].count == 2
+      assert 'bitfinex.order_book_snapshot' in result.costs
+
+      #rebalance is off in replays
+      assert engine.hedger.rebalMan.enabled == False
+      assert self.config['rebalance']['enable'] == True
+
+      report = result.toJson()
+      assert report['recorded_quotes'] == 1
+      assert report['fills'] == 2
+      assert len(report['hedges']) == 2
+      json.dumps(report)
+
+   async def test_since(self):
+      writeSession(self.path)
+      engine = ReplayEngine(self.config, self.path)
+      result = await engine.run(since=6 * MS)
+
+      #started past the login, the maker never got ready
+      assert engine.maker.isReady() == False
+      assert len(result.hedges) == 0
+
+   async def test_fill_rate(self):
+      writeSession(self.path)
+      engine = ReplayEngine(self.config, self.path)
+      result = await engine.run()
+      offer = engine.getLastQuote()[0]
+
+      #a sell above our ask would have been ours
+      order = getOrder(3, 1)
+      order['side'] = SIDE_SELL
+      order['price'] = float(offer['ask']) + 1
+      engine.checkFill({ 'order' : order, 'action' : ORDER_ACTION_CREATED })
+      assert result.fills == 3
+      assert result.quotedFills == 1
+
+      #too large for any of our tiers
+      order = getOrder(4, float(offer['volume']) + 1)
+      order['side'] = SIDE_SELL
+      order['price'] = float(offer['ask']) + 1
+      engine.checkFill({ 'order' : order, 'action' : ORDER_ACTION_CREATED })
+      assert result.fills == 4
+      assert result.quotedFills == 1
@@ -0,0 +1,84 @@
+import unittest
+import asyncio
+import time
+
+from .tools import TestTaker, TestMaker
+from leverex_core.utils import Order, SIDE_BUY
+from Factories.Definitions import Position, Balance
+from Factories.StatusReporter.Factory import Factory, ReportQueue
+from Hedger.SimpleHedger import SimpleHedger
+from Factories.Dealer.Factory import DealerFactory
+
+################################################################################
+##
+#### Status reporter tests
+##
+################################################################################
+class SlowReporter(Factory):
+   def __init__(self, config, delay):
+      super().__init__(config)
+      self.delay = delay
+      self.reports = []
+
+   async def report(self, notification):
+      #stand-in for a stalled terminal or exporter
+      await asyncio.sleep(self.delay)
+      self.reports.append(notification)
+
+class TestReporter(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : False,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   async def test_queue_coalescing(self):
+      queue = ReportQueue()
+      queue.put(Balance)
+      queue.put(Position)
+      queue.put(Balance)
+      self.assertEqual(len(queue), 2)
+      self.assertEqual(queue.coalesced, 1)
+
+      self.assertEqual(await queue.get(), Balance)
+      self.assertEqual(await queue.get(), Position)
+
+      waiter = asyncio.create_task(queue.get())
+      await asyncio.sleep(0)
+      self.assertFalse(waiter.done())
+      queue.put(Position)
+      self.assertEqual(await asyncio.wait_for(waiter, 0.05), Position)
+
+   async def test_slow_reporter_off_hedging_path(self):
+      maker = TestMaker(startBalance=1000)
+      taker = TestTaker(startBalance=1000)
+      hedger = SimpleHedger(self.config)
+      reporter = SlowReporter(self.config, 0.5)
+      dealer = DealerFactory(maker, taker, hedger, [reporter])
+      await dealer.run()
+      await dealer.waitOnReady()
+      await taker.populateOrderBook(10)
+
+      #hedging completes without waiting on the reporter
+      start = time.monotonic()
+      for i in range(5):
+         await maker.newOrder(Order(id=i, timestamp=0,
+            quantity=0.1, price=10000, side=SIDE_BUY))
+      self.assertLess(time.monotonic() - start, 0.25)
+      self.assertEqual(maker.getExposure(), 0.5)
+      self.assertEqual(taker.getExposure(), -maker.getExposure())
+
+      #the backlog was coalesced
+      self.assertLessEqual(len(reporter.queue), 4)
+      self.assertGreater(reporter.queue.coalesced, 0)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import asyncio
+import time
+
+from Factories.Dealer.Scheduler import EventScheduler, HEDGE, QUOTE, REPORT
+from Factories.Definitions import Position, OrderBook, Balance, \
+   PriceEvent, Ready
+
+################################################################################
+##
+#### Event scheduler tests
+##
+################################################################################
+class TestScheduler(unittest.IsolatedAsyncioTestCase):
+   def setUp(self):
+      self.processed = []
+      self.scheduler = EventScheduler(self.handler)
+      self.maker = object()
+      self.taker = object()
+      self.gate = None
+      self.failReady = False
+
+   async def handler(self, provider, eventType):
+      self.processed.append(eventType)
+      if eventType == Ready and self.failReady:
+         raise Exception("broken handler")
+      if self.gate != None:
+         gate = self.gate
+         self.gate = None
+         await gate.wait()
+
+   async def test_inline_when_idle(self):
+      await self.scheduler.push(self.maker, Position)
+      self.assertEqual(self.processed, [Position])
+      self.assertEqual(len(self.scheduler), 0)
+
+   async def test_drain_order(self):
+      gate = asyncio.Event()
+      self.gate = gate
+      first = asyncio.create_task(self.scheduler.push(self.taker, OrderBook))
+      await asyncio.sleep(0)
+
+      await self.scheduler.push(self.taker, PriceEvent)
+      await self.scheduler.push(self.taker, OrderBook)
+      await self.scheduler.push(self.taker, OrderBook)
+      await self.scheduler.push(self.maker, Balance)
+      await self.scheduler.push(self.maker, Position)
+      await self.scheduler.push(self.maker, Ready)
+
+      gate.set()
+      await first
+      self.assertEqual(self.processed,
+         [OrderBook, Position, Ready, OrderBook, Balance, PriceEvent])
+      self.assertEqual(self.scheduler.stats[QUOTE].coalesced, 1)
+      self.assertEqual(self.scheduler.stats[HEDGE].count, 1)
+
+   async def test_starvation(self):
+      gate = asyncio.Event()
+      self.gate = gate
+      first = asyncio.create_task(self.scheduler.push(self.maker, Position))
+      await asyncio.sleep(0)
+
+      #an old report event goes ahead of fresh hedge events
+      await self.scheduler.push(self.taker, PriceEvent)
+      self.scheduler.queues[REPORT][0] = (time.monotonic() - 1,) + \
+         self.scheduler.queues[REPORT][0][1:]
+      await self.scheduler.push(self.maker, Position)
+
+      gate.set()
+      await first
+      self.assertEqual(self.processed, [Position, PriceEvent, Position])
+      self.assertEqual(self.scheduler.stats[REPORT].starved, 1)
+      self.assertGreaterEqual(self.scheduler.stats[REPORT].maxDelay, 1)
+
+   async def test_queued_push_returns(self):
+      gate = asyncio.Event()
+      self.gate = gate
+      first = asyncio.create_task(self.scheduler.push(self.maker, Position))
+      await asyncio.sleep(0)
+
+      #a push landing mid drain doesn't wait on its event, the
+      #draining push handles it
+      await self.scheduler.push(self.taker, OrderBook)
+      self.assertEqual(self.processed, [Position])
+      self.assertEqual(len(self.scheduler), 1)
+
+      gate.set()
+      await first
+      self.assertEqual(self.processed, [Position, OrderBook])
+
+   async def test_handler_error(self):
+      self.failReady = True
+      gate = asyncio.Event()
+      self.gate = gate
+      first = asyncio.create_task(self.scheduler.push(self.maker, Position))
+      await asyncio.sleep(0)
+      await self.scheduler.push(self.maker, Ready)
+      await self.scheduler.push(self.taker, OrderBook)
+
+      #the failure is logged, the drain carries on
+      gate.set()
+      with self.assertLogs(level='ERROR'):
+         await first
+      self.assertEqual(self.processed, [Position, Ready, OrderBook])
+      self.assertEqual(self.scheduler.errors, 1)
+      self.assertFalse(self.scheduler.running)
+      self.assertIn("handler errors: 1", self.scheduler.getStatsStr())
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
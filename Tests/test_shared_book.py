@@ -0,0 +1,125 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+
+from Factories.Definitions import AggregationOrderBook
+from Factories.SharedOrderBook import SharedBookWriter, SharedBookReader, \
+   SharedBookException
+
+################################################################################
+##
+#### Shared order book tests
+##
+################################################################################
+def readerProcess(path, count, result):
+   #every snapshot the writer publishes has all volumes equal to its price
+   #offset, a torn read would mix levels from different updates
+   reader = SharedBookReader(path)
+   torn = 0
+   for i in range(count):
+      snapshot = reader.read()
+      if snapshot == None:
+         continue
+      volumes = set(v for p, v in snapshot.asks + snapshot.bids)
+      if len(volumes) > 1:
+         torn += 1
+   reader.close()
+   result.value = torn
+
+class TestSharedBook(unittest.TestCase):
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, 'book')
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   def test_order_book_mirror(self):
+      writer = SharedBookWriter(self.path, depth=2)
+      book = AggregationOrderBook(writer)
+      book.setup_from_snapshot([
+         [100, 1, 1.0], [99, 1, 2.0], [98, 1, 3.0],
+         [101, 1, -1.5], [102, 1, -2.5], [103, 1, -3.5]
+      ])
+
+      reader = SharedBookReader(self.path)
+      snapshot = reader.read()
+      self.assertEqual(snapshot.asks, [(101, 1.5), (102, 2.5)])
+      self.assertEqual(snapshot.bids, [(100, 1.0), (99, 2.0)])
+      self.assertEqual(snapshot.seq % 2, 0)
+
+      #updates are mirrored
+      book.process_update([100, 0, 1])
+      snapshot = reader.read()
+      self.assertEqual(snapshot.getBid(), (99, 2.0))
+      self.assertEqual(snapshot.getAsk(), (101, 1.5))
+
+      #changes past the published depth aren't written
+      seq = snapshot.seq
+      book.process_update([97, 1, 4.0])
+      book.process_update([104, 1, -4.5])
+      book.process_update([97, 0, 1])
+      self.assertEqual(reader.read().seq, seq)
+
+      #a removal inside it pulls the next level up
+      book.process_update([101, 0, -1])
+      snapshot = reader.read()
+      self.assertGreater(snapshot.seq, seq)
+      self.assertEqual(snapshot.asks, [(102, 2.5), (103, 3.5)])
+      self.assertEqual(snapshot.bids, [(99, 2.0), (98, 3.0)])
+
+      #a resnapshot is published once loaded, never empty in between
+      seq = snapshot.seq
+      book.reset()
+      self.assertEqual(reader.read().seq, seq)
+      book.setup_from_snapshot([[95, 1, 1.0], [96, 1, -1.0]])
+      snapshot = reader.read()
+      self.assertEqual(snapshot.seq, seq + 2)
+      self.assertEqual(snapshot.asks, [(96, 1.0)])
+      self.assertEqual(snapshot.bids, [(95, 1.0)])
+
+      book.reset()
+      book.setup_from_snapshot([])
+      snapshot = reader.read()
+      self.assertEqual(snapshot.asks, [])
+      self.assertEqual(snapshot.bids, [])
+      self.assertEqual(snapshot.getBid(), None)
+
+      #a closed mirror unmaps the region, the book carries on
+      book.closeSharedWriter()
+      self.assertTrue(writer.mmap.closed)
+      book.process_update([100, 1, 1.0])
+      self.assertEqual(book.get_levels(False), [(100, 1.0)])
+
+      reader.close()
+
+   def test_invalid_region(self):
+      with open(self.path, 'wb') as f:
+         f.write(b'\0' * 1024)
+      with self.assertRaises(SharedBookException):
+         SharedBookReader(self.path)
+
+   def test_concurrent_reader(self):
+      writer = SharedBookWriter(self.path, depth=10)
+      writer.publish({}, {})
+
+      result = multiprocessing.Value('i', -1)
+      process = multiprocessing.Process(
+         target=readerProcess, args=(self.path, 20000, result))
+      process.start()
+
+      i = 0
+      while process.is_alive():
+         i += 1
+         asks = {100 + n: float(i) for n in range(10)}
+         bids = {99 - n: float(i) for n in range(10)}
+         writer.publish(asks, bids)
+
+      process.join()
+      writer.close()
+      self.assertEqual(result.value, 0)
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
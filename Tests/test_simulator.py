@@ -0,0 +1,283 @@
+import unittest
+import asyncio
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+import websockets
+from jwcrypto import jwk
+
+from Simulator.Crowd import Crowd
+from Simulator.Exchange import Exchange, SimulatorException, getSettings
+from Simulator.Server import SimulatorServer
+from leverex_core.api_connection import AuthApiConnection
+from leverex_core.clock import SimulatedClock, NS_PER_SEC
+from leverex_core.utils import PriceOffer, WithdrawInfo, SIDE_BUY, SIDE_SELL, \
+   ORDER_TYPE_NORMAL_ROLLOVER_POSITION
+
+PRODUCT = 'xbtusd_rf'
+
+def getExchange():
+   clock = SimulatedClock()
+   clock.advance(1000 * NS_PER_SEC)
+   return Exchange(getSettings({ 'simulator' : { 'session_duration' : 60 }}), clock)
+
+################################################################################
+class SimulatorListener(object):
+   def __init__(self):
+      self.authorized = asyncio.Event()
+      self.orders = asyncio.Queue()
+      self.withdrawals = asyncio.Queue()
+      self.sessions = []
+      self.balances = None
+      self.offers = None
+
+   def on_connected(self):
+      pass
+
+   async def on_authorized(self):
+      self.authorized.set()
+
+   async def on_market_data(self, marketData):
+      pass
+
+   async def on_session_open(self, session):
+      self.sessions.append(session)
+
+   async def on_session_closed(self, session):
+      self.sessions.append(session)
+
+   async def on_balance_update(self, balances):
+      self.balances = balances
+
+   async def on_order_event(self, order, action):
+      await self.orders.put(order)
+
+   async def on_dealer_offers(self, offers):
+      self.offers = offers
+
+   async def on_withdraw_update(self, withdrawal):
+      await self.withdrawals.put(withdrawal)
+
+################################################################################
+##
+#### Simulator tests
+##
+################################################################################
+class TestExchange(unittest.TestCase):
+   def test_matching(self):
+      exchange = getExchange()
+      dealer1 = exchange.getAccount('dealer1')
+      dealer2 = exchange.getAccount('dealer2')
+      taker = exchange.getAccount('taker')
+
+      exchange.submitPrices(dealer1, PRODUCT, [
+         { 'volume' : '1', 'ask' : '10010', 'bid' : '9990' },
+         { 'volume' : '5', 'ask' : '10050', 'bid' : '9950' }])
+      exchange.submitPrices(dealer2, PRODUCT, [
+         { 'volume' : '2', 'ask' : '10020' }])
+      offers = exchange.getDealerOffers(PRODUCT)['offers']
+      self.assertEqual(len(offers), 5)
+
+      #best ask covering the amount
+      fills = exchange.marketOrder(taker, PRODUCT, SIDE_BUY, '1.5')
+      self.assertEqual(len(fills), 2)
+      (account, takerOrder), (maker, makerOrder) = fills
+      self.assertEqual(account, taker)
+      self.assertEqual(maker, dealer2)
+      self.assertEqual(takerOrder['price'], '10020')
+      self.assertEqual(takerOrder['is_taker'], True)
+      self.assertEqual(makerOrder['side'], SIDE_SELL)
+      self.assertEqual(taker.getNetExposure(PRODUCT), Decimal('1.5'))
+      self.assertEqual(dealer2.getNetExposure(PRODUCT), Decimal('-1.5'))
+      self.assertEqual(taker.getBalance(), 100000 - Decimal('1.5') * 15)
+
+      fills = exchange.marketOrder(taker, PRODUCT, SIDE_SELL, '0.5')
+      self.assertEqual(fills[1][0], dealer1)
+      self.assertEqual(fills[0][1]['price'], '9990')
+
+      with self.assertRaises(SimulatorException):
+         exchange.marketOrder(taker, PRODUCT, SIDE_BUY, '10')
+      with self.assertRaises(SimulatorException):
+         exchange.marketOrder(taker, PRODUCT, SIDE_BUY, '-1')
+
+      #dealers don't fill their own orders
+      exchange.submitPrices(dealer2, PRODUCT, [])
+      with self.assertRaises(SimulatorException):
+         exchange.marketOrder(dealer1, PRODUCT, SIDE_BUY, '1')
+
+      #margin
+      exchange.submitPrices(dealer1, PRODUCT, [{ 'volume' : '500', 'ask' : '10010' }])
+      with self.assertRaises(SimulatorException):
+         exchange.marketOrder(taker, PRODUCT, SIDE_BUY, '200')
+
+   def test_session_roll(self):
+      exchange = getExchange()
+      dealer = exchange.getAccount('dealer')
+      taker = exchange.getAccount('taker')
+      exchange.submitPrices(dealer, PRODUCT, [{ 'volume' : '1', 'ask' : '10010' }])
+      exchange.marketOrder(taker, PRODUCT, SIDE_BUY, '1')
+      balance = taker.getBalance()
+
+      session = exchange.sessions[PRODUCT]
+      self.assertEqual(session.cutOffAt, 1060)
+      exchange.indexPrices[PRODUCT] = 10110
+      closed, opened, updates = exchange.rollSession(PRODUCT)
+      self.assertEqual(closed, session)
+      self.assertEqual(closed.open, False)
+      self.assertEqual(opened.sessionId, session.sessionId + 1)
+      self.assertEqual(opened.openPrice, 10110)
+
+      #pnl is settled, exposure carried over
+      self.assertEqual(taker.getBalance(), balance + 100)
+      self.assertEqual(len(updates), 2)
+      for account, order in updates:
+         self.assertEqual(order['rollover_type'], ORDER_TYPE_NORMAL_ROLLOVER_POSITION)
+         self.assertEqual(order['session_id'], opened.sessionId)
+      self.assertEqual(taker.getNetExposure(PRODUCT), 1)
+      self.assertEqual(dealer.getNetExposure(PRODUCT), -1)
+
+   def test_cash(self):
+      exchange = getExchange()
+      account = exchange.getAccount('user')
+      withdrawal = exchange.withdraw(account, 'addr', 'USDT', '1000')
+      self.assertEqual(withdrawal['status'], WithdrawInfo.WITHDRAW_PENDING)
+      self.assertEqual(account.getBalance(), 99000)
+      WithdrawInfo(withdrawal)
+
+      exchange.cancelWithdrawal(account, withdrawal['id'])
+      self.assertEqual(account.getBalance(), 100000)
+      self.assertEqual(exchange.completeWithdrawal(account, withdrawal['id']), None)
+      with self.assertRaises(SimulatorException):
+         exchange.cancelWithdrawal(account, withdrawal['id'])
+
+      withdrawal = exchange.withdraw(account, 'addr', 'USDT', '500')
+      completed = exchange.completeWithdrawal(account, withdrawal['id'])
+      self.assertEqual(completed['status'], WithdrawInfo.WITHDRAW_COMPLETED)
+      self.assertEqual(account.getBalance(), 99500)
+
+      with self.assertRaises(SimulatorException):
+         exchange.withdraw(account, 'addr', 'USDT', '1000000')
+      with self.assertRaises(SimulatorException):
+         exchange.withdraw(account, 'addr', 'XBT', '1')
+
+      exchange.deposit(account, 500)
+      self.assertEqual(account.getBalance(), 100000)
+      self.assertEqual(len(account.deposits), 1)
+
+########
+class TestSimulatorServer(unittest.IsolatedAsyncioTestCase):
+   async def asyncSetUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.keyPath = os.path.join(self.tmpDir.name, 'key.pem')
+      with open(self.keyPath, 'wb') as keyFile:
+         key = jwk.JWK.generate(kty='EC', crv='P-256')
+         keyFile.write(key.export_to_pem(private_key=True, password=None))
+
+      self.server = SimulatorServer(getSettings({ 'simulator' : {
+         'withdrawal_delay' : 0.05, 'offers_interval' : 0.01 }}))
+      await self.server.start()
+      self.tasks = self.server.getAsyncIOTasks()
+
+   async def asyncTearDown(self):
+      for task in self.tasks:
+         task.cancel()
+      await asyncio.gather(*self.tasks, return_exceptions=True)
+      await self.server.stop()
+      self.tmpDir.cleanup()
+
+   async def connect(self):
+      config = self.server.getConfig()
+      connection = AuthApiConnection(config['api_endpoint'],
+         config['login_endpoint'], key_file_path=self.keyPath)
+      listener = SimulatorListener()
+      self.tasks.append(asyncio.create_task(connection.run(listener)))
+      await asyncio.wait_for(listener.authorized.wait(), 5)
+      return connection, listener
+
+   async def test_dealer_and_takers(self):
+      dealer, listener = await self.connect()
+      await dealer.subscribe_session_open(PRODUCT)
+      await dealer.subscribe_to_balance_updates(PRODUCT)
+      await dealer.subscribe_dealer_offers(PRODUCT)
+
+      replies = asyncio.Queue()
+      await dealer.submit_prices(PRODUCT,
+         [PriceOffer(1, ask=10010, bid=9990)], replies.put)
+      reply = await asyncio.wait_for(replies.get(), 5)
+      self.assertEqual(reply['submit_prices']['result'], 1)
+      await asyncio.sleep(0.05)
+      self.assertEqual(len(listener.offers.asks), 1)
+      self.assertEqual(len(listener.sessions), 1)
+      self.assertIn('balances', listener.balances)
+
+      #takers contend for the dealer's offers
+      crowd = Crowd(self.server.getConfig(), 20, 20, PRODUCT)
+      crowdTask = asyncio.create_task(crowd.run())
+      try:
+         order = await asyncio.wait_for(listener.orders.get(), 5)
+         self.assertEqual(order.is_taker, False)
+         self.assertEqual(order.price, 10010 if order.is_sell() else 9990)
+         await asyncio.sleep(0.2)
+      finally:
+         crowdTask.cancel()
+      self.assertEqual(crowd.stats.connected, 20)
+      self.assertGreater(crowd.stats.filled, 1)
+      self.assertEqual(crowd.stats.rejected, 0)
+
+      loaded = asyncio.Queue()
+      await dealer.load_open_positions(PRODUCT, loaded.put)
+      orders = await asyncio.wait_for(loaded.get(), 5)
+      self.assertGreater(len(orders), 1)
+
+      #cutoff, the dealer's exposure rolls over
+      self.server.rollSession(PRODUCT)
+      await asyncio.sleep(0.05)
+      self.assertEqual(len(listener.sessions), 3)
+      closed, opened = listener.sessions[1:]
+      self.assertEqual(closed.session_id, listener.sessions[0].session_id)
+      self.assertEqual(opened.session_id, closed.session_id + 1)
+
+   async def test_cash(self):
+      connection, listener = await self.connect()
+      replies = asyncio.Queue()
+      await connection.load_deposit_address(replies.put)
+      address = await asyncio.wait_for(replies.get(), 5)
+      self.assertTrue(address.startswith('sim1'))
+
+      await connection.withdraw_liquid(address='addr', currency='USDT',
+         amount=100, callback=replies.put)
+      withdrawal = await asyncio.wait_for(replies.get(), 5)
+      self.assertEqual(withdrawal.status_code, WithdrawInfo.WITHDRAW_PENDING)
+      completed = await asyncio.wait_for(listener.withdrawals.get(), 5)
+      self.assertEqual(completed.id, withdrawal.id)
+      self.assertEqual(completed.status_code, WithdrawInfo.WITHDRAW_COMPLETED)
+
+      await connection.withdraw_liquid(address='addr', currency='USDT',
+         amount=100, callback=replies.put)
+      withdrawal = await asyncio.wait_for(replies.get(), 5)
+      await connection.cancel_withdraw(id=withdrawal.id, callback=replies.put)
+      cancelled = await asyncio.wait_for(replies.get(), 5)
+      self.assertEqual(cancelled.status_code, WithdrawInfo.WITHDRAW_CANCELLED)
+
+      await connection.load_withdrawals_history(replies.put)
+      withdrawals = await asyncio.wait_for(replies.get(), 5)
+      self.assertEqual(len(withdrawals), 2)
+
+   async def test_public(self):
+      #public requests only, the rest needs a login
+      config = self.server.getConfig()
+      async with websockets.connect(config['public_endpoint']) as websocket:
+         await websocket.send(json.dumps({ 'load_balance' : {}}))
+         await websocket.send(json.dumps({ 'subscribe' : { 'product_type' : PRODUCT }}))
+         reply = json.loads(await websocket.recv())
+         self.assertEqual(reply, { 'subscribe' : { 'success' : True }})
+         reply = json.loads(await websocket.recv())
+         self.assertEqual(reply['market_data']['product_type'], PRODUCT)
+
+         await websocket.send(json.dumps({ 'authorize' : { 'token' : 'x' }}))
+         await websocket.send(json.dumps({ 'product_fee' : {
+            'product_type' : PRODUCT, 'reference' : 'ref' }}))
+         reply = json.loads(await websocket.recv())
+         self.assertEqual(reply['product_fee']['reference'], 'ref')
@@ -0,0 +1,113 @@
+import unittest
+import asyncio
+import os
+import tempfile
+
+from .tools import TestTaker, TestMaker
+from Hedger.SimpleHedger import SimpleHedger
+from Factories.Dealer.Factory import DealerFactory
+from Factories.Dealer.Standby import LeaderLock
+from Factories.Definitions import double_eq
+from leverex_core.utils import Order, SIDE_BUY
+
+################################################################################
+##
+#### Hot standby tests
+##
+################################################################################
+class TestStandby(unittest.IsolatedAsyncioTestCase):
+   config = {}
+   config['hedger'] = {
+      'price_ratio' : 0.01,
+      'max_offer_volume' : 5,
+      'min_size' : 0.00006,
+      'quote_ratio' : 0.2
+   }
+   config['rebalance'] = {
+      'enable' : False,
+      'threshold_pct' : 0.1,
+      'min_amount' : 10
+   }
+
+   def setUp(self):
+      fd, self.lockPath = tempfile.mkstemp()
+      os.close(fd)
+
+   def tearDown(self):
+      os.remove(self.lockPath)
+
+   async def createDealer(self, maker, taker):
+      dealer = DealerFactory(maker, taker,
+         SimpleHedger(self.config), lockFile=self.lockPath)
+      await dealer.run()
+      await dealer.waitOnReady()
+      return dealer
+
+   async def test_takeover(self):
+      #primary
+      maker1 = TestMaker(startBalance=1000)
+      taker1 = TestTaker(startBalance=1500)
+      primary = await self.createDealer(maker1, taker1)
+      self.assertTrue(primary.isActive())
+      self.assertTrue(primary.standby.isPrimary())
+
+      #standby, can't get the lock
+      maker2 = TestMaker(startBalance=1000)
+      taker2 = TestTaker(startBalance=1500)
+      standby = await self.createDealer(maker2, taker2)
+      self.assertFalse(standby.isActive())
+      self.assertFalse(standby.standby.isPrimary())
+
+      #both track the book, only the primary quotes
+      await taker1.populateOrderBook(10)
+      await taker2.populateOrderBook(10)
+      self.assertEqual(len(maker1.offers[-1]), 1)
+      self.assertEqual(len(maker2.offers), 0)
+
+      #a position on the standby's maker isn't hedged
+      await maker2.newOrder(Order(id=1, timestamp=0,
+         quantity=0.1, price=10100, side=SIDE_BUY))
+      self.assertTrue(double_eq(taker2.getExposure(), 0))
+
+      #primary dies, the standby takes over right away
+      primary.standby.lock.close()
+      for i in range(20):
+         if standby.isActive():
+            break
+         await asyncio.sleep(0.01)
+
+      self.assertTrue(standby.isActive())
+      self.assertTrue(standby.standby.isPrimary())
+      self.assertLess(standby.standby.takeoverTime, 0.1)
+      self.assertGreater(len(maker2.offers), 0)
+      self.assertGreater(len(maker2.offers[-1]), 0)
+      self.assertTrue(double_eq(taker2.getExposure(), -0.1))
+
+      standby.standby.lock.close()
+      primary.supervisor.stop()
+      standby.supervisor.stop()
+
+   async def test_restart(self):
+      #a dealer restarted in the same process gets the lock back
+      for i in range(2):
+         dealer = await self.createDealer(
+            TestMaker(startBalance=1000), TestTaker(startBalance=1500))
+         self.assertTrue(dealer.isActive())
+         self.assertTrue(dealer.standby.isPrimary())
+         dealer.stop()
+         self.assertFalse(dealer.standby.isPrimary())
+
+      #a process wide lock outlives its dealers
+      lock = LeaderLock(self.lockPath)
+      for i in range(2):
+         dealer = DealerFactory(TestMaker(startBalance=1000),
+            TestTaker(startBalance=1500), SimpleHedger(self.config), lock=lock)
+         await dealer.run()
+         self.assertTrue(dealer.isActive())
+         dealer.stop()
+         self.assertTrue(lock.locked)
+      lock.close()
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+#import time budgets, in seconds
+CLIENT_IMPORT_BUDGET = 0.5
+DEALER_IMPORT_BUDGET = 1.0
+
+#modules that are only needed on specific code paths
+LAZY_MODULES = ['PIL', 'pyqrcode', 'requests', 'certifi']
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measureImport(moduleName):
+   #run in a fresh interpreter so that nothing is cached
+   #only report modules loaded by the import itself, site hooks may
+   #preload some of them
+   script = ("import sys, time, json\n"
+      "preloaded = set(sys.modules)\n"
+      "start = time.perf_counter()\n"
+      f"import {moduleName}\n"
+      "duration = time.perf_counter() - start\n"
+      "modules = [m for m in sys.modules if m not in preloaded]\n"
+      "print(json.dumps({'duration': duration, 'modules': modules}))\n")
+
+   result = subprocess.run([sys.executable, '-c', script],
+      cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+   return json.loads(result.stdout.splitlines()[-1])
+
+def hasBfxApi():
+   try:
+      return importlib.util.find_spec('Providers.bfxapi.bfxapi') is not None
+   except ModuleNotFoundError:
+      return False
+
+################################################################################
+##
+#### Startup time tests
+##
+################################################################################
+class TestStartup(unittest.TestCase):
+   def checkImport(self, moduleName, budget):
+      result = measureImport(moduleName)
+
+      for lazyModule in LAZY_MODULES:
+         self.assertNotIn(lazyModule, result['modules'],
+            f"{lazyModule} is loaded when importing {moduleName}")
+
+      self.assertLess(result['duration'], budget,
+         f"importing {moduleName} took {result['duration']:.3f}s")
+
+   def test_client_import(self):
+      self.checkImport('client', CLIENT_IMPORT_BUDGET)
+
+   @unittest.skipUnless(hasBfxApi(), "bitfinex api submodule is not checked out")
+   def test_dealer_import(self):
+      self.checkImport('dealer', DEALER_IMPORT_BUDGET)
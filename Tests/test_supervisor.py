@@ -0,0 +1,69 @@
+import unittest
+import asyncio
+
+from Factories.Dealer.Supervisor import Supervisor
+
+################################################################################
+##
+#### Supervisor tests
+##
+################################################################################
+class FakeComponent(object):
+   def __init__(self, failures=0, runForever=False):
+      self.failures = failures
+      self.runForever = runForever
+      self.starts = 0
+
+   def getAsyncIOTask(self):
+      return asyncio.create_task(self.run())
+
+   async def run(self):
+      self.starts += 1
+      if self.starts <= self.failures:
+         raise Exception(f"failure #{self.starts}")
+      if self.runForever:
+         await asyncio.Event().wait()
+
+class TestSupervisor(unittest.IsolatedAsyncioTestCase):
+   async def test_auxiliary_restart(self):
+      restarts = []
+      async def onRestart(component):
+         restarts.append(component.name)
+
+      supervisor = Supervisor(onRestart, minBackoff=0.01, maxBackoff=0.02)
+      critical = FakeComponent(runForever=True)
+      reporter = FakeComponent(failures=3, runForever=True)
+      supervisor.add('maker', critical, critical=True)
+      auxComponent = supervisor.add('reporter', reporter, critical=False)
+
+      runTask = asyncio.create_task(supervisor.run())
+      await asyncio.sleep(0.2)
+
+      #the reporter was restarted in isolation, the critical component lives on
+      self.assertFalse(runTask.done())
+      self.assertEqual(reporter.starts, 4)
+      self.assertEqual(critical.starts, 1)
+      self.assertEqual(restarts, ['reporter'] * 3)
+      self.assertEqual(auxComponent.restarts, 3)
+      self.assertGreater(auxComponent.getDowntime(), 0.03)
+      self.assertEqual(auxComponent.backoff, 0.02)
+      self.assertIn("restarts: 3", supervisor.getReport()[1])
+
+      runTask.cancel()
+      supervisor.stop()
+
+   async def test_critical_exit(self):
+      supervisor = Supervisor(minBackoff=0.01)
+      supervisor.add('maker', FakeComponent(runForever=True), critical=True)
+      supervisor.add('taker', FakeComponent(failures=1), critical=True)
+      supervisor.add('reporter', FakeComponent(runForever=True), critical=False)
+
+      #the first critical component to exit ends the run
+      component = await asyncio.wait_for(supervisor.run(), 1)
+      self.assertEqual(component.name, 'taker')
+      self.assertEqual(str(component.lastError), "failure #1")
+      supervisor.stop()
+
+################################################################################
+if __name__ == '__main__':
+   unittest.main()
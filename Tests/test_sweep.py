@@ -0,0 +1,80 @@
+import unittest
+import os
+import tempfile
+
+from Backtest.Sweep import ParameterSweep, SweepException, parseParameter, \
+   getSweepPoints, getSweepConfig
+
+from .test_replay import TestReplay, writeSession
+
+################################################################################
+##
+#### Parameter sweep tests
+##
+################################################################################
+class TestSweep(unittest.TestCase):
+   def setUp(self):
+      self.tmpDir = tempfile.TemporaryDirectory()
+      self.path = os.path.join(self.tmpDir.name, "session.rec")
+
+   def tearDown(self):
+      self.tmpDir.cleanup()
+
+   def test_parse(self):
+      self.assertEqual(parseParameter('price_ratio=0.01,0.02'),
+         ('price_ratio', [0.01, 0.02]))
+      self.assertEqual(parseParameter('exposure_cooldown=100, 1000'),
+         ('exposure_cooldown', [100, 1000]))
+
+      with self.assertRaises(SweepException):
+         parseParameter('price_ratio')
+      with self.assertRaises(SweepException):
+         parseParameter('min_size=1')
+      with self.assertRaises(SweepException):
+         parseParameter('quote_ratio=')
+
+   def test_points(self):
+      points = getSweepPoints({
+         'price_ratio' : [0.01, 0.02],
+         'exposure_cooldown' : [100, 1000, 5000]
+      })
+      self.assertEqual(len(points), 6)
+      self.assertEqual(points[0], { 'price_ratio' : 0.01, 'exposure_cooldown' : 100 })
+      self.assertEqual(points[-1], { 'price_ratio' : 0.02, 'exposure_cooldown' : 5000 })
+
+      config = getSweepConfig(TestReplay.config, points[-1])
+      self.assertEqual(config['hedger']['price_ratio'], 0.02)
+      self.assertEqual(config['hedger']['max_offer_volume'], 5)
+      self.assertEqual(config['bitfinex']['exposure_cooldown'], 5000)
+      self.assertEqual(TestReplay.config['hedger']['price_ratio'], 0.01)
+
+   def test_sweep(self):
+      writeSession(self.path)
+      sweep = ParameterSweep(TestReplay.config, self.path, {
+         'price_ratio' : [0.01, 0.001],
+         'exposure_cooldown' : [1000, 10]
+      }, workers=2)
+      rows = sweep.run()
+
+      #rows come back in grid order
+      self.assertEqual([row.point for row in rows], sweep.points)
+      for row in rows:
+         self.assertEqual(row.records, 10)
+         self.assertEqual(row.fills, 2)
+         self.assertEqual(row.hedges, 2)
+         self.assertEqual(row.hedgeVolume, 1.5)
+
+      #the short cooldown hedges the second fill right away
+      self.assertEqual(str(rows[0].maxDrift), '0.50000000')
+      self.assertEqual(rows[1].maxDrift, 0)
+
+      table = ParameterSweep.getTable(rows).split('\n')
+      self.assertEqual(len(table), 2 + len(rows))
+      self.assertIn('fill rate', table[0])
+
+   def test_bad_grid(self):
+      writeSession(self.path)
+      with self.assertRaises(SweepException):
+         ParameterSweep(TestReplay.config, self.path, {})
+      with self.assertRaises(SweepException):
+         ParameterSweep(TestReplay.config, self.path, { 'min_size' : [1] })
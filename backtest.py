@@ -0,0 +1,36 @@
+import logging
+import asyncio
+import json
+import argparse
+
+from Backtest.Replay import ReplayEngine
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.WARNING, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex dealer backtest - replays a recorded session through the dealer')
+
+   parser.add_argument('--config', type=str, help='Dealer config file to use')
+   parser.add_argument('--log', type=str, help='Record log to replay')
+   parser.add_argument('--since', type=int, default=0,
+      help='Skip records older than this (monotonic ns, as recorded)')
+   parser.add_argument('--output', type=str, default=None,
+      help='Write quotes, hedges, exposure drift and costs to this JSON file')
+   args = parser.parse_args()
+
+   config = {}
+   with open(args.config) as json_config_file:
+      config = json.load(json_config_file)
+
+   engine = ReplayEngine(config, args.log)
+   result = asyncio.run(engine.run(args.since))
+   print(str(result))
+
+   if args.output != None:
+      with open(args.output, 'w') as outputFile:
+         json.dump(result.toJson(), outputFile, indent=3)
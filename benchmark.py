@@ -0,0 +1,72 @@
+import logging
+import argparse
+import os
+import sys
+
+from Benchmarks.Cases import getCases
+from Benchmarks.Suite import BenchmarkRunner, saveResults, loadResults, \
+   compareResults, DEFAULT_THRESHOLD, REPEAT
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+   'Benchmarks', 'baseline.json')
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.ERROR, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex dealer hot path benchmarks - compares against a baseline')
+
+   parser.add_argument('--filter', type=str, default=None,
+      help='Only run benchmarks matching this glob, e.g. "order_book.*"')
+   parser.add_argument('--slow', action='store_true', default=False,
+      help='Also run the slow cases (1000 order open volume)')
+   parser.add_argument('--repeat', type=int, default=REPEAT,
+      help='Timed batches per benchmark, the best one is kept')
+   parser.add_argument('--output', type=str, default=None,
+      help='Write the results to this JSON file')
+   parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+      help='Baseline results to compare against')
+   parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+      help='Fail when a benchmark is slower than the baseline by more than '
+         'this ratio')
+   parser.add_argument('--update-baseline', action='store_true', default=False,
+      help='Write the results over the baseline instead of comparing')
+   args = parser.parse_args()
+
+   runner = BenchmarkRunner(getCases(), repeat=args.repeat)
+   results = runner.run(args.filter, args.slow, callback=print)
+
+   if args.output != None:
+      saveResults(args.output, results)
+
+   if args.update_baseline:
+      baseline = {}
+      if os.path.exists(args.baseline):
+         #keep entries this run skipped
+         baseline = loadResults(args.baseline)
+      baseline.update(results)
+      saveResults(args.baseline, baseline)
+      print(f"updated {args.baseline}")
+      sys.exit(0)
+
+   if not os.path.exists(args.baseline):
+      print(f"no baseline at {args.baseline}, run with --update-baseline")
+      sys.exit(0)
+
+   print(f"\ncompared to {args.baseline}, threshold: {args.threshold * 100}%")
+   regressions = 0
+   for comparison in compareResults(loadResults(args.baseline), results,
+      args.threshold):
+      if comparison.current == None:
+         continue
+      print(f"  - {str(comparison)}")
+      if comparison.regressed:
+         regressions += 1
+
+   if regressions > 0:
+      print(f"{regressions} regression(s)")
+      sys.exit(1)
@@ -12,6 +12,10 @@ from leverex_core.utils import LeverexOpenVolume, SessionOrders, \
    round_down, Announcements
 from leverex_core.base_client import LeverexBaseClient
 from leverex_core.api_connection import PublicApiConnection
+from leverex_core.recorder import getRecorder
+from leverex_core.loop_monitor import getLoopMonitor
+from leverex_core.profiler import getProfiler, ProfilerException
+from leverex_core.memory import MemoryReport, MemoryTracker, getMemoryMonitor
 
 ################################################################################
 class LeverexClient(LeverexBaseClient):
@@ -20,8 +24,19 @@ class LeverexClient(LeverexBaseClient):
       self.setupConnection()
       self.takerFee = None
       self.public_connection = PublicApiConnection(
-         config['leverex']['public_endpoint'])
+         config['leverex']['public_endpoint'], recorder=getRecorder(config),
+         monitor=getLoopMonitor(config))
       self.announcements = Announcements()
+      self.profiler = getProfiler(config)
+
+      #snapshots work without the memory config group, it only
+      #adds the periodic reports and signal
+      self.memoryMonitor = getMemoryMonitor(config)
+      if self.memoryMonitor != None:
+         self.memoryMonitor.setup(self.printMemory)
+         self.memoryTracker = self.memoryMonitor.tracker
+      else:
+         self.memoryTracker = MemoryTracker()
 
    async def subscribe(self):
       await super().subscribeToInitialData()
@@ -115,6 +130,32 @@ class LeverexClient(LeverexBaseClient):
             pass
          self.printAnnouncements(displayAll)
 
+      elif command.startswith('book'):
+         self.printHedgeBook(command[4:].strip())
+
+      elif command.startswith('profile'):
+         value = command[7:].strip()
+         try:
+            if value == 'stop':
+               path = self.profiler.stop()
+               if path == None:
+                  print ("not profiling")
+            else:
+               self.profiler.start(float(value) if len(value) > 0 else None)
+         except (ProfilerException, ValueError) as e:
+            print (f"invalid command: {e}")
+
+      elif command.startswith('memory'):
+         value = command[6:].strip()
+         if value == 'snapshot':
+            path = self.memoryTracker.snapshot()
+            if path == None:
+               print ("tracing allocations, take another snapshot to diff against this one")
+         elif len(value) == 0:
+            await self.printMemory()
+         else:
+            print ("invalid command")
+
       elif command == 'help':
          helpStr = "- commands:\n"
          helpStr += "  . address: show deposit address\n"
@@ -126,6 +167,13 @@ class LeverexClient(LeverexBaseClient):
             "      new: display only new/updated announcements\n" \
             "      all: display all announcements\n" \
             "      passing no arguments will default to new\n"
+         helpStr += "  . book [depth]: show the hedging venue book published by a local dealer.\n" \
+            "      requires shared_book_path in the bitfinex config group\n"
+         helpStr += "  . profile [seconds/stop]: profile the client, the output is written to disk.\n" \
+            "      runs for the configured duration by default, SIGUSR1 toggles it too\n"
+         helpStr += "  . memory [snapshot]: show memory use and the size of long lived structures.\n" \
+            "      snapshot: trace allocations, each snapshot after the first writes\n" \
+            "      the allocation sites that grew since the previous one to disk\n"
          helpStr += "  . max: show maximum buyable and sellable exposure\n"
          helpStr += "  . [buy/sell] [XXX]: place a long/short market order for XXX amount\n" \
             "      XXX is in XBT. Enter a max position with XXX set to [max], e.g.:\n" \
@@ -156,10 +204,21 @@ class LeverexClient(LeverexBaseClient):
    async def run(self):
       tasks = [asyncio.create_task(self.connection.run(self))]
       tasks.append(asyncio.create_task(self.public_connection.run(self)))
+      tasks.append(self.profiler.getAsyncIOTask())
+      monitor = getLoopMonitor(self.config)
+      if monitor != None:
+         tasks.append(monitor.getAsyncIOTask())
+      if self.memoryMonitor != None:
+         tasks.append(self.memoryMonitor.getAsyncIOTask())
 
       done, pending = await asyncio.wait(
          tasks, return_when=asyncio.FIRST_COMPLETED)
 
+   async def printMemory(self):
+      gauges = self.getMemoryGauges()
+      gauges.update(self.announcements.getMemoryGauges())
+      print (f"- memory:\n{str(MemoryReport(gauges))}\n")
+
    ## listeners
    def on_connected(self):
       print (f"connected to {self.config['leverex']['api_endpoint']}")
@@ -317,6 +376,37 @@ class LeverexClient(LeverexBaseClient):
    def printAnnouncements(self, displayAll):
       print (self.announcements.toString(displayAll))
 
+   def printHedgeBook(self, depth):
+      #same key the dealer writes the book from
+      path = self.config.get('bitfinex', {}).get('shared_book_path')
+      if path == None:
+         print (" - Book: no bitfinex shared_book_path in config\n")
+         return
+
+      try:
+         depth = int(depth) if len(depth) > 0 else 5
+         #the dealer writes the book, we only map it in when asked
+         from Factories.SharedOrderBook import SharedBookReader
+         reader = SharedBookReader(path)
+         snapshot = reader.read()
+         reader.close()
+      except Exception as e:
+         print (f" - Book: failed to read {path}: {e}\n")
+         return
+
+      if snapshot == None:
+         print (" - Book: writer busy, try again\n")
+         return
+
+      bookStr = f" - Book (age: {round(time.time() - snapshot.timestamp, 3)}s):\n"
+      bookStr += "   asks:\n"
+      for price, volume in reversed(snapshot.asks[0:depth]):
+         bookStr += f"   . {price}: {volume}\n"
+      bookStr += "   bids:\n"
+      for price, volume in snapshot.bids[0:depth]:
+         bookStr += f"   . {price}: {volume}\n"
+      print (bookStr)
+
 ################################################################################
 if __name__ == '__main__':
    LOG_FORMAT = (
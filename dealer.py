@@ -5,14 +5,82 @@ import argparse
 import time
 
 from Providers.Leverex import LeverexProvider
-from Providers.Bitfinex import BitfinexProvider
+from Providers.Bitfinex import BitfinexProvider, BfxRouter
 from Factories.Dealer.Factory import DealerFactory
+from Factories.Dealer.MultiDealer import MultiDealer, getProductConfigs
+from Factories.Dealer.Standby import LeaderLock
+from Factories.Provider.Composite import CompositeTaker
+from Factories.Definitions import overlayConfig
 from Hedger.SimpleHedger import SimpleHedger
 from StatusReporter.LocalReporter import LocalReporter
-from StatusReporter.WebReporter import WebReporter
+from leverex_core.base_client import createProductRouter
+from leverex_core.loop_monitor import getLoopMonitor
+from leverex_core.profiler import getProfiler
+from leverex_core.memory import getMemoryMonitor
 
 #import pdb; pdb.set_trace()
 
+################################################################################
+def createReporters(config, local):
+   reporters = [LocalReporter(config)]
+   if local == False:
+      #the web exporter pulls tls dependencies, only load it when used
+      from StatusReporter.WebReporter import WebReporter
+      reporters.append(WebReporter(config))
+   return reporters
+
+####
+def createTaker(config):
+   if 'takers' not in config:
+      return BitfinexProvider(config)
+
+   #several bitfinex accounts or symbols hedging for one maker, each
+   #entry overrides the bitfinex group
+   venues = []
+   for overrides in config['takers']:
+      venues.append(BitfinexProvider(
+         overlayConfig(config, { 'bitfinex' : overrides })))
+   return CompositeTaker(venues)
+
+####
+async def runDealer(dealer):
+   try:
+      await dealer.run()
+   finally:
+      #the next attempt starts from a new dealer
+      dealer.stop()
+
+####
+async def runMultiDealer(config, local, lock, configFile):
+   #one leverex connection and one bitfinex client for all products
+   router = createProductRouter(config)
+   bfxRouter = BfxRouter(config)
+
+   #all products share the process' leadership lock, a failed product
+   #is rebuilt on the shared connections
+   def createDealer(productConfig):
+      maker = LeverexProvider(productConfig, router)
+      taker = BitfinexProvider(productConfig, bfxRouter)
+      hedger = SimpleHedger(productConfig)
+      return DealerFactory(maker, taker, hedger,
+         createReporters(productConfig, local), lock=lock,
+         loopMonitor=getLoopMonitor(config),
+         profiler=getProfiler(config),
+         memoryMonitor=getMemoryMonitor(config))
+
+   dealers = {}
+   configs = {}
+   for productConfig in getProductConfigs(config):
+      dealer = createDealer(productConfig)
+      dealers[dealer.maker.product] = dealer
+      configs[dealer.maker.product] = productConfig
+
+   multiDealer = MultiDealer(dealers, createDealer, configs, configFile)
+   try:
+      await multiDealer.run()
+   finally:
+      multiDealer.stop()
+
 ################################################################################
 if __name__ == '__main__':
    LOG_FORMAT = (
@@ -35,6 +103,8 @@ if __name__ == '__main__':
    parser.add_argument('--config', type=str, help='Config file to use')
    parser.add_argument('--local', default=False, action='store_true',
       help='Do not push to remote status reporter')
+   parser.add_argument('--lock', type=str, default=None,
+      help='Leadership lock file, instances sharing it run as primary/hot standby')
 
    args = parser.parse_args()
 
@@ -42,17 +112,30 @@ if __name__ == '__main__':
    with open(args.config) as json_config_file:
       config = json.load(json_config_file)
 
+   #one lock for the process, dealer restarts keep the leadership
+   lock = None
+   if args.lock != None:
+      lock = LeaderLock(args.lock)
+
    while True:
       try:
+         if 'products' in config:
+            asyncio.run(runMultiDealer(config, args.local, lock, args.config))
+            logging.warning("!! Dealers exited, restarting in 10 seconds !!")
+            time.sleep(10)
+            continue
+
          maker = LeverexProvider(config)
-         taker = BitfinexProvider(config)
+         taker = createTaker(config)
          hedger = SimpleHedger(config)
-         reporters = [LocalReporter(config)]
-         if args.local == False:
-            reporters.append(WebReporter(config))
+         reporters = createReporters(config, args.local)
 
-         dealer = DealerFactory(maker, taker, hedger, reporters)
-         asyncio.run(dealer.run())
+         dealer = DealerFactory(maker, taker, hedger, reporters,
+            lock=lock, configFile=args.config,
+            loopMonitor=getLoopMonitor(config),
+            profiler=getProfiler(config),
+            memoryMonitor=getMemoryMonitor(config))
+         asyncio.run(runDealer(dealer))
 
       except Exception as e:
          logging.error(f"!! Main loop broke with error: {str(e)} !!")
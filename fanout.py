@@ -0,0 +1,27 @@
+import logging
+import asyncio
+import json
+import argparse
+
+from FanOut.Service import FanOutService
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex market data fan-out - one upstream feed for all local processes')
+
+   parser.add_argument('--config', type=str, help='Config file to use')
+   args = parser.parse_args()
+
+   config = {}
+   with open(args.config) as json_config_file:
+      config = json.load(json_config_file)
+
+   service = FanOutService(config)
+   logging.warning(f"---- serving market data on {service.socketPath} ----")
+   asyncio.run(service.run())
@@ -29,9 +29,14 @@ class AuthApiConnection(object):
       key_file_path=None,
       dump_communication=False,
       email=None,
-      aeid_endpoint=None):
+      aeid_endpoint=None,
+      login_session=None,
+      recorder=None,
+      monitor=None):
 
       self._dump_communication = dump_communication
+      self._recorder = recorder
+      self._monitor = monitor
 
       self._login_client = None
       self.access_token = None
@@ -44,13 +49,29 @@ class AuthApiConnection(object):
          login_endpoint=login_endpoint,
          email=email,
          dump_communication=dump_communication,
-         aeid_endpoint=aeid_endpoint)
+         aeid_endpoint=aeid_endpoint,
+         session=login_session)
 
       self.websocket = None
       self.listener = None
       self._requests_cb = {}
 
+   async def _send(self, message):
+      data = json.dumps(message)
+      if self._recorder is not None:
+         self._recorder.outbound('leverex', data)
+      await self.websocket.send(data)
+
+   async def _recv(self):
+      data = await self.websocket.recv()
+      if data is not None and self._recorder is not None:
+         self._recorder.inbound('leverex', data)
+      return data
+
    async def _call_listener_cb(self, cb, *args, **kwargs):
+      if self._monitor is not None:
+         await self._monitor.call('leverex', cb, *args, **kwargs)
+         return
       if asyncio.iscoroutinefunction(cb):
          await cb(*args, **kwargs)
       else:
@@ -79,7 +100,7 @@ class AuthApiConnection(object):
          if callable(listener_cb):
             self._requests_cb[reference] = listener_cb
 
-      await self.websocket.send(json.dumps(load_deposit_address_request))
+      await self._send(load_deposit_address_request)
 
    async def load_trade_history(self, target_product,
       limit=0, offset=0, start_time: datetime = None,
@@ -103,7 +124,7 @@ class AuthApiConnection(object):
       }
 
       self._requests_cb[reference] = callback
-      await self.websocket.send(json.dumps(load_trades_request))
+      await self._send(load_trades_request)
 
    async def load_session_history(self, target_product,
       limit=0, offset=0, start_time: datetime = None,
@@ -125,7 +146,7 @@ class AuthApiConnection(object):
       }
 
       self._requests_cb[reference] = callback
-      await self.websocket.send(json.dumps(load_trades_request))
+      await self._send(load_trades_request)
 
    async def load_withdrawals_history(self, callback: Callable = None):
       reference = generateReferenceId()
@@ -142,7 +163,7 @@ class AuthApiConnection(object):
          if callable(listener_cb):
             self._requests_cb[reference] = listener_cb
 
-      await self.websocket.send(json.dumps(load_withdrawals_history_request))
+      await self._send(load_withdrawals_history_request)
 
    async def load_deposits_history(self, callback: Callable = None):
       reference = generateReferenceId()
@@ -160,7 +181,7 @@ class AuthApiConnection(object):
          if callable(listener_cb):
             self._requests_cb[reference] = listener_cb
 
-      await self.websocket.send(json.dumps(load_deposits_history_request))
+      await self._send(load_deposits_history_request)
 
    async def withdraw_liquid(self, *, address, currency, amount, callback: Callable = None):
       reference = generateReferenceId()
@@ -183,7 +204,7 @@ class AuthApiConnection(object):
          else:
             logging.error(f'No callback set for withdraw_liquid request {reference}')
 
-      await self.websocket.send(json.dumps(withdraw_request))
+      await self._send(withdraw_request)
 
    async def cancel_withdraw(self, *, id, callback: Callable = None):
       reference = generateReferenceId()
@@ -196,7 +217,7 @@ class AuthApiConnection(object):
       }
       if callback is not None:
          self._requests_cb[reference] = callback
-      await self.websocket.send(json.dumps(cancel_withdraw))
+      await self._send(cancel_withdraw)
 
    async def load_whitelisted_addresses(self, callback: Callable = None):
       reference = generateReferenceId()
@@ -214,7 +235,7 @@ class AuthApiConnection(object):
          if callable(listener_cb):
             self._requests_cb[reference] = listener_cb
 
-      await self.websocket.send(json.dumps(load_whitelisted_addresses_request))
+      await self._send(load_whitelisted_addresses_request)
 
    # callback(orders: list[Order] )
    async def load_open_positions(self, target_product, callback: Callable = None):
@@ -232,7 +253,7 @@ class AuthApiConnection(object):
       else:
          self._requests_cb[reference] = functools.partial(self.listener.on_load_positions, target_product=target_product)
 
-      await self.websocket.send(json.dumps(load_positions_request))
+      await self._send(load_positions_request)
 
    async def submit_prices(self, target_product: str, offers: PriceOffers, callback: Callable = None):
       price_offers = [offer.to_map() for offer in offers if offer.to_map() is not None]
@@ -254,7 +275,7 @@ class AuthApiConnection(object):
          if callable(listener_cb):
             self._requests_cb[reference] = listener_cb
 
-      await self.websocket.send(json.dumps(submit_prices_request))
+      await self._send(submit_prices_request)
 
    async def subscribe_session_open(self, target_product: str):
       subscribe_request = {
@@ -262,7 +283,7 @@ class AuthApiConnection(object):
             'product_type' : target_product
          }
       }
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def subscribe_to_product(self, target_product: str):
       subscribe_request = {
@@ -270,21 +291,21 @@ class AuthApiConnection(object):
             'product_type': target_product
          }
       }
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def subscribe_to_balance_updates(self, target_product: str):
       subscribe_request = {
          'load_balance' : {
             'product_type': target_product,
       }}
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def subscribe_dealer_offers(self, product: str):
       subscribe_request = {
          'subscribe_dealer_offers' : {
             'product_type': product,
       }}
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def place_order(self, amount: float, side, product: str, price: float):
       async def handleReply(reply):
@@ -302,7 +323,7 @@ class AuthApiConnection(object):
       }
 
       self._requests_cb[reference] = handleReply
-      await self.websocket.send(json.dumps(market_order))
+      await self._send(market_order)
 
    async def product_fee(self, product: str, cb):
       reference = generateReferenceId()
@@ -313,7 +334,7 @@ class AuthApiConnection(object):
          }
       }
       self._requests_cb[reference] = cb
-      await self.websocket.send(json.dumps(product_fee))
+      await self._send(product_fee)
 
    async def login(self):
       #get token from login server
@@ -330,8 +351,8 @@ class AuthApiConnection(object):
          }
       }
 
-      await self.websocket.send(json.dumps(auth_request))
-      data = await self.websocket.recv()
+      await self._send(auth_request)
+      data = await self._recv()
       loginResult = json.loads(data)
       if not 'authorize' in loginResult or not loginResult['authorize']['success']:
          raise Exception("Login failed")
@@ -340,6 +361,10 @@ class AuthApiConnection(object):
    async def run(self, listener):
       self.listener = listener
       try:
+         #sign the login challenge while the api socket connects
+         if self._login_client is not None:
+            self._login_client.prepare_login(self._api_endpoint)
+
          async with websockets.connect(self._api_endpoint) as self.websocket:
             await self._call_listener_method('on_connected')
 
@@ -360,173 +385,176 @@ class AuthApiConnection(object):
 
    async def readLoop(self):
       while True:
-         data = await self.websocket.recv()
+         data = await self._recv()
          if data is None:
             continue
-         update = json.loads(data)
-
-         if 'market_data' in update:
-            await self.listener.on_market_data(update['market_data'])
-
-         elif 'subscribe' in update:
-            if not update['subscribe']['success']:
-               raise Exception('Failed to subscribe to prices: {}'.format(update['subscribe']['error_msg']))
-
-         elif 'submit_prices' in update:
-            reference = update['submit_prices']['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, update)
-            else:
-               logging.error(f'submit_prices response with unregistered request reference:{reference}')
-
-         elif 'withdraw_liquid' in update:
-            reference = update['withdraw_liquid']['reference']
-
-            if reference in self._requests_cb:
-               withdraw_info = WithdrawInfo(update['withdraw_liquid'])
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, withdraw_info)
-            else:
-               logging.error(f'withdraw_liquid response with unregistered request reference:{reference}')
-
-         elif 'cancel_withdraw' in update:
-            reference = update['cancel_withdraw']['reference']
-            withdraw_info = WithdrawInfo(update['cancel_withdraw'])
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, withdraw_info)
-            else:
-               logging.error(f'cancel_withdraw response with unregistered request reference:{reference}')
-
-         elif 'load_addresses' in update:
-            reference = update['load_addresses']['reference']
-
-            addresses = {}
-
-            for entry in update['load_addresses']['addresses']:
-               addresses[entry['address']] = entry['description']
-
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, addresses)
-            else:
-               logging.error(f'load_addresses response with unregistered request reference:{reference}')
-
-         elif 'load_deposit_address' in update:
-            reference = update['load_deposit_address']['reference']
-
-            address = update['load_deposit_address']['address']
-
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, address)
-            else:
-               logging.error(f'load_deposit_address response with unregistered request reference:{reference}')
-
-         elif 'trade_history' in update:
-            reference = update['trade_history']['reference']
-
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               trade_history = TradeHistory(update['trade_history'])
-               await self._call_listener_cb(cb, trade_history)
-            else:
-               logging.error(f'trade_history response with unregistered request reference:{reference}')
-
-         elif 'session_history' in update:
-            reference = update['session_history']['reference']
-
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               session_history = SessionHistory(update['session_history'])
-               await self._call_listener_cb(cb, session_history)
-            else:
-               logging.error(f'session_history response with unregistered request reference:{reference}')
-
-         elif 'load_withdrawals' in update:
-            reference = update['load_withdrawals']['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               withdrawals = [WithdrawInfo(entry) for entry in update['load_withdrawals']['withdrawals']]
-               await self._call_listener_cb(cb, withdrawals)
-            else:
-               logging.error(f'load_withdrawals response with unregistered request reference:{reference}')
-
-         elif 'load_deposits' in update:
-            reference = update['load_deposits']['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-
-               deposits = [DepositInfo(entry) for entry in update['load_deposits']['deposits']]
-
-               await self._call_listener_cb(cb, deposits)
-            else:
-               logging.error(f'load_deposits response with unregistered request reference:{reference}')
-
-         elif 'load_orders' in update:
-            orders = [LeverexOrder(order_data) for order_data in update['load_orders']['orders']]
-            reference = update['load_orders']['reference']
-
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, orders)
-            else:
-               logging.error(f'load_orders response with unregistered request  reference:{reference}')
-
-         elif 'order_update' in update:
-            order = LeverexOrder(update['order_update']['order'])
-            action = int(update['order_update']['action'])
-            await self.listener.on_order_event(order, action)
-
-         # _call_listener_method
-         elif 'update_deposit' in update:
-            deposit_info = DepositInfo(update['update_deposit'])
-            await self._call_listener_method('on_deposit_update', deposit_info)
-
-         elif 'update_withdrawal' in update:
-            withdraw_info = WithdrawInfo(update['update_withdrawal'])
-            await self._call_listener_method('on_withdraw_update', withdraw_info)
-
-         elif 'session_closed' in update:
-            await self._call_listener_cb(self.listener.on_session_closed, SessionCloseInfo(update['session_closed']))
-
-         elif 'session_open' in update:
-            await self._call_listener_cb(self.listener.on_session_open, SessionOpenInfo(update['session_open']))
-
-         elif 'load_balance' in update:
-            await self._call_listener_cb(self.listener.on_balance_update, update['load_balance'])
-
-         elif 'subscribe_dealer_offers' in update:
-            sub_reply = update['subscribe_dealer_offers']
-            if sub_reply['success'] != True:
-               logging.warning(f"failed to subcribe to dealer offers with error: {sub_reply['error']}")
-
-         elif 'dealer_offers' in update:
-            dealer_offers = DealerOffers(update['dealer_offers'])
-            await self._call_listener_method('on_dealer_offers', dealer_offers)
-
-         elif 'market_order' in update:
-            order_reply = update['market_order']
-            reference = order_reply['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, order_reply)
-
-         elif 'product_fee' in update:
-            fee_reply = update['product_fee']
-            reference = fee_reply['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, fee_reply)
-
-         elif 'authorize' in update:
-            if not update['authorize']['success']:
-               raise Exception('Failed to renew session token')
-         elif 'logout' in update:
-            raise Exception('ERROR: we got a logout message. Closing connection')
+         await self.processMessage(data)
+
+   async def processMessage(self, data):
+      update = json.loads(data)
+
+      if 'market_data' in update:
+         await self._call_listener_cb(self.listener.on_market_data, update['market_data'])
+
+      elif 'subscribe' in update:
+         if not update['subscribe']['success']:
+            raise Exception('Failed to subscribe to prices: {}'.format(update['subscribe']['error_msg']))
+
+      elif 'submit_prices' in update:
+         reference = update['submit_prices']['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, update)
+         else:
+            logging.error(f'submit_prices response with unregistered request reference:{reference}')
+
+      elif 'withdraw_liquid' in update:
+         reference = update['withdraw_liquid']['reference']
+
+         if reference in self._requests_cb:
+            withdraw_info = WithdrawInfo(update['withdraw_liquid'])
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, withdraw_info)
+         else:
+            logging.error(f'withdraw_liquid response with unregistered request reference:{reference}')
+
+      elif 'cancel_withdraw' in update:
+         reference = update['cancel_withdraw']['reference']
+         withdraw_info = WithdrawInfo(update['cancel_withdraw'])
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, withdraw_info)
+         else:
+            logging.error(f'cancel_withdraw response with unregistered request reference:{reference}')
+
+      elif 'load_addresses' in update:
+         reference = update['load_addresses']['reference']
+
+         addresses = {}
+
+         for entry in update['load_addresses']['addresses']:
+            addresses[entry['address']] = entry['description']
+
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, addresses)
+         else:
+            logging.error(f'load_addresses response with unregistered request reference:{reference}')
+
+      elif 'load_deposit_address' in update:
+         reference = update['load_deposit_address']['reference']
+
+         address = update['load_deposit_address']['address']
+
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, address)
          else:
-            logging.warning('!!! Ignore update\n{} !!!'.format(update))
+            logging.error(f'load_deposit_address response with unregistered request reference:{reference}')
+
+      elif 'trade_history' in update:
+         reference = update['trade_history']['reference']
+
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            trade_history = TradeHistory(update['trade_history'])
+            await self._call_listener_cb(cb, trade_history)
+         else:
+            logging.error(f'trade_history response with unregistered request reference:{reference}')
+
+      elif 'session_history' in update:
+         reference = update['session_history']['reference']
+
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            session_history = SessionHistory(update['session_history'])
+            await self._call_listener_cb(cb, session_history)
+         else:
+            logging.error(f'session_history response with unregistered request reference:{reference}')
+
+      elif 'load_withdrawals' in update:
+         reference = update['load_withdrawals']['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            withdrawals = [WithdrawInfo(entry) for entry in update['load_withdrawals']['withdrawals']]
+            await self._call_listener_cb(cb, withdrawals)
+         else:
+            logging.error(f'load_withdrawals response with unregistered request reference:{reference}')
+
+      elif 'load_deposits' in update:
+         reference = update['load_deposits']['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+
+            deposits = [DepositInfo(entry) for entry in update['load_deposits']['deposits']]
+
+            await self._call_listener_cb(cb, deposits)
+         else:
+            logging.error(f'load_deposits response with unregistered request reference:{reference}')
+
+      elif 'load_orders' in update:
+         orders = [LeverexOrder(order_data) for order_data in update['load_orders']['orders']]
+         reference = update['load_orders']['reference']
+
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, orders)
+         else:
+            logging.error(f'load_orders response with unregistered request  reference:{reference}')
+
+      elif 'order_update' in update:
+         order = LeverexOrder(update['order_update']['order'])
+         action = int(update['order_update']['action'])
+         await self._call_listener_cb(self.listener.on_order_event, order, action)
+
+      # _call_listener_method
+      elif 'update_deposit' in update:
+         deposit_info = DepositInfo(update['update_deposit'])
+         await self._call_listener_method('on_deposit_update', deposit_info)
+
+      elif 'update_withdrawal' in update:
+         withdraw_info = WithdrawInfo(update['update_withdrawal'])
+         await self._call_listener_method('on_withdraw_update', withdraw_info)
+
+      elif 'session_closed' in update:
+         await self._call_listener_cb(self.listener.on_session_closed, SessionCloseInfo(update['session_closed']))
+
+      elif 'session_open' in update:
+         await self._call_listener_cb(self.listener.on_session_open, SessionOpenInfo(update['session_open']))
+
+      elif 'load_balance' in update:
+         await self._call_listener_cb(self.listener.on_balance_update, update['load_balance'])
+
+      elif 'subscribe_dealer_offers' in update:
+         sub_reply = update['subscribe_dealer_offers']
+         if sub_reply['success'] != True:
+            logging.warning(f"failed to subcribe to dealer offers with error: {sub_reply['error']}")
+
+      elif 'dealer_offers' in update:
+         dealer_offers = DealerOffers(update['dealer_offers'])
+         await self._call_listener_method('on_dealer_offers', dealer_offers)
+
+      elif 'market_order' in update:
+         order_reply = update['market_order']
+         reference = order_reply['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, order_reply)
+
+      elif 'product_fee' in update:
+         fee_reply = update['product_fee']
+         reference = fee_reply['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, fee_reply)
+
+      elif 'authorize' in update:
+         if not update['authorize']['success']:
+            raise Exception('Failed to renew session token')
+      elif 'logout' in update:
+         raise Exception('ERROR: we got a logout message. Closing connection')
+      else:
+         logging.warning('!!! Ignore update\n{} !!!'.format(update))
 
    async def cycleSession(self):
       while True:
@@ -544,17 +572,34 @@ class AuthApiConnection(object):
             }
          }
 
-         await self.websocket.send(json.dumps(auth_request))
+         await self._send(auth_request)
 
 ################################################################################
 class PublicApiConnection(object):
-   def __init__(self, endpoint):
+   def __init__(self, endpoint, recorder=None, monitor=None):
       self.endpoint = endpoint
       self.websocket = None
       self.listener = None
       self._requests_cb = {}
+      self._recorder = recorder
+      self._monitor = monitor
+
+   async def _send(self, message):
+      data = json.dumps(message)
+      if self._recorder is not None:
+         self._recorder.outbound('leverex_public', data)
+      await self.websocket.send(data)
+
+   async def _recv(self):
+      data = await self.websocket.recv()
+      if data is not None and self._recorder is not None:
+         self._recorder.inbound('leverex_public', data)
+      return data
 
    async def _call_listener_cb(self, cb, *args, **kwargs):
+      if self._monitor is not None:
+         await self._monitor.call('leverex_public', cb, *args, **kwargs)
+         return
       if asyncio.iscoroutinefunction(cb):
          await cb(*args, **kwargs)
       else:
@@ -567,11 +612,17 @@ class PublicApiConnection(object):
       else:
          logging.error(f'{method_name} not defined in listener')
 
+   def connect(self):
+      #unix:// endpoints point at a local fan-out service
+      if self.endpoint.startswith('unix://'):
+         return websockets.unix_connect(self.endpoint[len('unix://'):])
+      return websockets.connect(self.endpoint)
+
    async def run(self, listener):
       try:
          self.listener = listener
 
-         async with websockets.connect(self.endpoint) as self.websocket:
+         async with self.connect() as self.websocket:
             await self._call_listener_method('on_public_connected')
             await self.readLoop()
       except Exception as e:
@@ -586,7 +637,7 @@ class PublicApiConnection(object):
             'product_type' : target_product
          }
       }
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def subscribe_to_product(self, target_product: str):
       subscribe_request = {
@@ -594,14 +645,14 @@ class PublicApiConnection(object):
             'product_type': target_product
          }
       }
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def subscribe_dealer_offers(self, product: str):
       subscribe_request = {
          'subscribe_dealer_offers' : {
             'product_type': product,
       }}
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def product_fee(self, product: str, cb):
       reference = generateReferenceId()
@@ -612,53 +663,56 @@ class PublicApiConnection(object):
          }
       }
       self._requests_cb[reference] = cb
-      await self.websocket.send(json.dumps(product_fee))
+      await self._send(product_fee)
 
    async def subscribe_to_announcements(self):
       subscribe_request = {
          'get_chyrons' : {}
       }
-      await self.websocket.send(json.dumps(subscribe_request))
+      await self._send(subscribe_request)
 
    async def readLoop(self):
       while True:
-         data = await self.websocket.recv()
+         data = await self._recv()
          if data is None:
             continue
-         update = json.loads(data)
+         await self.processMessage(data)
 
-         if 'market_data' in update:
-            await self.listener.on_market_data(update['market_data'])
+   async def processMessage(self, data):
+      update = json.loads(data)
 
-         elif 'subscribe' in update:
-            if not update['subscribe']['success']:
-               raise Exception('Failed to subscribe to prices: {}'.format(update['subscribe']['error_msg']))
+      if 'market_data' in update:
+         await self._call_listener_cb(self.listener.on_market_data, update['market_data'])
 
-         elif 'session_open' in update:
-            await self._call_listener_cb(self.listener.on_session_open, SessionOpenInfo(update['session_open']))
+      elif 'subscribe' in update:
+         if not update['subscribe']['success']:
+            raise Exception('Failed to subscribe to prices: {}'.format(update['subscribe']['error_msg']))
 
-         elif 'session_closed' in update:
-            await self._call_listener_cb(self.listener.on_session_closed, SessionCloseInfo(update['session_closed']))
+      elif 'session_open' in update:
+         await self._call_listener_cb(self.listener.on_session_open, SessionOpenInfo(update['session_open']))
 
-         elif 'subscribe_dealer_offers' in update:
-            sub_reply = update['subscribe_dealer_offers']
-            if sub_reply['success'] != True:
-               logging.warning(f"failed to subcribe to dealer offers with error: {sub_reply['error']}")
+      elif 'session_closed' in update:
+         await self._call_listener_cb(self.listener.on_session_closed, SessionCloseInfo(update['session_closed']))
 
-         elif 'dealer_offers' in update:
-            dealer_offers = DealerOffers(update['dealer_offers'])
-            await self._call_listener_method('on_dealer_offers', dealer_offers)
+      elif 'subscribe_dealer_offers' in update:
+         sub_reply = update['subscribe_dealer_offers']
+         if sub_reply['success'] != True:
+            logging.warning(f"failed to subcribe to dealer offers with error: {sub_reply['error']}")
 
-         elif 'product_fee' in update:
-            fee_reply = update['product_fee']
-            reference = fee_reply['reference']
-            if reference in self._requests_cb:
-               cb = self._requests_cb.pop(reference)
-               await self._call_listener_cb(cb, fee_reply)
+      elif 'dealer_offers' in update:
+         dealer_offers = DealerOffers(update['dealer_offers'])
+         await self._call_listener_method('on_dealer_offers', dealer_offers)
 
-         elif 'chyrons' in update:
-            announcements = update['chyrons']
-            await self._call_listener_method('on_announcement', announcements)
+      elif 'product_fee' in update:
+         fee_reply = update['product_fee']
+         reference = fee_reply['reference']
+         if reference in self._requests_cb:
+            cb = self._requests_cb.pop(reference)
+            await self._call_listener_cb(cb, fee_reply)
 
-         else:
-            logging.warning('!!! Ignore update\n{} !!!'.format(update))
+      elif 'chyrons' in update:
+         announcements = update['chyrons']
+         await self._call_listener_method('on_announcement', announcements)
+
+      else:
+         logging.warning('!!! Ignore update\n{} !!!'.format(update))
@@ -1,7 +1,35 @@
 from .utils import LeverexException, SessionInfo, get_product_info, \
    SessionOrders, getBalancesFromJson, ORDER_ACTION_UPDATED, round_down
 from .api_connection import AuthApiConnection
-from Factories.Definitions import checkConfig
+from .product_router import ProductRouter
+from .recorder import getRecorder
+from .loop_monitor import getLoopMonitor
+from Factories.Definitions import checkConfig, InitBarrier
+
+################################################################################
+def createConnection(config):
+   leverexConfig = config['leverex']
+   keyPath = None
+   if 'key_file_path' in leverexConfig:
+      keyPath = leverexConfig['key_file_path']
+
+   aeid_endpoint = None
+   if 'aeid' in config and 'endpoint' in config['aeid']:
+      aeid_endpoint = config['aeid']['endpoint']
+
+   return AuthApiConnection(
+      api_endpoint=leverexConfig['api_endpoint'],
+      login_endpoint=leverexConfig['login_endpoint'],
+      key_file_path=keyPath,
+      dump_communication=False,
+      aeid_endpoint=aeid_endpoint,
+      recorder=getRecorder(config),
+      monitor=getLoopMonitor(config))
+
+####
+def createProductRouter(config):
+   #one authenticated connection serving all products of the account
+   return ProductRouter(createConnection(config))
 
 ################################################################################
 class LeverexBaseClient(object):
@@ -14,8 +42,9 @@ class LeverexBaseClient(object):
    }
 
    ## setup ##
-   def __init__(self, config):
+   def __init__(self, config, router=None):
       self.config = config
+      self.router = router
 
       #check for required config entries
       checkConfig(self.config, self.required_settings)
@@ -34,25 +63,22 @@ class LeverexBaseClient(object):
       self.withdrawalHistory = None
       self.netExposure = 0
       self.bands = {}
+      self.initBarrier = InitBarrier(f"Leverex {self.product}")
 
    def setupConnection(self):
-      leverexConfig = self.config['leverex']
-      keyPath = None
-      if 'key_file_path' in leverexConfig:
-         keyPath = leverexConfig['key_file_path']
-
-      aeid_endpoint = None
-      if 'aeid' in self.config and 'endpoint' in self.config['aeid']:
-         aeid_endpoint = self.config['aeid']['endpoint']
-
-      self.connection = AuthApiConnection(
-         api_endpoint=leverexConfig['api_endpoint'],
-         login_endpoint=leverexConfig['login_endpoint'],
-         key_file_path=keyPath,
-         dump_communication=False,
-         aeid_endpoint=aeid_endpoint)
+      if self.router != None:
+         #product events reach us through the shared connection's router
+         self.connection = self.router.connection
+         self.router.addListener(self.product, self)
+         return
+
+      self.connection = createConnection(self.config)
 
    async def subscribeToInitialData(self):
+      #requests go out back to back without waiting on replies, the
+      #barrier items are done from the replies
+      self.initBarrier.add('balance')
+      self.initBarrier.add('positions')
       await self.connection.subscribe_to_balance_updates(self.product)
       await self.connection.load_open_positions(
          target_product=self.product,
@@ -66,6 +92,7 @@ class LeverexBaseClient(object):
    async def loadAddresses(self, callback=None):
       async def depositAddressCallback(address):
          self.chainAddresses.setDepositAddr(address)
+         self.initBarrier.done('deposit address')
          if callback:
             await callback()
 
@@ -74,19 +101,24 @@ class LeverexBaseClient(object):
          for addr in addresses:
             addressList.append(addr)
          self.chainAddresses.setWithdrawAddresses(addressList)
+         self.initBarrier.done('withdraw addresses')
          if callback:
             await callback()
 
+      self.initBarrier.add('deposit address')
+      self.initBarrier.add('withdraw addresses')
       await self.connection.load_deposit_address(depositAddressCallback)
       await self.connection.load_whitelisted_addresses(withdrawAddressCallback)
 
    ## listeners ##
    async def on_balance_update(self, balances):
       self.balances = getBalancesFromJson(balances)
+      self.initBarrier.done('balance')
 
    async def on_positions_loaded(self, orders):
       for order in orders:
          self.storeOrder(order, ORDER_ACTION_UPDATED)
+      self.initBarrier.done('positions')
 
    async def on_session_open(self, sessionInfo):
       await self.setSession(SessionInfo(sessionInfo))
@@ -152,3 +184,15 @@ class LeverexBaseClient(object):
       if not sessionOrders:
          raise Exception()
       return sessionOrders.orders
+
+   def getMemoryGauges(self):
+      #these only grow for as long as the client runs
+      withdrawals = 0
+      if self.withdrawalHistory != None:
+         withdrawals = len(self.withdrawalHistory)
+      return {
+         'order_sessions' : len(self.orderData),
+         'orders' : sum(len(orders.orders) for orders in self.orderData.values()),
+         'withdrawals' : withdrawals,
+         'pending_requests' : len(self.connection._requests_cb)
+      }
@@ -0,0 +1,97 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+NS_PER_SEC = 1000000000
+
+################################################################################
+##
+#### clocks
+##
+################################################################################
+'''
+Components that read the time or wait on it take a clock instead of
+calling the time module, so replays, benchmarks and tests can run
+cooldowns and refresh intervals without sleeping. All clocks expose:
+   time(), time_ns(): timestamps, seconds and ns
+   monotonic(): for durations and throttles
+   sleep(seconds): awaitable
+'''
+class WallClock(object):
+   def time(self):
+      return time.time()
+
+   def time_ns(self):
+      return time.time_ns()
+
+   def monotonic(self):
+      return time.monotonic()
+
+   async def sleep(self, seconds):
+      await asyncio.sleep(seconds)
+
+########
+class MonotonicClock(WallClock):
+   '''
+   Timestamps off the monotonic clock, immune to wall clock steps.
+   Only good for measuring time between two reads of the same clock.
+   '''
+   def time(self):
+      return time.monotonic()
+
+   def time_ns(self):
+      return time.monotonic_ns()
+
+########
+class SimulatedClock(object):
+   '''
+   Time only moves when advanced. Sleepers wake once the clock is
+   advanced past their deadline, the clock never goes backwards.
+   '''
+   def __init__(self, start=0):
+      self._now = start #in ns
+      self._sleepers = []
+      self._counter = itertools.count()
+
+   def time(self):
+      return self._now / NS_PER_SEC
+
+   def time_ns(self):
+      return self._now
+
+   def monotonic(self):
+      return self.time()
+
+   def advance(self, timestamp):
+      #returns how many sleepers were woken
+      self._now = max(self._now, timestamp)
+      woken = 0
+      while len(self._sleepers) > 0 and self._sleepers[0][0] <= self._now:
+         deadline, count, future = heapq.heappop(self._sleepers)
+         if not future.done():
+            future.set_result(None)
+            woken += 1
+      return woken
+
+   def forward(self, seconds):
+      return self.advance(self._now + int(seconds * NS_PER_SEC))
+
+   def getNextDeadline(self):
+      for deadline, count, future in sorted(self._sleepers):
+         if not future.done():
+            return deadline
+      return None
+
+   async def sleep(self, seconds):
+      if seconds <= 0:
+         await asyncio.sleep(0)
+         return
+
+      future = asyncio.get_running_loop().create_future()
+      heapq.heappush(self._sleepers, (self._now + int(seconds * NS_PER_SEC),
+         next(self._counter), future))
+      await future
+
+########
+WALL_CLOCK = WallClock()
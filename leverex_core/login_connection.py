@@ -1,23 +1,184 @@
-import requests
+import asyncio
+import contextlib
 import json
 import datetime
 import websockets
+import websockets.exceptions
 import random
 import logging
-import pyqrcode
-import platform
-import io
 
 from jwcrypto import jwk, jws, jwe
 from jwcrypto.common import json_encode
 
-from PIL import Image, ImageDraw
+#pre-signed login challenges older than this are signed anew (in seconds)
+CHALLENGE_LIFETIME = 30
 
 ####
 class LoginException(Exception):
    def __init__(self, errStr):
       super().__init__(errStr)
 
+####
+class LoginConnectionException(LoginException):
+   pass
+
+################################################################################
+class LoginReplies():
+   def __init__(self, queue):
+      self._queue = queue
+
+   async def recv(self):
+      reply = await self._queue.get()
+      if reply is None:
+         raise LoginConnectionException("lost connection to login server")
+      return reply
+
+####
+class LoginSession():
+   '''
+   Long lived connection to the login server. The websocket is opened
+   on first use and reopened on the next request after a failure.
+   Replies are routed back to their request by message_id, so a single
+   session can serve several login clients at once.
+   '''
+   def __init__(self, login_endpoint, dump_communication=False):
+      self._login_endpoint = login_endpoint
+      self._dump_communication = dump_communication
+
+      self._websocket = None
+      self._readTask = None
+      self._connectLock = None
+      self._loop = None
+      self._replyQueues = {}
+
+   def _checkLoop(self):
+      #the dealer restarts on a fresh event loop, sockets and locks
+      #from the previous loop cannot be reused
+      loop = asyncio.get_running_loop()
+      if self._loop is loop:
+         return
+
+      self._loop = loop
+      self._websocket = None
+      self._readTask = None
+      self._connectLock = asyncio.Lock()
+      self._replyQueues = {}
+
+   def isConnected(self):
+      return self._websocket is not None
+
+   async def connect(self):
+      self._checkLoop()
+      async with self._connectLock:
+         if self._websocket is not None:
+            return
+
+         logging.info("Connecting to login endpoint: {}".format(self._login_endpoint))
+         websocket = await websockets.connect(self._login_endpoint)
+         self._websocket = websocket
+         self._readTask = asyncio.create_task(
+            self.readLoop(websocket), name="Login read task")
+
+   async def close(self):
+      if self._websocket is None:
+         return
+      websocket = self._websocket
+      self._websocket = None
+      await websocket.close()
+
+   async def readLoop(self, websocket):
+      try:
+         async for data in websocket:
+            reply = json.loads(data)
+            if self._dump_communication:
+               logging.info('Received {}'.format(data))
+
+            queue = self._replyQueues.get(reply.get('message_id'))
+            if queue is None:
+               logging.warning("Unexpected login reply: {}".format(data))
+               continue
+            queue.put_nowait(reply)
+
+      except websockets.exceptions.ConnectionClosed as e:
+         logging.warning(f"login connection closed: {e}")
+
+      except Exception as e:
+         #a reply we can't route, drop the socket, the next request
+         #reopens it
+         logging.error(f"login read loop failed: {e}")
+         await websocket.close()
+
+      finally:
+         if self._websocket is websocket:
+            self._websocket = None
+
+         #wake up pending requests, they will not get a reply
+         for queue in self._replyQueues.values():
+            queue.put_nowait(None)
+
+   def _newMessageId(self):
+      while True:
+         messageId = random.randint(0, 2**32-1)
+         if messageId not in self._replyQueues:
+            return messageId
+
+   @contextlib.asynccontextmanager
+   async def exchange(self, data):
+      '''
+      Sends data and yields a LoginReplies object that receives
+      all replies carrying the request message_id.
+      '''
+      await self.connect()
+
+      messageId = self._newMessageId()
+      data['message_id'] = messageId
+      queue = asyncio.Queue()
+      self._replyQueues[messageId] = queue
+
+      try:
+         if self._dump_communication:
+            logging.info('Sending {}'.format(json.dumps(data)))
+
+         websocket = self._websocket
+         if websocket is None:
+            raise LoginConnectionException("lost connection to login server")
+
+         try:
+            await websocket.send(json.dumps(data))
+         except websockets.exceptions.ConnectionClosed:
+            raise LoginConnectionException("lost connection to login server")
+
+         yield LoginReplies(queue)
+      finally:
+         self._replyQueues.pop(messageId, None)
+
+   async def request(self, data, retries=1):
+      #single reply requests are retried on a fresh connection
+      attempt = 0
+      while True:
+         try:
+            async with self.exchange(data) as replies:
+               return await replies.recv()
+         except LoginConnectionException:
+            if attempt >= retries:
+               raise
+            attempt += 1
+            logging.warning("login connection lost, retrying request")
+
+####
+_loginSessions = {}
+
+def getLoginSession(login_endpoint, dump_communication=False):
+   if login_endpoint not in _loginSessions:
+      _loginSessions[login_endpoint] = LoginSession(
+         login_endpoint, dump_communication)
+
+   #any client of a shared session can turn on its logging
+   session = _loginSessions[login_endpoint]
+   if dump_communication:
+      session._dump_communication = True
+   return session
+
 ####
 class LoginServiceClientWS():
    def __init__(self,
@@ -26,7 +187,8 @@ class LoginServiceClientWS():
       email=None,
       dump_communication=False,
       aeid_endpoint=None,
-      service_url=None
+      service_url=None,
+      session=None
       ):
 
       self._dump_communication = dump_communication
@@ -35,10 +197,23 @@ class LoginServiceClientWS():
       self._messages = {}
       self._service_url = service_url
 
+      #login sessions are shared per endpoint unless one is provided
+      if session is None:
+         session = getLoginSession(login_endpoint, dump_communication)
+      self._session = session
+
+      #key material is hashed and serialized once, thumbprint()
+      #rehashes the key on every call
+      self._thumbprint = None
+      self._public_key = None
+      self._challenge = None
+      self._sessionTask = None
       if private_key_path is not None:
          with open(private_key_path, 'r') as key_file:
             self._key = jwk.JWK()
             self._key.import_from_pem(key_file.read().encode())
+         self._thumbprint = self._key.thumbprint()
+         self._public_key = self._key.export_public(True)
       else:
          self._key = None
       self._aeid_endpoint = aeid_endpoint
@@ -56,74 +231,65 @@ class LoginServiceClientWS():
    def get_login_endpoint(self):
       return self._login_endpoint
 
+   def get_session(self):
+      return self._session
+
 
    async def send_key_to_endpoint(self):
       #print out the key fingerprint
       logging.info("Uploading key {} to login server for account:{}".format(
-         self._key.thumbprint(), self._email))
-
-      #randomize messageId
-      messageId = random.randint(0, 2**32-1)
+         self._thumbprint, self._email))
 
-      #create the upload_key_init packet
+      #create the upload_key_init packet, the login session
+      #sets the message id
       data = {'method': "upload_key_init", 'api': "login",
          'args': {
             'email': self.get_email(),
             'service_url': self.get_service_url(),
-            'user_cert': self._key.export_public(True)
-            },
-         #randomize the message id, it will be sent back to us on reply
-         'message_id': messageId}
+            'user_cert': self._public_key
+            }
+         }
 
       #send to login server
-      logging.info("Connecting to login endpoint: {}".format(self._login_endpoint))
-      async with websockets.connect(self._login_endpoint) as websocket:
-         await websocket.send(json.dumps(data))
-
+      async with self._session.exchange(data) as replies:
          logging.info('Request sent. Please approve on your eID device.')
          #await response, this should prompt the autheid account
          #attached to this email for vetting the key
          while True:
-            resp = await websocket.recv()
-
             #report status, we're done
-            uploadResult = json.loads(resp)
+            uploadResult = await replies.recv()
 
             if uploadResult['error'] is not None:
                error_message = uploadResult['error']
                logging.error(f'Request failed: {error_message}')
                return False
 
-            if uploadResult['message_id'] != messageId:
-               logging.warning(f'Unexpected reply: {uploadResult}')
+            if not 'data' in uploadResult:
                continue
+
+            operation_status = uploadResult['data']['status']
+            if operation_status == 'PENDING':
+               # waiting for user action
+               continue
+            elif operation_status == 'USER_CANCELLED':
+               logging.error('Request rejected')
+               return False
+            elif operation_status == 'TIMEOUT':
+               logging.error('Request sign timeout')
+               return False
+            elif operation_status == 'SUCCESS':
+               logging.info('Request accepted')
+               return True
             else:
-               if not 'data' in uploadResult:
-                  continue
-
-               operation_status = uploadResult['data']['status']
-               if operation_status == 'PENDING':
-                  # waiting for user action
-                  continue
-               elif operation_status == 'USER_CANCELLED':
-                  logging.error('Request rejected')
-                  return False
-               elif operation_status == 'TIMEOUT':
-                  logging.error('Request sign timeout')
-                  return False
-               elif operation_status == 'SUCCESS':
-                  logging.info('Request accepted')
-                  return True
-               else:
-                  logging.error(f'Error: unexpected status {operation_status}')
-                  return False
+               logging.error(f'Error: unexpected status {operation_status}')
+               return False
 
       return False
 
    def _sign_token(self, token):
       jws_token = jws.JWS(token.encode('utf-8'))
       header = {
-         'kid': self._key.thumbprint(),
+         'kid': self._thumbprint,
       }
       jws_token.add_signature(
          self._key, None, json_encode({'alg': 'ES256'}), json_encode(header)
@@ -131,6 +297,62 @@ class LoginServiceClientWS():
 
       return jws_token.serialize(compact=False)
 
+   async def _sign_challenge(self, api_enpoint_url):
+      token_dict = {
+           'thumbprint': self._thumbprint,
+           'created': '{}'.format(datetime.datetime.utcnow()),
+           'service_url': api_enpoint_url
+      }
+      token = json.dumps(token_dict)
+
+      #ES256 signing is cpu bound, keep it off the event loop
+      loop = asyncio.get_running_loop()
+      return await loop.run_in_executor(None, self._sign_token, token)
+
+   def prepare_login(self, api_enpoint_url):
+      '''
+      Starts signing the login challenge and opening the login session
+      in the background, so that both are ready by the time the api
+      connection is established.
+      '''
+      if self._key == None:
+         return
+
+      #a challenge prepared for an earlier connection attempt is stale
+      self._cancel_challenge()
+      loop = asyncio.get_running_loop()
+      self._challenge = {
+         'service_url': api_enpoint_url,
+         'created': loop.time(),
+         'task': asyncio.create_task(self._sign_challenge(api_enpoint_url))
+      }
+      self._sessionTask = asyncio.create_task(self._connect_session())
+
+   async def _connect_session(self):
+      try:
+         await self._session.connect()
+      except Exception as e:
+         #the login request will reconnect and report the error
+         logging.warning(f"failed to open login session ahead of login: {e}")
+
+   def _cancel_challenge(self):
+      if self._challenge != None:
+         self._challenge['task'].cancel()
+         self._challenge = None
+
+   async def _get_signed_challenge(self, api_enpoint_url):
+      challenge = self._challenge
+      if challenge != None and challenge['service_url'] == api_enpoint_url:
+         #challenges carry their creation time, do not use stale ones
+         loop = asyncio.get_running_loop()
+         if loop.time() - challenge['created'] < CHALLENGE_LIFETIME:
+            self._challenge = None
+            return await challenge['task']
+
+      #an unmatched or stale challenge is abandoned, don't leave it running
+      self._cancel_challenge()
+      return await self._sign_challenge(api_enpoint_url)
+
    # get_access_token return
    # {
    #    'access_token': 'token string'
@@ -147,86 +369,57 @@ class LoginServiceClientWS():
 
    ## generate and sign access token provided private key
    async def get_access_token_from_key(self, api_enpoint_url):
-      token_dict = {
-           'thumbprint': self._key.thumbprint(),
-           'created': '{}'.format(datetime.datetime.utcnow()),
-           'service_url': api_enpoint_url
-      }
-      token = json.dumps(token_dict)
-      serialized_token = self._sign_token(token)
+      serialized_token = await self._get_signed_challenge(api_enpoint_url)
 
-      messageId = random.randint(0, 2**32-1)
       data = {'method': "new", 'api': "login",
          'args': {
             'signed_challenge': serialized_token,
-            },
-         #randomize the message id, it will be sent back to us on reply
-         'message_id': messageId}
+            }
+         }
 
-      async with websockets.connect(self._login_endpoint) as websocket:
-         if self._dump_communication:
-            logging.info('Sending {}'.format(json.dumps(data)))
-         await websocket.send(json.dumps(data))
+      uploadResult = await self._session.request(data)
+      return uploadResult['data']
 
-         while True:
-            resp = await websocket.recv()
+   def _display_qr(self, requestUrl):
+      #QR login is interactive only, keep its dependencies out of
+      #the import path of the dealer
+      import platform
+      import pyqrcode
 
-            #report status, we're done
-            uploadResult = json.loads(resp)
+      qr = pyqrcode.create(requestUrl)
 
-            if self._dump_communication:
-               logging.info('Received {}'.format(json.dumps(uploadResult)))
+      #display login QR
+      print ("login request has been created, scan this QR with your aeid mobile app to proceed")
 
-            if uploadResult['message_id'] != messageId:
-               logging.warning("Unexpected response: {}".format(uploadResult))
-               continue
-            else:
-               break
+      if platform.system() == 'Windows':
+         import io
+         from PIL import Image
 
-         return uploadResult['data']
+         buffer = io.BytesIO()
+         qr.png(buffer, scale=10)
+         buffer.seek(0)
+         img = Image.open(buffer)
+         img.show(title="Scan this QR with your Autheid mobile App")
+      else:
+         print(qr.terminal())
 
    ## get request id to generate token from 2FA
    async def get_access_token_from_request(self, api_enpoint_url):
-      messageId = random.randint(0, 2**32-1)
       data = {'method': "login_init",
          'api': "login",
-         'args': {'service_url': api_enpoint_url},
-         #randomize the message id, it will be sent back to us on reply
-         'message_id': messageId}
-
-      async with websockets.connect(self._login_endpoint) as websocket:
-         if self._dump_communication:
-            logging.info('Sending {}'.format(json.dumps(data)))
-         await websocket.send(json.dumps(data))
+         'args': {'service_url': api_enpoint_url}
+         }
 
+      async with self._session.exchange(data) as replies:
          while True:
-            resp = await websocket.recv()
-            loginReply = json.loads(resp)
-
-            if self._dump_communication:
-               logging.info('Received {}'.format(resp))
-
-            if loginReply['message_id'] != messageId:
-               logging.warning("Unexpected login reply: {}".format(resp))
-               continue
+            loginReply = await replies.recv()
+            resp = json.dumps(loginReply)
 
             # handle login server replies
             if loginReply['method'] == 'login_init':
                requestId = loginReply['data']['request_id']
                requestUrl = f"{self._aeid_endpoint}/app/requests/?request_id={requestId}"
-               qr = pyqrcode.create(requestUrl)
-
-               #display login QR
-               print ("login request has been created, scan this QR with your aeid mobile app to proceed")
-
-               if platform.system() == 'Windows':
-                   buffer = io.BytesIO()
-                   qr.png(buffer, scale=10)
-                   buffer.seek(0)
-                   img = Image.open(buffer)
-                   img.show(title="Scan this QR with your Autheid mobile App")
-               else:
-                   print(qr.terminal())
+               self._display_qr(requestUrl)
 
                #wait on request status update
                continue
@@ -256,32 +449,11 @@ class LoginServiceClientWS():
 
    ## refresh session JWT
    async def update_access_token(self, access_token):
-      messageId = random.randint(0, 2**32-1)
       data = {'method': "renew", 'api': "login",
          'args': {
             'access_token': access_token,
-            },
-         #randomize the message id, it will be sent back to us on reply
-         'message_id': messageId}
-
-      async with websockets.connect(self._login_endpoint) as websocket:
-         if self._dump_communication:
-            logging.info('Sending {}'.format(json.dumps(data)))
-         await websocket.send(json.dumps(data))
-
-         while True:
-            resp = await websocket.recv()
-
-            #report status, we're done
-            uploadResult = json.loads(resp)
-
-            if self._dump_communication:
-               logging.info('Received {}'.format(json.dumps(uploadResult)))
-
-            if uploadResult['message_id'] != messageId:
-               logging.warning("Unexpected reply: {}".format(uploadResult))
-               continue
-            else:
-               break
+            }
+         }
 
-         return uploadResult['data']
+      uploadResult = await self._session.request(data)
+      return uploadResult['data']
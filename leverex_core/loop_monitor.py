@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+LAG_INTERVAL = 0.1      #in seconds, between event loop lag samples
+SLOW_THRESHOLD = 0.05   #in seconds, callbacks and stalls longer than this get logged
+STACK_DEPTH = 5         #frames logged off the top of a stalled stack
+
+################################################################################
+class LagStats(object):
+   def __init__(self):
+      self.count = 0
+      self.total = 0
+      self.max = 0
+
+   def record(self, value):
+      self.count += 1
+      self.total += value
+      self.max = max(self.max, value)
+
+   def getAverage(self):
+      if self.count == 0:
+         return 0
+      return self.total / self.count
+
+   def __str__(self):
+      return f"{self.count} samples, avg: {round(self.getAverage() * 1000, 3)}ms, " \
+         f"max: {round(self.max * 1000, 3)}ms"
+
+####
+def getCallbackName(cb):
+   name = getattr(cb, '__qualname__', None)
+   if name == None:
+      return repr(cb)
+   return name
+
+def getCallbackLocation(cb):
+   code = getattr(getattr(cb, '__func__', cb), '__code__', None)
+   if code == None:
+      return None
+   return f"{code.co_filename}:{code.co_firstlineno}"
+
+################################################################################
+class LoopMonitor(object):
+   '''
+   Samples event loop scheduling lag and times the callbacks routed
+   through call(). A callback running over the threshold is logged with
+   its event type and the top of the loop thread's stack, as sampled by
+   a watchdog thread while the loop was stalled: a blocking callback
+   names the line it blocked on.
+
+   Coroutine callbacks are timed until they return, awaits included. No
+   stalled stack in the log means the time was spent waiting, not
+   starving the loop.
+   '''
+   def __init__(self, threshold=SLOW_THRESHOLD, interval=LAG_INTERVAL,
+      stackDepth=STACK_DEPTH):
+      self._name = "LoopMonitor"
+      self.threshold = threshold
+      self.interval = interval
+      self.stackDepth = stackDepth
+
+      self.lag = LagStats()
+      self.slowCallbacks = 0
+      self.stalls = 0
+
+      #watchdog state
+      self.loopThreadId = None
+      self.heartbeat = None
+      self.syncStart = None
+      self.lastStall = None #(monotonic time, formatted stack)
+      self.watchdog = None
+      self.running = False
+      self.task = None
+
+   @property
+   def name(self):
+      return self._name
+
+   def getAsyncIOTask(self):
+      #dealers sharing the monitor share its sampling task
+      if self.task == None or self.task.done():
+         self.task = asyncio.create_task(self.lagLoop())
+      return self.task
+
+   ## timing ##
+   async def call(self, eventType, cb, *args, **kwargs):
+      if not asyncio.iscoroutinefunction(cb):
+         return self.callSync(eventType, cb, *args, **kwargs)
+
+      start = time.monotonic()
+      try:
+         return await cb(*args, **kwargs)
+      finally:
+         self.checkDuration(eventType, cb, start)
+
+   def callSync(self, eventType, cb, *args, **kwargs):
+      #the loop can't switch away from a sync callback, the watchdog
+      #watches the outermost one
+      start = time.monotonic()
+      outer = self.syncStart
+      if outer == None:
+         self.syncStart = start
+      try:
+         return cb(*args, **kwargs)
+      finally:
+         self.syncStart = outer
+         self.checkDuration(eventType, cb, start)
+
+   def wrap(self, eventType, cb):
+      #keeps cb sync or async, for emitters that treat them differently
+      if asyncio.iscoroutinefunction(cb):
+         async def monitored(*args, **kwargs):
+            return await self.call(eventType, cb, *args, **kwargs)
+      else:
+         def monitored(*args, **kwargs):
+            return self.callSync(eventType, cb, *args, **kwargs)
+      return monitored
+
+   def checkDuration(self, eventType, cb, start):
+      duration = time.monotonic() - start
+      if duration > self.threshold:
+         self.onSlowCallback(eventType, cb, start, duration)
+
+   def onSlowCallback(self, eventType, cb, start, duration):
+      self.slowCallbacks += 1
+      message = f"[LoopMonitor] slow callback {getCallbackName(cb)} " \
+         f"({eventType}): {round(duration * 1000, 1)}ms"
+
+      stall = self.lastStall
+      if stall != None and stall[0] >= start:
+         message += f", loop stalled in:\n{stall[1]}"
+      else:
+         location = getCallbackLocation(cb)
+         if location != None:
+            message += f", defined at {location}"
+      logging.warning(message)
+
+   ## lag sampling ##
+   async def lagLoop(self):
+      self.loopThreadId = threading.get_ident()
+      self.heartbeat = time.monotonic()
+      self.startWatchdog()
+      try:
+         while True:
+            start = time.monotonic()
+            self.heartbeat = start
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - start - self.interval, 0)
+            self.lag.record(lag)
+            if lag > self.threshold:
+               logging.warning(f"[LoopMonitor] event loop lagged "
+                  f"{round(lag * 1000, 1)}ms")
+      finally:
+         self.running = False
+
+   def startWatchdog(self):
+      self.running = True
+      if self.watchdog != None and self.watchdog.is_alive():
+         return
+      self.watchdog = threading.Thread(target=self.watchdogLoop,
+         name="LoopMonitorWatchdog", daemon=True)
+      self.watchdog.start()
+
+   def isStalled(self, now, syncStart, beat):
+      if syncStart != None and now - syncStart > self.threshold:
+         return True
+      #an overdue heartbeat means a coroutine is holding the loop
+      return beat != None and now - beat > self.interval + self.threshold
+
+   def watchdogLoop(self):
+      #grab the loop thread's stack once per stall
+      seen = None
+      while self.running:
+         time.sleep(self.threshold / 2)
+         syncStart = self.syncStart
+         beat = self.heartbeat
+         if not self.isStalled(time.monotonic(), syncStart, beat) or \
+            (syncStart, beat) == seen:
+            continue
+         seen = (syncStart, beat)
+
+         frame = sys._current_frames().get(self.loopThreadId)
+         if frame == None:
+            continue
+         stack = traceback.extract_stack(frame, limit=self.stackDepth)
+         del frame
+         self.stalls += 1
+         self.lastStall = (time.monotonic(), ''.join(traceback.format_list(stack)))
+
+   def __str__(self):
+      return f"loop lag: {str(self.lag)}, slow callbacks: {self.slowCallbacks}, " \
+         f"stalls: {self.stalls}"
+
+################################################################################
+_monitor = None
+
+def getLoopMonitor(config):
+   '''
+   Opt-in through the "loop_monitor" config group. There is one event
+   loop per process, connections and dealers share the monitor.
+   '''
+   global _monitor
+   if 'loop_monitor' not in config:
+      return None
+
+   if _monitor == None:
+      settings = config['loop_monitor']
+      _monitor = LoopMonitor(
+         settings.get('threshold', SLOW_THRESHOLD),
+         settings.get('interval', LAG_INTERVAL),
+         settings.get('stack_depth', STACK_DEPTH))
+   return _monitor
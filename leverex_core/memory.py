@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+import tracemalloc
+
+REPORT_INTERVAL = 300   #in seconds, between gauge reports
+TRACE_FRAMES = 10       #frames kept per traced allocation
+TOP_ENTRIES = 25        #allocation sites written per snapshot diff
+MEMORY_SIGNAL = signal.SIGUSR2
+
+####
+def getRss():
+   #current resident set size in bytes, None where /proc isn't available
+   try:
+      with open('/proc/self/statm') as statm:
+         return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+   except (OSError, ValueError, IndexError):
+      return None
+
+def formatSize(size):
+   if size == None:
+      return "N/A"
+   return f"{round(size / 2**20, 1)}MB"
+
+################################################################################
+class MemoryReport(object):
+   '''
+   Process memory and the sizes of the structures that grow with the
+   process' lifetime, as gauged by their owners' getMemoryGauges().
+   '''
+   def __init__(self, gauges):
+      self.rss = getRss()
+      self.traced = None
+      self.tracedPeak = None
+      if tracemalloc.is_tracing():
+         self.traced, self.tracedPeak = tracemalloc.get_traced_memory()
+      self.gauges = gauges
+
+   def __str__(self):
+      result = f"  - rss: {formatSize(self.rss)}"
+      if self.traced != None:
+         result += f", traced: {formatSize(self.traced)}, " \
+            f"peak: {formatSize(self.tracedPeak)}"
+      for name, size in self.gauges.items():
+         result += f"\n  - {name}: {size}"
+      return result
+
+########
+class MemoryTracker(object):
+   '''
+   tracemalloc snapshots. The first snapshot starts tracing if it isn't
+   on already, each following one is diffed against the previous and
+   the allocation sites that grew the most are written to outputDir.
+   Tracing slows allocations down, it stays on once started.
+   '''
+   def __init__(self, outputDir='.', frames=TRACE_FRAMES, top=TOP_ENTRIES):
+      self.outputDir = outputDir
+      self.frames = frames
+      self.top = top
+      self.previous = None
+      self.lastOutput = None
+
+   def start(self):
+      if not tracemalloc.is_tracing():
+         tracemalloc.start(self.frames)
+
+   def takeSnapshot(self):
+      snapshot = tracemalloc.take_snapshot()
+      return snapshot.filter_traces([
+         tracemalloc.Filter(False, tracemalloc.__file__)])
+
+   def snapshot(self):
+      #returns the diff path, None when this snapshot is the baseline
+      if self.previous == None or not tracemalloc.is_tracing():
+         self.start()
+         self.previous = self.takeSnapshot()
+         logging.warning("[MemoryTracker] tracing allocations, "
+            "the next snapshot is diffed against this one")
+         return None
+
+      snapshot = self.takeSnapshot()
+      stats = snapshot.compare_to(self.previous, 'traceback')
+      self.previous = snapshot
+
+      path = self.getOutputPath()
+      with open(path, 'w') as output:
+         for stat in stats[:self.top]:
+            output.write(f"{stat}\n")
+            for line in stat.traceback.format():
+               output.write(f"{line}\n")
+            output.write("\n")
+
+      self.lastOutput = path
+      logging.warning(f"[MemoryTracker] snapshot diff written to {path}")
+      return path
+
+   def getOutputPath(self):
+      stamp = time.strftime('%Y%m%d-%H%M%S')
+      path = os.path.join(self.outputDir, f"memory-{os.getpid()}-{stamp}.diff")
+
+      #snapshots within the same second get a suffix
+      count = 1
+      while os.path.exists(path):
+         path = os.path.join(self.outputDir,
+            f"memory-{os.getpid()}-{stamp}-{count}.diff")
+         count += 1
+      return path
+
+################################################################################
+class MemoryMonitor(object):
+   '''
+   Periodically notifies its listeners, which report their memory
+   gauges. MEMORY_SIGNAL takes a tracker snapshot while the task from
+   getAsyncIOTask() runs.
+   '''
+   def __init__(self, tracker, interval=REPORT_INTERVAL):
+      self._name = "MemoryMonitor"
+      self.tracker = tracker
+      self.interval = interval
+      self.callbacks = []
+      self.task = None
+
+   @property
+   def name(self):
+      return self._name
+
+   def setup(self, callback):
+      #dealers sharing the monitor each get notified
+      if callback not in self.callbacks:
+         self.callbacks.append(callback)
+
+   def removeCallback(self, callback):
+      #a stopped dealer is no longer reported on
+      if callback in self.callbacks:
+         self.callbacks.remove(callback)
+
+   def getAsyncIOTask(self):
+      if self.task == None or self.task.done():
+         self.task = asyncio.create_task(self.run())
+      return self.task
+
+   async def run(self):
+      loop = asyncio.get_running_loop()
+      loop.add_signal_handler(MEMORY_SIGNAL, self.tracker.snapshot)
+      try:
+         while True:
+            await asyncio.sleep(self.interval)
+            for callback in self.callbacks:
+               await callback()
+      finally:
+         loop.remove_signal_handler(MEMORY_SIGNAL)
+
+################################################################################
+_monitor = None
+
+def getMemoryMonitor(config):
+   '''
+   Opt-in through the "memory" config group: interval, output_dir,
+   frames, top and trace, which starts tracing allocations right away.
+   '''
+   global _monitor
+   if 'memory' not in config:
+      return None
+
+   if _monitor == None:
+      settings = config['memory']
+      tracker = MemoryTracker(
+         settings.get('output_dir', '.'),
+         settings.get('frames', TRACE_FRAMES),
+         settings.get('top', TOP_ENTRIES))
+      if settings.get('trace', False):
+         tracker.start()
+      _monitor = MemoryMonitor(tracker,
+         settings.get('interval', REPORT_INTERVAL))
+   return _monitor
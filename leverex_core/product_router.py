@@ -0,0 +1,149 @@
+import asyncio
+import logging
+
+################################################################################
+class ProductRouter(object):
+   '''
+   Listener for an AuthApiConnection serving several products. Every
+   notification the connection emits has an explicit route:
+
+    - product notifications are demultiplexed by product_type to the
+      listener registered for that product. Those naming no product or
+      an unknown one are logged and dropped.
+    - connection state and balances are broadcast to all listeners.
+    - account operations (deposits, withdrawals, addresses) go to a
+      single owner: the account handler if one is set, the first
+      registered listener otherwise. Broadcasting them would have every
+      product book the same transfer.
+
+   A listener raising out of a callback is logged and skipped.
+
+   Providers sharing a router share its connection: one socket, one
+   login and one token renewal cycle for all products.
+   '''
+   def __init__(self, connection):
+      self.connection = connection
+      self.listeners = {}
+      self.accountHandler = None
+      self._task = None
+
+   def addListener(self, product, listener):
+      if product in self.listeners:
+         raise Exception(f"product {product} already has a listener")
+      self.listeners[product] = listener
+
+   def removeListener(self, product, listener):
+      #a restarted product registers its new provider
+      if self.listeners.get(product) is listener:
+         del self.listeners[product]
+
+   def getListener(self, product):
+      return self.listeners.get(product)
+
+   def setAccountHandler(self, handler):
+      self.accountHandler = handler
+
+   def getAccountHandler(self):
+      if self.accountHandler != None:
+         return self.accountHandler
+      for listener in self.listeners.values():
+         return listener
+      return None
+
+   def getAsyncIOTask(self):
+      #every provider asks for the connection task, only run it once
+      if self._task == None or self._task.get_loop() is not asyncio.get_running_loop():
+         self._task = asyncio.create_task(self.connection.run(self))
+      return self._task
+
+   ## dispatch ##
+   async def _call(self, listener, methodName, *args, **kwargs):
+      cb = getattr(listener, methodName, None)
+      if not callable(cb):
+         return
+
+      #a product failing on a notification can't take the others down
+      try:
+         await self.connection._call_listener_cb(cb, *args, **kwargs)
+      except Exception as e:
+         logging.error(f"[ProductRouter] {getattr(listener, 'product', None)}"
+            f" failed on {methodName} with error: {e}")
+
+   async def _route(self, product, methodName, *args, **kwargs):
+      listener = self.listeners.get(product)
+      if listener == None:
+         logging.warning(f"[ProductRouter] no listener for product {product}, dropping {methodName}")
+         return
+      await self._call(listener, methodName, *args, **kwargs)
+
+   async def _broadcast(self, methodName, *args, **kwargs):
+      for product in list(self.listeners):
+         await self._call(self.listeners[product], methodName, *args, **kwargs)
+
+   async def _toAccount(self, methodName, *args, **kwargs):
+      handler = self.getAccountHandler()
+      if handler == None:
+         logging.warning(f"[ProductRouter] no account handler, dropping {methodName}")
+         return
+      await self._call(handler, methodName, *args, **kwargs)
+
+   ## connection notifications ##
+   async def on_connected(self):
+      await self._broadcast('on_connected')
+
+   async def on_authorized(self):
+      await self._broadcast('on_authorized')
+
+   async def on_balance_update(self, balances):
+      await self._broadcast('on_balance_update', balances)
+
+   ## account notifications ##
+   async def on_deposit_update(self, depositInfo):
+      await self._toAccount('on_deposit_update', depositInfo)
+
+   async def on_withdraw_update(self, withdrawInfo):
+      await self._toAccount('on_withdraw_update', withdrawInfo)
+
+   async def on_deposit_address_loaded(self, address):
+      await self._toAccount('on_deposit_address_loaded', address)
+
+   async def on_withdrawals_history_loaded(self, withdrawals):
+      await self._toAccount('on_withdrawals_history_loaded', withdrawals)
+
+   async def on_deposits_history_loaded(self, deposits):
+      await self._toAccount('on_deposits_history_loaded', deposits)
+
+   async def on_withdraw_request_response(self, withdrawInfo):
+      await self._toAccount('on_withdraw_request_response', withdrawInfo)
+
+   async def on_whitelisted_addresses_loaded(self, addresses):
+      await self._toAccount('on_whitelisted_addresses_loaded', addresses)
+
+   ## product notifications ##
+   async def on_market_data(self, marketData):
+      await self._route(marketData.get('product_type'),
+         'on_market_data', marketData)
+
+   async def on_session_open(self, sessionInfo):
+      await self._route(sessionInfo.product_type,
+         'on_session_open', sessionInfo)
+
+   async def on_session_closed(self, sessionInfo):
+      await self._route(sessionInfo.product_type,
+         'on_session_closed', sessionInfo)
+
+   async def on_order_event(self, order, eventType):
+      await self._route(order.product_type,
+         'on_order_event', order, eventType)
+
+   async def on_load_positions(self, orders, target_product):
+      await self._route(target_product,
+         'on_load_positions', orders, target_product=target_product)
+
+   async def on_dealer_offers(self, offers):
+      await self._route(offers.product_type,
+         'on_dealer_offers', offers)
+
+   async def onSubmitPrices(self, reply):
+      await self._route(reply['submit_prices'].get('product_type'),
+         'onSubmitPrices', reply)
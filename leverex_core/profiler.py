@@ -0,0 +1,189 @@
+import asyncio
+import cProfile
+import collections
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+PROFILE_DURATION = 30   #in seconds, unless stopped earlier
+SAMPLE_INTERVAL = 0.005 #in seconds, between stack samples
+PROFILE_SIGNAL = signal.SIGUSR1
+
+MODE_CPROFILE = 'cprofile'  #deterministic, pstats output
+MODE_SAMPLING = 'sampling'  #stack samples, collapsed stacks output
+PROFILE_MODES = [MODE_CPROFILE, MODE_SAMPLING]
+
+class ProfilerException(Exception):
+   pass
+
+####
+def getCollapsedStack(frame):
+   names = []
+   while frame != None:
+      code = frame.f_code
+      names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+      frame = frame.f_back
+   return ';'.join(reversed(names))
+
+################################################################################
+class StackSampler(object):
+   '''
+   Samples a thread's stack from a side thread. Output is in the
+   collapsed format flame graph tools read: one line per distinct
+   stack, root first, followed by its sample count.
+   '''
+   def __init__(self, threadId, interval):
+      self.threadId = threadId
+      self.interval = interval
+      self.counts = collections.Counter()
+      self.running = False
+      self.thread = None
+
+   def start(self):
+      self.running = True
+      self.thread = threading.Thread(target=self.sampleLoop,
+         name="StackSampler", daemon=True)
+      self.thread.start()
+
+   def stop(self):
+      self.running = False
+      self.thread.join()
+
+   def sampleLoop(self):
+      while self.running:
+         frame = sys._current_frames().get(self.threadId)
+         if frame != None:
+            self.counts[getCollapsedStack(frame)] += 1
+         del frame
+         time.sleep(self.interval)
+
+   def write(self, path):
+      with open(path, 'w') as output:
+         for stack, count in self.counts.most_common():
+            output.write(f"{stack} {count}\n")
+
+################################################################################
+class Profiler(object):
+   '''
+   Profiles the event loop thread on demand, for a set duration or until
+   stopped. PROFILE_SIGNAL toggles it while the task from
+   getAsyncIOTask() runs, so a live process can be profiled without a
+   restart. Each run is written to its own file in outputDir.
+   '''
+   def __init__(self, outputDir='.', mode=MODE_CPROFILE,
+      duration=PROFILE_DURATION, interval=SAMPLE_INTERVAL):
+      if mode not in PROFILE_MODES:
+         raise ProfilerException(f"unknown profiler mode {mode}")
+
+      self._name = "Profiler"
+      self.outputDir = outputDir
+      self.mode = mode
+      self.duration = duration
+      self.interval = interval
+
+      self.session = None
+      self.stopHandle = None
+      self.lastOutput = None
+      self.task = None
+
+   @property
+   def name(self):
+      return self._name
+
+   def isRunning(self):
+      return self.session != None
+
+   ## control ##
+   def start(self, duration=None):
+      if self.isRunning():
+         raise ProfilerException("already profiling")
+      if duration == None:
+         duration = self.duration
+
+      if self.mode == MODE_CPROFILE:
+         #cProfile only sees the thread it is enabled from, the loop's
+         self.session = cProfile.Profile()
+         self.session.enable()
+      else:
+         self.session = StackSampler(threading.get_ident(), self.interval)
+         self.session.start()
+
+      self.stopHandle = asyncio.get_running_loop().call_later(duration, self.stop)
+      logging.warning(f"[Profiler] {self.mode} profiling for {duration}s")
+
+   def stop(self):
+      #returns the output path, None if there was nothing to stop
+      if not self.isRunning():
+         return None
+      self.stopHandle.cancel()
+      self.stopHandle = None
+
+      session = self.session
+      self.session = None
+      path = self.getOutputPath()
+      if self.mode == MODE_CPROFILE:
+         session.disable()
+         session.dump_stats(path)
+      else:
+         session.stop()
+         session.write(path)
+
+      self.lastOutput = path
+      logging.warning(f"[Profiler] profile written to {path}")
+      return path
+
+   def toggle(self):
+      if self.isRunning():
+         self.stop()
+      else:
+         self.start()
+
+   def getOutputPath(self):
+      extension = 'pstats' if self.mode == MODE_CPROFILE else 'collapsed'
+      stamp = time.strftime('%Y%m%d-%H%M%S')
+      path = os.path.join(self.outputDir, f"profile-{os.getpid()}-{stamp}.{extension}")
+
+      #runs within the same second get a suffix
+      count = 1
+      while os.path.exists(path):
+         path = os.path.join(self.outputDir,
+            f"profile-{os.getpid()}-{stamp}-{count}.{extension}")
+         count += 1
+      return path
+
+   ## signal ##
+   def getAsyncIOTask(self):
+      #dealers sharing the profiler share its task
+      if self.task == None or self.task.done():
+         self.task = asyncio.create_task(self.run())
+      return self.task
+
+   async def run(self):
+      loop = asyncio.get_running_loop()
+      loop.add_signal_handler(PROFILE_SIGNAL, self.toggle)
+      try:
+         await asyncio.Event().wait()
+      finally:
+         loop.remove_signal_handler(PROFILE_SIGNAL)
+         self.stop()
+
+################################################################################
+_profiler = None
+
+def getProfiler(config):
+   '''
+   Always available, the "profiler" config group overrides the defaults:
+   output_dir, mode, duration and interval.
+   '''
+   global _profiler
+   if _profiler == None:
+      settings = config.get('profiler', {})
+      _profiler = Profiler(
+         settings.get('output_dir', '.'),
+         settings.get('mode', MODE_CPROFILE),
+         settings.get('duration', PROFILE_DURATION),
+         settings.get('interval', SAMPLE_INTERVAL))
+   return _profiler
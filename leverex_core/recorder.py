@@ -0,0 +1,321 @@
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+################################################################################
+##
+#### wire event recorder
+##
+################################################################################
+'''
+Append-only binary log of the messages a dealer sends and receives. All
+fields are little endian:
+   file header: magic, version
+   record: header (payload length, monotonic ns, kind, stream id), payload
+
+Kinds:
+   IN, OUT: a message, the payload is the raw frame (utf-8)
+   STREAM: declares a stream id for this writer session, the payload is
+      the stream name. Ids are only valid until the next declaration
+   INDEX: written every INDEX_INTERVAL messages, covers the messages since
+      the previous index: previous index offset, first message offset,
+      first and last timestamps, message count
+
+Payload lengths let a reader skip to any record without decoding, index
+records let it jump close to a timestamp.
+'''
+RECORD_MAGIC = b'LVXR'
+RECORD_VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sI')
+RECORD_HEADER = struct.Struct('<IQBB')
+INDEX = struct.Struct('<QQQQI')
+
+IN       = 0
+OUT      = 1
+STREAM   = 2
+INDEX_KIND = 3
+
+INDEX_INTERVAL = 1000   #messages
+MAX_QUEUE_LEN = 100000  #messages waiting on the writer thread
+
+class RecorderException(Exception):
+   pass
+
+################################################################################
+class Record(object):
+   def __init__(self, offset, timestamp, kind, stream, payload):
+      self.offset = offset
+      self.timestamp = timestamp #monotonic, in ns
+      self.kind = kind
+      self.stream = stream
+      self.payload = payload
+
+   @property
+   def data(self):
+      return self.payload.decode()
+
+   def json(self):
+      return json.loads(self.payload)
+
+   def isInbound(self):
+      return self.kind == IN
+
+   def __str__(self):
+      direction = "<-" if self.kind == IN else "->"
+      return f"[{self.timestamp}] {self.stream} {direction} {self.data}"
+
+########
+class EventRecorder(object):
+   '''
+   Messages are stamped and queued on the caller's thread, encoding and
+   disk writes happen on a background thread so the event loop never
+   blocks on the file. If the writer falls MAX_QUEUE_LEN messages
+   behind, new messages are dropped and counted.
+   '''
+   def __init__(self, path, indexInterval=INDEX_INTERVAL):
+      self.path = path
+      self.indexInterval = indexInterval
+      self.queue = queue.Queue(MAX_QUEUE_LEN)
+      self.streams = {}
+      self.recorded = 0
+      self.dropped = 0
+      self.written = 0
+
+      self._file = open(path, 'ab')
+      if self._file.tell() == 0:
+         self._file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION))
+      self._lastIndex = 0
+      self._resetChunk()
+
+      self._thread = threading.Thread(target=self._writeLoop,
+         name="event recorder", daemon=True)
+      self._thread.start()
+
+   def record(self, stream, kind, data):
+      try:
+         self.queue.put_nowait((time.monotonic_ns(), stream, kind, data))
+         self.recorded += 1
+      except queue.Full:
+         self.dropped += 1
+
+   def inbound(self, stream, data):
+      self.record(stream, IN, data)
+
+   def outbound(self, stream, data):
+      self.record(stream, OUT, data)
+
+   def close(self):
+      self.queue.put(None)
+      self._thread.join()
+
+   ## writer thread ##
+   def _resetChunk(self):
+      self._chunkStart = None
+      self._chunkFirst = 0
+      self._chunkLast = 0
+      self._chunkCount = 0
+
+   def _writeRecord(self, timestamp, kind, streamId, payload):
+      offset = self._file.tell()
+      self._file.write(RECORD_HEADER.pack(len(payload), timestamp, kind, streamId))
+      self._file.write(payload)
+      return offset
+
+   def _getStreamId(self, stream, timestamp):
+      if stream not in self.streams:
+         if len(self.streams) > 255:
+            raise RecorderException("too many streams")
+         self.streams[stream] = len(self.streams)
+         self._writeRecord(timestamp, STREAM, self.streams[stream], stream.encode())
+      return self.streams[stream]
+
+   def _writeIndex(self):
+      offset = self._file.tell()
+      self._writeRecord(self._chunkLast, INDEX_KIND, 0, INDEX.pack(
+         self._lastIndex, self._chunkStart,
+         self._chunkFirst, self._chunkLast, self._chunkCount))
+      self._lastIndex = offset
+      self._resetChunk()
+
+   def _write(self, item):
+      timestamp, stream, kind, data = item
+      if isinstance(data, str):
+         payload = data.encode()
+      elif isinstance(data, bytes):
+         payload = data
+      else:
+         payload = json.dumps(data, default=str).encode()
+
+      streamId = self._getStreamId(stream, timestamp)
+      offset = self._writeRecord(timestamp, kind, streamId, payload)
+      if self._chunkStart == None:
+         self._chunkStart = offset
+         self._chunkFirst = timestamp
+      self._chunkLast = timestamp
+      self._chunkCount += 1
+      self.written += 1
+
+      if self._chunkCount >= self.indexInterval:
+         self._writeIndex()
+
+   def _writeLoop(self):
+      closing = False
+      while not closing:
+         item = self.queue.get()
+         try:
+            #write whatever piled up, then flush once
+            while True:
+               if item == None:
+                  closing = True
+                  break
+               self._write(item)
+               try:
+                  item = self.queue.get_nowait()
+               except queue.Empty:
+                  break
+            self._file.flush()
+         except Exception as e:
+            logging.error(f"[EventRecorder] failed to write to {self.path}: {e}")
+
+      if self._chunkCount > 0:
+         self._writeIndex()
+      self._file.close()
+
+########
+class RecordReader(object):
+   '''
+   mapped: read through a read-only memory map of the file rather than
+   file reads. Processes mapping the same log share its pages, the map
+   covers the file as it was when the reader was created.
+   '''
+   def __init__(self, path, mapped=False):
+      self.path = path
+      self._map = None
+      with open(path, 'rb') as recordFile:
+         header = recordFile.read(FILE_HEADER.size)
+         if len(header) < FILE_HEADER.size:
+            raise RecorderException(f"{path} is not a record file")
+         magic, version = FILE_HEADER.unpack(header)
+         if magic != RECORD_MAGIC or version != RECORD_VERSION:
+            raise RecorderException(f"{path} is not a record file")
+
+         if mapped:
+            self._map = mmap.mmap(recordFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+   def isMapped(self):
+      return self._map != None
+
+   def close(self):
+      if self._map != None:
+         self._map.close()
+         self._map = None
+
+   def readRecords(self, offset=FILE_HEADER.size, headersOnly=False):
+      #yields every record, messages and bookkeeping, from offset
+      if self._map != None:
+         yield from self._readMapped(offset, headersOnly)
+         return
+
+      with open(self.path, 'rb') as recordFile:
+         recordFile.seek(offset)
+         while True:
+            header = recordFile.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+               #end of file, or a record cut short by a crash
+               return
+            length, timestamp, kind, streamId = RECORD_HEADER.unpack(header)
+            payload = None
+            if headersOnly and kind in (IN, OUT):
+               recordFile.seek(length, os.SEEK_CUR)
+            else:
+               payload = recordFile.read(length)
+               if len(payload) < length:
+                  return
+            yield offset, timestamp, kind, streamId, payload
+            offset += RECORD_HEADER.size + length
+
+   def _readMapped(self, offset, headersOnly):
+      size = len(self._map)
+      while offset + RECORD_HEADER.size <= size:
+         length, timestamp, kind, streamId = \
+            RECORD_HEADER.unpack_from(self._map, offset)
+         start = offset + RECORD_HEADER.size
+         if start + length > size:
+            return
+         payload = None
+         if not headersOnly or kind not in (IN, OUT):
+            payload = self._map[start:start + length]
+         yield offset, timestamp, kind, streamId, payload
+         offset = start + length
+
+   def __iter__(self):
+      return self.getMessages()
+
+   def getMessages(self, since=0):
+      #messages with a timestamp >= since, in file order
+      offset = FILE_HEADER.size
+      streams = {}
+      if since > 0:
+         offset, streams = self.seek(since)
+
+      for offset, timestamp, kind, streamId, payload in self.readRecords(offset):
+         if kind == STREAM:
+            if streamId == 0:
+               #new writer session
+               streams = {}
+            streams[streamId] = payload.decode()
+         elif kind in (IN, OUT) and timestamp >= since:
+            yield Record(offset, timestamp, kind,
+               streams.get(streamId), payload)
+
+   def getIndex(self):
+      result = []
+      for offset, timestamp, kind, streamId, payload in self.readRecords(headersOnly=True):
+         if kind == INDEX_KIND:
+            result.append(INDEX.unpack(payload))
+      return result
+
+   def seek(self, timestamp):
+      #returns the offset of the first chunk that reaches timestamp and
+      #the streams declared at that point, only index and stream records
+      #are decoded on the way
+      streams = {}
+      tail = FILE_HEADER.size
+      tailStreams = {}
+      for offset, ts, kind, streamId, payload in self.readRecords(headersOnly=True):
+         if kind == STREAM:
+            if streamId == 0:
+               streams = {}
+            streams[streamId] = payload.decode()
+         elif kind == INDEX_KIND:
+            prevIndex, chunkStart, first, last, count = INDEX.unpack(payload)
+            if last >= timestamp:
+               return chunkStart, dict(streams)
+            tail = offset + RECORD_HEADER.size + len(payload)
+            tailStreams = dict(streams)
+
+      #not indexed yet
+      return tail, tailStreams
+
+################################################################################
+_recorders = {}
+
+def getRecorder(config):
+   '''
+   Opt-in through the "recorder" config group. Connections sharing a
+   config share the recorder, so a dealer writes a single log.
+   '''
+   if 'recorder' not in config or 'path' not in config['recorder']:
+      return None
+
+   path = os.path.abspath(config['recorder']['path'])
+   if path not in _recorders:
+      _recorders[path] = EventRecorder(path,
+         config['recorder'].get('index_interval', INDEX_INTERVAL))
+   return _recorders[path]
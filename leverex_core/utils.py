@@ -4,6 +4,8 @@ import logging
 from datetime import datetime
 from decimal import Decimal, ROUND_DOWN, ROUND_UP
 
+from .clock import WALL_CLOCK
+
 ### order enums ###
 ORDER_ACTION_CREATED = 1
 ORDER_ACTION_UPDATED = 2
@@ -159,7 +161,7 @@ class SessionsHistory(object):
 
 ### offers ###
 class PriceOffer():
-   def __init__(self, volume, ask=None, bid=None, isLast=False):
+   def __init__(self, volume, ask=None, bid=None, isLast=False, clock=WALL_CLOCK):
       if volume:
          self._volume = round_down(volume, 8)
       else:
@@ -170,7 +172,7 @@ class PriceOffer():
 
       self._ask = ask
       self._bid = bid
-      self._timestamp = time.time_ns() / 1000000 #time in ms
+      self._timestamp = clock.time_ns() / 1000000 #time in ms
       self._isLast = isLast
 
    @property
@@ -220,6 +222,7 @@ class DealerOffers(object):
    def __init__(self, jsonPacket):
       self.asks = []
       self.bids = []
+      self.product_type = jsonPacket.get('product_type')
 
       if not 'offers' in jsonPacket:
          return
@@ -978,6 +981,9 @@ class Announcements(object):
    def __init__(self):
       self.chyrons = {}
 
+   def getMemoryGauges(self):
+      return { 'chyrons' : len(self.chyrons) }
+
    def processUpdate(self, chyronsJson):
       if not 'items' in chyronsJson:
          return
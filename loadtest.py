@@ -0,0 +1,54 @@
+import logging
+import json
+import argparse
+
+from LoadTest.Harness import LoadTest, parseRates, parseMultipliers, \
+   DEFAULT_MULTIPLIERS, DEFAULT_STEP_DURATION, DEFAULT_WARMUP
+from LoadTest.Stats import LOAD_STREAMS
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.ERROR, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex dealer load test - ramps up the load from local '
+         'venue stand-ins until the dealer saturates')
+
+   parser.add_argument('--config', type=str, default=None,
+      help='Dealer config file, its hedger settings are used')
+   parser.add_argument('--rates', type=str, default=None,
+      help='Base rates in messages per second, as stream=rate,... with '
+         f'stream in: {", ".join(LOAD_STREAMS)}')
+   parser.add_argument('--steps', type=str,
+      default=','.join(str(m) for m in DEFAULT_MULTIPLIERS),
+      help='Rate multiplier of each step of the ramp')
+   parser.add_argument('--step-duration', type=float, default=DEFAULT_STEP_DURATION,
+      help='Duration of each step, in seconds')
+   parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP,
+      help='Time for the dealer to connect before the ramp, in seconds')
+   parser.add_argument('--output', type=str, default=None,
+      help='Write the report to this JSON file')
+   args = parser.parse_args()
+
+   hedgerConfig = {}
+   if args.config != None:
+      with open(args.config) as json_config_file:
+         hedgerConfig = json.load(json_config_file).get('hedger', {})
+
+   loadTest = LoadTest(multipliers=parseMultipliers(args.steps),
+      stepDuration=args.step_duration, warmup=args.warmup,
+      hedgerConfig=hedgerConfig)
+   if args.rates != None:
+      loadTest.rates = parseRates(args.rates)
+
+   print(f"ramping {loadTest.rates} over {len(loadTest.multipliers)} steps "
+      f"of {args.step_duration}s")
+   report = loadTest.run()
+   print(report)
+
+   if args.output != None:
+      with open(args.output, 'w') as outputFile:
+         json.dump(report.toJson(), outputFile, indent=3)
@@ -0,0 +1,68 @@
+import logging
+import asyncio
+import json
+import argparse
+
+from Simulator.Crowd import Crowd
+from Simulator.Exchange import getSettings
+from Simulator.Server import SimulatorServer, LOCALHOST
+
+CROWD_REPORT_INTERVAL = 10 #in s
+
+################################################################################
+async def runSimulator(args, settings):
+   server = SimulatorServer(settings)
+   await server.start(args.host, args.api_port, args.public_port, args.login_port)
+   print(f"simulating {', '.join(settings['products'])}, leverex config:\n"
+      f"{json.dumps(server.getConfig(), indent=3)}")
+
+   tasks = server.getAsyncIOTasks()
+   if args.crowd > 0:
+      crowd = Crowd(server.getConfig(), args.crowd, args.crowd_rate,
+         settings['products'][0])
+      tasks.append(asyncio.create_task(crowd.run()))
+
+      async def reportLoop():
+         while True:
+            await asyncio.sleep(CROWD_REPORT_INTERVAL)
+            print(f"crowd: {str(crowd.stats)}")
+      tasks.append(asyncio.create_task(reportLoop()))
+
+   try:
+      await asyncio.gather(*tasks)
+   finally:
+      await server.stop()
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.WARNING, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex exchange simulator - serves the login, api and '
+         'public endpoints locally')
+
+   parser.add_argument('--config', type=str, default=None,
+      help='Config file, settings are read from its simulator group')
+   parser.add_argument('--host', type=str, default=LOCALHOST,
+      help='Interface to listen on')
+   parser.add_argument('--api-port', type=int, default=0,
+      help='Authenticated api port, any free port by default')
+   parser.add_argument('--public-port', type=int, default=0,
+      help='Public api port')
+   parser.add_argument('--login-port', type=int, default=0,
+      help='Login api port')
+   parser.add_argument('--crowd', type=int, default=0,
+      help='Simulated takers sending market orders against the dealers')
+   parser.add_argument('--crowd-rate', type=float, default=0.1,
+      help='Market orders per second per simulated taker')
+   args = parser.parse_args()
+
+   config = {}
+   if args.config != None:
+      with open(args.config) as json_config_file:
+         config = json.load(json_config_file)
+
+   asyncio.run(runSimulator(args, getSettings(config)))
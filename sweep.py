@@ -0,0 +1,43 @@
+import logging
+import json
+import argparse
+
+from Backtest.Sweep import ParameterSweep, parseParameter, SWEEP_PARAMETERS
+
+################################################################################
+if __name__ == '__main__':
+   LOG_FORMAT = (
+      "[%(asctime)s,%(msecs)d] [%(levelname)-8s] [%(filename)s:%(lineno)d] %(message)s"
+   )
+   logging.basicConfig(level=logging.WARNING, format=LOG_FORMAT)
+
+   parser = argparse.ArgumentParser(
+      description='Leverex dealer parameter sweep - replays a recorded session '
+         'once per set of hedger parameters, in parallel')
+
+   parser.add_argument('--config', type=str, help='Base dealer config file')
+   parser.add_argument('--log', type=str, help='Record log to replay')
+   parser.add_argument('--param', type=str, action='append', default=[],
+      help='Parameter values to sweep, as name=v1,v2,... Repeat for each '
+         f'parameter, one of: {", ".join(SWEEP_PARAMETERS)}')
+   parser.add_argument('--since', type=int, default=0,
+      help='Skip records older than this (monotonic ns, as recorded)')
+   parser.add_argument('--workers', type=int, default=None,
+      help='Worker processes, defaults to the CPU count')
+   parser.add_argument('--output', type=str, default=None,
+      help='Write the result rows to this JSON file')
+   args = parser.parse_args()
+
+   config = {}
+   with open(args.config) as json_config_file:
+      config = json.load(json_config_file)
+
+   grid = dict(parseParameter(arg) for arg in args.param)
+   sweep = ParameterSweep(config, args.log, grid, args.workers)
+   print(f"replaying {args.log} with {len(sweep.points)} parameter sets")
+   rows = sweep.run(args.since)
+   print(ParameterSweep.getTable(rows))
+
+   if args.output != None:
+      with open(args.output, 'w') as outputFile:
+         json.dump([row.toJson() for row in rows], outputFile, indent=3)